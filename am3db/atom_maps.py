@@ -0,0 +1,382 @@
+"""
+AM3DB's atom maps module.
+
+An atom map maps the reactant atoms to the product atoms, i.e., an atom map of [0, 2, 1] means that reactant atom 0
+matches product atom 0, reactant atom 1 matches product atom 2, and reactant atom 2 matches product atom 1.
+The AtomMapSet class stores many atom maps of a reaction as rows of a 2D NumPy array of the smallest unsigned
+integer type able to hold the atom indices, with vectorized operations over all maps.
+"""
+
+import base64
+from itertools import product
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from am3db.storage import get_database_settings
+
+
+ATOM_MAPS_FORMATS = ('list', 'compact')
+MAX_SYMMETRIES = 1000
+
+
+class AtomMapSet(object):
+    """
+    A set of atom maps of a single reaction.
+
+    Args:
+        maps (Union[np.ndarray, Sequence[Sequence[int]]]): The atom maps, one per row.
+        num_atoms (int, optional): The number of atoms, only required if there are no maps.
+
+    Attributes:
+        maps (np.ndarray): A read-only (number of maps) x (number of atoms) array of atom maps.
+    """
+
+    def __init__(self,
+                 maps: Union[np.ndarray, Sequence[Sequence[int]]],
+                 num_atoms: Optional[int] = None,
+                 ):
+        maps = np.asarray(maps)
+        if maps.size == 0:
+            maps = maps.reshape((0, num_atoms or 0))
+        if maps.ndim != 2:
+            raise ValueError(f'Atom maps must be a 2D array, got an array of shape {maps.shape}.')
+        if maps.size and (maps.min() < 0 or maps.max() >= maps.shape[1]):
+            raise ValueError(f'Atom map entries must be atom indices between 0 and {maps.shape[1] - 1}.')
+        self.maps = maps.astype(get_index_dtype(maps.shape[1]))
+        self.maps.flags.writeable = False
+
+    def __len__(self) -> int:
+        return self.maps.shape[0]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, AtomMapSet) and np.array_equal(self.maps, other.maps) \
+            and self.num_atoms == other.num_atoms
+
+    def __repr__(self) -> str:
+        return f'AtomMapSet({self.to_list()})'
+
+    @property
+    def num_atoms(self) -> int:
+        """The number of atoms in each atom map"""
+        return self.maps.shape[1]
+
+    @classmethod
+    def from_list(cls, atom_maps: Optional[Union[List[int], List[List[int]]]]) -> 'AtomMapSet':
+        """
+        Create an AtomMapSet from the database list format.
+
+        Args:
+            atom_maps (Union[List[int], List[List[int]]]): A single atom map or a list of atom maps.
+
+        Returns:
+            AtomMapSet: The atom map set.
+        """
+        if not atom_maps:
+            return cls(np.zeros((0, 0), dtype=np.uint8))
+        if isinstance(atom_maps[0], (int, np.integer)):
+            atom_maps = [atom_maps]
+        return cls(atom_maps)
+
+    def to_list(self) -> List[List[int]]:
+        """
+        Convert to the database list format.
+
+        Returns:
+            List[List[int]]: The atom maps.
+        """
+        return self.maps.tolist()
+
+    @classmethod
+    def from_compact(cls, data: str) -> 'AtomMapSet':
+        """
+        Create an AtomMapSet from its compact serialization.
+
+        Args:
+            data (str): The compact serialization, as generated by ``to_compact()``.
+
+        Returns:
+            AtomMapSet: The atom map set.
+        """
+        header, _, payload = data.partition(':')
+        num_maps, num_atoms = (int(value) for value in header.split('x'))
+        flat = np.frombuffer(base64.b64decode(payload), dtype=get_index_dtype(num_atoms).newbyteorder('<'))
+        return cls(flat.reshape((num_maps, num_atoms)), num_atoms=num_atoms)
+
+    def to_compact(self) -> str:
+        """
+        Serialize to a compact string of the form ``<number of maps>x<number of atoms>:<base64 data>``,
+        the data being the little-endian array of atom indices.
+
+        Returns:
+            str: The compact serialization.
+        """
+        data = self.maps.astype(self.maps.dtype.newbyteorder('<'), copy=False).tobytes()
+        return f'{len(self)}x{self.num_atoms}:{base64.b64encode(data).decode("ascii")}'
+
+    def deduplicate(self) -> 'AtomMapSet':
+        """
+        Remove repeated atom maps, keeping the first occurrence of each.
+
+        Returns:
+            AtomMapSet: The unique atom maps, in their original order.
+        """
+        if len(self) < 2:
+            return self
+        _, first_indices = np.unique(self.maps, axis=0, return_index=True)
+        return AtomMapSet(self.maps[np.sort(first_indices)])
+
+    def inverse(self) -> 'AtomMapSet':
+        """
+        Invert all atom maps, mapping the product atoms to the reactant atoms.
+
+        Returns:
+            AtomMapSet: The inverse atom maps.
+        """
+        inverse = np.empty_like(self.maps)
+        rows = np.arange(len(self))[:, np.newaxis]
+        inverse[rows, self.maps] = np.arange(self.num_atoms, dtype=self.maps.dtype)
+        return AtomMapSet(inverse, num_atoms=self.num_atoms)
+
+    def compose(self,
+                product_permutation: Optional[Sequence[int]] = None,
+                reactant_permutation: Optional[Sequence[int]] = None,
+                ) -> 'AtomMapSet':
+        """
+        Compose all atom maps with permutations of the reactant and/or product atoms.
+        The composed map sends reactant atom ``i`` to ``product_permutation[map[reactant_permutation[i]]]``.
+
+        Args:
+            product_permutation (Sequence[int], optional): A permutation of the product atom indices.
+            reactant_permutation (Sequence[int], optional): A permutation of the reactant atom indices.
+
+        Returns:
+            AtomMapSet: The composed atom maps.
+        """
+        maps = self.maps
+        if reactant_permutation is not None:
+            maps = maps[:, np.asarray(reactant_permutation, dtype=np.intp)]
+        if product_permutation is not None:
+            maps = np.asarray(product_permutation)[maps]
+        return AtomMapSet(maps, num_atoms=self.num_atoms)
+
+    def canonicalize(self,
+                     reactant_symmetries: Optional[Sequence[Sequence[int]]] = None,
+                     product_symmetries: Optional[Sequence[Sequence[int]]] = None,
+                     ) -> np.ndarray:
+        """
+        Get the canonical form of every atom map under the given symmetries,
+        which is the lexicographically smallest map among all its symmetry-equivalent images.
+
+        Args:
+            reactant_symmetries (Sequence[Sequence[int]], optional): Permutations of the reactant atom indices
+                                                                     which leave the reactants unchanged.
+            product_symmetries (Sequence[Sequence[int]], optional): Permutations of the product atom indices
+                                                                    which leave the products unchanged.
+
+        Returns:
+            np.ndarray: The canonical atom maps, one per row.
+        """
+        identity = np.arange(self.num_atoms, dtype=np.intp)
+        r_perms = np.asarray(reactant_symmetries, dtype=np.intp) if reactant_symmetries else identity[np.newaxis]
+        p_perms = np.asarray(product_symmetries, dtype=np.intp) if product_symmetries else identity[np.newaxis]
+        # images[m, s, q, i] = p_perms[q, maps[m, r_perms[s, i]]], then flattened over (s, q).
+        r_images = self.maps.astype(np.intp)[:, r_perms]
+        images = p_perms[np.arange(len(p_perms))[np.newaxis, np.newaxis, :, np.newaxis], r_images[:, :, np.newaxis, :]]
+        images = images.reshape((len(self), -1, self.num_atoms))
+        candidates = np.ones(images.shape[:2], dtype=bool)
+        for column in range(self.num_atoms):
+            values = np.where(candidates, images[:, :, column], self.num_atoms)
+            candidates &= values == values.min(axis=1, keepdims=True)
+        return images[np.arange(len(self)), candidates.argmax(axis=1)]
+
+    def cluster(self,
+                reactant_symmetries: Optional[Sequence[Sequence[int]]] = None,
+                product_symmetries: Optional[Sequence[Sequence[int]]] = None,
+                ) -> List[List[int]]:
+        """
+        Group symmetry-equivalent atom maps, generating the ``clustering`` database field.
+        Without symmetries, only identical atom maps are grouped.
+
+        Args:
+            reactant_symmetries (Sequence[Sequence[int]], optional): Permutations of the reactant atom indices
+                                                                     which leave the reactants unchanged.
+            product_symmetries (Sequence[Sequence[int]], optional): Permutations of the product atom indices
+                                                                    which leave the products unchanged.
+
+        Returns:
+            List[List[int]]: Groups of atom map indices, ordered by their first member.
+        """
+        if not len(self):
+            return list()
+        canonical = self.canonicalize(reactant_symmetries, product_symmetries)
+        _, first_indices, inverse = np.unique(canonical, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(first_indices, kind='stable')
+        return [np.flatnonzero(inverse == group).tolist() for group in order]
+
+
+def get_index_dtype(num_atoms: int) -> np.dtype:
+    """
+    Get the smallest unsigned integer type able to hold the indices of a number of atoms.
+
+    Args:
+        num_atoms (int): The number of atoms.
+
+    Returns:
+        np.dtype: The data type.
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if num_atoms <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def get_atom_maps_format(database_path: Optional[str] = None) -> str:
+    """
+    Get the format in which a database stores atom maps, according to its ``atom_maps_format`` setting.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        str: The format, 'list' (the default) or 'compact'.
+    """
+    return get_database_settings(database_path).get('atom_maps_format', 'list')
+
+
+def encode_atom_maps(value: Optional[Union[str, List[int], List[List[int]]]],
+                     atom_maps_format: str = 'list',
+                     ) -> Optional[Union[str, List[List[int]]]]:
+    """
+    Encode the ``atom_maps`` field of a database entry in the given format.
+    Atom maps which do not form a valid AtomMapSet (e.g., ragged maps) are returned as is.
+
+    Args:
+        value (Union[str, List[int], List[List[int]]]): The atom maps, in either format.
+        atom_maps_format (str, optional): The format, 'list' or 'compact'.
+
+    Returns:
+        Optional[Union[str, List[List[int]]]]: The encoded atom maps, ``None`` if there are none.
+    """
+    if value is None:
+        return None
+    if atom_maps_format not in ATOM_MAPS_FORMATS:
+        raise ValueError(f'Got an illegal atom maps format "{atom_maps_format}", '
+                         f'allowed values are: {ATOM_MAPS_FORMATS}')
+    try:
+        atom_maps = decode_atom_maps(value)
+    except ValueError:
+        return value
+    return atom_maps.to_compact() if atom_maps_format == 'compact' else atom_maps.to_list()
+
+
+def get_automorphisms(labels: Sequence,
+                      bonds: Dict[Tuple[int, int], object],
+                      max_count: int = MAX_SYMMETRIES,
+                      ) -> Optional[List[List[int]]]:
+    """
+    Get the automorphisms of a molecular graph, i.e., the permutations of the atom indices
+    which preserve the atom labels and the bonds.
+
+    Args:
+        labels (Sequence): The atom labels (e.g., element symbols), one per atom.
+        bonds (Dict[Tuple[int, int], object]): Keys are pairs of bonded atom indices (in both orders),
+                                               values are bond labels (e.g., bond orders).
+        max_count (int, optional): The maximal number of automorphisms to enumerate.
+
+    Returns:
+        Optional[List[List[int]]]: The automorphisms, ``None`` if there are more than ``max_count``.
+    """
+    num_atoms = len(labels)
+    neighbors = [list() for _ in range(num_atoms)]
+    for i, j in bonds.keys():
+        neighbors[i].append(j)
+    # Refine the atom labels by their neighborhoods, only atoms of equal refined labels may be swapped.
+    colors = [str(label) for label in labels]
+    for _ in range(num_atoms):
+        refined = [f'{colors[i]}|{sorted((str(bonds[(i, j)]), colors[j]) for j in neighbors[i])}'
+                   for i in range(num_atoms)]
+        ids = {color: k for k, color in enumerate(sorted(set(refined)))}
+        refined = [str(ids[color]) for color in refined]
+        if len(set(refined)) == len(set(colors)):
+            colors = refined
+            break
+        colors = refined
+    candidates = dict()
+    for i in range(num_atoms):
+        candidates.setdefault(colors[i], list()).append(i)
+    # Map the atoms in a breadth-first order, so that most atoms are constrained by an already mapped neighbor.
+    order, seen = list(), set()
+    for root in sorted(range(num_atoms), key=lambda i: (len(candidates[colors[i]]), i)):
+        queue = [root] if root not in seen else list()
+        seen.add(root)
+        while queue:
+            atom = queue.pop(0)
+            order.append(atom)
+            for neighbor in neighbors[atom]:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    queue.append(neighbor)
+    automorphisms, permutation, used = list(), [-1] * num_atoms, [False] * num_atoms
+
+    def extend(position: int) -> bool:
+        if position == num_atoms:
+            automorphisms.append(list(permutation))
+            return len(automorphisms) <= max_count
+        atom = order[position]
+        for image in candidates[colors[atom]]:
+            if used[image] or any(bonds.get((mapped, atom)) != bonds.get((permutation[mapped], image))
+                                  for mapped in order[:position]):
+                continue
+            permutation[atom], used[image] = image, True
+            proceed = extend(position + 1)
+            permutation[atom], used[image] = -1, False
+            if not proceed:
+                return False
+        return True
+
+    return automorphisms if extend(0) else None
+
+
+def combine_symmetries(symmetries: Sequence[Optional[Sequence[Sequence[int]]]],
+                       sizes: Sequence[int],
+                       max_count: int = MAX_SYMMETRIES,
+                       ) -> List[List[int]]:
+    """
+    Combine the symmetries of the species on one side of a reaction into symmetries of the concatenated atom indices.
+    Species without symmetries, or whose symmetries would exceed ``max_count`` combined symmetries,
+    only contribute their identity permutation.
+
+    Args:
+        symmetries (Sequence[Optional[Sequence[Sequence[int]]]]): The automorphisms of each species.
+        sizes (Sequence[int]): The number of atoms of each species.
+        max_count (int, optional): The maximal number of combined symmetries.
+
+    Returns:
+        List[List[int]]: The combined symmetries.
+    """
+    blocks, offset, count = list(), 0, 1
+    for species_symmetries, size in zip(symmetries, sizes):
+        identity = [list(range(size))]
+        if not species_symmetries or count * len(species_symmetries) > max_count:
+            species_symmetries = identity
+        blocks.append([[offset + i for i in permutation] for permutation in species_symmetries])
+        count *= len(species_symmetries)
+        offset += size
+    return [sum(permutations, list()) for permutations in product(*blocks)]
+
+
+def decode_atom_maps(value: Optional[Union[str, List[int], List[List[int]]]]) -> AtomMapSet:
+    """
+    Decode the ``atom_maps`` field of a database entry, given either in the list or in the compact format.
+
+    Args:
+        value (Union[str, List[int], List[List[int]]]): The stored atom maps.
+
+    Returns:
+        AtomMapSet: The atom map set.
+    """
+    if isinstance(value, str):
+        return AtomMapSet.from_compact(value)
+    return AtomMapSet.from_list(value)
@@ -0,0 +1,194 @@
+"""
+AM3DB's catalog module.
+
+A cached catalog of the shards in a database reactions folder. Shard filenames are parsed exactly
+(``<family>_<n><extension>``), so a family label is never matched as a substring of another family label.
+The folder is listed again only when its modification time changes, and writers notify the catalog of the shards
+they create, so a catalog answers which families and shards exist, and which shard holds a reaction ID,
+without listing the folder on every call. A folder modified within ``RACY_INTERVAL`` seconds of being listed
+is listed again on the next access, since files created within the timestamp granularity may not change its mtime.
+"""
+
+import os
+import time
+from typing import List, Optional
+
+from am3db.common import DATABASE_PATH
+from am3db.storage import parse_shard_filename
+
+
+RACY_INTERVAL = 1.0
+
+
+class ShardCatalog(object):
+    """
+    A catalog of the shards in a reactions folder, keyed by family.
+
+    Args:
+        reactions_path (str): The path to the database reactions folder.
+
+    Attributes:
+        reactions_path (str): The path to the database reactions folder.
+        families (Dict[str, List[Tuple[int, str]]]): Keys are family labels,
+                                                     values are (shard number, shard filename) tuples sorted by number.
+        shards (set): The shard filenames.
+        num_scans (int): The number of times the folder was listed.
+    """
+
+    def __init__(self, reactions_path: str):
+        self.reactions_path = reactions_path
+        self.families = dict()
+        self.shards = set()
+        self.num_scans = 0
+        self._stat = None
+        self._valid = False
+
+    def refresh(self) -> 'ShardCatalog':
+        """
+        List the reactions folder again if it was modified since it was last listed or the catalog was invalidated.
+
+        Returns:
+            ShardCatalog: The catalog instance, to allow chaining.
+        """
+        try:
+            stat = os.stat(self.reactions_path)
+            stat = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            stat = None
+        if self._valid and stat == self._stat:
+            return self
+        families, shards = dict(), set()
+        if stat is not None:
+            for file_name in os.listdir(self.reactions_path):
+                parsed = parse_shard_filename(file_name)
+                if parsed is not None:
+                    families.setdefault(parsed[0], list()).append((parsed[1], file_name))
+                    shards.add(file_name)
+        for family_shards in families.values():
+            family_shards.sort()
+        self.families, self.shards, self._stat = families, shards, stat
+        self._valid = stat is None or time.time_ns() - stat[1] > RACY_INTERVAL * 1e9
+        self.num_scans += 1
+        return self
+
+    def invalidate(self):
+        """
+        Force listing the reactions folder on the next access.
+        """
+        self._valid = False
+
+    def add_shard(self, shard: str):
+        """
+        Add a shard written by this process to the catalog, without listing the folder.
+
+        Args:
+            shard (str): The shard filename.
+        """
+        parsed = parse_shard_filename(shard)
+        if parsed is None or shard in self.shards:
+            return
+        self.shards.add(shard)
+        family_shards = self.families.setdefault(parsed[0], list())
+        family_shards.append((parsed[1], shard))
+        family_shards.sort()
+
+    def get_families(self) -> List[str]:
+        """
+        Get the labels of the families which have shards.
+
+        Returns:
+            List[str]: The sorted family labels.
+        """
+        return sorted(self.refresh().families.keys())
+
+    def get_shards(self,
+                   family: str,
+                   extension: Optional[str] = None,
+                   ) -> List[str]:
+        """
+        Get the shard filenames of a family, sorted by their number.
+
+        Args:
+            family (str): The reaction family label.
+            extension (str, optional): Only get shards with this file extension.
+
+        Returns:
+            List[str]: The shard filenames.
+        """
+        return [shard for _, shard in self.refresh().families.get(family, list())
+                if extension is None or shard.endswith(extension)]
+
+    def has_shard(self, shard: str) -> bool:
+        """
+        Check whether a shard exists.
+
+        Args:
+            shard (str): The shard filename.
+
+        Returns:
+            bool: Whether the shard exists.
+        """
+        return shard in self.refresh().shards
+
+    def find_shard(self,
+                   family: str,
+                   index: int,
+                   extension: str = '.yml',
+                   ) -> Optional[str]:
+        """
+        Get the shard holding a reaction ID.
+
+        Args:
+            family (str): The reaction family label.
+            index (int): The reaction ID.
+            extension (str, optional): The shard file extension of the database storage backend.
+
+        Returns:
+            Optional[str]: The shard filename, ``None`` if the shard which would hold the reaction does not exist.
+        """
+        from am3db.manifest import determine_family_filename_by_index
+        shard = determine_family_filename_by_index(index=index, family=family, extension=extension,
+                                                   database_path=os.path.dirname(self.reactions_path))
+        return shard if self.has_shard(shard) else None
+
+
+_catalogs = dict()
+
+
+def get_catalog(reactions_path: Optional[str] = None) -> ShardCatalog:
+    """
+    Get the shard catalog of a reactions folder, cached per process.
+
+    Args:
+        reactions_path (str, optional): The path to the reactions folder, defaults to that of the database.
+
+    Returns:
+        ShardCatalog: The catalog.
+    """
+    reactions_path = os.path.abspath(reactions_path or os.path.join(DATABASE_PATH, 'reactions'))
+    if reactions_path not in _catalogs:
+        _catalogs[reactions_path] = ShardCatalog(reactions_path=reactions_path)
+    return _catalogs[reactions_path]
+
+
+def notify_shard_written(reactions_path: str,
+                         shard: str,
+                         ):
+    """
+    Notify the cached catalog of a reactions folder that a shard was written.
+
+    Args:
+        reactions_path (str): The path to the reactions folder.
+        shard (str): The shard filename.
+    """
+    catalog = _catalogs.get(os.path.abspath(reactions_path), None)
+    if catalog is not None:
+        catalog.add_shard(shard)
+
+
+def invalidate_catalogs():
+    """
+    Force all cached catalogs to list their folders on the next access, e.g., after shards were removed.
+    """
+    for catalog in _catalogs.values():
+        catalog.invalidate()
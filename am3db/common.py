@@ -4,6 +4,10 @@ AM3DB common module
 
 import datetime
 import os
+import subprocess
+from typing import Tuple
+
+import yaml
 
 VERSION = '0.1.0'
 
@@ -44,3 +48,111 @@ def time_lapse(t0: datetime.datetime) -> datetime.timedelta:
         The time difference between now and t0.
     """
     return datetime.datetime.now() - t0
+
+
+def read_yaml_file(path: str) -> dict:
+    """
+    Read a YAML file (usually an input / restart file, but also conformers file)
+    and return the parameters as python variables.
+    Compatible with ``arc.common.read_yaml_file()``.
+
+    Args:
+        path (str): The YAML file path to read.
+
+    Returns:
+        dict: The content read from the file.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f'Could not find the YAML file {path}')
+    with open(path, 'r') as f:
+        content = yaml.load(stream=f, Loader=yaml.FullLoader)
+    return content
+
+
+def save_yaml_file(path: str,
+                   content,
+                   ):
+    """
+    Save a YAML file (usually an input / restart file, but also conformers file).
+    The output is identical to that of ``arc.common.save_yaml_file()``.
+
+    Args:
+        path (str): The YAML file path to save.
+        content: The content to save.
+    """
+    if os.path.dirname(path) and not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    yaml_str = to_yaml(py_content=content)
+    with open(path, 'w') as f:
+        f.write(yaml_str)
+
+
+def to_yaml(py_content) -> str:
+    """
+    Convert a Python list or dictionary to a YAML string format.
+
+    Args:
+        py_content: The Python content to save.
+
+    Returns:
+        str: The corresponding YAML representation.
+    """
+    return yaml.dump(data=py_content, Dumper=_Dumper)
+
+
+def string_representer(dumper, data):
+    """
+    Add a custom string representer to use block literals for multiline strings.
+    """
+    if len(data.splitlines()) > 1:
+        return dumper.represent_scalar(tag='tag:yaml.org,2002:str', value=data, style='|')
+    return dumper.represent_scalar(tag='tag:yaml.org,2002:str', value=data)
+
+
+class _Dumper(yaml.Dumper):
+    """A YAML dumper with the multiline string representer, which leaves the global yaml.Dumper untouched."""
+    pass
+
+
+_Dumper.add_representer(str, string_representer)
+
+
+def get_git_commit(path: str = AM3DB_PATH) -> Tuple[str, str]:
+    """
+    Get the recent git commit to be logged.
+
+    Args:
+        path (str, optional): The path to the git repository.
+
+    Returns:
+        Tuple[str, str]: The git HEAD commit hash and the git HEAD commit date, each as a string.
+    """
+    head, date = '', ''
+    if os.path.exists(os.path.join(path, '.git')):
+        try:
+            head, date = subprocess.check_output(['git', 'log', '--format=%H%n%cd', '-1'], cwd=path).splitlines()
+            head, date = head.decode(), date.decode()
+        except (subprocess.CalledProcessError, OSError, ValueError):
+            return head, date
+    return head, date
+
+
+def get_git_branch(path: str = AM3DB_PATH) -> str:
+    """
+    Get the git branch to be logged.
+
+    Args:
+        path (str, optional): The path to the git repository.
+
+    Returns:
+        str: The git branch name.
+    """
+    if os.path.exists(os.path.join(path, '.git')):
+        try:
+            branch_list = subprocess.check_output(['git', 'branch'], cwd=path).splitlines()
+        except (subprocess.CalledProcessError, OSError):
+            return ''
+        for branch_name in branch_list:
+            if '*' in branch_name.decode():
+                return branch_name.decode()[2:]
+    return ''
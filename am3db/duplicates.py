@@ -0,0 +1,219 @@
+"""
+AM3DB's duplicates module.
+
+A lazily built, incrementally updated hash index of the reactions stored per family, used to detect duplicate
+reactions at save time. Reactions are keyed by their canonical
+(sorted reactant InChI keys, sorted product InChI keys, multiplicity, charge) tuple.
+"""
+
+import os
+from itertools import zip_longest
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from am3db.journal import get_journal, get_journal_size
+from am3db.storage import read_shard
+
+if TYPE_CHECKING:
+    from am3db.manifest import FamilyManifest
+
+
+DUPLICATE_POLICIES = ('allow', 'skip', 'merge', 'raise')
+
+
+class DuplicateReactionError(Exception):
+    """
+    An exception raised when saving a reaction which already exists in the database.
+    """
+    pass
+
+
+class DuplicateIndex(object):
+    """
+    A hash index of the reactions of a family in the database.
+
+    Args:
+        family (str): The reaction family label.
+
+    Attributes:
+        family (str): The reaction family label.
+        keys (Dict[Tuple, int]): Keys are canonical reaction keys, values are reaction IDs.
+        shards (dict): The manifest shard entries the index was last synchronized with.
+        journal_size (int): The size of the family journal the index was last synchronized with.
+    """
+
+    def __init__(self, family: str):
+        self.family = family
+        self.keys = dict()
+        self.shards = None
+        self.journal_size = None
+
+    def is_in_sync(self, manifest: 'FamilyManifest') -> bool:
+        """
+        Check whether the index reflects the shards recorded in the family manifest and the family journal.
+
+        Args:
+            manifest (FamilyManifest): The family manifest.
+
+        Returns:
+            bool: Whether the index is in sync.
+        """
+        return self.shards == manifest.shards \
+            and self.journal_size == get_journal_size(manifest.family, manifest.database_path)
+
+    def build(self, manifest: 'FamilyManifest'):
+        """
+        Build the index from the shards recorded in the family manifest and the family journal.
+
+        Args:
+            manifest (FamilyManifest): The family manifest.
+        """
+        self.keys = dict()
+        journal_entries = dict(get_journal(manifest.family, manifest.database_path).entries)
+        for shard in manifest.shards.keys():
+            for index, entry in read_shard(os.path.join(manifest.reactions_path, shard)).items():
+                self.add(index, entry)
+        for index, entry in journal_entries.items():
+            self.add(index, entry)
+        self.synchronize(manifest)
+
+    def synchronize(self, manifest: 'FamilyManifest'):
+        """
+        Mark the index as reflecting the shards currently recorded in the family manifest and the family journal.
+
+        Args:
+            manifest (FamilyManifest): The family manifest.
+        """
+        self.shards = {shard: dict(entry) for shard, entry in manifest.shards.items()}
+        self.journal_size = get_journal_size(manifest.family, manifest.database_path)
+
+    def add(self,
+            index: int,
+            entry: dict,
+            ):
+        """
+        Add a reaction entry to the index.
+
+        Args:
+            index (int): The reaction ID.
+            entry (dict): The database entry, as generated by ``AMReaction.as_db_dict()``.
+        """
+        key = get_reaction_key(entry)
+        if key is not None:
+            self.keys.setdefault(key, index)
+
+    def find(self,
+             entry: dict,
+             own_reverse: bool = False,
+             ) -> Optional[int]:
+        """
+        Find a stored reaction identical to the given entry.
+
+        Args:
+            entry (dict): The database entry, as generated by ``AMReaction.as_db_dict()``.
+            own_reverse (bool, optional): Whether the family is its own reverse,
+                                          in which case the reverse direction is also looked up.
+
+        Returns:
+            Optional[int]: The reaction ID of the stored reaction, ``None`` if there is no duplicate.
+        """
+        key = get_reaction_key(entry)
+        if key is None:
+            return None
+        if key in self.keys:
+            return self.keys[key]
+        if own_reverse:
+            return self.keys.get(get_reaction_key(entry, reverse=True), None)
+        return None
+
+
+_duplicate_indices = dict()
+
+
+def get_duplicate_index(manifest: 'FamilyManifest') -> DuplicateIndex:
+    """
+    Get the duplicate index of a family, building it on first usage or if the shards changed since.
+    Indices are cached per process for every database and family.
+
+    Args:
+        manifest (FamilyManifest): The (loaded) family manifest.
+
+    Returns:
+        DuplicateIndex: The duplicate index.
+    """
+    cache_key = (os.path.abspath(manifest.database_path), manifest.family)
+    if cache_key not in _duplicate_indices:
+        _duplicate_indices[cache_key] = DuplicateIndex(family=manifest.family)
+    duplicate_index = _duplicate_indices[cache_key]
+    if not duplicate_index.is_in_sync(manifest):
+        duplicate_index.build(manifest)
+    return duplicate_index
+
+
+def clear_duplicate_indices():
+    """
+    Clear all cached duplicate indices.
+    """
+    _duplicate_indices.clear()
+
+
+def get_reaction_key(entry: dict,
+                     reverse: bool = False,
+                     ) -> Optional[Tuple]:
+    """
+    Get the canonical key of a reaction entry.
+
+    Args:
+        entry (dict): The database entry, as generated by ``AMReaction.as_db_dict()``.
+        reverse (bool, optional): Whether to generate the key of the reverse reaction.
+
+    Returns:
+        Optional[Tuple]: The (sorted reactant InChI keys, sorted product InChI keys, multiplicity, charge) tuple,
+                         ``None`` if the InChI keys of either side are unknown.
+    """
+    r_inchi_keys, p_inchi_keys = entry.get('r_inchi_keys'), entry.get('p_inchi_keys')
+    if not r_inchi_keys or not p_inchi_keys:
+        return None
+    if reverse:
+        r_inchi_keys, p_inchi_keys = p_inchi_keys, r_inchi_keys
+    return tuple(sorted(r_inchi_keys)), tuple(sorted(p_inchi_keys)), entry.get('multiplicity'), entry.get('charge')
+
+
+def merge_review_state(stored_entry: dict,
+                       new_entry: dict,
+                       ) -> dict:
+    """
+    Merge the review state of a new entry into a stored duplicate entry.
+
+    Args:
+        stored_entry (dict): The stored database entry.
+        new_entry (dict): The new database entry.
+
+    Returns:
+        dict: The stored entry with the union of the approving reviewers of both entries,
+              and the union of their rejections as (reviewer, reason) pairs, so reviewers and reasons stay aligned.
+    """
+    merged = dict(stored_entry)
+    approved_by = list(stored_entry.get('approved_by') or list())
+    approved_by.extend(name for name in new_entry.get('approved_by') or list() if name not in approved_by)
+    merged['approved_by'] = approved_by if len(approved_by) or stored_entry.get('approved_by') is not None \
+        else stored_entry.get('approved_by')
+    rejections = get_rejections(stored_entry)
+    rejections.extend(rejection for rejection in get_rejections(new_entry) if rejection not in rejections)
+    if len(rejections) or stored_entry.get('rejected_by') is not None:
+        merged['rejected_by'] = [name for name, _ in rejections]
+    if len(rejections) or stored_entry.get('rejected_reasons') is not None:
+        merged['rejected_reasons'] = [reason for _, reason in rejections]
+    return merged
+
+
+def get_rejections(entry: dict) -> List[Tuple[str, str]]:
+    """
+    Get the rejections of a database entry.
+
+    Args:
+        entry (dict): The database entry.
+
+    Returns:
+        List[Tuple[str, str]]: The (reviewer, reason) pairs, the reason is ``None`` if it is missing.
+    """
+    return list(zip_longest(entry.get('rejected_by') or list(), entry.get('rejected_reasons') or list()))
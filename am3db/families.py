@@ -0,0 +1,168 @@
+"""
+AM3DB's families module.
+
+Determining the RMG family of a reaction requires a loaded RMG kinetics families database, which takes seconds
+to load, and template matching. This module loads the families database once per process (see
+``initialize_worker()`` for process pools) and memoizes the family of reactions keyed by the canonical identity
+of their reactants and products, so that the many reactions of a dataset sharing the same species are matched once.
+"""
+
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
+
+from am3db.species_cache import SPECIES_CACHE, SpeciesCache
+
+if TYPE_CHECKING:
+    from rmgpy.data.rmg import RMGDatabase
+    from arc.reaction import ARCReaction
+
+
+_rmg_database = None
+
+
+def get_rmg_database(kinetics_families: str = 'default') -> 'RMGDatabase':
+    """
+    Get the RMG database with the kinetics families loaded, loading it on the first call in this process.
+
+    Args:
+        kinetics_families (str, optional): The RMG kinetics families to load on the first call.
+
+    Returns:
+        RMGDatabase: The RMG database.
+    """
+    global _rmg_database
+    if _rmg_database is None:
+        from arc.rmgdb import load_families_only, make_rmg_database_object
+        rmg_database = make_rmg_database_object()
+        load_families_only(rmg_database, kinetics_families=kinetics_families)
+        _rmg_database = rmg_database
+    return _rmg_database
+
+
+def initialize_worker():
+    """
+    Load the RMG families database in a new worker process, used as a process pool initializer.
+    """
+    try:
+        get_rmg_database()
+    except Exception:
+        # Not fatal to the pool, loading is retried (and the error reported) per reaction.
+        pass
+
+
+class FamilyCache(object):
+    """
+    A size-bound LRU memo of RMG family determination results.
+
+    Args:
+        max_size (int, optional): The maximal number of cached reactions, 0 disables the cache.
+
+    Attributes:
+        max_size (int): The maximal number of cached reactions.
+        hits (int): The number of cache hits.
+        misses (int): The number of cache misses.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self,
+            key: Optional[tuple],
+            compute: Callable,
+            ) -> tuple:
+        """
+        Get the cached family determination result of a reaction, computing and caching it on a miss.
+
+        Args:
+            key (tuple): The reaction key, the result is computed without caching if ``None``.
+            compute (Callable): A function returning the family and whether it is its own reverse.
+
+        Returns:
+            tuple: The family (``None`` if the reaction does not match any family) and whether it is its own reverse.
+        """
+        if key is None or self.max_size <= 0:
+            self.misses += 1
+            return compute()
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        value = self._entries[key] = compute()
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return value
+
+    def determine_family(self,
+                         reaction: 'ARCReaction',
+                         species_cache: Optional[SpeciesCache] = None,
+                         ):
+        """
+        Set the RMG family of a reaction, matching it against the shared families database on a cache miss.
+
+        Args:
+            reaction (ARCReaction): The reaction.
+            species_cache (SpeciesCache, optional): A cache of per-species data, the module-level cache by default.
+        """
+        def compute():
+            from arc.rmgdb import determine_family
+            determine_family(reaction=reaction, db=get_rmg_database())
+            return reaction.family, reaction.family_own_reverse
+
+        reaction.family, reaction.family_own_reverse = \
+            self.get(get_reaction_key(reaction, species_cache=species_cache), compute)
+
+    def stats(self) -> dict:
+        """
+        Get the cache statistics.
+
+        Returns:
+            dict: The cache size, bound, hits, misses and hit rate.
+        """
+        total = self.hits + self.misses
+        return {'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
+
+    def clear(self):
+        """
+        Clear the cached reactions and reset the counters.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def get_reaction_key(reaction: 'ARCReaction',
+                     species_cache: Optional[SpeciesCache] = None,
+                     ) -> Optional[Tuple[tuple, tuple, int, int]]:
+    """
+    Get the family cache key of a reaction, independent of the order of the reactants, products and atoms.
+
+    Args:
+        reaction (ARCReaction): The reaction.
+        species_cache (SpeciesCache, optional): A cache of per-species data, the module-level cache by default.
+
+    Returns:
+        Optional[Tuple[tuple, tuple, int, int]]: The sorted canonical SMILES and multiplicities of the reactants
+                                                 and of the products, the reaction multiplicity and charge.
+                                                 ``None`` if a species has no molecule.
+    """
+    species_cache = species_cache if species_cache is not None else SPECIES_CACHE
+    if not len(reaction.r_species) or not len(reaction.p_species) \
+            or any(spc.mol is None for spc in reaction.r_species + reaction.p_species):
+        return None
+    r_species = tuple(sorted((species_cache.get_smiles(spc), spc.multiplicity) for spc in reaction.r_species))
+    p_species = tuple(sorted((species_cache.get_smiles(spc), spc.multiplicity) for spc in reaction.p_species))
+    return r_species, p_species, reaction.multiplicity, reaction.charge
+
+
+FAMILY_CACHE = FamilyCache()
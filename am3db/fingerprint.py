@@ -0,0 +1,81 @@
+"""
+AM3DB's fingerprint module.
+
+A content fingerprint of the inputs of a database entry: the species adjacency lists and input geometries,
+the reaction multiplicity and charge, and the AM3DB version which computed the entry.
+``AMReaction.as_db_dict()`` stores the fingerprint with the entry, so ``am3db.refresh`` recomputes only the entries
+whose inputs changed or which were computed by another version of AM3DB.
+"""
+
+import hashlib
+import json
+from typing import List, Optional
+
+from am3db.common import VERSION
+
+
+def compute_fingerprint(r_adjacency_lists: List[List[str]],
+                        p_adjacency_lists: List[List[str]],
+                        r_xyz: List[dict],
+                        p_xyz: List[dict],
+                        multiplicity: Optional[int] = None,
+                        charge: Optional[int] = None,
+                        version: str = VERSION,
+                        ) -> str:
+    """
+    Compute the content fingerprint of the inputs of a database entry.
+
+    Args:
+        r_adjacency_lists (List[List[str]]): The adjacency lists of the reactants.
+        p_adjacency_lists (List[List[str]]): The adjacency lists of the products.
+        r_xyz (List[dict]): The reactant geometries.
+        p_xyz (List[dict]): The product geometries.
+        multiplicity (int, optional): The reaction surface multiplicity.
+        charge (int, optional): The reaction surface charge.
+        version (str, optional): The AM3DB version.
+
+    Returns:
+        str: The SHA-256 hex digest.
+    """
+    content = [version, multiplicity, charge, r_adjacency_lists, p_adjacency_lists, r_xyz, p_xyz]
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def get_entry_fingerprint(entry: dict,
+                          version: str = VERSION,
+                          ) -> str:
+    """
+    Compute the content fingerprint of the inputs stored in a database entry.
+
+    Args:
+        entry (dict): The database entry.
+        version (str, optional): The AM3DB version.
+
+    Returns:
+        str: The SHA-256 hex digest.
+    """
+    return compute_fingerprint(r_adjacency_lists=entry.get('r_adjacency_lists') or list(),
+                               p_adjacency_lists=entry.get('p_adjacency_lists') or list(),
+                               r_xyz=entry.get('r_xyz') or list(),
+                               p_xyz=entry.get('p_xyz') or list(),
+                               multiplicity=entry.get('multiplicity'),
+                               charge=entry.get('charge'),
+                               version=version,
+                               )
+
+
+def is_stale(entry: dict,
+             version: str = VERSION,
+             ) -> bool:
+    """
+    Check whether a database entry should be recomputed, i.e., whether it has no fingerprint,
+    or it was computed by another version of AM3DB, or its inputs were modified after it was computed.
+
+    Args:
+        entry (dict): The database entry.
+        version (str, optional): The current AM3DB version.
+
+    Returns:
+        bool: Whether the entry is stale.
+    """
+    return entry.get('fingerprint') != get_entry_fingerprint(entry, version=version)
@@ -0,0 +1,239 @@
+"""
+AM3DB's geometry module.
+
+Loads the stored reactant and product geometries into contiguous NumPy coordinate arrays with per-reaction offsets,
+and compares them in batches using vectorized Kabsch alignment.
+Geometries of multi-species sides are concatenated in the stored species order, matching the atom map indexing.
+"""
+
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from am3db.atom_maps import decode_atom_maps
+
+
+SIDES = ('reactant', 'product')
+
+
+class GeometryStore(object):
+    """
+    Contiguous storage of the reactant and product geometries of many reactions.
+
+    Args:
+        entries (Iterable[Tuple[str, int, dict]]): Tuples of family labels, reaction IDs, and database entries
+                                                   with at least the 'r_xyz', 'p_xyz', and 'atom_maps' fields.
+
+    Attributes:
+        keys (List[Tuple[str, int]]): The family label and reaction ID of every stored reaction.
+        r_coords (np.ndarray): The reactant coordinates of all reactions, a (number of atoms) x 3 array.
+        r_offsets (np.ndarray): The reactant atoms of reaction ``i`` are ``r_coords[r_offsets[i]:r_offsets[i + 1]]``.
+        r_symbols (np.ndarray): The element codes of all reactant atoms.
+        p_coords (np.ndarray): The product coordinates of all reactions, a (number of atoms) x 3 array.
+        p_offsets (np.ndarray): The product atoms of reaction ``i`` are ``p_coords[p_offsets[i]:p_offsets[i + 1]]``.
+        p_symbols (np.ndarray): The element codes of all product atoms.
+        mapped_p_indices (np.ndarray): For every reactant atom, the global index of its mapped product atom
+                                       in ``p_coords`` according to the first stored atom map, -1 if unmapped.
+        symbol_codes (Dict[str, int]): Keys are element symbols, values are their codes.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, int, dict]]):
+        self.keys, self.symbol_codes = list(), dict()
+        r_coords, r_symbols, r_counts = list(), list(), list()
+        p_coords, p_symbols, p_counts = list(), list(), list()
+        maps = list()
+        for family, index, entry in entries:
+            self.keys.append((family, index))
+            for xyz_list, coords, symbols, counts in [(entry.get('r_xyz'), r_coords, r_symbols, r_counts),
+                                                      (entry.get('p_xyz'), p_coords, p_symbols, p_counts)]:
+                block_coords, block_symbols = concatenate_xyz(xyz_list or list())
+                coords.append(block_coords)
+                symbols.extend(self.symbol_codes.setdefault(symbol, len(self.symbol_codes))
+                               for symbol in block_symbols)
+                counts.append(len(block_symbols))
+            try:
+                atom_maps = decode_atom_maps(entry.get('atom_maps'))
+            except ValueError:
+                atom_maps = None  # Invalid (e.g., ragged) stored atom maps, the reaction is treated as unmapped.
+            valid = atom_maps is not None and len(atom_maps) and atom_maps.num_atoms == r_counts[-1] == p_counts[-1]
+            maps.append(atom_maps.maps[0].astype(np.int64) if valid else np.full(r_counts[-1], -1, dtype=np.int64))
+        self.r_coords = np.concatenate(r_coords) if len(r_coords) else np.zeros((0, 3))
+        self.p_coords = np.concatenate(p_coords) if len(p_coords) else np.zeros((0, 3))
+        self.r_symbols = np.asarray(r_symbols, dtype=np.int32)
+        self.p_symbols = np.asarray(p_symbols, dtype=np.int32)
+        self.r_offsets = np.concatenate([[0], np.cumsum(r_counts, dtype=np.int64)]).astype(np.int64)
+        self.p_offsets = np.concatenate([[0], np.cumsum(p_counts, dtype=np.int64)]).astype(np.int64)
+        local_maps = np.concatenate(maps) if len(maps) else np.zeros(0, dtype=np.int64)
+        atom_reactions = np.repeat(np.arange(len(self.keys)), r_counts)
+        self.mapped_p_indices = np.where(local_maps >= 0, self.p_offsets[atom_reactions] + local_maps, -1)
+        self._groups = dict()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def from_database(cls,
+                      database_path: Optional[str] = None,
+                      **kwargs,
+                      ) -> 'GeometryStore':
+        """
+        Load the geometries of the database reactions matching the given ``ReactionDB.query()`` criteria.
+
+        Args:
+            database_path (str, optional): The path to the database folder.
+
+        Returns:
+            GeometryStore: The geometry store.
+        """
+        from am3db.query import ReactionDB
+        kwargs['fields'] = ['r_xyz', 'p_xyz', 'atom_maps']
+        return cls(ReactionDB(database_path=database_path).query(**kwargs))
+
+    def get_coords(self,
+                   i: int,
+                   side: str = 'reactant',
+                   ) -> np.ndarray:
+        """
+        Get the coordinates of a stored reaction.
+
+        Args:
+            i (int): The position of the reaction in the store.
+            side (str, optional): Either 'reactant', or 'product' for the product coordinates
+                                  reordered by the atom map to follow the reactant atom order.
+
+        Returns:
+            np.ndarray: A (number of atoms) x 3 array, ``None`` for unmapped product coordinates.
+        """
+        start, end = self.r_offsets[i], self.r_offsets[i + 1]
+        if side == 'reactant':
+            return self.r_coords[start:end]
+        mapped = self.mapped_p_indices[start:end]
+        if (mapped < 0).any():
+            return None
+        return self.p_coords[mapped]
+
+    def search(self,
+               xyz: Union[dict, List[dict]],
+               side: str = 'reactant',
+               k: int = 10,
+               ) -> List[Tuple[str, int, float]]:
+        """
+        Find the stored reactions whose geometry is nearest to a query geometry after Kabsch alignment.
+        Only stored geometries with the same element sequence as the query are considered.
+        Product geometries are compared in the reactant atom order, through the stored atom map.
+
+        Args:
+            xyz (Union[dict, List[dict]]): The query geometry, an ARC xyz dictionary or a list of them
+                                           (concatenated in order, like the stored species of a reaction side).
+            side (str, optional): The stored side to compare with, either 'reactant' or 'product'.
+            k (int, optional): The number of nearest reactions to return.
+
+        Returns:
+            List[Tuple[str, int, float]]: The family label, reaction ID, and RMSD (Angstrom) of the nearest reactions,
+                                          sorted by increasing RMSD.
+        """
+        if side not in SIDES:
+            raise ValueError(f'Got an illegal side argument "{side}", allowed values are: {SIDES}')
+        query_coords, query_symbols = concatenate_xyz(xyz if isinstance(xyz, list) else [xyz])
+        if any(symbol not in self.symbol_codes for symbol in query_symbols):
+            return list()
+        query_codes = np.asarray([self.symbol_codes[symbol] for symbol in query_symbols], dtype=np.int32)
+        reactions, coords, symbols = self._get_group(len(query_symbols), side)
+        if not len(reactions):
+            return list()
+        mask = (symbols == query_codes).all(axis=1)
+        reactions, coords = reactions[mask], coords[mask]
+        if not len(reactions):
+            return list()
+        rmsds = kabsch_rmsd(coords, query_coords)
+        order = np.argsort(rmsds, kind='stable')[:k]
+        return [(*self.keys[reactions[i]], float(rmsds[i])) for i in order]
+
+    def atom_map_rmsds(self) -> np.ndarray:
+        """
+        Compute the RMSD between the reactant geometry and the atom-mapped product geometry of every reaction.
+        Outliers indicate atom maps which do not correspond to the stored 3D structures.
+
+        Returns:
+            np.ndarray: The RMSD (Angstrom) per stored reaction, NaN where no valid atom map is stored.
+        """
+        rmsds = np.full(len(self), np.nan)
+        for num_atoms in np.unique(np.diff(self.r_offsets)):
+            reactions, r_coords, _ = self._get_group(int(num_atoms), 'reactant')
+            valid, p_coords, _ = self._get_group(int(num_atoms), 'product')
+            if len(valid):
+                positions = np.searchsorted(reactions, valid)
+                rmsds[valid] = kabsch_rmsd(r_coords[positions], p_coords)
+        return rmsds
+
+    def _get_group(self,
+                   num_atoms: int,
+                   side: str,
+                   ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gather the geometries of all reactions with a given number of reactant atoms into dense arrays.
+        For the product side, only reactions with a valid atom map are included.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: The reaction positions, an (m, num_atoms, 3) coordinates array,
+                                                       and an (m, num_atoms) element codes array.
+        """
+        if (num_atoms, side) not in self._groups:
+            reactions = np.flatnonzero(np.diff(self.r_offsets) == num_atoms)
+            atom_indices = self.r_offsets[reactions][:, np.newaxis] + np.arange(num_atoms)
+            if side == 'reactant':
+                coords, symbols = self.r_coords[atom_indices], self.r_symbols[atom_indices]
+            else:
+                mapped = self.mapped_p_indices[atom_indices]
+                valid = (mapped >= 0).all(axis=1) if num_atoms else np.zeros(len(reactions), dtype=bool)
+                reactions, mapped = reactions[valid], mapped[valid]
+                coords, symbols = self.p_coords[mapped], self.p_symbols[mapped]
+            self._groups[(num_atoms, side)] = (reactions, coords.reshape((-1, num_atoms, 3)),
+                                               symbols.reshape((-1, num_atoms)))
+        return self._groups[(num_atoms, side)]
+
+
+def concatenate_xyz(xyz_list: List[dict]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Concatenate ARC xyz dictionaries into a single coordinates array.
+
+    Args:
+        xyz_list (List[dict]): The xyz dictionaries.
+
+    Returns:
+        Tuple[np.ndarray, List[str]]: A (number of atoms) x 3 coordinates array, and the element symbols.
+    """
+    coords, symbols = list(), list()
+    for xyz in xyz_list:
+        coords.extend(xyz['coords'])
+        symbols.extend(xyz['symbols'])
+    return np.asarray(coords, dtype=np.float64).reshape((-1, 3)), symbols
+
+
+def kabsch_rmsd(coords: np.ndarray,
+                reference: np.ndarray,
+                ) -> np.ndarray:
+    """
+    Compute the RMSD of a batch of geometries from reference geometries after optimal superposition
+    (the Kabsch algorithm), vectorized over the batch.
+
+    Args:
+        coords (np.ndarray): An (m, n, 3) array of geometries.
+        reference (np.ndarray): Either an (n, 3) reference geometry or an (m, n, 3) array of references.
+
+    Returns:
+        np.ndarray: The m RMSD values.
+    """
+    coords = coords - coords.mean(axis=1, keepdims=True)
+    reference = np.broadcast_to(reference, coords.shape)
+    reference = reference - reference.mean(axis=1, keepdims=True)
+    num_atoms = coords.shape[1]
+    if not num_atoms:
+        return np.zeros(coords.shape[0])
+    covariance = np.einsum('mni,mnj->mij', coords, reference)
+    u, s, vt = np.linalg.svd(covariance)
+    signs = np.sign(np.linalg.det(np.matmul(u, vt)))
+    s[:, -1] *= np.where(signs == 0, 1, signs)
+    squared = (np.einsum('mni,mni->m', coords, coords) + np.einsum('mni,mni->m', reference, reference)
+               - 2 * s.sum(axis=1)) / num_atoms
+    return np.sqrt(np.maximum(squared, 0.0))
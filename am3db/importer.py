@@ -0,0 +1,480 @@
+"""
+AM3DB's importer module.
+
+Streams large external reaction lists into the database with a bounded memory usage, independent of the input size:
+input records are parsed lazily, reactions are constructed and their database entries computed over the ingestion
+process pool (see ``am3db.ingestion``), and entries are written to the database as results arrive.
+Backpressure is inherent: the input is only read as fast as the pool accepts chunks, and the pool only accepts
+chunks as fast as results are written.
+
+Supported inputs (optionally gzip-compressed, e.g., ``reactions.csv.gz``):
+    CSV/TSV: A header row with 'reactants' and 'products' columns holding SMILES, several species on a side
+             are separated by '.' or ' + '. Optional 'multiplicity', 'charge' and 'id' columns.
+    JSONL: One JSON object per line, either with 'reactants' and 'products' as above (strings or lists of SMILES),
+           or a reaction specification (see ``am3db.ingestion.reaction_from_spec()``).
+    RMG kinetics libraries: A folder with a ``reactions.py`` and a ``dictionary.txt`` file. Reactions are read
+                            lazily, the species dictionary is loaded once.
+
+The import is checkpointed every ``checkpoint_every`` processed records, after the database writer was flushed,
+in ``<database>/imports/<input name>.checkpoint.yml``, and a rerun of an interrupted import resumes from the last
+checkpoint. Records processed after the last checkpoint are processed again, reactions which were already written
+are recognized as duplicates and not written twice. Failed records are reported in
+``<database>/imports/<input name>.failures.jsonl`` with their input position, key, and error.
+
+Example::
+
+    python -m am3db.importer reactions.csv [--database-path database] [--max-workers 8] [--restart]
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import traceback
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from am3db.common import DATABASE_PATH, read_yaml_file
+from am3db.ingestion import IngestionPipeline, IngestionResult, process_spec
+from am3db.manifest import MAX_RXNS_PER_FILE
+from am3db.storage import save_yaml_file_atomically
+from am3db.writer import DatabaseWriter
+
+
+IMPORTS_FOLDER = 'imports'
+INPUT_FORMATS = ('csv', 'jsonl', 'rmg')
+SPECIES_SEPARATOR = re.compile(r'\s+\+\s+|\.')
+ARROW = re.compile(r'\s*<=>\s*|\s*=>\s*|\s*=\s*')
+
+
+def import_reactions(path: str,
+                     database_path: Optional[str] = None,
+                     input_format: Optional[str] = None,
+                     checkpoint_path: Optional[str] = None,
+                     report_path: Optional[str] = None,
+                     resume: bool = True,
+                     checkpoint_every: int = MAX_RXNS_PER_FILE,
+                     max_workers: Optional[int] = None,
+                     chunk_size: int = 10,
+                     timeout: Optional[float] = None,
+                     max_pending_chunks: Optional[int] = None,
+                     on_duplicate: str = 'skip',
+                     ) -> dict:
+    """
+    Import the reactions of an external reaction list into the database.
+
+    Args:
+        path (str): The path to the input file, or to an RMG kinetics library folder.
+        database_path (str, optional): The path to the database folder.
+        input_format (str, optional): The input format ('csv', 'jsonl' or 'rmg'), determined from the path if not given.
+        checkpoint_path (str, optional): The path to the checkpoint file, see ``get_import_paths()``.
+        report_path (str, optional): The path to the failure report, see ``get_import_paths()``.
+        resume (bool, optional): Whether to resume from the checkpoint of a previous import of the same input.
+        checkpoint_every (int, optional): The number of processed records between checkpoints,
+                                          which also bounds the number of entries held by the database writer.
+        max_workers (int, optional): The number of worker processes, see ``IngestionPipeline``.
+        chunk_size (int, optional): The number of records sent to a worker at once.
+        timeout (float, optional): The maximal time in seconds for processing a single record.
+        max_pending_chunks (int, optional): The maximal number of chunks in flight, see ``IngestionPipeline``.
+        on_duplicate (str, optional): The duplicate policy of the database writer, see ``DatabaseWriter``.
+                                      With 'allow', records processed again after resuming are written twice.
+
+    Returns:
+        dict: The number of 'read', 'imported' and 'failed' records, the position the import was 'resumed' from,
+              and the 'report' path.
+    """
+    database_path = database_path or DATABASE_PATH
+    input_format = input_format or get_input_format(path)
+    default_checkpoint_path, default_report_path = get_import_paths(path, database_path=database_path)
+    checkpoint_path, report_path = checkpoint_path or default_checkpoint_path, report_path or default_report_path
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    source = get_source_state(path)
+    checkpoint = load_checkpoint(checkpoint_path, source=source) if resume else None
+    checkpoint = checkpoint or dict(source, position=0, imported=0, failed=0, report_offset=0, complete=False)
+    start = checkpoint['position']
+    if start:
+        print(f'Resuming the import of {path} from record {start}.')
+    summary = {'read': start, 'imported': checkpoint['imported'], 'failed': checkpoint['failed'],
+               'resumed': start, 'report': report_path}
+    keys = dict()  # The keys of the records in flight, keyed by their pipeline position.
+
+    def stream_records() -> Iterator[dict]:
+        records = islice(read_records(path, input_format=input_format), start, None)
+        for position, (key, record) in enumerate(records):
+            keys[position] = key
+            yield record
+
+    pipeline = IngestionPipeline(database_path=database_path, max_workers=max_workers, chunk_size=chunk_size,
+                                 timeout=timeout, max_pending_chunks=max_pending_chunks)
+    with open(report_path, 'ab') as report, \
+            DatabaseWriter(database_path=database_path, on_duplicate=on_duplicate) as writer:
+        report.truncate(checkpoint['report_offset'])  # Failures after the checkpoint are reported again.
+        report.seek(0, os.SEEK_END)
+        since_checkpoint = 0
+        for result in pipeline.process(stream_records(), function=process_record):
+            key = keys.pop(result.position)
+            position = start + result.position
+            if result.success:
+                writer.add_entry(family=result.family,
+                                 entry=result.entry,
+                                 index=result.index,
+                                 own_reverse=result.family_own_reverse)
+                summary['imported'] += 1
+            else:
+                summary['failed'] += 1
+                report.write((json.dumps({'position': position,
+                                          'key': key,
+                                          'message': result.error.strip().splitlines()[-1],
+                                          'error': result.error,
+                                          }) + '\n').encode('utf-8'))
+            summary['read'] = position + 1
+            since_checkpoint += 1
+            if since_checkpoint >= checkpoint_every:
+                save_checkpoint(checkpoint_path, checkpoint=checkpoint, summary=summary, writer=writer, report=report)
+                since_checkpoint = 0
+        save_checkpoint(checkpoint_path, checkpoint=checkpoint, summary=summary, writer=writer, report=report,
+                        complete=True)
+    return summary
+
+
+def save_checkpoint(path: str,
+                    checkpoint: dict,
+                    summary: dict,
+                    writer: DatabaseWriter,
+                    report: io.BufferedWriter,
+                    complete: bool = False,
+                    ):
+    """
+    Flush the database writer and the failure report, then atomically save the import checkpoint.
+
+    Args:
+        path (str): The path to the checkpoint file.
+        checkpoint (dict): The checkpoint, updated in place.
+        summary (dict): The import summary.
+        writer (DatabaseWriter): The database writer.
+        report (io.BufferedWriter): The failure report.
+        complete (bool, optional): Whether the whole input was processed.
+    """
+    writer.flush()
+    report.flush()
+    os.fsync(report.fileno())
+    checkpoint.update(position=summary['read'], imported=summary['imported'], failed=summary['failed'],
+                      report_offset=report.tell(), complete=complete)
+    save_yaml_file_atomically(path=path, content=checkpoint)
+
+
+def load_checkpoint(path: str,
+                    source: dict,
+                    ) -> Optional[dict]:
+    """
+    Load the checkpoint of a previous import of the same input.
+
+    Args:
+        path (str): The path to the checkpoint file.
+        source (dict): The current input state, see ``get_source_state()``.
+
+    Returns:
+        Optional[dict]: The checkpoint, ``None`` if there is none or if it belongs to another or a modified input.
+    """
+    if not os.path.isfile(path):
+        return None
+    checkpoint = read_yaml_file(path)
+    if not isinstance(checkpoint, dict) or any(checkpoint.get(key) != value for key, value in source.items()):
+        print(f'Warning: Not resuming from {path}, it belongs to another or a modified input.')
+        return None
+    return checkpoint
+
+
+def get_source_state(path: str) -> dict:
+    """
+    Get the state of an input identifying it between an import and its resumption.
+
+    Args:
+        path (str): The path to the input file or RMG kinetics library folder.
+
+    Returns:
+        dict: The absolute 'source' path, and the 'size' and 'mtime_ns' of the input file.
+    """
+    file_path = os.path.join(path, 'reactions.py') if os.path.isdir(path) else path
+    stat = os.stat(file_path)
+    return {'source': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def get_import_paths(path: str,
+                     database_path: Optional[str] = None,
+                     ) -> Tuple[str, str]:
+    """
+    Get the default checkpoint and failure report paths of importing an input.
+
+    Args:
+        path (str): The path to the input file or RMG kinetics library folder.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        Tuple[str, str]: The checkpoint path and the failure report path.
+    """
+    name = os.path.basename(os.path.normpath(path))
+    folder = os.path.join(database_path or DATABASE_PATH, IMPORTS_FOLDER)
+    return os.path.join(folder, f'{name}.checkpoint.yml'), os.path.join(folder, f'{name}.failures.jsonl')
+
+
+def get_input_format(path: str) -> str:
+    """
+    Determine the format of an input from its path.
+
+    Args:
+        path (str): The path to the input file or RMG kinetics library folder.
+
+    Returns:
+        str: The input format, one of ``INPUT_FORMATS``.
+    """
+    if os.path.isdir(path) or os.path.basename(path) == 'reactions.py':
+        return 'rmg'
+    extension = os.path.splitext(path[:-3] if path.endswith('.gz') else path)[1].lower()
+    if extension in ('.csv', '.tsv'):
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f'Could not determine the format of {path}, give one of {INPUT_FORMATS}.')
+
+
+def read_records(path: str,
+                 input_format: Optional[str] = None,
+                 ) -> Iterator[Tuple[str, dict]]:
+    """
+    Lazily read the reaction records of an input.
+
+    Args:
+        path (str): The path to the input file or RMG kinetics library folder.
+        input_format (str, optional): The input format, determined from the path if not given.
+
+    Yields:
+        Tuple[str, dict]: A key identifying the record in the input, and the record (see ``spec_from_record()``).
+    """
+    input_format = input_format or get_input_format(path)
+    if input_format == 'csv':
+        yield from read_csv(path)
+    elif input_format == 'jsonl':
+        yield from read_jsonl(path)
+    elif input_format == 'rmg':
+        yield from read_rmg_library(path)
+    else:
+        raise ValueError(f'Got an unsupported input format "{input_format}", allowed values are: {INPUT_FORMATS}')
+
+
+def read_csv(path: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Lazily read the rows of a CSV (or tab separated, by the '.tsv' extension) file.
+
+    Args:
+        path (str): The path to the file.
+
+    Yields:
+        Tuple[str, dict]: The row 'id', or its line number, and the row.
+    """
+    delimiter = '\t' if '.tsv' in os.path.basename(path).lower() else ','
+    with open_text(path) as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        for row in reader:
+            yield row.get('id') or f'line {reader.line_num}', row
+
+
+def read_jsonl(path: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Lazily read the records of a JSONL file, blank lines are skipped.
+    A line which is not a JSON object is yielded as an invalid record, which fails to import.
+
+    Args:
+        path (str): The path to the file.
+
+    Yields:
+        Tuple[str, dict]: The record 'id', or its line number, and the record.
+    """
+    with open_text(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = {'invalid': f'Line {line_number} is not valid JSON: {e}'}
+            if not isinstance(record, dict):
+                record = {'invalid': f'Line {line_number} is not a JSON object.'}
+            yield str(record.get('id') or f'line {line_number}'), record
+
+
+def read_rmg_library(path: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Lazily read the reactions of an RMG kinetics library, only the reaction labels are parsed.
+
+    Args:
+        path (str): The path to the library folder, or to its ``reactions.py`` file.
+
+    Yields:
+        Tuple[str, dict]: The reaction index and label, and the record with the reactant and product labels
+                          and the adjacency lists of their species.
+    """
+    folder = path if os.path.isdir(path) else os.path.dirname(path)
+    adjacency_lists = read_rmg_dictionary(os.path.join(folder, 'dictionary.txt'))
+    entry_pattern = re.compile(r'^\s*entry\s*\(')
+    index_pattern = re.compile(r'^\s*index\s*=\s*(-?\d+)')
+    label_pattern = re.compile(r'^\s*label\s*=\s*([\'"])(.+?)\1')
+    index = None
+    with open_text(os.path.join(folder, 'reactions.py')) as f:
+        for line in f:
+            if entry_pattern.match(line):
+                index = None
+            elif index_pattern.match(line):
+                index = int(index_pattern.match(line).group(1))
+            elif label_pattern.match(line):
+                label = label_pattern.match(line).group(2)
+                sides = ARROW.split(label, maxsplit=1) + ['']
+                reactants, products = [[spc.strip() for spc in side.split(' + ') if spc.strip()]
+                                       for side in sides[:2]]
+                yield f'{index}: {label}', {'reactants': reactants,
+                                            'products': products,
+                                            'adjacency_lists': {spc: adjacency_lists.get(spc)
+                                                                for spc in reactants + products},
+                                            }
+
+
+def read_rmg_dictionary(path: str) -> Dict[str, str]:
+    """
+    Read an RMG species dictionary, a label line followed by an adjacency list per species.
+
+    Args:
+        path (str): The path to the ``dictionary.txt`` file.
+
+    Returns:
+        Dict[str, str]: Keys are species labels, values are adjacency lists.
+    """
+    adjacency_lists, lines = dict(), list()
+    with open_text(path) as f:
+        for line in list(f) + ['']:
+            if line.strip().startswith('//'):
+                continue
+            if line.strip():
+                lines.append(line.strip())
+            elif lines:
+                adjacency_lists[lines[0]] = '\n'.join(lines[1:]) + '\n'
+                lines = list()
+    return adjacency_lists
+
+
+def spec_from_record(record: dict) -> dict:
+    """
+    Convert an input record into a reaction specification, see ``am3db.ingestion.reaction_from_spec()``.
+
+    Args:
+        record (dict): The record, either a reaction specification, or 'reactants' and 'products' given as SMILES
+                       (strings of species separated by '.' or ' + ', or lists), or as species labels
+                       resolved by an 'adjacency_lists' dictionary. 'multiplicity' and 'charge' are optional.
+
+    Raises:
+        ValueError: If the record does not define a reaction.
+
+    Returns:
+        dict: The reaction specification.
+    """
+    if 'invalid' in record:
+        raise ValueError(record['invalid'])
+    if 'r_species' in record or 'p_species' in record or 'species_list' in record:
+        return {key: value for key, value in record.items() if key != 'id'}
+    spec = dict()
+    for side, key in [('r', 'reactants'), ('p', 'products')]:
+        species = record.get(key)
+        if isinstance(species, str):
+            species = [smiles for smiles in SPECIES_SEPARATOR.split(species.strip()) if smiles]
+        if not species:
+            raise ValueError(f'The record has no {key}.')
+        if record.get('adjacency_lists') is not None:
+            missing = [label for label in species if not record['adjacency_lists'].get(label)]
+            if missing:
+                raise ValueError(f'The species {missing} are not defined in the species dictionary.')
+            spec[f'{side}_species'] = [{'label': label, 'adjlist': record['adjacency_lists'][label]}
+                                       for label in species]
+        else:
+            spec[f'{side}_species'] = [{'label': f'{side}{i}', 'smiles': smiles} for i, smiles in enumerate(species)]
+    for key in ['multiplicity', 'charge']:
+        if record.get(key) not in (None, ''):
+            spec[key] = int(record[key])
+    return spec
+
+
+def process_record(record: dict,
+                   position: int,
+                   ) -> IngestionResult:
+    """
+    Convert an input record into a reaction and compute its database entry, this is the function executed by the
+    pool workers.
+
+    Args:
+        record (dict): The input record, see ``spec_from_record()``.
+        position (int): The position of the record in the input.
+
+    Returns:
+        IngestionResult: The result.
+    """
+    try:
+        spec = spec_from_record(record)
+    except Exception:
+        return IngestionResult(position=position, error=traceback.format_exc())
+    return process_spec(spec, position)
+
+
+def open_text(path: str) -> io.TextIOBase:
+    """
+    Open a text file for reading, decompressing it if its name ends with '.gz'.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        io.TextIOBase: The file object.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def read_failures(report_path: str) -> List[dict]:
+    """
+    Read a failure report.
+
+    Args:
+        report_path (str): The path to the failure report.
+
+    Returns:
+        List[dict]: The failed records' 'position', 'key', error 'message' and full 'error'.
+    """
+    if not os.path.isfile(report_path):
+        return list()
+    with open(report_path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    """Import an external reaction list from the command line and print a summary."""
+    parser = argparse.ArgumentParser(description='Import reactions from CSV/JSONL files or RMG kinetics libraries.')
+    parser.add_argument('path', type=str, help='The path to the input file or RMG kinetics library folder.')
+    parser.add_argument('--database-path', type=str, default=None, help='The path to the database folder.')
+    parser.add_argument('--format', type=str, default=None, choices=INPUT_FORMATS, help='The input format.')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of a previous import.')
+    parser.add_argument('--max-workers', type=int, default=None, help='The number of worker processes.')
+    parser.add_argument('--chunk-size', type=int, default=10, help='The number of records sent to a worker at once.')
+    parser.add_argument('--timeout', type=float, default=None, help='The maximal seconds per reaction.')
+    args = parser.parse_args()
+
+    summary = import_reactions(path=args.path, database_path=args.database_path, input_format=args.format,
+                               resume=not args.restart, max_workers=args.max_workers, chunk_size=args.chunk_size,
+                               timeout=args.timeout)
+    print(f'Read {summary["read"]} records: {summary["imported"]} imported, {summary["failed"]} failed '
+          f'(reported in {summary["report"]}).')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+AM3DB's ingestion module.
+
+Reaction construction and ``AMReaction.as_db_dict()`` are CPU-bound, this module spreads them over a process pool
+and streams the results back in the input order to a ``DatabaseWriter``.
+Each worker loads the RMG families database once, when it starts. If instrumentation is enabled (see
+``am3db.instrumentation``), the workers' statistics are merged into the statistics of the calling process.
+"""
+
+import os
+import signal
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from am3db import instrumentation
+from am3db.families import initialize_worker
+from am3db.manifest import MAX_RXNS_PER_FILE
+from am3db.writer import DatabaseWriter
+
+if TYPE_CHECKING:
+    from am3db.reaction import AMReaction
+
+
+class ItemTimeoutError(BaseException):
+    """
+    An exception raised when processing a single reaction exceeds the allowed time.
+    It derives from ``BaseException`` so that ``except Exception`` clauses of the processing code don't swallow it.
+    """
+    pass
+
+
+class IngestionResult(object):
+    """
+    The outcome of processing a single reaction specification.
+
+    Args:
+        position (int): The position of the specification in the input.
+        family (str, optional): The reaction family label.
+        family_own_reverse (bool, optional): Whether the reaction family is its own reverse.
+        index (int, optional): The reaction ID in the database.
+        entry (dict, optional): The database entry, as generated by ``AMReaction.as_db_dict()``.
+        error (str, optional): The formatted error if processing failed.
+
+    Attributes:
+        position (int): The position of the specification in the input.
+        family (str): The reaction family label.
+        family_own_reverse (bool): Whether the reaction family is its own reverse.
+        index (int): The reaction ID in the database.
+        entry (dict): The database entry, as generated by ``AMReaction.as_db_dict()``.
+        error (str): The formatted error if processing failed.
+        stats (dict): The instrumentation statistics of a worker process, set on the last result of a chunk.
+    """
+
+    def __init__(self,
+                 position: int,
+                 family: Optional[str] = None,
+                 family_own_reverse: bool = False,
+                 index: Optional[int] = None,
+                 entry: Optional[dict] = None,
+                 error: Optional[str] = None,
+                 ):
+        self.position = position
+        self.family = family
+        self.family_own_reverse = family_own_reverse
+        self.index = index
+        self.entry = entry
+        self.error = error
+        self.stats = None
+
+    @property
+    def success(self) -> bool:
+        """Whether the reaction was processed successfully"""
+        return self.error is None
+
+    def __repr__(self) -> str:
+        return f'IngestionResult(position={self.position}, family={self.family}, index={self.index}, ' \
+               f'error={self.error.splitlines()[-1] if self.error else None})'
+
+
+class IngestionPipeline(object):
+    """
+    A pipeline computing database entries over a process pool and writing them to the database.
+
+    Reaction specifications are sent to the workers in chunks, at most ``max_pending_chunks`` chunks are in flight
+    at any time, and results are yielded in the input order as soon as the oldest chunk completes.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+        max_workers (int, optional): The number of worker processes, defaults to the number of CPUs.
+                                     A value of 1 processes the reactions serially in the current process.
+        chunk_size (int, optional): The number of reaction specifications sent to a worker at once.
+        timeout (float, optional): The maximal time in seconds for processing a single reaction.
+                                   Only enforced on platforms supporting ``SIGALRM``.
+        max_pending_chunks (int, optional): The maximal number of chunks in flight, defaults to twice the workers.
+        on_duplicate (str, optional): The duplicate policy of the database writer, see ``DatabaseWriter``.
+
+    Attributes:
+        database_path (str): The path to the database folder.
+        max_workers (int): The number of worker processes.
+        chunk_size (int): The number of reaction specifications sent to a worker at once.
+        timeout (float): The maximal time in seconds for processing a single reaction.
+        max_pending_chunks (int): The maximal number of chunks in flight.
+        on_duplicate (str): The duplicate policy of the database writer.
+    """
+
+    def __init__(self,
+                 database_path: Optional[str] = None,
+                 max_workers: Optional[int] = None,
+                 chunk_size: int = 10,
+                 timeout: Optional[float] = None,
+                 max_pending_chunks: Optional[int] = None,
+                 on_duplicate: str = 'skip',
+                 ):
+        self.database_path = database_path
+        self.max_workers = max_workers
+        self.chunk_size = max(chunk_size, 1)
+        self.timeout = timeout
+        self.max_pending_chunks = max_pending_chunks
+        self.on_duplicate = on_duplicate
+
+    def process(self,
+                specs: Iterable[Union[dict, 'AMReaction']],
+                function: Optional[Callable] = None,
+                ) -> Iterator[IngestionResult]:
+        """
+        Compute the database entries of the given reaction specifications.
+
+        Args:
+            specs (Iterable[Union[dict, AMReaction]]): Reaction specifications, see ``reaction_from_spec()``.
+            function (Callable, optional): A picklable function processing a single item and its input position
+                                           into an IngestionResult, ``process_spec()`` by default.
+
+        Yields:
+            IngestionResult: The results, in the input order.
+        """
+        function = function or process_spec
+        chunks = chunk_specs(specs, chunk_size=self.chunk_size)
+        if self.max_workers == 1:
+            for chunk in chunks:
+                yield from process_chunk(chunk, timeout=self.timeout, function=function)
+            return
+        max_pending_chunks = self.max_pending_chunks or 2 * (self.max_workers or os.cpu_count() or 1)
+        instrument = instrumentation.is_enabled()
+        with ProcessPoolExecutor(max_workers=self.max_workers,
+                                 initializer=initialize_pool_worker,
+                                 initargs=(instrument,),
+                                 ) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(process_chunk, chunk, self.timeout, instrument, function))
+                if len(pending) >= max_pending_chunks:
+                    yield from merge_worker_stats(pending.popleft().result())
+            while len(pending):
+                yield from merge_worker_stats(pending.popleft().result())
+
+    def ingest(self, specs: Iterable[Union[dict, 'AMReaction']]) -> Dict[str, int]:
+        """
+        Compute the database entries of the given reaction specifications and save them in the database.
+        The database writer is flushed every ``MAX_RXNS_PER_FILE`` reactions, and only counts are kept of the results,
+        so the memory usage is bounded regardless of the number of specifications.
+
+        Args:
+            specs (Iterable[Union[dict, AMReaction]]): Reaction specifications, see ``reaction_from_spec()``.
+
+        Returns:
+            Dict[str, int]: The number of ``'ingested'`` and of ``'failed'`` reaction specifications.
+        """
+        summary, num_pending = {'ingested': 0, 'failed': 0}, 0
+        with DatabaseWriter(database_path=self.database_path, on_duplicate=self.on_duplicate) as writer:
+            for result in self.process(specs):
+                if not result.success:
+                    print(f'Could not ingest reaction specification {result.position}: '
+                          f'{result.error.splitlines()[-1]}')
+                    summary['failed'] += 1
+                    continue
+                writer.add_entry(family=result.family,
+                                 entry=result.entry,
+                                 index=result.index,
+                                 own_reverse=result.family_own_reverse)
+                summary['ingested'] += 1
+                num_pending += 1
+                if num_pending >= MAX_RXNS_PER_FILE:
+                    writer.flush()
+                    num_pending = 0
+        return summary
+
+
+def reaction_from_spec(spec: Union[dict, 'AMReaction']) -> 'AMReaction':
+    """
+    Construct an AMReaction from a picklable specification.
+
+    Args:
+        spec (Union[dict, AMReaction]): Either an AMReaction instance, or a dictionary of AMReaction arguments
+                                        in which species may be given as dictionaries of ARCSpecies arguments.
+
+    Returns:
+        AMReaction: The reaction.
+    """
+    from arc.species import ARCSpecies
+    from am3db.reaction import AMReaction
+    if isinstance(spec, AMReaction):
+        return spec
+    kwargs = dict(spec)
+    for key in ['r_species', 'p_species', 'species_list']:
+        if kwargs.get(key, None) is not None:
+            kwargs[key] = [ARCSpecies(**spc) if isinstance(spc, dict) else spc for spc in kwargs[key]]
+    return AMReaction(**kwargs)
+
+
+def process_spec(spec: Union[dict, 'AMReaction'],
+                 position: int,
+                 ) -> IngestionResult:
+    """
+    Construct a reaction and compute its database entry, capturing any error.
+
+    Args:
+        spec (Union[dict, AMReaction]): The reaction specification.
+        position (int): The position of the specification in the input.
+
+    Returns:
+        IngestionResult: The result.
+    """
+    try:
+        reaction = reaction_from_spec(spec)
+        if reaction.family is None:
+            return IngestionResult(position=position, error='Could not identify the reaction family.')
+        return IngestionResult(position=position,
+                               family=reaction.family.label,
+                               family_own_reverse=bool(reaction.family_own_reverse),
+                               index=reaction._index,
+                               entry=reaction.as_db_dict())
+    except Exception:
+        return IngestionResult(position=position, error=traceback.format_exc())
+
+
+def process_chunk(chunk: List[Tuple[int, Union[dict, 'AMReaction']]],
+                  timeout: Optional[float] = None,
+                  collect_stats: bool = False,
+                  function: Optional[Callable] = None,
+                  ) -> List[IngestionResult]:
+    """
+    Process a chunk of reaction specifications, this is the function executed by the pool workers.
+
+    Args:
+        chunk (List[Tuple[int, Union[dict, AMReaction]]]): Tuples of input positions and reaction specifications.
+        timeout (float, optional): The maximal time in seconds for processing a single reaction.
+        collect_stats (bool, optional): Whether to hand over the instrumentation statistics of this process
+                                        with the last result, and reset them.
+        function (Callable, optional): The function processing a single item, ``process_spec()`` by default.
+
+    Returns:
+        List[IngestionResult]: The results, in the chunk order.
+    """
+    results = _process_chunk(chunk, timeout=timeout, function=function or process_spec)
+    if collect_stats and len(results):
+        results[-1].stats = instrumentation.reset()
+    return results
+
+
+def _process_chunk(chunk: List[Tuple[int, Union[dict, 'AMReaction']]],
+                   timeout: Optional[float] = None,
+                   function: Callable = process_spec,
+                   ) -> List[IngestionResult]:
+    """
+    Process a chunk of reaction specifications, with an optional per-reaction timeout.
+    """
+    use_alarm = timeout is not None and hasattr(signal, 'SIGALRM') \
+        and threading.current_thread() is threading.main_thread()
+    if not use_alarm:
+        return [function(spec, position) for position, spec in chunk]
+    results = list()
+    previous_handler = signal.signal(signal.SIGALRM, _raise_item_timeout)
+    try:
+        for position, spec in chunk:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            try:
+                results.append(function(spec, position))
+            except ItemTimeoutError:
+                results.append(IngestionResult(position=position,
+                                               error=f'ItemTimeoutError: Processing took more than {timeout} s.'))
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        signal.signal(signal.SIGALRM, previous_handler)
+    return results
+
+
+def chunk_specs(specs: Iterable[Union[dict, 'AMReaction']],
+                chunk_size: int,
+                ) -> Iterator[List[Tuple[int, Union[dict, 'AMReaction']]]]:
+    """
+    Lazily split reaction specifications into chunks annotated with their input positions.
+
+    Args:
+        specs (Iterable[Union[dict, AMReaction]]): The reaction specifications.
+        chunk_size (int): The chunk size.
+
+    Yields:
+        List[Tuple[int, Union[dict, AMReaction]]]: Tuples of input positions and reaction specifications.
+    """
+    chunk = list()
+    for position, spec in enumerate(specs):
+        chunk.append((position, spec))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = list()
+    if len(chunk):
+        yield chunk
+
+
+def initialize_pool_worker(instrument: bool = False):
+    """
+    Initialize an ingestion worker process.
+
+    Args:
+        instrument (bool, optional): Whether to enable instrumentation in the worker.
+    """
+    if instrument:
+        instrumentation.reset()  # Forked workers inherit the statistics of the parent process.
+        instrumentation.enable()
+    initialize_worker()
+
+
+def merge_worker_stats(results: List[IngestionResult]) -> List[IngestionResult]:
+    """
+    Merge the instrumentation statistics handed over by a worker with its results into this process.
+
+    Args:
+        results (List[IngestionResult]): The results of a chunk.
+
+    Returns:
+        List[IngestionResult]: The results, without the statistics.
+    """
+    for result in results:
+        if result.stats is not None:
+            instrumentation.merge_stats(result.stats)
+            result.stats = None
+    return results
+
+
+def profile_spec(spec: Union[dict, 'AMReaction'],
+                 path: Optional[str] = None,
+                 sort: str = 'cumulative',
+                 limit: int = 30,
+                 ) -> Tuple[IngestionResult, str]:
+    """
+    Construct a single reaction and compute its database entry under cProfile.
+
+    Args:
+        spec (Union[dict, AMReaction]): The reaction specification, see ``reaction_from_spec()``.
+        path (str, optional): A path to save the raw profile.
+        sort (str, optional): The ``pstats`` sort key of the report.
+        limit (int, optional): The number of functions in the report.
+
+    Returns:
+        Tuple[IngestionResult, str]: The result and the profile report.
+    """
+    return instrumentation.profile_call(process_spec, spec, 0, path=path, sort=sort, limit=limit)
+
+
+def _raise_item_timeout(signum, frame):
+    """A SIGALRM handler interrupting the processing of a single reaction."""
+    raise ItemTimeoutError()
@@ -0,0 +1,340 @@
+"""
+AM3DB's instrumentation module.
+
+Opt-in timers and counters around the stages of reaction processing (``AMReaction.__init__()``, ``as_db_dict()``,
+saving and the shard I/O), aggregated per stage into a count, total, min, max and a latency histogram.
+Instrumentation is disabled by default, in which case a timer is a shared no-op context manager.
+Enable it with ``enable()`` or by setting the ``AM3DB_INSTRUMENT`` environment variable (inherited by worker
+processes), then dump the statistics with ``log_stats()`` or ``save_stats()``.
+``profile_call()`` captures a cProfile of a single call, e.g., of processing a single reaction.
+
+Example::
+
+    from am3db import instrumentation
+
+    instrumentation.enable()
+    IngestionPipeline().ingest(specs)
+    instrumentation.save_stats('stats.json')
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
+
+if TYPE_CHECKING:
+    from am3db.logger import Logger
+
+
+HISTOGRAM_BOUNDS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0)  # Upper bucket bounds in seconds, the last is open.
+
+_enabled = os.environ.get('AM3DB_INSTRUMENT', '') not in ('', '0')
+_stages = dict()
+_counters = dict()
+_lock = threading.Lock()
+
+
+class StageStats(object):
+    """
+    The aggregated timings of a stage.
+
+    Attributes:
+        count (int): The number of timed calls.
+        total (float): The total time in seconds.
+        min (float): The shortest time in seconds.
+        max (float): The longest time in seconds.
+        histogram (List[int]): The number of calls per bucket of ``HISTOGRAM_BOUNDS``, plus the open last bucket.
+    """
+    __slots__ = ('count', 'total', 'min', 'max', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, elapsed: float):
+        """
+        Add a timing.
+
+        Args:
+            elapsed (float): The time in seconds.
+        """
+        self.count += 1
+        self.total += elapsed
+        self.min = elapsed if self.min is None else min(self.min, elapsed)
+        self.max = elapsed if self.max is None else max(self.max, elapsed)
+        bucket = 0
+        while bucket < len(HISTOGRAM_BOUNDS) and elapsed > HISTOGRAM_BOUNDS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+
+    def merge(self, stats: dict):
+        """
+        Merge the timings of another process.
+
+        Args:
+            stats (dict): The stage statistics, as returned by ``as_dict()``.
+        """
+        if not stats['count']:
+            return
+        self.count += stats['count']
+        self.total += stats['total_s']
+        self.min = stats['min_s'] if self.min is None else min(self.min, stats['min_s'])
+        self.max = stats['max_s'] if self.max is None else max(self.max, stats['max_s'])
+        self.histogram = [a + b for a, b in zip(self.histogram, stats['histogram'])]
+
+    def as_dict(self) -> dict:
+        """
+        A dictionary representation of the statistics.
+
+        Returns:
+            dict: The count, total, mean, min and max times, and the histogram.
+        """
+        return {'count': self.count,
+                'total_s': self.total,
+                'mean_s': self.total / self.count if self.count else 0.0,
+                'min_s': self.min,
+                'max_s': self.max,
+                'histogram': list(self.histogram)}
+
+
+class _Timer(object):
+    """A context manager recording the time spent in a stage."""
+    __slots__ = ('stage', 't0')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.t0 = None
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        record(self.stage, time.perf_counter() - self.t0)
+
+
+class _NullTimer(object):
+    """A no-op context manager used while instrumentation is disabled."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enable():
+    """
+    Enable instrumentation in this process.
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """
+    Disable instrumentation in this process, the collected statistics are kept.
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    """
+    Check whether instrumentation is enabled in this process.
+
+    Returns:
+        bool: Whether instrumentation is enabled.
+    """
+    return _enabled
+
+
+def timer(stage: str):
+    """
+    Get a context manager timing a stage, a no-op if instrumentation is disabled.
+
+    Args:
+        stage (str): The stage name.
+
+    Returns:
+        The context manager.
+    """
+    return _Timer(stage) if _enabled else _NULL_TIMER
+
+
+def timed(stage: str) -> Callable:
+    """
+    A decorator timing every call of a function as a stage.
+
+    Args:
+        stage (str): The stage name.
+
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(stage: str,
+           elapsed: float,
+           ):
+    """
+    Record the time spent in a stage.
+
+    Args:
+        stage (str): The stage name.
+        elapsed (float): The time in seconds.
+    """
+    with _lock:
+        if stage not in _stages:
+            _stages[stage] = StageStats()
+        _stages[stage].add(elapsed)
+
+
+def count(counter: str,
+          value: int = 1,
+          ):
+    """
+    Increment a counter, a no-op if instrumentation is disabled.
+
+    Args:
+        counter (str): The counter name.
+        value (int, optional): The increment.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[counter] = _counters.get(counter, 0) + value
+
+
+def get_stats() -> dict:
+    """
+    Get the statistics collected in this process.
+
+    Returns:
+        dict: The statistics per stage (see ``StageStats.as_dict()``) and the counters.
+    """
+    with _lock:
+        return {'stages': {stage: stats.as_dict() for stage, stats in sorted(_stages.items())},
+                'counters': dict(sorted(_counters.items()))}
+
+
+def merge_stats(stats: dict):
+    """
+    Merge statistics collected in another process, e.g., in an ingestion worker, into this process.
+
+    Args:
+        stats (dict): The statistics, as returned by ``get_stats()``.
+    """
+    with _lock:
+        for stage, stage_stats in stats['stages'].items():
+            if stage not in _stages:
+                _stages[stage] = StageStats()
+            _stages[stage].merge(stage_stats)
+        for counter, value in stats['counters'].items():
+            _counters[counter] = _counters.get(counter, 0) + value
+
+
+def reset() -> dict:
+    """
+    Reset the statistics collected in this process.
+
+    Returns:
+        dict: The statistics before the reset.
+    """
+    stats = get_stats()
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+    return stats
+
+
+def format_stats(stats: Optional[dict] = None) -> str:
+    """
+    Format statistics as a table.
+
+    Args:
+        stats (dict, optional): The statistics, those collected in this process by default.
+
+    Returns:
+        str: The table, stages are sorted by their total time.
+    """
+    stats = stats or get_stats()
+    lines = [f'{"stage":<32}{"count":>10}{"total (s)":>14}{"mean (ms)":>14}{"max (ms)":>14}']
+    for stage, stage_stats in sorted(stats['stages'].items(), key=lambda item: -item[1]['total_s']):
+        lines.append(f'{stage:<32}{stage_stats["count"]:>10}{stage_stats["total_s"]:>14.3f}'
+                     f'{stage_stats["mean_s"] * 1e3:>14.3f}{(stage_stats["max_s"] or 0.0) * 1e3:>14.3f}')
+    for counter, value in stats['counters'].items():
+        lines.append(f'{counter:<32}{value:>10}')
+    return '\n'.join(lines) + '\n'
+
+
+def log_stats(logger: 'Logger'):
+    """
+    Log the statistics collected in this process.
+
+    Args:
+        logger (Logger): The logger.
+    """
+    logger.info('Instrumentation statistics:\n' + format_stats())
+
+
+def save_stats(path: str):
+    """
+    Save the statistics collected in this process as JSON.
+
+    Args:
+        path (str): The path to the JSON file.
+    """
+    with open(path, 'w') as f:
+        json.dump(get_stats(), f, indent=2)
+
+
+def profile_call(function: Callable,
+                 *args,
+                 path: Optional[str] = None,
+                 sort: str = 'cumulative',
+                 limit: int = 30,
+                 **kwargs,
+                 ) -> Tuple[object, str]:
+    """
+    Call a function under cProfile.
+
+    Args:
+        function (Callable): The function.
+        *args: The positional arguments of the function.
+        path (str, optional): A path to save the raw profile, e.g., for ``snakeviz``.
+        sort (str, optional): The ``pstats`` sort key of the report.
+        limit (int, optional): The number of functions in the report.
+        **kwargs: The keyword arguments of the function.
+
+    Returns:
+        Tuple[object, str]: The return value of the function and the profile report.
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    if path is not None:
+        profiler.dump_stats(path)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats(sort).print_stats(limit)
+    return result, report.getvalue()
@@ -0,0 +1,292 @@
+"""
+AM3DB's journal module.
+
+In a journaled database (the ``journal`` database setting), ``DatabaseWriter.flush()`` appends the saved entries
+to a per-family append-only journal, ``<database>/journals/<family>.journal``, instead of rewriting the shards.
+The journal starts with a header holding a random generation nonce, written when the journal is created,
+so a cached journal is never mistaken for a journal created after a compaction, even if it reuses the inode.
+Each record holds a single entry keyed by its reaction ID, in the binary shard encoding, and is prefixed by
+its length and CRC32 checksum. Records are read up to the first incomplete or corrupt record, so a crash while
+appending loses at most that record, which is truncated by the next append.
+Compaction folds the journal into the shards in bulk and removes it. Readers merge the shards with the
+journal, journal entries taking precedence; the journal is read before the shards, so entries compacted
+concurrently are not missed.
+"""
+
+import os
+import struct
+import uuid
+import zlib
+from typing import Dict, List, Optional
+
+from am3db.catalog import notify_shard_written
+from am3db.common import DATABASE_PATH
+from am3db.instrumentation import timed
+from am3db.locks import FileLock, family_lock, get_lock_path, shard_lock
+from am3db.manifest import FamilyManifest, determine_family_filename_by_index
+from am3db.storage import decode_shard, encode_shard, get_database_settings, read_shard, save_shard
+
+
+JOURNALS_FOLDER = 'journals'
+JOURNAL_EXTENSION = '.journal'
+COMPACTION_THRESHOLD = 1000  # The number of journaled entries which triggers a compaction when a writer flushes.
+
+JOURNAL_MAGIC = b'AM3J'
+_FILE_HEADER_SIZE = len(JOURNAL_MAGIC) + 16  # The magic bytes and the generation nonce.
+_HEADER = struct.Struct('<II')  # The record payload length and CRC32 checksum.
+
+
+class Journal(object):
+    """
+    The append-only journal of a reaction family. The journal is read incrementally,
+    only records appended since the last read are parsed.
+
+    Args:
+        family (str): The reaction family label.
+        database_path (str, optional): The path to the database folder.
+
+    Attributes:
+        family (str): The reaction family label.
+        database_path (str): The path to the database folder.
+        path (str): The path to the journal file.
+        entries (Dict[int, dict]): The journaled entries keyed by reaction ID, as of the last read.
+    """
+
+    def __init__(self,
+                 family: str,
+                 database_path: Optional[str] = None,
+                 ):
+        self.family = family
+        self.database_path = database_path or DATABASE_PATH
+        self.path = os.path.join(self.database_path, JOURNALS_FOLDER, f'{self.family}{JOURNAL_EXTENSION}')
+        self.entries = dict()
+        self._offset = 0
+        self._generation = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def next_index(self) -> int:
+        """The next reaction ID after the journaled entries"""
+        return max(self.entries.keys()) + 1 if len(self.entries) else 0
+
+    def lock(self) -> FileLock:
+        """
+        Get the lock guarding appends to the journal and its compaction.
+
+        Returns:
+            FileLock: The (unlocked) lock.
+        """
+        return FileLock(get_lock_path(f'{self.family}.journal', self.database_path))
+
+    def read(self) -> Dict[int, dict]:
+        """
+        Read the records appended to the journal since the last read.
+        The cached entries are dropped if the journal was recreated (its generation changed) or truncated.
+
+        Returns:
+            Dict[int, dict]: All journaled entries keyed by reaction ID.
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            self.entries, self._offset, self._generation = dict(), 0, None
+            return self.entries
+        with f:
+            header = f.read(_FILE_HEADER_SIZE)
+            if len(header) < _FILE_HEADER_SIZE or not header.startswith(JOURNAL_MAGIC):
+                # No journal, or a journal whose creation was interrupted.
+                self.entries, self._offset, self._generation = dict(), 0, None
+                return self.entries
+            size = os.fstat(f.fileno()).st_size
+            if header != self._generation or size < self._offset:
+                self.entries, self._offset, self._generation = dict(), _FILE_HEADER_SIZE, header
+            if size == self._offset:
+                return self.entries
+            f.seek(self._offset)
+            data = f.read()
+        position = 0
+        while position + _HEADER.size <= len(data):
+            length, checksum = _HEADER.unpack_from(data, position)
+            payload = data[position + _HEADER.size:position + _HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break  # An incomplete record, being appended or left by a crash.
+            self.entries.update(decode_shard(payload))
+            position += _HEADER.size + length
+        self._offset += position
+        return self.entries
+
+    @timed('journal.append')
+    def append(self,
+               entries: Dict[int, dict],
+               fsync: bool = False,
+               ):
+        """
+        Append entries to the journal in a single write, one record per entry.
+        An incomplete record left at the end of the journal by a crashed writer is truncated first,
+        the journal is only truncated at the end of the records read from the current generation of the journal.
+        Must be called while holding the journal lock.
+
+        Args:
+            entries (Dict[int, dict]): The entries keyed by reaction ID.
+            fsync (bool, optional): Whether to also flush the journal to the storage device.
+        """
+        if not len(entries):
+            return
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.read()
+        data = bytearray()
+        for index, entry in entries.items():
+            payload = encode_shard({index: entry})
+            data += _HEADER.pack(len(payload), zlib.crc32(payload))
+            data += payload
+        with open(self.path, 'r+b' if self._generation is not None else 'wb') as f:
+            if self._generation is None:
+                f.write(JOURNAL_MAGIC + uuid.uuid4().bytes)
+            else:
+                f.seek(self._offset)
+                f.truncate()
+            f.write(data)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        self.read()
+
+    def get_shard_entries(self, extension: str = '.yml') -> Dict[str, Dict[int, dict]]:
+        """
+        Get the journaled entries grouped by the shard they belong to.
+
+        Args:
+            extension (str, optional): The shard file extension of the database storage backend.
+
+        Returns:
+            Dict[str, Dict[int, dict]]: Keys are shard filenames, values are entries keyed by reaction ID.
+        """
+        shard_entries = dict()
+        for index, entry in self.read().items():
+            shard = determine_family_filename_by_index(index=index, family=self.family, extension=extension,
+                                                       database_path=self.database_path)
+            shard_entries.setdefault(shard, dict())[index] = entry
+        return shard_entries
+
+    @timed('journal.compact')
+    def compact(self) -> int:
+        """
+        Fold the journal into the family shards, writing each affected shard once, and remove the journal.
+
+        Returns:
+            int: The number of compacted entries.
+        """
+        with family_lock(self.family, database_path=self.database_path):
+            with self.lock():
+                if not len(self.read()):
+                    return 0
+                manifest = FamilyManifest(family=self.family, database_path=self.database_path).load(save_rebuilt=True)
+                shard_entries = self.get_shard_entries(manifest.extension)
+                manifest.next_index = max(manifest.next_index, self.next_index)
+                if not os.path.isdir(manifest.reactions_path):
+                    os.makedirs(manifest.reactions_path, exist_ok=True)
+                for shard in sorted(shard_entries.keys()):
+                    with shard_lock(shard, database_path=self.database_path):
+                        shard_path = os.path.join(manifest.reactions_path, shard)
+                        content = read_shard(shard_path)
+                        content.update(shard_entries[shard])
+                        save_shard(shard_path, content)
+                        notify_shard_written(manifest.reactions_path, shard)
+                        manifest.update_shard(shard=shard, count=len(content))
+                manifest.save()
+                num_compacted = len(self.entries)
+                os.remove(self.path)
+                self.read()
+        return num_compacted
+
+
+_journals = dict()
+
+
+def get_journal(family: str,
+                database_path: Optional[str] = None,
+                ) -> Journal:
+    """
+    Get the journal of a family, cached per process so that it is read incrementally.
+
+    Args:
+        family (str): The reaction family label.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        Journal: The journal, read up to date.
+    """
+    database_path = database_path or DATABASE_PATH
+    cache_key = (os.path.abspath(database_path), family)
+    if cache_key not in _journals:
+        _journals[cache_key] = Journal(family=family, database_path=database_path)
+    journal = _journals[cache_key]
+    journal.read()
+    return journal
+
+
+def get_journal_size(family: str,
+                     database_path: Optional[str] = None,
+                     ) -> int:
+    """
+    Get the size of the journal file of a family, used to detect appends.
+
+    Args:
+        family (str): The reaction family label.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        int: The journal size in bytes, 0 if the family has no journal.
+    """
+    path = os.path.join(database_path or DATABASE_PATH, JOURNALS_FOLDER, f'{family}{JOURNAL_EXTENSION}')
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def get_journaled_families(database_path: Optional[str] = None) -> List[str]:
+    """
+    Get the labels of the families which have a journal.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        List[str]: The sorted family labels.
+    """
+    journals_path = os.path.join(database_path or DATABASE_PATH, JOURNALS_FOLDER)
+    if not os.path.isdir(journals_path):
+        return list()
+    return sorted(file_name[:-len(JOURNAL_EXTENSION)] for file_name in os.listdir(journals_path)
+                  if file_name.endswith(JOURNAL_EXTENSION))
+
+
+def is_journaled(database_path: Optional[str] = None) -> bool:
+    """
+    Check whether saves to a database are journaled, according to its ``journal`` setting.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        bool: Whether saves are journaled.
+    """
+    return bool(get_database_settings(database_path).get('journal', False))
+
+
+def compact_journals(database_path: Optional[str] = None) -> int:
+    """
+    Compact the journals of all families of a database.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        int: The number of compacted entries.
+    """
+    return sum(get_journal(family, database_path).compact() for family in get_journaled_families(database_path))
+
@@ -0,0 +1,230 @@
+"""
+AM3DB's locks module.
+
+Advisory inter-process file locks (``fcntl.flock``) coordinating concurrent writers of a database folder.
+Lock files are kept under ``<database>/locks/``:
+    ``<family>.index.lock``: Held while allocating reaction IDs of a family.
+    ``<family>.lock``: Held while a family's shards and manifest are updated.
+    ``<shard>.lock``: Held while a shard is read, modified and replaced.
+    ``users.lock``: Held while the users file is updated.
+Locks which are taken together are always acquired in this order: family, then shards (sorted by filename).
+Every FileLock opens its own file description, so locks are also exclusive between threads of a process,
+and a lock must not be acquired again by a thread which already holds it.
+On platforms without ``fcntl``, locks are no-ops.
+"""
+
+import os
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from am3db.common import DATABASE_PATH
+from am3db.storage import get_tmp_path
+
+
+LOCKS_FOLDER = 'locks'
+
+
+class LockTimeoutError(Exception):
+    """
+    An exception raised when a lock cannot be acquired within the given timeout.
+    """
+    pass
+
+
+class FileLock(object):
+    """
+    An exclusive advisory lock on a lock file, used as a context manager.
+
+    Args:
+        path (str): The path to the lock file, created if it does not exist.
+        timeout (float, optional): The maximal number of seconds to wait for the lock, wait forever if not given.
+        poll_interval (float, optional): The number of seconds between attempts to acquire the lock with a timeout.
+
+    Attributes:
+        path (str): The path to the lock file.
+        timeout (float): The maximal number of seconds to wait for the lock.
+        poll_interval (float): The number of seconds between attempts to acquire the lock.
+    """
+
+    def __init__(self,
+                 path: str,
+                 timeout: Optional[float] = None,
+                 poll_interval: float = 0.01,
+                 ):
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._file = None
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    @property
+    def is_locked(self) -> bool:
+        """Whether this instance holds the lock"""
+        return self._file is not None
+
+    def acquire(self):
+        """
+        Acquire the lock, blocking until it is available or the timeout expires.
+        """
+        if self._file is not None:
+            raise RuntimeError(f'The lock {self.path} is already held by this instance.')
+        if os.path.dirname(self.path) and not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        lock_file = open(self.path, 'a')
+        if fcntl is not None:
+            if self.timeout is None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                deadline = time.monotonic() + self.timeout
+                while True:
+                    try:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() >= deadline:
+                            lock_file.close()
+                            raise LockTimeoutError(f'Could not acquire the lock {self.path} '
+                                                   f'within {self.timeout} seconds.')
+                        time.sleep(self.poll_interval)
+        self._file = lock_file
+
+    def release(self):
+        """
+        Release the lock.
+        """
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+def get_lock_path(name: str,
+                  database_path: Optional[str] = None,
+                  ) -> str:
+    """
+    Get the path to a lock file of a database.
+
+    Args:
+        name (str): The lock name.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        str: The path to the lock file.
+    """
+    return os.path.join(database_path or DATABASE_PATH, LOCKS_FOLDER, f'{name}.lock')
+
+
+def family_lock(family: str,
+                database_path: Optional[str] = None,
+                timeout: Optional[float] = None,
+                ) -> FileLock:
+    """
+    Get the lock guarding the shards and manifest of a family.
+
+    Args:
+        family (str): The reaction family label.
+        database_path (str, optional): The path to the database folder.
+        timeout (float, optional): The maximal number of seconds to wait for the lock.
+
+    Returns:
+        FileLock: The (unlocked) lock.
+    """
+    return FileLock(get_lock_path(family, database_path), timeout=timeout)
+
+
+def shard_lock(shard: str,
+               database_path: Optional[str] = None,
+               timeout: Optional[float] = None,
+               ) -> FileLock:
+    """
+    Get the lock guarding a shard.
+
+    Args:
+        shard (str): The shard filename.
+        database_path (str, optional): The path to the database folder.
+        timeout (float, optional): The maximal number of seconds to wait for the lock.
+
+    Returns:
+        FileLock: The (unlocked) lock.
+    """
+    return FileLock(get_lock_path(shard, database_path), timeout=timeout)
+
+
+def allocate_indices(family: str,
+                     count: int = 1,
+                     minimum: int = 0,
+                     database_path: Optional[str] = None,
+                     ) -> int:
+    """
+    Atomically allocate consecutive reaction IDs of a family, which are never allocated again.
+    The next free ID is kept in ``<database>/locks/<family>.next``. With ``count=0`` nothing is allocated,
+    but the next free ID is raised to ``minimum``, which is used to reserve explicitly given reaction IDs.
+
+    Args:
+        family (str): The reaction family label.
+        count (int, optional): The number of reaction IDs to allocate.
+        minimum (int, optional): The smallest allocatable ID, e.g., the next free ID according to the manifest.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        int: The first allocated reaction ID.
+    """
+    counter_path = os.path.join(database_path or DATABASE_PATH, LOCKS_FOLDER, f'{family}.next')
+    with FileLock(get_lock_path(f'{family}.index', database_path)):
+        next_index = 0
+        if os.path.isfile(counter_path):
+            with open(counter_path, 'r') as f:
+                value = f.read().strip()
+            next_index = int(value) if value.isdigit() else 0
+        first = max(next_index, minimum)
+        tmp_path = get_tmp_path(counter_path)
+        with open(tmp_path, 'w') as f:
+            f.write(str(first + count))
+        os.replace(tmp_path, counter_path)
+    return first
+
+
+def release_indices(family: str,
+                    first: int,
+                    end: int,
+                    database_path: Optional[str] = None,
+                    ) -> bool:
+    """
+    Return the unused tail ``[first, end)`` of a block of reaction IDs allocated by ``allocate_indices()``.
+    The IDs are only returned if no IDs were allocated after the block, otherwise they are left unused.
+
+    Args:
+        family (str): The reaction family label.
+        first (int): The first unused reaction ID of the block.
+        end (int): The reaction ID following the block.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        bool: Whether the reaction IDs were returned.
+    """
+    counter_path = os.path.join(database_path or DATABASE_PATH, LOCKS_FOLDER, f'{family}.next')
+    with FileLock(get_lock_path(f'{family}.index', database_path)):
+        if not os.path.isfile(counter_path):
+            return False
+        with open(counter_path, 'r') as f:
+            value = f.read().strip()
+        if value != str(end):
+            return False
+        tmp_path = get_tmp_path(counter_path)
+        with open(tmp_path, 'w') as f:
+            f.write(str(first))
+        os.replace(tmp_path, counter_path)
+    return True
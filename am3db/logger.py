@@ -4,39 +4,87 @@ AM3DB logger module
 
 import datetime
 import os
+import queue
+import threading
 import time
+import weakref
+from typing import Optional
 
-from arc.common import get_git_branch, get_git_commit
+from am3db.common import AM3DB_PATH, VERSION, dict_to_str, get_git_branch, get_git_commit, time_lapse
 
-from am3db.common import AM3DB_PATH, VERSION, dict_to_str, time_lapse
+
+_STOP = object()
+_ROTATE = object()
 
 
 class Logger(object):
     """
     The T3 Logger class.
 
+    In the default mode, every message is appended to the log file as it is logged.
+    In the buffered mode, messages are handed over to a background thread through a queue, which keeps the log file
+    open and writes the buffered messages whenever ``flush_size`` characters accumulate, ``flush_interval`` seconds
+    pass, or an error is logged. Call ``close()`` to write all pending messages, which is also done
+    when the logger is garbage collected or at interpreter exit, whichever comes first.
+
     Args:
         user (str): The username.
         project (str): A project name.
+        buffered (bool, optional): Whether to buffer the messages and write them from a background thread.
+        echo (bool, optional): Whether to print the messages to the console.
+        flush_size (int, optional): The number of buffered characters which triggers a write in the buffered mode.
+        flush_interval (float, optional): The maximal number of seconds a message is buffered in the buffered mode.
+        max_bytes (int, optional): The log file size in bytes which triggers a rotation, no rotation if not given.
+        backup_count (int, optional): The number of rotated log files to keep.
 
     Attributes:
         user (str): The username.
         project (str): A project name.
         log_file (str): The path to the log file.
+        buffered (bool): Whether messages are buffered and written from a background thread.
+        echo (bool): Whether messages are printed to the console.
+        flush_size (int): The number of buffered characters which triggers a write.
+        flush_interval (float): The maximal number of seconds a message is buffered.
+        max_bytes (int): The log file size in bytes which triggers a rotation.
+        backup_count (int): The number of rotated log files to keep.
     """
 
     def __init__(self,
                  user: str,
                  project: str,
+                 buffered: bool = False,
+                 echo: bool = True,
+                 flush_size: int = 64 * 1024,
+                 flush_interval: float = 1.0,
+                 max_bytes: Optional[int] = None,
+                 backup_count: int = 5,
                  ):
         self.user = user
         self.project = project
+        self.buffered = buffered
+        self.echo = echo
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
         self.t0 = datetime.datetime.now()
         t0_str = self.t0.strftime("%Y.%m.%d %H.%M.%S")
         logs_path = os.path.join(AM3DB_PATH, 'logs')
         if not os.path.isdir(logs_path):
             os.mkdir(logs_path)
         self.log_file = os.path.join(logs_path, f'{self.user} {t0_str}.log')
+        self._writer, self._queue, self._thread, self._finalizer = None, None, None, None
+        if self.buffered:
+            self._writer = LogWriter(log_file=self.log_file,
+                                     flush_size=self.flush_size,
+                                     flush_interval=self.flush_interval,
+                                     max_bytes=self.max_bytes,
+                                     backup_count=self.backup_count,
+                                     name=f'Logger {self.user}',
+                                     )
+            self._queue, self._thread = self._writer.queue, self._writer.thread
+            # The finalizer must not reference the logger, otherwise it would never be garbage collected.
+            self._finalizer = weakref.finalize(self, self._writer.close)
         self.log_header()
 
     def log(self,
@@ -61,10 +109,47 @@ class Logger(object):
         elif not isinstance(message, str):
             message = str(message)
         message = prefix[level] + message + suffix[level] if level is not None else message
-        print(message)
+        if self.echo:
+            print(message)
         if level is not None:
-            with open(self.log_file, 'a') as f:
-                f.write(message + '\n')
+            if self._queue is not None:
+                self._queue.put((message + '\n', level == 'error'))
+            else:
+                with open(self.log_file, 'a') as f:
+                    f.write(message + '\n')
+                    if self.max_bytes is not None and f.tell() >= self.max_bytes:
+                        f.close()
+                        self.rotate()
+
+    def flush(self):
+        """
+        Write all buffered messages to the log file, waiting for the background thread in the buffered mode.
+        """
+        if self._queue is not None:
+            written = threading.Event()
+            self._queue.put(written)
+            written.wait()
+
+    def close(self):
+        """
+        Write all buffered messages, stop the background thread and close the log file.
+        Messages logged after closing are written directly to the log file.
+        """
+        if self._queue is not None:
+            self._finalizer()
+            self._queue = None
+
+    def rotate(self):
+        """
+        Rotate the log file, see ``rotate_log_file()``.
+        In the buffered mode, the buffered messages are written first, and the rotation is done by the background
+        thread, which is the only one using the open log file handle.
+        """
+        if self._queue is not None:
+            self._queue.put(_ROTATE)
+            self.flush()
+        else:
+            rotate_log_file(self.log_file, backup_count=self.backup_count)
 
     def debug(self, message: str):
         """
@@ -118,3 +203,125 @@ class Logger(object):
         else:
             self.log('\n', level='always')
         self.log(f'Starting project {self.project}', level='always')
+
+
+class LogWriter(object):
+    """
+    Writes the messages of a buffered Logger to its log file from a background thread.
+    The writer holds no reference to its Logger, so that the Logger can be garbage collected while the thread runs.
+
+    Args:
+        log_file (str): The path to the log file.
+        flush_size (int): The number of buffered characters which triggers a write.
+        flush_interval (float): The maximal number of seconds a message is buffered.
+        max_bytes (int): The log file size in bytes which triggers a rotation, no rotation if ``None``.
+        backup_count (int): The number of rotated log files to keep.
+        name (str): The name of the background thread.
+
+    Attributes:
+        log_file (str): The path to the log file.
+        flush_size (int): The number of buffered characters which triggers a write.
+        flush_interval (float): The maximal number of seconds a message is buffered.
+        max_bytes (int): The log file size in bytes which triggers a rotation.
+        backup_count (int): The number of rotated log files to keep.
+        queue (queue.Queue): The queued (message, urgent) tuples, flush events, and the rotate and stop sentinels.
+        thread (threading.Thread): The background thread.
+        handle: The open log file handle, ``None`` if the log file is not open.
+    """
+
+    def __init__(self,
+                 log_file: str,
+                 flush_size: int,
+                 flush_interval: float,
+                 max_bytes: Optional[int],
+                 backup_count: int,
+                 name: str,
+                 ):
+        self.log_file = log_file
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = queue.Queue()
+        self.handle = None
+        self.thread = threading.Thread(target=self.write_loop, name=name, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """
+        Write all queued messages, stop the background thread and close the log file.
+        """
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def close_handle(self):
+        """
+        Close the log file handle, it is opened again on the next write.
+        """
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def write_loop(self):
+        """
+        Write the queued messages to the log file, run by the background thread in the buffered mode.
+        """
+        buffer, buffer_size, last_write = list(), 0, time.monotonic()
+        while True:
+            timeout = max(self.flush_interval - (time.monotonic() - last_write), 0) if buffer else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            urgent = item is None or item is _STOP or item is _ROTATE or isinstance(item, threading.Event)
+            if isinstance(item, tuple):
+                message, urgent = item
+                buffer.append(message)
+                buffer_size += len(message)
+            if buffer and (urgent or buffer_size >= self.flush_size
+                           or time.monotonic() - last_write >= self.flush_interval):
+                self.write(''.join(buffer))
+                buffer, buffer_size, last_write = list(), 0, time.monotonic()
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _ROTATE:
+                self.close_handle()
+                rotate_log_file(self.log_file, backup_count=self.backup_count)
+            elif item is _STOP:
+                self.close_handle()
+                break
+
+    def write(self, text: str):
+        """
+        Write text to the open log file handle and rotate the log file if needed.
+
+        Args:
+            text (str): The text to write.
+        """
+        if self.handle is None:
+            self.handle = open(self.log_file, 'a')
+        self.handle.write(text)
+        self.handle.flush()
+        if self.max_bytes is not None and self.handle.tell() >= self.max_bytes:
+            self.close_handle()
+            rotate_log_file(self.log_file, backup_count=self.backup_count)
+
+
+def rotate_log_file(log_file: str,
+                    backup_count: int,
+                    ):
+    """
+    Rotate a log file, renaming ``<log>`` to ``<log>.1``, ``<log>.1`` to ``<log>.2``, and so on,
+    keeping up to ``backup_count`` rotated files.
+
+    Args:
+        log_file (str): The path to the log file.
+        backup_count (int): The number of rotated log files to keep.
+    """
+    for i in range(backup_count - 1, 0, -1):
+        if os.path.isfile(f'{log_file}.{i}'):
+            os.replace(f'{log_file}.{i}', f'{log_file}.{i + 1}')
+    if backup_count > 0 and os.path.isfile(log_file):
+        os.replace(log_file, f'{log_file}.1')
+    elif os.path.isfile(log_file):
+        os.remove(log_file)
@@ -0,0 +1,347 @@
+"""
+AM3DB's family manifest module.
+
+A manifest is a small per-family YAML file stored under ``<database>/manifests/<family>.yml``.
+It records the next free reaction index and the shards of the family with their reaction counts,
+so that assigning an index to a new reaction does not require parsing the family shards.
+
+By default, shard ``<family>_<n>`` holds the reaction IDs ``[n * MAX_RXNS_PER_FILE, (n + 1) * MAX_RXNS_PER_FILE)``.
+Once a shard of the family was split or merged (see ``am3db.sharding``), a shard table stored next to the manifest,
+``<database>/manifests/<family>.table.yml``, maps contiguous ranges of reaction IDs to shard numbers instead.
+"""
+
+import bisect
+import os
+from typing import List, Optional, Tuple
+
+from am3db.catalog import get_catalog
+from am3db.common import DATABASE_PATH, read_yaml_file
+from am3db.storage import get_database_backend, parse_shard_filename, read_shard, save_yaml_file_atomically
+
+
+MANIFESTS_FOLDER = 'manifests'
+SHARD_TABLE_SUFFIX = '.table.yml'
+MAX_RXNS_PER_FILE = 500
+
+
+class FamilyManifest(object):
+    """
+    A persistent manifest of a reaction family in the database.
+
+    Args:
+        family (str): The reaction family label.
+        database_path (str, optional): The path to the database folder.
+
+    Attributes:
+        family (str): The reaction family label.
+        database_path (str): The path to the database folder.
+        path (str): The path to the manifest file.
+        extension (str): The shard file extension of the database storage backend.
+        next_index (int): The next free reaction ID in this family.
+        shards (dict): Keys are shard filenames, values are dictionaries with the 'count' of reactions in the shard,
+                       and the shard file 'size' and 'mtime_ns' used to detect changes made behind the manifest's back.
+        derived_shard_table (Optional[List[List[int]]]): A shard table derived from the shards by ``rebuild()``,
+                                                         saved with the manifest.
+        rebuilt (bool): Whether the manifest was rebuilt from the shards and not saved since.
+    """
+
+    def __init__(self,
+                 family: str,
+                 database_path: Optional[str] = None,
+                 ):
+        self.family = family
+        self.database_path = database_path or DATABASE_PATH
+        self.path = os.path.join(self.database_path, MANIFESTS_FOLDER, f'{self.family}.yml')
+        self.extension = get_database_backend(self.database_path).extension
+        self.next_index = 0
+        self.shards = dict()
+        self.derived_shard_table = None
+        self.rebuilt = False
+
+    @property
+    def reactions_path(self) -> str:
+        """The path to the database reactions folder"""
+        return os.path.join(self.database_path, 'reactions')
+
+    def load(self, save_rebuilt: bool = False) -> 'FamilyManifest':
+        """
+        Load the manifest from the database, rebuild it from the shards if it is missing or out of sync.
+        By default nothing is written, a rebuilt manifest is only persisted by ``save()``.
+
+        Args:
+            save_rebuilt (bool, optional): Whether to save the manifest if it was rebuilt,
+                                           only pass it while holding the family lock (see ``am3db.locks``).
+
+        Returns:
+            FamilyManifest: The manifest instance, to allow chaining.
+        """
+        content = read_yaml_file(self.path) if os.path.isfile(self.path) else None
+        if isinstance(content, dict) and content.get('family') == self.family:
+            self.next_index = content.get('next_index', 0)
+            self.shards = content.get('shards', None) or dict()
+            if self.is_in_sync():
+                self.rebuilt = False
+                return self
+        self.rebuild()
+        if save_rebuilt:
+            self.save()
+        return self
+
+    def save(self):
+        """
+        Save the manifest in the database, and the shard table derived by ``rebuild()`` if any.
+        Must be called while holding the family lock.
+        """
+        if self.derived_shard_table is not None:
+            save_shard_table(self.family, self.derived_shard_table, database_path=self.database_path)
+            self.derived_shard_table = None
+        save_yaml_file_atomically(path=self.path, content=self.as_dict())
+        self.rebuilt = False
+
+    def as_dict(self) -> dict:
+        """A dictionary representation of the manifest."""
+        return {'family': self.family,
+                'next_index': self.next_index,
+                'shards': self.shards,
+                }
+
+    def is_in_sync(self) -> bool:
+        """
+        Check whether the manifest agrees with the shards on disk.
+        Only the shard files are stat'ed, none of them is parsed.
+
+        Returns:
+            bool: Whether the manifest is in sync with the database.
+        """
+        for shard, entry in self.shards.items():
+            shard_path = os.path.join(self.reactions_path, shard)
+            if not os.path.isfile(shard_path):
+                return False
+            stat = os.stat(shard_path)
+            if stat.st_size != entry.get('size') or stat.st_mtime_ns != entry.get('mtime_ns'):
+                return False
+        shard_numbers = [get_shard_number(shard, self.family, self.extension) for shard in self.shards.keys()]
+        next_shard_number = max(shard_numbers) + 1 if len(shard_numbers) else 0
+        if os.path.isfile(os.path.join(self.reactions_path, f'{self.family}_{next_shard_number}{self.extension}')):
+            return False
+        return True
+
+    def rebuild(self):
+        """
+        Rebuild the manifest by parsing all shards of the family.
+        If the shards don't follow the default layout and the family has no shard table,
+        the shard table is derived from the reaction IDs in the shards, it is saved with the manifest.
+        """
+        self.next_index, self.shards, self.derived_shard_table, self.rebuilt = 0, dict(), None, True
+        catalog = get_catalog(self.reactions_path)
+        catalog.invalidate()  # The shards were modified behind the manifest's back.
+        ranges, default_layout = list(), True
+        for file_name in catalog.get_shards(self.family, extension=self.extension):
+            indices = get_shard_indices(read_shard(os.path.join(self.reactions_path, file_name)))
+            self.update_shard(shard=file_name, count=len(indices))
+            if len(indices):
+                self.next_index = max(self.next_index, max(indices) + 1)
+                number = get_shard_number(file_name, self.family, self.extension)
+                ranges.append([min(indices), number])
+                default_layout = default_layout and min(indices) >= number * MAX_RXNS_PER_FILE \
+                    and max(indices) < (number + 1) * MAX_RXNS_PER_FILE
+        if not default_layout and get_shard_table(self.family, self.database_path) is None:
+            ranges.sort()
+            ranges[0][0] = 0
+            self.derived_shard_table = ranges
+
+    def update_shard(self,
+                     shard: str,
+                     count: int,
+                     index: Optional[int] = None,
+                     ):
+        """
+        Update the manifest after a shard was written.
+
+        Args:
+            shard (str): The shard filename.
+            count (int): The number of reactions in the shard.
+            index (int, optional): A reaction ID that was just saved in the shard.
+        """
+        stat = os.stat(os.path.join(self.reactions_path, shard))
+        self.shards[shard] = {'count': count, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if index is not None:
+            self.next_index = max(self.next_index, index + 1)
+
+    def remove_shard(self, shard: str):
+        """
+        Update the manifest before a shard is removed.
+
+        Args:
+            shard (str): The shard filename.
+        """
+        self.shards.pop(shard, None)
+
+
+_shard_tables = dict()
+
+
+def get_shard_table_path(family: str,
+                         database_path: Optional[str] = None,
+                         ) -> str:
+    """
+    Get the path to the shard table of a family.
+
+    Args:
+        family (str): The reaction family label.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        str: The path to the shard table file.
+    """
+    return os.path.join(database_path or DATABASE_PATH, MANIFESTS_FOLDER, f'{family}{SHARD_TABLE_SUFFIX}')
+
+
+def get_shard_table(family: str,
+                    database_path: Optional[str] = None,
+                    ) -> Optional[List[List[int]]]:
+    """
+    Get the shard table of a family, cached until the table file changes.
+
+    Args:
+        family (str): The reaction family label.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        Optional[List[List[int]]]: [first reaction ID, shard number] pairs sorted by the first reaction ID,
+                                   each shard holding the IDs up to the next pair's first ID.
+                                   ``None`` if the family follows the default layout.
+    """
+    table = _get_cached_shard_table(get_shard_table_path(family, database_path))
+    return [[start, number] for start, number in zip(*table)] if table is not None else None
+
+
+def _get_cached_shard_table(path: str) -> Optional[Tuple[List[int], List[int]]]:
+    """Get the cached (first reaction IDs, shard numbers) of a shard table file, reading it if it changed."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        _shard_tables.pop(path, None)
+        return None
+    stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    if path not in _shard_tables or _shard_tables[path][0] != stat:
+        ranges = read_yaml_file(path) or list()
+        _shard_tables[path] = (stat, ([start for start, _ in ranges], [number for _, number in ranges]))
+    return _shard_tables[path][1] if len(_shard_tables[path][1][0]) else None
+
+
+def save_shard_table(family: str,
+                     table: List[List[int]],
+                     database_path: Optional[str] = None,
+                     ):
+    """
+    Save the shard table of a family, must be called while holding the family lock.
+
+    Args:
+        family (str): The reaction family label.
+        table (List[List[int]]): [first reaction ID, shard number] pairs, see ``get_shard_table()``.
+        database_path (str, optional): The path to the database folder.
+    """
+    save_yaml_file_atomically(path=get_shard_table_path(family, database_path),
+                              content=[[int(start), int(number)] for start, number in sorted(table)])
+
+
+def determine_family_filename_by_index(index: int,
+                                       family: str,
+                                       extension: str = '.yml',
+                                       database_path: Optional[str] = None,
+                                       ) -> str:
+    """
+    Determine the family filename in the database by the reaction ID,
+    using the family shard table if the family has one.
+
+    Args:
+        index (int): The reaction ID in the database.
+        family (str): The reaction family label.
+        extension (str, optional): The shard file extension of the database storage backend.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        str: The shard filename.
+    """
+    table = _get_cached_shard_table(get_shard_table_path(family, database_path))
+    if table is not None:
+        num = table[1][max(bisect.bisect_right(table[0], index) - 1, 0)]
+    else:
+        num = int(index / MAX_RXNS_PER_FILE)
+    return f'{family}_{num}{extension}'
+
+
+def sort_shards(shards: List[str],
+                family: str,
+                extension: str = '.yml',
+                database_path: Optional[str] = None,
+                ) -> List[str]:
+    """
+    Sort shard filenames of a family by the reaction IDs they hold.
+
+    Args:
+        shards (List[str]): The shard filenames.
+        family (str): The reaction family label.
+        extension (str, optional): The shard file extension of the database storage backend.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        List[str]: The sorted shard filenames.
+    """
+    table = _get_cached_shard_table(get_shard_table_path(family, database_path))
+    positions = {number: position for position, number in enumerate(table[1])} if table is not None else dict()
+    numbers = {shard: get_shard_number(shard, family, extension) for shard in shards}
+    return sorted(shards, key=lambda shard: (positions.get(numbers[shard], len(positions)), numbers[shard] or 0))
+
+
+def get_all_family_files(family: str,
+                         reactions_path: str = '',
+                         ) -> List[str]:
+    """
+    Get all database files for a given family, see ``am3db.catalog``.
+
+    Args:
+         family (str): The family label.
+         reactions_path (str, optional): The path to the database reactions folder.
+
+    Returns:
+        List[str]: The shard filenames of this family in the database, sorted by their number.
+    """
+    return get_catalog(reactions_path or None).get_shards(family)
+
+
+def get_shard_number(file_name: str,
+                     family: str,
+                     extension: str = '.yml',
+                     ) -> Optional[int]:
+    """
+    Get the shard number from a shard filename in the format ``<family>_<n><extension>``.
+
+    Args:
+        file_name (str): The shard filename.
+        family (str): The reaction family label.
+        extension (str, optional): The shard file extension.
+
+    Returns:
+        Optional[int]: The shard number, ``None`` if the file is not a shard of this family.
+    """
+    parsed = parse_shard_filename(file_name, extension=extension)
+    return parsed[1] if parsed is not None and parsed[0] == family else None
+
+
+def get_shard_indices(content) -> List[int]:
+    """
+    Get the reaction IDs stored in a shard.
+
+    Args:
+        content: The shard content, a dictionary keyed by reaction ID (or a list of reactions with an 'index' key).
+
+    Returns:
+        List[int]: The reaction IDs.
+    """
+    if isinstance(content, dict):
+        return list(content.keys())
+    if isinstance(content, list):
+        return [reaction['index'] for reaction in content]
+    return list()
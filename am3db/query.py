@@ -0,0 +1,248 @@
+"""
+AM3DB's query module.
+
+A read path over the shard database. Matching entries are streamed shard by shard,
+so at most one shard is held in memory at any time (besides the un-compacted journal, see ``am3db.journal``).
+"""
+
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from am3db.catalog import get_catalog
+from am3db.common import DATABASE_PATH
+from am3db.journal import get_journal, get_journaled_families
+from am3db.manifest import determine_family_filename_by_index, sort_shards
+from am3db.records import StoredReaction
+from am3db.storage import get_database_backend, read_shard
+
+
+class ReactionDB(object):
+    """
+    A read-only view of the AM3DB reaction database.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+
+    Attributes:
+        database_path (str): The path to the database folder.
+        reactions_path (str): The path to the database reactions folder.
+        extension (str): The shard file extension of the database storage backend.
+    """
+
+    def __init__(self, database_path: Optional[str] = None):
+        self.database_path = database_path or DATABASE_PATH
+        self.reactions_path = os.path.join(self.database_path, 'reactions')
+        self.extension = get_database_backend(self.database_path).extension
+
+    def get_families(self) -> List[str]:
+        """
+        Get the labels of all families stored in the database.
+
+        Returns:
+            List[str]: The sorted family labels.
+        """
+        catalog = get_catalog(self.reactions_path)
+        families = set(get_journaled_families(self.database_path))
+        families.update(family for family in catalog.get_families() if len(catalog.get_shards(family, self.extension)))
+        return sorted(families)
+
+    def get_shards(self, family: str) -> List[str]:
+        """
+        Get the shard filenames of a family, sorted by their number.
+
+        Args:
+            family (str): The reaction family label.
+
+        Returns:
+            List[str]: The shard filenames.
+        """
+        return get_catalog(self.reactions_path).get_shards(family, extension=self.extension)
+
+    def get(self,
+            family: str,
+            index: int,
+            ) -> Optional[dict]:
+        """
+        Get a single reaction entry, only its shard is read.
+        The shard is looked up again if the entry was moved by a concurrent shard split or merge.
+
+        Args:
+            family (str): The reaction family label.
+            index (int): The reaction ID.
+
+        Returns:
+            Optional[dict]: The database entry, ``None`` if it does not exist.
+        """
+        journal = get_journal(family, database_path=self.database_path)
+        if index in journal.entries:
+            return journal.entries[index]
+        shard = determine_family_filename_by_index(index=index, family=family, extension=self.extension,
+                                                   database_path=self.database_path)
+        entry = read_shard(os.path.join(self.reactions_path, shard)).get(index, None)
+        if entry is None:
+            moved_shard = determine_family_filename_by_index(index=index, family=family, extension=self.extension,
+                                                             database_path=self.database_path)
+            if moved_shard != shard:
+                entry = read_shard(os.path.join(self.reactions_path, moved_shard)).get(index, None)
+        return entry
+
+    def query(self,
+              family: Optional[str] = None,
+              indices: Optional[Iterable[int]] = None,
+              multiplicity: Optional[int] = None,
+              charge: Optional[int] = None,
+              inchi_key: Optional[str] = None,
+              approved: Optional[bool] = None,
+              rejected: Optional[bool] = None,
+              where: Optional[Callable[[dict], bool]] = None,
+              fields: Optional[List[str]] = None,
+              ) -> Iterator[Tuple[str, int, dict]]:
+        """
+        Stream the reaction entries matching all given criteria.
+        Shards which cannot hold any of the requested ``indices`` are not read.
+
+        Example::
+
+            for family, index, entry in ReactionDB().query(family='intra_H_migration', approved=True,
+                                                           multiplicity=2, inchi_key='OCBFFGCSTGGPSQ-UHFFFAOYSA-N',
+                                                           fields=['r_xyz', 'p_xyz', 'atom_maps']):
+                ...
+
+        Args:
+            family (str, optional): The reaction family label, all families are queried if not given.
+            indices (Iterable[int], optional): The reaction IDs to consider.
+            multiplicity (int, optional): The reaction surface multiplicity.
+            charge (int, optional): The reaction surface charge.
+            inchi_key (str, optional): An InChI key of a reactant or a product.
+            approved (bool, optional): Whether the reaction was approved by at least one reviewer.
+            rejected (bool, optional): Whether the reaction was rejected by at least one reviewer.
+            where (Callable[[dict], bool], optional): An additional predicate on the database entry.
+            fields (List[str], optional): Only return these fields of the entries.
+
+        Yields:
+            Tuple[str, int, dict]: The family label, reaction ID, and (projected) database entry.
+        """
+        indices = set(indices) if indices is not None else None
+        for family_label in ([family] if family is not None else self.get_families()):
+            index_shards = self._get_index_shards(family_label, indices) if indices is not None else None
+            journal_entries = get_journal(family_label, database_path=self.database_path) \
+                .get_shard_entries(self.extension)
+            shards = sort_shards(list(set(self.get_shards(family_label)) | set(journal_entries.keys())),
+                                 family=family_label, extension=self.extension, database_path=self.database_path)
+            for shard in shards:
+                if index_shards is not None and shard not in index_shards:
+                    continue
+                content = read_shard(os.path.join(self.reactions_path, shard))
+                content.update(journal_entries.get(shard, dict()))
+                for index in sorted(content.keys()):
+                    entry = content[index]
+                    if indices is not None and index not in indices:
+                        continue
+                    if not entry_matches(entry, multiplicity=multiplicity, charge=charge, inchi_key=inchi_key,
+                                         approved=approved, rejected=rejected):
+                        continue
+                    if where is not None and not where(entry):
+                        continue
+                    yield family_label, index, project_entry(entry, fields)
+
+    def records(self, **kwargs) -> Iterator[StoredReaction]:
+        """
+        Stream lightweight records of the reactions matching all given criteria, accepts the ``query()`` arguments
+        besides ``fields``. No AMReaction is constructed, see ``am3db.records``.
+
+        Yields:
+            StoredReaction: The records.
+        """
+        kwargs['fields'] = None
+        for family, index, entry in self.query(**kwargs):
+            yield StoredReaction(family=family, index=index, entry=entry)
+
+    def get_record(self,
+                   family: str,
+                   index: int,
+                   ) -> Optional[StoredReaction]:
+        """
+        Get a lightweight record of a single reaction, only its shard is read.
+
+        Args:
+            family (str): The reaction family label.
+            index (int): The reaction ID.
+
+        Returns:
+            Optional[StoredReaction]: The record, ``None`` if the reaction does not exist.
+        """
+        entry = self.get(family, index)
+        return StoredReaction(family=family, index=index, entry=entry) if entry is not None else None
+
+    def count(self, **kwargs) -> int:
+        """
+        Count the reactions matching the given criteria, accepts the ``query()`` arguments.
+
+        Returns:
+            int: The number of matching reactions.
+        """
+        kwargs['fields'] = list()
+        return sum(1 for _ in self.query(**kwargs))
+
+    def _get_index_shards(self,
+                          family: str,
+                          indices: Iterable[int],
+                          ) -> set:
+        """Get the shard filenames that may hold the given reaction IDs."""
+        return {determine_family_filename_by_index(index=index, family=family, extension=self.extension,
+                                                   database_path=self.database_path)
+                for index in indices}
+
+
+def entry_matches(entry: dict,
+                  multiplicity: Optional[int] = None,
+                  charge: Optional[int] = None,
+                  inchi_key: Optional[str] = None,
+                  approved: Optional[bool] = None,
+                  rejected: Optional[bool] = None,
+                  ) -> bool:
+    """
+    Check whether a database entry matches all given criteria.
+
+    Args:
+        entry (dict): The database entry.
+        multiplicity (int, optional): The reaction surface multiplicity.
+        charge (int, optional): The reaction surface charge.
+        inchi_key (str, optional): An InChI key of a reactant or a product.
+        approved (bool, optional): Whether the reaction was approved by at least one reviewer.
+        rejected (bool, optional): Whether the reaction was rejected by at least one reviewer.
+
+    Returns:
+        bool: Whether the entry matches.
+    """
+    if multiplicity is not None and entry.get('multiplicity') != multiplicity:
+        return False
+    if charge is not None and entry.get('charge') != charge:
+        return False
+    if inchi_key is not None \
+            and inchi_key not in (entry.get('r_inchi_keys') or list()) \
+            and inchi_key not in (entry.get('p_inchi_keys') or list()):
+        return False
+    if approved is not None and bool(entry.get('approved_by')) != approved:
+        return False
+    if rejected is not None and bool(entry.get('rejected_by')) != rejected:
+        return False
+    return True
+
+
+def project_entry(entry: dict,
+                  fields: Optional[List[str]] = None,
+                  ) -> Dict:
+    """
+    Project a database entry onto the requested fields.
+
+    Args:
+        entry (dict): The database entry.
+        fields (List[str], optional): The fields to keep, all fields are kept if not given.
+
+    Returns:
+        dict: The projected entry.
+    """
+    if fields is None:
+        return entry
+    return {field: entry.get(field, None) for field in fields}
@@ -1,25 +1,32 @@
 """
 AM3DB's reaction module.
 """
-import os.path
-from typing import TYPE_CHECKING, List, Optional
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from arc.common import generate_resonance_structures, read_yaml_file, save_yaml_file
 from arc.reaction import ARCReaction
-from arc.rmgdb import determine_family
 from arc.species.mapping import get_atom_indices_of_labeled_atoms_in_an_rmg_reaction, get_rmg_reactions_from_arc_reaction
 
+from am3db.atom_maps import AtomMapSet, combine_symmetries
 from am3db.common import DATABASE_PATH
+from am3db.families import FAMILY_CACHE
+from am3db.fingerprint import compute_fingerprint
+from am3db.instrumentation import timed, timer
+from am3db.journal import get_journal
+from am3db.locks import family_lock
+from am3db.manifest import (MAX_RXNS_PER_FILE,
+                            FamilyManifest,
+                            determine_family_filename_by_index,
+                            get_all_family_files,
+                            )
+from am3db.species_cache import SPECIES_CACHE, SpeciesCache
 from am3db.user import get_user_from_file
+from am3db.writer import DatabaseWriter, save_many, set_up_folders
 
 if TYPE_CHECKING:
     from rmgpy.reaction import Reaction
     from arc.species import ARCSpecies
 
 
-MAX_RXNS_PER_FILE = 500
-
-
 class AMReaction(ARCReaction):
     """
     An AM3DB Reaction class.
@@ -37,6 +44,7 @@ class AMReaction(ARCReaction):
         species_list (list, optional): A list of ARCSpecies entries for matching reactants and products
                                        to existing species.
         index (int, optional): The reaction ID in the database.
+        database_path (str, optional): The path to the database folder of the reaction.
 
     Attributes:
         label (str): The reaction's label in the format `r1 + r2 <=> p1 + p2`
@@ -56,8 +64,10 @@ class AMReaction(ARCReaction):
                               reactant atom 1 matches product atom 2, and reactant atom 2 matches product atom 1.
 
         index (int): The reaction ID in the database.
+        database_path (str): The path to the database folder of the reaction, where it is saved by default.
     """
 
+    @timed('reaction.init')
     def __init__(self,
                  label: str = '',
                  reactants: Optional[List[str]] = None,
@@ -69,20 +79,25 @@ class AMReaction(ARCReaction):
                  charge: Optional[int] = None,
                  species_list: Optional[List['ARCSpecies']] = None,
                  index: Optional[int] = None,
+                 database_path: Optional[str] = None,
                  ):
 
-        super().__init__(label=label,
-                         reactants=reactants,
-                         products=products,
-                         r_species=r_species,
-                         p_species=p_species,
-                         rmg_reaction=rmg_reaction,
-                         multiplicity=multiplicity,
-                         charge=charge,
-                         species_list=species_list,
-                         )
+        with timer('reaction.init.arc'):
+            super().__init__(label=label,
+                             reactants=reactants,
+                             products=products,
+                             r_species=r_species,
+                             p_species=p_species,
+                             rmg_reaction=rmg_reaction,
+                             multiplicity=multiplicity,
+                             charge=charge,
+                             species_list=species_list,
+                             )
         self._index = index
-        determine_family(reaction=self)
+        self._next_index = None
+        self.database_path = database_path or DATABASE_PATH
+        with timer('reaction.init.determine_family'):
+            FAMILY_CACHE.determine_family(reaction=self)
         self.approved_by = None
         self.rejected_by = None
         self.rejected_reasons = list()
@@ -90,25 +105,20 @@ class AMReaction(ARCReaction):
 
     @property
     def index(self) -> Optional[int]:
-        """The reaction ID"""
+        """The reaction ID, or the next free reaction ID of the family if the reaction was not saved yet"""
         if self._index is None and self.family is not None:
-            family_files = get_all_family_files(self.family.label)
-            if not len(family_files):
-                self._index = 0
-            else:
-                max_fam_num, max_fam_file = -1, ''
-                for family_file in family_files:
-                    fam_num = int(family_file.split('.')[0].split('_')[-1])
-                    if fam_num > max_fam_num:
-                        max_fam_num = fam_num
-                        max_fam_file = family_file
-                if max_fam_file:
-                    reactions = read_yaml_file(os.path.join(DATABASE_PATH, 'reactions', max_fam_file))
-                    max_index = -1
-                    for reaction in reactions:
-                        if reaction['index'] > max_index:
-                            max_index = reaction['index']
-                    self._index = max_index + 1
+            # Not assigned, the reaction ID is only allocated when the reaction is saved.
+            if self._next_index is None:
+                family = self.family.label
+                manifest = FamilyManifest(family=family, database_path=self.database_path).load()
+                if manifest.rebuilt:
+                    # Persist the rebuilt manifest, so the shards are not parsed again by the next reaction.
+                    with family_lock(family, database_path=self.database_path):
+                        manifest = FamilyManifest(family=family, database_path=self.database_path)
+                        manifest.load(save_rebuilt=True)
+                self._next_index = max(manifest.next_index,
+                                       get_journal(family, database_path=self.database_path).next_index)
+            return self._next_index
         return self._index
 
     @index.setter
@@ -152,59 +162,74 @@ class AMReaction(ARCReaction):
         self.rejected_by.append(user.name)
         self.rejected_reasons.append(reason)
 
-    def save(self, database_path: Optional[str] = None):
+    @timed('reaction.save')
+    def save(self,
+             database_path: Optional[str] = None,
+             on_duplicate: str = 'skip',
+             ) -> Optional[int]:
         """
         Save the Reaction object instance in the database.
         Atom_maps are saves as a list, their structure is List[List[List[int]]],
         entries of the first list are lists of atom-maps,
         each first list entry represents collection of equivalent atom-maps,
         all entries together represent the comprehensive orthogonal 3D atom-maps.
+        Use ``save_many()`` or a ``DatabaseWriter`` to save many reactions at once.
+
+        Args:
+            database_path (str, optional): The path to the database folder, the reaction's database by default.
+            on_duplicate (str, optional): What to do if the reaction already exists in the database under another ID,
+                                          see ``DatabaseWriter``.
+
+        Returns:
+            Optional[int]: The reaction ID, ``None`` if the reaction cannot be saved.
         """
-        if self.family is None:
-            print('Error: Cannot save a reaction without identifying its family.')
-            return None
-        set_up_folders()
-        family_file_name = determine_family_filename_by_index(index=self.index, family=self.family.label)
-        family_file_path = os.path.join(database_path or DATABASE_PATH, 'reactions', family_file_name)
-        file_content = read_yaml_file(family_file_path) or dict()
-        file_content[self.index] = self.as_db_dict()
-        save_yaml_file(family_file_path, file_content)
+        with DatabaseWriter(database_path=database_path or self.database_path, on_duplicate=on_duplicate) as writer:
+            index = writer.add(self)
+        return index
 
-    def as_db_dict(self):
-        """A dictionary representation of the object for the database."""
-        try:
-            r_inchi_keys = [r.mol.to_inchi_key() for r in self.r_species]
-        except:
-            r_inchi_keys = list()
-        try:
-            p_inchi_keys = [p.mol.to_inchi_key() for p in self.p_species]
-        except:
-            p_inchi_keys = list()
+    @timed('reaction.as_db_dict')
+    def as_db_dict(self, species_cache: Optional[SpeciesCache] = None):
+        """
+        A dictionary representation of the object for the database.
 
-        r_adjacency_lists, p_adjacency_lists = list(), list()
-        if all(spc.mol is not None for spc in self.r_species):
-            for spc in self.r_species:
-                mols = generate_resonance_structures(spc.mol)
-                r_adjacency_lists.append([mol.to_adjacency_list() for mol in mols or [spc.mol]])
-        if all(spc.mol is not None for spc in self.p_species):
-            for spc in self.p_species:
-                mols = generate_resonance_structures(spc.mol)
-                p_adjacency_lists.append([mol.to_adjacency_list() for mol in mols or [spc.mol]])
+        Args:
+            species_cache (SpeciesCache, optional): A cache of per-species data, the module-level cache by default.
+        """
+        species_cache = species_cache if species_cache is not None else SPECIES_CACHE
+        with timer('reaction.as_db_dict.inchi_keys'):
+            try:
+                r_inchi_keys = [species_cache.get_inchi_key(r) for r in self.r_species]
+            except Exception:
+                r_inchi_keys = list()
+            try:
+                p_inchi_keys = [species_cache.get_inchi_key(p) for p in self.p_species]
+            except Exception:
+                p_inchi_keys = list()
+
+        with timer('reaction.as_db_dict.resonance'):
+            r_adjacency_lists, p_adjacency_lists = self._get_adjacency_lists(species_cache)
 
         reactant_index_dict, product_index_dict = None, None
-        rmg_reactions = get_rmg_reactions_from_arc_reaction(arc_reaction=self, backend='ARC')
-        if rmg_reactions is not None:
-            for rmg_reaction in rmg_reactions:
-                reactant_index_dict, product_index_dict = \
-                    get_atom_indices_of_labeled_atoms_in_an_rmg_reaction(arc_reaction=self, rmg_reaction=rmg_reaction)
-
-        for spc in self.r_species + self.p_species:
-            spc.initial_xyz = spc.initial_xyz or spc.get_xyz()  # Important to initialize to get a 3D atom-map.
-        r_xyz = [r.get_xyz() for r in self.r_species]
-        p_xyz = [p.get_xyz() for p in self.p_species]
-        atom_maps = self.atom_map
-        if atom_maps is not None:
-            atom_maps = [atom_maps] if isinstance(atom_maps[0], int) else atom_maps
+        with timer('reaction.as_db_dict.rmg_labels'):
+            rmg_reactions = get_rmg_reactions_from_arc_reaction(arc_reaction=self, backend='ARC')
+            if rmg_reactions is not None:
+                for rmg_reaction in rmg_reactions:
+                    reactant_index_dict, product_index_dict = \
+                        get_atom_indices_of_labeled_atoms_in_an_rmg_reaction(arc_reaction=self,
+                                                                             rmg_reaction=rmg_reaction)
+
+        with timer('reaction.as_db_dict.xyz'):
+            r_xyz, p_xyz = self._get_xyz(species_cache)
+        with timer('reaction.as_db_dict.atom_maps'):
+            atom_maps, clustering = self.atom_map, self.clustering
+            if atom_maps is not None:
+                try:
+                    atom_map_set = AtomMapSet.from_list(atom_maps).deduplicate()
+                except ValueError:
+                    atom_map_set = None  # An invalid atom map is stored as is, without clustering.
+                if atom_map_set is not None:
+                    atom_maps = atom_map_set.to_list()
+                    clustering = atom_map_set.cluster(*self._get_symmetries(species_cache, atom_map_set.num_atoms))
 
         return {'multiplicity': self.multiplicity,  # int
                 'charge': self.charge,  # int
@@ -217,55 +242,61 @@ class AMReaction(ARCReaction):
                 'r_rmg_labels': reactant_index_dict,  # Dict[str, int]
                 'p_rmg_labels': product_index_dict,  # Dict[str, int]
                 'atom_maps': atom_maps,  # List[List[int]]
-                'clustering': self.clustering,  # List[List[int]]
+                'fingerprint': compute_fingerprint(r_adjacency_lists, p_adjacency_lists, r_xyz, p_xyz,
+                                                   multiplicity=self.multiplicity, charge=self.charge),  # str
+                'clustering': clustering,  # List[List[int]], groups of symmetry-equivalent atom maps
                 'approved_by': self.approved_by,  # List[str]
                 'rejected_by': self.rejected_by,  # List[str]
                 'rejected_reasons': self.rejected_reasons,  # List[str]
                 }
 
+    def get_fingerprint(self, species_cache: Optional[SpeciesCache] = None) -> str:
+        """
+        Get the content fingerprint of the inputs of the database entry of this reaction (see ``am3db.fingerprint``)
+        without computing the entry.
 
-def set_up_folders():
-    """
-    Set up the database folders upon first usage.
-    """
-    reactions_path = os.path.join(DATABASE_PATH, 'reactions')
-    if not os.path.isdir(reactions_path):
-        os.makedirs(reactions_path)
-
-
-def get_all_family_files(family: str,
-                         reactions_path: str = '',
-                         ) -> List[str]:
-    """
-    Get all database files for a given family.
-
-    Args:
-         family (str): The family label.
-         reactions_path (str, optional): The path to the database reactions folder.
-
-    Returns:
-        List[str]: The filenames representing this family in the database.
-    """
-    reactions_path = reactions_path or os.path.join(DATABASE_PATH, 'reactions')
-    file_names, family_files = list(), list()
-    for (_, _, files) in os.walk(reactions_path):
-        file_names.extend(files)
-        break  # Don't continue to explore subdirectories.
-    for file_name in file_names:
-        if family in file_name:
-            family_files.append(file_name)
-    return family_files
-
-
-def determine_family_filename_by_index(index: int,
-                                       family: str,
-                                       ) -> str:
-    """
-    Determine the family filename in the database by the reaction ID.
+        Args:
+            species_cache (SpeciesCache, optional): A cache of per-species data, the module-level cache by default.
 
-    Args:
-        index (int): The reaction ID in the database.
-        family (str): The reaction family label.
-    """
-    num = int(index / MAX_RXNS_PER_FILE)
-    return f'{family}_{num}.yml'
+        Returns:
+            str: The fingerprint, as stored by ``as_db_dict()``.
+        """
+        species_cache = species_cache if species_cache is not None else SPECIES_CACHE
+        r_adjacency_lists, p_adjacency_lists = self._get_adjacency_lists(species_cache)
+        r_xyz, p_xyz = self._get_xyz(species_cache)
+        return compute_fingerprint(r_adjacency_lists, p_adjacency_lists, r_xyz, p_xyz,
+                                   multiplicity=self.multiplicity, charge=self.charge)
+
+    def _get_adjacency_lists(self, species_cache: SpeciesCache) -> Tuple[List[List[str]], List[List[str]]]:
+        """Get the adjacency lists of all representative resonance structures of the reactants and products."""
+        r_adjacency_lists, p_adjacency_lists = list(), list()
+        if all(spc.mol is not None for spc in self.r_species):
+            for spc in self.r_species:
+                r_adjacency_lists.append(species_cache.get_adjacency_lists(spc))
+        if all(spc.mol is not None for spc in self.p_species):
+            for spc in self.p_species:
+                p_adjacency_lists.append(species_cache.get_adjacency_lists(spc))
+        return r_adjacency_lists, p_adjacency_lists
+
+    def _get_symmetries(self,
+                        species_cache: SpeciesCache,
+                        num_atoms: int,
+                        ) -> Tuple[Optional[List[List[int]]], Optional[List[List[int]]]]:
+        """Get the symmetries of the concatenated reactant and product atom indices, ``None`` if not available."""
+        symmetries = list()
+        for species in [self.r_species, self.p_species]:
+            try:
+                side_symmetries = combine_symmetries([species_cache.get_symmetries(spc) for spc in species],
+                                                     sizes=[len(spc.mol.atoms) for spc in species])
+            except Exception:
+                side_symmetries = None
+            if side_symmetries is not None and any(len(permutation) != num_atoms for permutation in side_symmetries):
+                side_symmetries = None
+            symmetries.append(side_symmetries)
+        return symmetries[0], symmetries[1]
+
+    def _get_xyz(self, species_cache: SpeciesCache) -> Tuple[List[dict], List[dict]]:
+        """Initialize the geometries of the reactants and products and get them."""
+        for spc in self.r_species + self.p_species:
+            spc.initial_xyz = species_cache.get_xyz(spc)  # Important to initialize to get a 3D atom-map.
+        return [r.get_xyz() for r in self.r_species], [p.get_xyz() for p in self.p_species]
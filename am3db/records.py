@@ -0,0 +1,194 @@
+"""
+AM3DB's records module.
+
+A StoredReaction is a lightweight read-only view of a stored database entry, created straight from the shard data.
+Unlike an AMReaction, creating it does not construct any species or determine the reaction family,
+and derived values (the atom maps, the coordinates arrays) are only decoded when first accessed.
+Use ``to_am_reaction()`` when the full chemistry object is required.
+
+Example::
+
+    for record in ReactionDB().records(family='H_Abstraction'):
+        if record.approved:
+            maps = record.atom_maps
+"""
+
+from typing import TYPE_CHECKING, List, Optional
+
+import numpy as np
+
+from am3db.atom_maps import AtomMapSet, decode_atom_maps
+from am3db.geometry import concatenate_xyz
+
+if TYPE_CHECKING:
+    from am3db.reaction import AMReaction
+
+
+_UNSET = object()
+
+
+class StoredReaction(object):
+    """
+    A read-only view of a stored database entry.
+
+    Args:
+        family (str): The reaction family label.
+        index (int): The reaction ID.
+        entry (dict): The database entry, as read from the shard.
+
+    Attributes:
+        family (str): The reaction family label.
+        index (int): The reaction ID.
+        entry (dict): The database entry.
+    """
+    __slots__ = ('family', 'index', 'entry', '_atom_maps', '_r_coords', '_p_coords')
+
+    def __init__(self,
+                 family: str,
+                 index: int,
+                 entry: dict,
+                 ):
+        self.family = family
+        self.index = index
+        self.entry = entry
+        self._atom_maps = _UNSET
+        self._r_coords = _UNSET
+        self._p_coords = _UNSET
+
+    def __repr__(self) -> str:
+        return f'StoredReaction(family={self.family}, index={self.index})'
+
+    def __getitem__(self, key: str):
+        return self.entry[key]
+
+    def get(self, key: str, default=None):
+        """
+        Get a field of the database entry.
+
+        Args:
+            key (str): The field name.
+            default: The value returned if the entry has no such field.
+
+        Returns:
+            The field value.
+        """
+        return self.entry.get(key, default)
+
+    @property
+    def multiplicity(self) -> Optional[int]:
+        """The reaction surface multiplicity"""
+        return self.entry.get('multiplicity')
+
+    @property
+    def charge(self) -> Optional[int]:
+        """The reaction surface charge"""
+        return self.entry.get('charge')
+
+    @property
+    def r_inchi_keys(self) -> List[str]:
+        """The reactant InChI keys"""
+        return self.entry.get('r_inchi_keys') or list()
+
+    @property
+    def p_inchi_keys(self) -> List[str]:
+        """The product InChI keys"""
+        return self.entry.get('p_inchi_keys') or list()
+
+    @property
+    def approved_by(self) -> Optional[List[str]]:
+        """The names of the reviewers who approved the reaction"""
+        return self.entry.get('approved_by')
+
+    @property
+    def rejected_by(self) -> Optional[List[str]]:
+        """The names of the reviewers who rejected the reaction"""
+        return self.entry.get('rejected_by')
+
+    @property
+    def rejected_reasons(self) -> List[str]:
+        """The reasons for rejecting the reaction"""
+        return self.entry.get('rejected_reasons') or list()
+
+    @property
+    def approved(self) -> bool:
+        """Whether the reaction was approved by at least one reviewer"""
+        return bool(self.entry.get('approved_by'))
+
+    @property
+    def rejected(self) -> bool:
+        """Whether the reaction was rejected by at least one reviewer"""
+        return bool(self.entry.get('rejected_by'))
+
+    @property
+    def atom_maps(self) -> AtomMapSet:
+        """The atom maps, decoded on first access from either the list or the compact format, empty if invalid"""
+        if self._atom_maps is _UNSET:
+            try:
+                self._atom_maps = decode_atom_maps(self.entry.get('atom_maps'))
+            except ValueError:
+                self._atom_maps = AtomMapSet.from_list(None)  # Invalid (e.g., ragged) atom maps are stored as they are.
+        return self._atom_maps
+
+    @property
+    def r_coords(self) -> np.ndarray:
+        """The concatenated reactant coordinates, a (number of atoms) x 3 array decoded on first access"""
+        if self._r_coords is _UNSET:
+            self._r_coords = concatenate_xyz(self.entry.get('r_xyz') or list())[0]
+        return self._r_coords
+
+    @property
+    def p_coords(self) -> np.ndarray:
+        """The concatenated product coordinates, a (number of atoms) x 3 array decoded on first access"""
+        if self._p_coords is _UNSET:
+            self._p_coords = concatenate_xyz(self.entry.get('p_xyz') or list())[0]
+        return self._p_coords
+
+    def to_am_reaction(self) -> 'AMReaction':
+        """
+        Construct the full AMReaction of the stored entry, with its reaction ID, atom maps, and review state.
+        This constructs the species and determines the reaction family, use sparingly.
+        The stored atom maps are restored rather than recomputed, since the review state refers to them.
+        An entry without atom maps is mapped anew on access, and its review state is then not carried over.
+
+        Returns:
+            AMReaction: The reaction.
+        """
+        reaction = reaction_from_entry(self.entry)
+        reaction.index = self.index
+        stored_maps = self.entry.get('atom_maps')
+        if isinstance(stored_maps, str):
+            stored_maps = self.atom_maps.to_list()
+        if stored_maps:
+            reaction.atom_map = stored_maps
+            reaction.approved_by = self.entry.get('approved_by')
+            reaction.rejected_by = self.entry.get('rejected_by')
+            reaction.rejected_reasons = list(self.entry.get('rejected_reasons') or list())
+            reaction.clustering = list(self.entry.get('clustering') or list())
+        return reaction
+
+
+def reaction_from_entry(entry: dict) -> 'AMReaction':
+    """
+    Construct an AMReaction from the inputs stored in a database entry,
+    i.e., the first adjacency list and the geometry of every reactant and product.
+
+    Args:
+        entry (dict): The database entry.
+
+    Returns:
+        AMReaction: The reaction, without its review state.
+    """
+    from arc.species import ARCSpecies
+    from am3db.reaction import AMReaction
+    species = dict()
+    for side in ['r', 'p']:
+        xyz_list = entry.get(f'{side}_xyz') or list()
+        adjacency_lists = entry.get(f'{side}_adjacency_lists') or [None] * len(xyz_list)
+        species[side] = [ARCSpecies(label=f'{side}{i}', adjlist=adjacency[0], xyz=xyz) if adjacency
+                         else ARCSpecies(label=f'{side}{i}', xyz=xyz)
+                         for i, (adjacency, xyz) in enumerate(zip(adjacency_lists, xyz_list))]
+    return AMReaction(r_species=species['r'],
+                      p_species=species['p'],
+                      multiplicity=entry.get('multiplicity'),
+                      charge=entry.get('charge'),
+                      )
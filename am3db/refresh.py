@@ -0,0 +1,268 @@
+"""
+AM3DB's refresh module.
+
+Recomputes only the database entries whose inputs changed, instead of re-running ``AMReaction.as_db_dict()``
+over the entire database. Every entry carries a content fingerprint of its inputs (see ``am3db.fingerprint``).
+An entry is recomputed if its fingerprint is missing, if it was computed by another version of AM3DB,
+or if an updated reaction specification with other species or geometries is given for it.
+Entries are recomputed over the ingestion process pool (see ``am3db.ingestion``),
+and only the shards holding recomputed entries are written back.
+
+Example::
+
+    from am3db.refresh import refresh_database
+
+    summary = refresh_database(updates={('H_Abstraction', 12): {'r_species': [...], 'p_species': [...]}})
+
+or from the command line: python -m am3db.refresh [--database-path database] [--families F1 F2] [--force]
+                                                  [--max-workers 8]
+"""
+
+import argparse
+import os
+import traceback
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from am3db.atom_maps import decode_atom_maps, encode_atom_maps, get_atom_maps_format
+from am3db.catalog import notify_shard_written
+from am3db.common import DATABASE_PATH
+from am3db.fingerprint import is_stale
+from am3db.ingestion import IngestionPipeline, IngestionResult, reaction_from_spec
+from am3db.journal import get_journal
+from am3db.locks import family_lock, shard_lock
+from am3db.manifest import MAX_RXNS_PER_FILE, FamilyManifest, determine_family_filename_by_index
+from am3db.query import ReactionDB
+from am3db.records import reaction_from_entry
+from am3db.storage import get_database_backend, read_shard, save_shard
+
+if TYPE_CHECKING:
+    from am3db.reaction import AMReaction
+
+
+REVIEW_FIELDS = ('approved_by', 'rejected_by', 'rejected_reasons')
+
+
+def refresh_database(database_path: Optional[str] = None,
+                     updates: Optional[Dict[Tuple[str, int], Union[dict, 'AMReaction']]] = None,
+                     families: Optional[List[str]] = None,
+                     force: bool = False,
+                     max_workers: Optional[int] = None,
+                     chunk_size: int = 10,
+                     timeout: Optional[float] = None,
+                     ) -> dict:
+    """
+    Recompute the stale database entries and write back the shards which changed.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+        updates (Dict[Tuple[str, int], Union[dict, AMReaction]], optional): Keys are family labels and reaction IDs,
+            values are updated reaction specifications (see ``reaction_from_spec()``), e.g., with new geometries.
+            An entry with an update is recomputed only if the fingerprint of the update differs from the stored one.
+        families (List[str], optional): The families to refresh, all families by default.
+        force (bool, optional): Whether to recompute all entries regardless of their fingerprints.
+        max_workers (int, optional): The number of worker processes, see ``IngestionPipeline``.
+        chunk_size (int, optional): The number of entries sent to a worker at once.
+        timeout (float, optional): The maximal time in seconds for recomputing a single entry.
+
+    Returns:
+        dict: The number of 'checked', 'recomputed', 'unchanged' and 'failed' entries,
+              the 'shards' which were written, and the 'errors' as (family label, reaction ID, error) tuples.
+    """
+    database_path = database_path or DATABASE_PATH
+    updates = dict(updates or dict())
+    summary = {'checked': 0, 'recomputed': 0, 'unchanged': 0, 'failed': 0, 'shards': list(), 'errors': list()}
+    fingerprints = dict()  # The stored fingerprints of the entries in flight, keyed by (family, index).
+    pipeline = IngestionPipeline(database_path=database_path, max_workers=max_workers, chunk_size=chunk_size,
+                                 timeout=timeout)
+    tasks = get_refresh_tasks(database_path, updates=updates, families=families, force=force,
+                              summary=summary, fingerprints=fingerprints)
+    pending, num_pending = dict(), 0
+    for result in pipeline.process(tasks, function=refresh_entry):
+        fingerprint = fingerprints.pop((result.family, result.index), None)
+        if not result.success:
+            summary['failed'] += 1
+            summary['errors'].append((result.family, result.index, result.error))
+        elif result.entry is None:
+            summary['unchanged'] += 1
+        else:
+            pending.setdefault(result.family, dict())[result.index] = (fingerprint, result.entry)
+            num_pending += 1
+        if num_pending >= MAX_RXNS_PER_FILE:
+            write_back(pending, database_path=database_path, summary=summary)
+            pending, num_pending = dict(), 0
+    write_back(pending, database_path=database_path, summary=summary)
+    for family, index in sorted(updates.keys()):
+        summary['failed'] += 1
+        summary['errors'].append((family, index, f'Reaction {index} of the {family} family was not refreshed, '
+                                                 f'it does not exist in the database.'))
+    return summary
+
+
+def get_refresh_tasks(database_path: str,
+                      updates: Dict[Tuple[str, int], Union[dict, 'AMReaction']],
+                      families: Optional[Iterable[str]] = None,
+                      force: bool = False,
+                      summary: Optional[dict] = None,
+                      fingerprints: Optional[dict] = None,
+                      ) -> Iterator[Tuple[str, int, dict, Optional[Union[dict, 'AMReaction']]]]:
+    """
+    Lazily stream the entries to refresh, shard by shard. The family journals are compacted first.
+
+    Args:
+        database_path (str): The path to the database folder.
+        updates (Dict[Tuple[str, int], Union[dict, AMReaction]]): The updated reaction specifications,
+                                                                  streamed updates are removed.
+        families (Iterable[str], optional): The families to refresh, all families by default.
+        force (bool, optional): Whether to refresh all entries regardless of their fingerprints.
+        summary (dict, optional): A refresh summary in which the checked entries are counted.
+        fingerprints (dict, optional): A dictionary in which the stored fingerprints of the streamed entries are kept.
+
+    Yields:
+        Tuple[str, int, dict, Optional[Union[dict, AMReaction]]]: The family label, reaction ID, stored entry,
+                                                                  and updated reaction specification if given.
+    """
+    db = ReactionDB(database_path=database_path)
+    for family in (families if families is not None else db.get_families()):
+        get_journal(family, database_path=database_path).compact()  # Refresh the journaled entries in their shards.
+        for _, index, entry in db.query(family=family):
+            if summary is not None:
+                summary['checked'] += 1
+            spec = updates.pop((family, index), None)
+            if spec is None and not force and not is_stale(entry):
+                if summary is not None:
+                    summary['unchanged'] += 1
+                continue
+            if fingerprints is not None:
+                fingerprints[(family, index)] = entry.get('fingerprint')
+            yield family, index, entry, spec
+
+
+def refresh_entry(task: Tuple[str, int, dict, Optional[Union[dict, 'AMReaction']]],
+                  position: int,
+                  ) -> IngestionResult:
+    """
+    Recompute a stored entry, this is the function executed by the pool workers.
+    The reaction is constructed from the updated specification if given, otherwise from the stored entry.
+
+    Args:
+        task (Tuple[str, int, dict, Optional[Union[dict, AMReaction]]]): The family label, reaction ID,
+                                                                         stored entry, and updated specification.
+        position (int): The position of the task in the input.
+
+    Returns:
+        IngestionResult: The result, its entry is ``None`` if the updated specification did not change the inputs.
+    """
+    family, index, entry, spec = task
+    try:
+        reaction = reaction_from_spec(spec) if spec is not None else reaction_from_entry(entry)
+        if spec is not None and reaction.get_fingerprint() == entry.get('fingerprint'):
+            return IngestionResult(position=position, family=family, index=index)
+        if reaction.family is None or reaction.family.label != family:
+            label = reaction.family.label if reaction.family is not None else None
+            return IngestionResult(position=position, family=family, index=index,
+                                   error=f'The reaction family of reaction {index} changed from {family} to {label}.')
+        return IngestionResult(position=position,
+                               family=family,
+                               family_own_reverse=bool(reaction.family_own_reverse),
+                               index=index,
+                               entry=reaction.as_db_dict())
+    except Exception:
+        return IngestionResult(position=position, family=family, index=index, error=traceback.format_exc())
+
+
+def write_back(entries: Dict[str, Dict[int, Tuple[Optional[str], dict]]],
+               database_path: Optional[str] = None,
+               summary: Optional[dict] = None,
+               ):
+    """
+    Write recomputed entries back to their shards, each touched shard is written once.
+    An entry is only replaced if its stored fingerprint did not change since it was read,
+    otherwise it was modified concurrently and is reported as failed.
+
+    Args:
+        entries (Dict[str, Dict[int, Tuple[Optional[str], dict]]]): Keys are family labels, values are dictionaries
+            keyed by reaction ID of the fingerprint of the stored entry when it was read and the recomputed entry.
+        database_path (str, optional): The path to the database folder.
+        summary (dict, optional): A refresh summary in which the written shards and recomputed entries are recorded.
+    """
+    database_path = database_path or DATABASE_PATH
+    extension = get_database_backend(database_path).extension
+    atom_maps_format = get_atom_maps_format(database_path)
+    for family in sorted(entries.keys()):
+        with family_lock(family, database_path=database_path):
+            manifest = FamilyManifest(family=family, database_path=database_path).load(save_rebuilt=True)
+            shard_entries = dict()
+            for index, item in entries[family].items():
+                shard = determine_family_filename_by_index(index=index, family=family, extension=extension,
+                                                           database_path=database_path)
+                shard_entries.setdefault(shard, dict())[index] = item
+            for shard in sorted(shard_entries.keys()):
+                with shard_lock(shard, database_path=database_path):
+                    shard_path = os.path.join(manifest.reactions_path, shard)
+                    content = read_shard(shard_path)
+                    changed = False
+                    for index, (fingerprint, entry) in sorted(shard_entries[shard].items()):
+                        stored_entry = content.get(index, None)
+                        if stored_entry is None or stored_entry.get('fingerprint') != fingerprint:
+                            if summary is not None:
+                                summary['failed'] += 1
+                                summary['errors'].append((family, index, f'Reaction {index} of the {family} family '
+                                                                         f'was modified while it was refreshed.'))
+                            continue
+                        entry = carry_review_state(stored_entry=stored_entry, new_entry=entry)
+                        if entry.get('atom_maps') is not None:
+                            entry['atom_maps'] = encode_atom_maps(entry['atom_maps'], atom_maps_format)
+                        content[index] = entry
+                        changed = True
+                        if summary is not None:
+                            summary['recomputed'] += 1
+                    if changed:
+                        save_shard(shard_path, content)
+                        notify_shard_written(manifest.reactions_path, shard)
+                        manifest.update_shard(shard=shard, count=len(content))
+                        if summary is not None and shard not in summary['shards']:
+                            summary['shards'].append(shard)
+            manifest.save()
+
+
+def carry_review_state(stored_entry: dict,
+                       new_entry: dict,
+                       ) -> dict:
+    """
+    Carry the review state of a stored entry over to its recomputed entry.
+    The approvals and rejections are only kept if the atom maps did not change, so that new atom maps are reviewed.
+
+    Args:
+        stored_entry (dict): The stored database entry.
+        new_entry (dict): The recomputed database entry.
+
+    Returns:
+        dict: The recomputed entry with the review state of the stored entry.
+    """
+    entry = dict(new_entry)
+    stored_maps = decode_atom_maps(stored_entry.get('atom_maps')).to_list()
+    if stored_maps == decode_atom_maps(new_entry.get('atom_maps')).to_list():
+        for key in REVIEW_FIELDS:
+            entry[key] = stored_entry.get(key, None)
+    return entry
+
+
+def main():
+    """Refresh the stale entries of a database from the command line and print a summary."""
+    parser = argparse.ArgumentParser(description='Recompute the AM3DB entries whose inputs changed.')
+    parser.add_argument('--database-path', type=str, default=None, help='The path to the database folder.')
+    parser.add_argument('--families', type=str, nargs='+', default=None, help='The families to refresh.')
+    parser.add_argument('--force', action='store_true', help='Recompute all entries.')
+    parser.add_argument('--max-workers', type=int, default=None, help='The number of worker processes.')
+    args = parser.parse_args()
+
+    summary = refresh_database(database_path=args.database_path, families=args.families, force=args.force,
+                               max_workers=args.max_workers)
+    print(f'Checked {summary["checked"]} entries: {summary["recomputed"]} recomputed, '
+          f'{summary["unchanged"]} unchanged, {summary["failed"]} failed, {len(summary["shards"])} shards written.')
+    for family, index, error in summary['errors']:
+        print(f'Error: Could not refresh reaction {index} of the {family} family:\n{error}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+AM3DB's review module.
+
+Applies many approve/reject decisions of a reviewer to the reactions stored in the database:
+the reviewer's permissions are checked once, and each affected shard is locked, read once and written once.
+"""
+
+import os
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from am3db.common import DATABASE_PATH
+from am3db.journal import get_journal
+from am3db.locks import family_lock, shard_lock
+from am3db.manifest import FamilyManifest, determine_family_filename_by_index
+from am3db.storage import get_database_backend, read_shard, save_shard
+from am3db.user import User, get_user_registry
+
+
+DECISIONS = ('approve', 'reject')
+
+
+def review_batch(name: str,
+                 decisions: Iterable[Sequence],
+                 database_path: Optional[str] = None,
+                 ) -> List[Tuple[str, int]]:
+    """
+    Approve or reject many stored reactions.
+
+    Example::
+
+        review_batch('IM', [('intra_H_migration', 0, 'approve'),
+                            ('intra_H_migration', 1, 'reject', 'The H atoms are swapped.')])
+
+    Args:
+        name (str): The username of the reviewer.
+        decisions (Iterable[Sequence]): Tuples of the family label, reaction ID, decision ('approve' or 'reject'),
+                                        and for rejections, the reason for rejecting the reaction.
+        database_path (str, optional): The path to the database folder, whose users file identifies the reviewer.
+
+    Returns:
+        List[Tuple[str, int]]: The family labels and reaction IDs of the reviewed reactions.
+    """
+    user = get_user_registry(os.path.join(database_path or DATABASE_PATH, 'users.yml')).get(name)
+    if user is None:
+        print(f'Error: User {name} does not have edit privileges in the system.\n'
+              f'Not reviewing any reaction.')
+        return list()
+    decisions = list(decisions)
+    for decision in decisions:
+        check_decision(decision)
+    return apply_reviews([(user, decision) for decision in decisions], database_path=database_path)
+
+
+def check_decision(decision: Sequence):
+    """
+    Check that a review decision is legal.
+
+    Args:
+        decision (Sequence): The family label, reaction ID, decision ('approve' or 'reject'),
+                             and for rejections, the reason for rejecting the reaction.
+
+    Raises:
+        ValueError: If the decision is illegal, or if a rejection has no reason.
+    """
+    family, index, action = decision[0], decision[1], decision[2]
+    if action not in DECISIONS:
+        raise ValueError(f'Got an illegal decision "{action}" for reaction {index} of the {family} family, '
+                         f'allowed values are: {DECISIONS}')
+    if action == 'reject' and len(decision) < 4:
+        raise ValueError(f'A reason must be given for rejecting reaction {index} of the {family} family.')
+
+
+def apply_reviews(reviews: Iterable[Tuple[User, Sequence]],
+                  database_path: Optional[str] = None,
+                  ) -> List[Tuple[str, int]]:
+    """
+    Apply checked review decisions of possibly several reviewers, each affected shard is read and written once.
+    Decisions are applied in the given order.
+
+    Args:
+        reviews (Iterable[Tuple[User, Sequence]]): Tuples of the reviewer and a decision, see ``check_decision()``.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        List[Tuple[str, int]]: The family labels and reaction IDs of the reviewed reactions.
+    """
+    database_path = database_path or DATABASE_PATH
+    extension = get_database_backend(database_path).extension
+    family_reviews = dict()
+    for user, decision in reviews:
+        family_reviews.setdefault(decision[0], list()).append((user, decision))
+    reviewed = list()
+    for family in sorted(family_reviews.keys()):
+        get_journal(family, database_path=database_path).compact()  # Review the journaled entries in their shards.
+        with family_lock(family, database_path=database_path):
+            manifest = FamilyManifest(family=family, database_path=database_path).load(save_rebuilt=True)
+            shard_reviews = dict()  # Shards are determined under the family lock, as shards may be split.
+            for user, decision in family_reviews[family]:
+                shard = determine_family_filename_by_index(index=decision[1], family=family, extension=extension,
+                                                           database_path=database_path)
+                shard_reviews.setdefault(shard, list()).append((user, decision))
+            for shard in sorted(shard_reviews.keys()):
+                with shard_lock(shard, database_path=database_path):
+                    shard_path = os.path.join(manifest.reactions_path, shard)
+                    content = read_shard(shard_path)
+                    changed = False
+                    for user, decision in shard_reviews[shard]:
+                        index = decision[1]
+                        if index not in content:
+                            print(f'Error: Reaction {index} of the {family} family does not exist in the database.')
+                            continue
+                        if decision[2] == 'approve':
+                            approve_entry(content[index], user)
+                        else:
+                            reject_entry(content[index], user, reason=decision[3])
+                        reviewed.append((family, index))
+                        changed = True
+                    if changed:
+                        save_shard(shard_path, content)
+                        manifest.update_shard(shard=shard, count=len(content))
+            manifest.save()
+    return reviewed
+
+
+def approve_entry(entry: dict,
+                  user: User,
+                  ):
+    """
+    Approve the 3D atom-mapping of a database entry, see ``AMReaction.approve()``.
+
+    Args:
+        entry (dict): The database entry.
+        user (User): The reviewer.
+    """
+    entry['approved_by'] = entry.get('approved_by') or list()
+    if entry.get('rejected_by') is not None:
+        if user.status.value == 'admin':
+            entry['rejected_by'] = None
+    entry['approved_by'].append(user.name)
+
+
+def reject_entry(entry: dict,
+                 user: User,
+                 reason: str,
+                 ):
+    """
+    Reject the 3D atom-mapping of a database entry, see ``AMReaction.reject()``.
+
+    Args:
+        entry (dict): The database entry.
+        user (User): The reviewer.
+        reason (str): The reason for rejecting this reaction.
+    """
+    entry['rejected_by'] = entry.get('rejected_by') or list()
+    entry['rejected_by'].append(user.name)
+    entry['rejected_reasons'] = entry.get('rejected_reasons') or list()
+    entry['rejected_reasons'].append(reason)
@@ -0,0 +1,666 @@
+"""
+AM3DB's server module.
+
+An asyncio HTTP/JSON review service, letting many reviewers approve or reject the stored 3D atom-maps concurrently.
+Reviewers are identified by their username and checked against the users file (see ``am3db.user``),
+the permissions of ``AMReaction.approve()`` and ``AMReaction.reject()`` apply.
+Decisions are not written one by one: the decisions on the same shard are collected for a short debounce period
+and then applied together (see ``am3db.review.apply_reviews()``), so each shard is read and written once per batch.
+A response to a decision is only sent after the decision was written to the database.
+
+Endpoints::
+
+    GET  /families                              The families in the database.
+    GET  /pending?family=F&page=0&size=50       A page of the reactions which were neither approved nor rejected.
+    GET  /reactions/<family>/<index>            A database entry.
+    POST /review                                {"name": "IM", "family": "F", "index": 12, "decision": "reject",
+                                                 "reason": "The H atoms are swapped."}
+    GET  /stats                                 The number of received decisions and of batches written.
+
+The service runs in-process without any external service. ``LocalReviewClient`` calls it directly (no sockets),
+and ``simulate_reviewers()`` runs many concurrent simulated reviewers against it, e.g., for load testing.
+
+Example::
+
+    python -m am3db.server [--database-path database] [--host 127.0.0.1] [--port 8080] [--debounce 0.05]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from am3db.common import DATABASE_PATH
+from am3db.manifest import determine_family_filename_by_index
+from am3db.query import ReactionDB
+from am3db.review import apply_reviews, check_decision
+from am3db.storage import get_database_backend
+from am3db.user import User, get_user_registry
+
+
+PENDING_FIELDS = ['multiplicity', 'charge', 'r_inchi_keys', 'p_inchi_keys']
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEADERS = 100
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class ReviewService(object):
+    """
+    The transport-independent review service, requests are handled by ``handle()``.
+    Must be used from within a single running event loop.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+        users_path (str, optional): The path to the users file, defaults to the ``users.yml`` file of the database.
+        debounce (float, optional): The number of seconds decisions on a shard are collected before being written.
+        page_size (int, optional): The default number of reactions in a page of pending reactions.
+        pending_ttl (float, optional): The number of seconds after which the pending reactions of a family are
+                                       read again from the database, e.g., to see reactions added meanwhile.
+
+    Attributes:
+        database_path (str): The path to the database folder.
+        users_path (str): The path to the users file.
+        debounce (float): The number of seconds decisions on a shard are collected before being written.
+        page_size (int): The default number of reactions in a page of pending reactions.
+        pending_ttl (float): The number of seconds after which the pending reactions of a family are read again.
+        stats (dict): The number of received 'decisions', of written 'batches', and of 'reviewed' reactions.
+    """
+
+    def __init__(self,
+                 database_path: Optional[str] = None,
+                 users_path: Optional[str] = None,
+                 debounce: float = 0.05,
+                 page_size: int = 50,
+                 pending_ttl: float = 60.0,
+                 ):
+        self.database_path = database_path or DATABASE_PATH
+        self.users_path = users_path or os.path.join(self.database_path, 'users.yml')
+        self.debounce = debounce
+        self.page_size = page_size
+        self.pending_ttl = pending_ttl
+        self.stats = {'decisions': 0, 'batches': 0, 'reviewed': 0}
+        self.db = ReactionDB(database_path=self.database_path)
+        self.extension = get_database_backend(self.database_path).extension
+        self._batches = dict()  # Keys are (family, shard), values are lists of (user, decision, future) tuples.
+        self._flush_tasks = set()
+        self._shard_locks = dict()
+        self._pending = dict()  # Keys are families, values are (read time, {reaction ID: summary}) tuples.
+        self._pending_locks = dict()
+        self._queued = dict()  # The number of decisions not written yet, keyed by their (family, reaction ID).
+
+    async def handle(self,
+                     method: str,
+                     target: str,
+                     body: bytes = b'',
+                     ) -> Tuple[int, dict]:
+        """
+        Handle a request.
+
+        Args:
+            method (str): The HTTP method.
+            target (str): The request target, i.e., the path and query string.
+            body (bytes, optional): The request body.
+
+        Returns:
+            Tuple[int, dict]: The HTTP status code and the response content.
+        """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if parts == ['review']:
+                if method != 'POST':
+                    return 405, {'error': 'Use POST to review a reaction.'}
+                return await self.review(json.loads(body.decode('utf-8') or '{}'))
+            if method != 'GET':
+                return 405, {'error': f'Use GET for /{"/".join(parts)}.'}
+            if parts == ['families']:
+                return 200, {'families': self.db.get_families()}
+            if parts == ['pending']:
+                return await self.get_pending(family=query.get('family'),
+                                              page=int(query.get('page', 0)),
+                                              size=int(query.get('size', self.page_size)))
+            if len(parts) == 3 and parts[0] == 'reactions':
+                return await self.get_reaction(family=parts[1], index=int(parts[2]))
+            if parts == ['stats']:
+                return 200, dict(self.stats)
+        except (ValueError, TypeError, KeyError) as e:
+            return 400, {'error': f'Bad request: {e}'}
+        return 404, {'error': f'Unknown resource {url.path}.'}
+
+    async def get_pending(self,
+                          family: Optional[str] = None,
+                          page: int = 0,
+                          size: Optional[int] = None,
+                          ) -> Tuple[int, dict]:
+        """
+        Get a page of the reactions of a family which were neither approved nor rejected.
+        Reactions with a decision which is not written yet are excluded.
+
+        Args:
+            family (str, optional): The reaction family label, the first family with pending reactions by default.
+            page (int, optional): The page number, starting at 0.
+            size (int, optional): The number of reactions in a page.
+
+        Returns:
+            Tuple[int, dict]: The HTTP status code and the page.
+        """
+        size = size if size is not None else self.page_size
+        if page < 0 or size <= 0:
+            raise ValueError('The page must be non-negative and the size must be positive.')
+        families = [family] if family is not None else self.db.get_families()
+        indices, summaries = list(), dict()
+        for family_label in families:
+            family = family_label
+            summaries = await self._get_pending_summaries(family)
+            indices = [index for index in summaries.keys() if (family, index) not in self._queued]
+            if len(indices):
+                break
+        reactions = [dict(summaries[index], index=index) for index in indices[page * size:(page + 1) * size]]
+        return 200, {'family': family, 'page': page, 'size': size, 'total': len(indices), 'reactions': reactions}
+
+    async def get_reaction(self,
+                           family: str,
+                           index: int,
+                           ) -> Tuple[int, dict]:
+        """
+        Get a database entry.
+
+        Args:
+            family (str): The reaction family label.
+            index (int): The reaction ID.
+
+        Returns:
+            Tuple[int, dict]: The HTTP status code and the entry.
+        """
+        entry = await asyncio.get_running_loop().run_in_executor(None, self.db.get, family, index)
+        if entry is None:
+            return 404, {'error': f'Reaction {index} of the {family} family does not exist in the database.'}
+        return 200, {'family': family, 'index': index, 'entry': entry}
+
+    async def review(self, request: dict) -> Tuple[int, dict]:
+        """
+        Approve or reject a reaction, returns once the decision was written to the database.
+
+        Args:
+            request (dict): The reviewer 'name', the reaction 'family' and 'index', the 'decision'
+                            ('approve' or 'reject'), and for rejections, the 'reason' for rejecting the reaction.
+
+        Returns:
+            Tuple[int, dict]: The HTTP status code and whether the reaction was reviewed.
+        """
+        user = get_user_registry(self.users_path).get(str(request['name']))
+        if user is None:
+            return 403, {'error': f'User {request["name"]} does not have edit privileges in the system.'}
+        decision = (str(request['family']), int(request['index']), request['decision'])
+        if request.get('reason') is not None:
+            decision += (str(request['reason']),)
+        check_decision(decision)
+        if not await self.submit(user, decision):
+            return 404, {'error': f'Reaction {decision[1]} of the {decision[0]} family '
+                                  f'does not exist in the database.'}
+        return 200, {'family': decision[0], 'index': decision[1], 'decision': decision[2], 'reviewed': True}
+
+    async def submit(self,
+                     user: User,
+                     decision: Sequence,
+                     ) -> bool:
+        """
+        Queue a checked decision for the batch of its shard, the batch is written after the debounce period.
+
+        Args:
+            user (User): The reviewer.
+            decision (Sequence): The decision, see ``am3db.review.check_decision()``.
+
+        Returns:
+            bool: Whether the reaction was reviewed, ``False`` if it does not exist.
+        """
+        loop = asyncio.get_running_loop()
+        family, index = decision[0], decision[1]
+        shard = determine_family_filename_by_index(index=index, family=family, extension=self.extension,
+                                                   database_path=self.database_path)
+        key = (family, shard)
+        future = loop.create_future()
+        if key not in self._batches:
+            self._batches[key] = list()
+            task = loop.create_task(self._flush_later(key))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        self._batches[key].append((user, decision, future))
+        self._queued[(family, index)] = self._queued.get((family, index), 0) + 1
+        self.stats['decisions'] += 1
+        return await future
+
+    async def close(self):
+        """
+        Write all queued decisions.
+        """
+        while self._flush_tasks:
+            await asyncio.gather(*list(self._flush_tasks), return_exceptions=True)
+
+    async def _flush_later(self, key: Tuple[str, str]):
+        """
+        Write the batch of decisions on a shard after the debounce period.
+        Batches of the same shard are written one at a time, decisions arriving meanwhile join the waiting batch.
+
+        Args:
+            key (Tuple[str, str]): The family label and shard filename.
+        """
+        await asyncio.sleep(self.debounce)
+        if key not in self._shard_locks:
+            self._shard_locks[key] = asyncio.Lock()
+        async with self._shard_locks[key]:
+            batch = self._batches.pop(key)
+            try:
+                reviewed = await asyncio.get_running_loop().run_in_executor(
+                    None, apply_reviews, [(user, decision) for user, decision, _ in batch], self.database_path)
+            except Exception as e:
+                reviewed = None
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _, decision, _ in batch:
+                    # Another decision on the same reaction may be waiting in the next batch.
+                    self._queued[(decision[0], decision[1])] -= 1
+                    if not self._queued[(decision[0], decision[1])]:
+                        del self._queued[(decision[0], decision[1])]
+            if reviewed is not None:
+                self.stats['batches'] += 1
+                self.stats['reviewed'] += len(reviewed)
+                reviewed = set(reviewed)
+                for _, decision, future in batch:
+                    if (decision[0], decision[1]) in reviewed:
+                        self._pending.get(decision[0], (0, dict()))[1].pop(decision[1], None)
+                    if not future.done():
+                        future.set_result((decision[0], decision[1]) in reviewed)
+
+    async def _get_pending_summaries(self, family: str) -> Dict[int, dict]:
+        """
+        Get the summaries of the pending reactions of a family, read from the database once per ``pending_ttl``.
+
+        Args:
+            family (str): The reaction family label.
+
+        Returns:
+            Dict[int, dict]: Keys are reaction IDs, values are the ``PENDING_FIELDS`` of the entries.
+        """
+        if family not in self._pending_locks:
+            self._pending_locks[family] = asyncio.Lock()
+        async with self._pending_locks[family]:
+            read_time, summaries = self._pending.get(family, (None, None))
+            if read_time is None or time.monotonic() - read_time > self.pending_ttl:
+                summaries = await asyncio.get_running_loop().run_in_executor(None, self._read_pending, family)
+                self._pending[family] = (time.monotonic(), summaries)
+        return summaries
+
+    def _read_pending(self, family: str) -> Dict[int, dict]:
+        """Read the summaries of the pending reactions of a family from the database."""
+        return {index: entry for _, index, entry in self.db.query(family=family, approved=False, rejected=False,
+                                                                 fields=PENDING_FIELDS)}
+
+
+class ReviewServer(object):
+    """
+    An HTTP/1.1 server exposing a review service, connections are kept alive between requests.
+
+    Args:
+        service (ReviewService): The review service.
+        host (str, optional): The host to listen on.
+        port (int, optional): The port to listen on, a free port is chosen if 0.
+
+    Attributes:
+        service (ReviewService): The review service.
+        host (str): The host to listen on.
+        port (int): The port listened on, set once the server started.
+    """
+
+    def __init__(self,
+                 service: ReviewService,
+                 host: str = '127.0.0.1',
+                 port: int = 8080,
+                 ):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        """
+        Start listening.
+        """
+        self._server = await asyncio.start_server(self._handle_connection, host=self.host, port=self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """
+        Stop listening, and write all queued decisions.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.service.close()
+
+    async def serve_forever(self):
+        """
+        Serve until cancelled.
+        """
+        if self._server is None:
+            await self.start()
+        print(f'Serving the AM3DB review service of {self.service.database_path} on http://{self.host}:{self.port}')
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(self,
+                                 reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter,
+                                 ):
+        """
+        Handle the requests of a connection.
+
+        Args:
+            reader (asyncio.StreamReader): The connection reader.
+            writer (asyncio.StreamWriter): The connection writer.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = dict()
+                while len(headers) <= MAX_HEADERS:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Malformed request.'}, keep_alive=False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, 413, {'error': 'The request body is too large.'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                try:
+                    status, content = await self.service.handle(method, target, body)
+                except Exception as e:
+                    status, content = 500, {'error': f'{e.__class__.__name__}: {e}'}
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, content, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter,
+                       status: int,
+                       content: dict,
+                       keep_alive: bool = True,
+                       ):
+        """Write a JSON response."""
+        body = encode_json(content)
+        writer.write(f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\n'
+                     f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + body)
+        await writer.drain()
+
+
+class LocalReviewClient(object):
+    """
+    A review client calling a review service in-process, a stand-in for ``HTTPReviewClient`` without sockets.
+
+    Args:
+        service (ReviewService): The review service.
+        name (str): The username of the reviewer.
+
+    Attributes:
+        service (ReviewService): The review service.
+        name (str): The username of the reviewer.
+    """
+
+    def __init__(self,
+                 service: ReviewService,
+                 name: str,
+                 ):
+        self.service = service
+        self.name = name
+
+    async def request(self,
+                      method: str,
+                      target: str,
+                      content: Optional[dict] = None,
+                      ) -> Tuple[int, dict]:
+        """
+        Send a request.
+
+        Args:
+            method (str): The HTTP method.
+            target (str): The request target.
+            content (dict, optional): The JSON request content.
+
+        Returns:
+            Tuple[int, dict]: The HTTP status code and the response content.
+        """
+        status, response = await self.service.handle(method, target, encode_json(content) if content else b'')
+        return status, json.loads(encode_json(response).decode('utf-8'))
+
+    async def pending(self,
+                      family: Optional[str] = None,
+                      page: int = 0,
+                      size: Optional[int] = None,
+                      ) -> Tuple[int, dict]:
+        """
+        Get a page of pending reactions, see ``ReviewService.get_pending()``.
+
+        Returns:
+            Tuple[int, dict]: The HTTP status code and the page.
+        """
+        target = f'/pending?page={page}'
+        if family is not None:
+            target += f'&family={family}'
+        if size is not None:
+            target += f'&size={size}'
+        return await self.request('GET', target)
+
+    async def review(self,
+                     family: str,
+                     index: int,
+                     decision: str,
+                     reason: Optional[str] = None,
+                     ) -> Tuple[int, dict]:
+        """
+        Approve or reject a reaction, see ``ReviewService.review()``.
+
+        Returns:
+            Tuple[int, dict]: The HTTP status code and whether the reaction was reviewed.
+        """
+        return await self.request('POST', '/review', {'name': self.name, 'family': family, 'index': index,
+                                                      'decision': decision, 'reason': reason})
+
+    async def close(self):
+        """
+        Close the client.
+        """
+        pass
+
+
+class HTTPReviewClient(LocalReviewClient):
+    """
+    A review client sending requests to a review server over a kept-alive HTTP/1.1 connection.
+    Requests of a client are sent one at a time.
+
+    Args:
+        host (str): The server host.
+        port (int): The server port.
+        name (str): The username of the reviewer.
+
+    Attributes:
+        host (str): The server host.
+        port (int): The server port.
+        name (str): The username of the reviewer.
+    """
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 name: str,
+                 ):
+        super().__init__(service=None, name=name)
+        self.host = host
+        self.port = port
+        self._reader, self._writer = None, None
+
+    async def request(self,
+                      method: str,
+                      target: str,
+                      content: Optional[dict] = None,
+                      ) -> Tuple[int, dict]:
+        """
+        Send a request.
+
+        Args:
+            method (str): The HTTP method.
+            target (str): The request target.
+            content (dict, optional): The JSON request content.
+
+        Returns:
+            Tuple[int, dict]: The HTTP status code and the response content.
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = encode_json(content) if content else b''
+        self._writer.write(f'{method} {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+                           f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'
+                           .encode('latin-1') + body)
+        await self._writer.drain()
+        status = int((await self._reader.readline()).split()[1])
+        headers = dict()
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        response = json.loads((await self._reader.readexactly(int(headers.get('content-length', 0)))).decode('utf-8'))
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, response
+
+    async def close(self):
+        """
+        Close the connection.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._reader, self._writer = None, None
+
+
+async def simulate_reviewers(service: ReviewService,
+                             names: List[str],
+                             reviews_per_reviewer: int = 1,
+                             family: Optional[str] = None,
+                             reject_every: int = 0,
+                             server: Optional[ReviewServer] = None,
+                             ) -> dict:
+    """
+    Simulate concurrent reviewers, each repeatedly fetching a page of pending reactions and reviewing one of them.
+
+    Args:
+        service (ReviewService): The review service.
+        names (List[str]): The usernames of the reviewers, one simulated reviewer per name.
+        reviews_per_reviewer (int, optional): The number of reactions each reviewer reviews.
+        family (str, optional): The reaction family label to review.
+        reject_every (int, optional): Every reviewer rejects every n-th reaction it reviews, never rejects if 0.
+        server (ReviewServer, optional): A started review server, reviewers send requests over HTTP if given,
+                                         otherwise they call the service in-process.
+
+    Returns:
+        dict: The number of 'reviewers', 'requests', 'reviewed' and 'failed' reviews, the total 'elapsed' seconds,
+              the mean and maximal review latency in seconds, and the number of written 'batches'.
+    """
+    latencies, counts = list(), {'requests': 0, 'reviewed': 0, 'failed': 0}
+
+    async def reviewer(number: int, name: str):
+        client = HTTPReviewClient(server.host, server.port, name) if server is not None \
+            else LocalReviewClient(service, name)
+        try:
+            for i in range(reviews_per_reviewer):
+                status, page = await client.pending(family=family, size=len(names))
+                counts['requests'] += 1
+                if status != 200 or not page['reactions']:
+                    break
+                reaction = page['reactions'][number % len(page['reactions'])]
+                rejecting = reject_every and (i + 1) % reject_every == 0
+                t0 = time.monotonic()
+                status, _ = await client.review(page['family'], reaction['index'],
+                                                decision='reject' if rejecting else 'approve',
+                                                reason='Simulated rejection.' if rejecting else None)
+                latencies.append(time.monotonic() - t0)
+                counts['requests'] += 1
+                counts['reviewed' if status == 200 else 'failed'] += 1
+        finally:
+            await client.close()
+
+    batches, t0 = service.stats['batches'], time.monotonic()
+    await asyncio.gather(*[reviewer(number, name) for number, name in enumerate(names)])
+    return dict(counts,
+                reviewers=len(names),
+                elapsed=time.monotonic() - t0,
+                latency_mean=sum(latencies) / len(latencies) if latencies else 0.0,
+                latency_max=max(latencies) if latencies else 0.0,
+                batches=service.stats['batches'] - batches)
+
+
+def encode_json(content) -> bytes:
+    """
+    Encode content as JSON, arrays are encoded as lists.
+
+    Args:
+        content: The content.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    return json.dumps(content, default=lambda obj: obj.tolist() if hasattr(obj, 'tolist') else str(obj)) \
+        .encode('utf-8')
+
+
+def main():
+    """Serve the review service of a database from the command line."""
+    parser = argparse.ArgumentParser(description='Serve the AM3DB review service.')
+    parser.add_argument('--database-path', type=str, default=None, help='The path to the database folder.')
+    parser.add_argument('--users-path', type=str, default=None, help='The path to the users file.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='The host to listen on.')
+    parser.add_argument('--port', type=int, default=8080, help='The port to listen on.')
+    parser.add_argument('--debounce', type=float, default=0.05,
+                        help='The number of seconds decisions on a shard are collected before being written.')
+    parser.add_argument('--page-size', type=int, default=50, help='The default number of reactions in a page.')
+    args = parser.parse_args()
+
+    async def serve():
+        service = ReviewService(database_path=args.database_path, users_path=args.users_path,
+                                debounce=args.debounce, page_size=args.page_size)
+        await ReviewServer(service, host=args.host, port=args.port).serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+AM3DB's sharding module.
+
+Shards of families with large molecules are many times bigger than shards of families with small molecules
+when both hold ``MAX_RXNS_PER_FILE`` reactions. With a shard budget in the database settings,
+``shard_max_records`` and/or ``shard_max_bytes``, writers split a shard which exceeds the budget after a write
+into shards of contiguous reaction ID ranges, recorded in the family shard table (see ``am3db.manifest``).
+``rebalance_family()`` and ``rebalance_database()`` also merge adjacent shards which fit the budget together.
+
+A shard is split by writing the new shards, saving the shard table, and only then rewriting the original shard,
+and shards are merged by rewriting the first shard, saving the shard table, and only then removing the second shard,
+so lock-free readers which looked up a reaction ID in the previous table still find it.
+All functions which modify shards must be called while holding the family lock.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+from am3db.catalog import get_catalog, invalidate_catalogs, notify_shard_written
+from am3db.common import DATABASE_PATH
+from am3db.journal import get_journal
+from am3db.locks import family_lock, shard_lock
+from am3db.manifest import (MAX_RXNS_PER_FILE,
+                            FamilyManifest,
+                            get_shard_number,
+                            get_shard_table,
+                            save_shard_table,
+                            )
+from am3db.query import ReactionDB
+from am3db.storage import get_database_settings, read_shard, save_shard
+
+
+def get_shard_budget(database_path: Optional[str] = None) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Get the shard budget of a database from its ``shard_max_records`` and ``shard_max_bytes`` settings.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        Tuple[Optional[int], Optional[int]]: The maximal number of reactions and bytes per shard,
+                                             ``None`` values if not set.
+    """
+    settings = get_database_settings(database_path)
+    return settings.get('shard_max_records', None), settings.get('shard_max_bytes', None)
+
+
+def is_adaptive(database_path: Optional[str] = None) -> bool:
+    """
+    Check whether writers split shards which exceed the shard budget of a database.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        bool: Whether a shard budget is set.
+    """
+    return any(value is not None for value in get_shard_budget(database_path))
+
+
+def exceeds_budget(count: int,
+                   size: int,
+                   max_records: Optional[int] = None,
+                   max_bytes: Optional[int] = None,
+                   ) -> bool:
+    """
+    Check whether a shard exceeds a shard budget.
+
+    Args:
+        count (int): The number of reactions in the shard.
+        size (int): The shard file size in bytes.
+        max_records (int, optional): The maximal number of reactions per shard.
+        max_bytes (int, optional): The maximal number of bytes per shard.
+
+    Returns:
+        bool: Whether the shard exceeds the budget, a shard with a single reaction never does.
+    """
+    if count <= 1:
+        return False
+    return (max_records is not None and count > max_records) or (max_bytes is not None and size > max_bytes)
+
+
+def get_family_shard_table(manifest: FamilyManifest) -> List[List[int]]:
+    """
+    Get the shard table of a family, converting the default layout into a table if the family has none.
+
+    Args:
+        manifest (FamilyManifest): The family manifest.
+
+    Returns:
+        List[List[int]]: [first reaction ID, shard number] pairs sorted by the first reaction ID.
+    """
+    table = get_shard_table(manifest.family, manifest.database_path)
+    if table is not None:
+        return table
+    numbers = sorted(get_shard_number(shard, manifest.family, manifest.extension) for shard in manifest.shards.keys())
+    table = [[number * MAX_RXNS_PER_FILE, number] for number in numbers] or [[0, 0]]
+    table[0][0] = 0
+    return table
+
+
+def split_shard(manifest: FamilyManifest,
+                shard: str,
+                content: Dict[int, dict],
+                max_records: Optional[int] = None,
+                max_bytes: Optional[int] = None,
+                ) -> List[str]:
+    """
+    Split a shard which exceeds the shard budget into shards of contiguous reaction ID ranges.
+    The number of reactions per part is estimated from the average reaction size in the shard.
+    Must be called while holding the family lock and the shard lock, the manifest is saved.
+
+    Args:
+        manifest (FamilyManifest): The family manifest, up to date with the shard.
+        shard (str): The shard filename.
+        content (Dict[int, dict]): The shard content.
+        max_records (int, optional): The maximal number of reactions per shard.
+        max_bytes (int, optional): The maximal number of bytes per shard.
+
+    Returns:
+        List[str]: The filenames of the new shards, empty if the shard was not split.
+    """
+    indices = sorted(content.keys())
+    size = manifest.shards[shard]['size']
+    if not exceeds_budget(len(indices), size, max_records, max_bytes):
+        return list()
+    records_per_part = max_records if max_records is not None else len(indices)
+    if max_bytes is not None:
+        records_per_part = min(records_per_part, max(1, int(max_bytes * len(indices) / size)))
+    records_per_part = max(records_per_part, 1)
+    parts = [indices[i:i + records_per_part] for i in range(0, len(indices), records_per_part)]
+    if len(parts) < 2:
+        return list()
+    table = get_family_shard_table(manifest)
+    shards = set(manifest.shards.keys()) | set(get_catalog(manifest.reactions_path).get_shards(manifest.family))
+    next_number = max([number for _, number in table]
+                      + [get_shard_number(s, manifest.family, manifest.extension) or 0 for s in shards]) + 1
+    new_shards = list()
+    for part in parts[1:]:
+        new_shard = f'{manifest.family}_{next_number}{manifest.extension}'
+        save_shard(os.path.join(manifest.reactions_path, new_shard), {index: content[index] for index in part})
+        notify_shard_written(manifest.reactions_path, new_shard)
+        manifest.update_shard(shard=new_shard, count=len(part))
+        table.append([part[0], next_number])
+        new_shards.append(new_shard)
+        next_number += 1
+    save_shard_table(manifest.family, table, database_path=manifest.database_path)
+    save_shard(os.path.join(manifest.reactions_path, shard), {index: content[index] for index in parts[0]})
+    manifest.update_shard(shard=shard, count=len(parts[0]))
+    manifest.save()
+    return new_shards
+
+
+def merge_shards(manifest: FamilyManifest,
+                 first: str,
+                 second: str,
+                 ) -> Dict[int, dict]:
+    """
+    Merge a shard into the preceding shard in the shard table.
+    Must be called while holding the family lock and the locks of both shards, the manifest is saved.
+
+    Args:
+        manifest (FamilyManifest): The family manifest.
+        first (str): The filename of the shard to keep.
+        second (str): The filename of the shard to merge into the first one, it is removed.
+
+    Returns:
+        Dict[int, dict]: The content of the merged shard.
+    """
+    table = get_family_shard_table(manifest)
+    numbers = [number for _, number in table]
+    first_number = get_shard_number(first, manifest.family, manifest.extension)
+    second_number = get_shard_number(second, manifest.family, manifest.extension)
+    if first_number not in numbers or second_number not in numbers \
+            or numbers.index(second_number) != numbers.index(first_number) + 1:
+        raise ValueError(f'Cannot merge shard {second} into shard {first}, they are not adjacent.')
+    content = read_shard(os.path.join(manifest.reactions_path, first))
+    content.update(read_shard(os.path.join(manifest.reactions_path, second)))
+    save_shard(os.path.join(manifest.reactions_path, first), content)
+    manifest.update_shard(shard=first, count=len(content))
+    del table[numbers.index(second_number)]
+    save_shard_table(manifest.family, table, database_path=manifest.database_path)
+    manifest.remove_shard(second)
+    manifest.save()
+    if os.path.isfile(os.path.join(manifest.reactions_path, second)):
+        os.remove(os.path.join(manifest.reactions_path, second))
+    invalidate_catalogs()
+    return content
+
+
+def split_oversized_shards(family: str,
+                           database_path: Optional[str] = None,
+                           ) -> List[str]:
+    """
+    Split the shards of a family which exceed the shard budget of the database.
+
+    Args:
+        family (str): The reaction family label.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        List[str]: The filenames of the new shards.
+    """
+    max_records, max_bytes = get_shard_budget(database_path)
+    new_shards = list()
+    with family_lock(family, database_path=database_path):
+        manifest = FamilyManifest(family=family, database_path=database_path).load(save_rebuilt=True)
+        for shard, entry in sorted(manifest.shards.items()):
+            if exceeds_budget(entry['count'], entry['size'], max_records, max_bytes):
+                with shard_lock(shard, database_path=database_path):
+                    content = read_shard(os.path.join(manifest.reactions_path, shard))
+                    new_shards.extend(split_shard(manifest, shard, content, max_records, max_bytes))
+    return new_shards
+
+
+def rebalance_family(family: str,
+                     database_path: Optional[str] = None,
+                     max_records: Optional[int] = None,
+                     max_bytes: Optional[int] = None,
+                     ) -> dict:
+    """
+    Rewrite the shards of a family to fit a shard budget: shards exceeding the budget are split,
+    and adjacent shards which fit the budget together are merged. The family journal is compacted first.
+
+    Args:
+        family (str): The reaction family label.
+        database_path (str, optional): The path to the database folder.
+        max_records (int, optional): The maximal number of reactions per shard, the database setting by default.
+        max_bytes (int, optional): The maximal number of bytes per shard, the database setting by default.
+
+    Returns:
+        dict: The number of 'split' and 'merged' shards, and the final number of 'shards'.
+    """
+    database_path = database_path or DATABASE_PATH
+    if max_records is None and max_bytes is None:
+        max_records, max_bytes = get_shard_budget(database_path)
+        if max_records is None and max_bytes is None:
+            max_records = MAX_RXNS_PER_FILE
+    get_journal(family, database_path=database_path).compact()
+    num_split, num_merged = 0, 0
+    with family_lock(family, database_path=database_path):
+        manifest = FamilyManifest(family=family, database_path=database_path).load(save_rebuilt=True)
+        for shard, entry in sorted(manifest.shards.items()):
+            if exceeds_budget(entry['count'], entry['size'], max_records, max_bytes):
+                with shard_lock(shard, database_path=database_path):
+                    content = read_shard(os.path.join(manifest.reactions_path, shard))
+                    num_split += len(split_shard(manifest, shard, content, max_records, max_bytes)) > 0
+        table = get_family_shard_table(manifest)
+        position = 0
+        while position < len(table) - 1:
+            first = f'{family}_{table[position][1]}{manifest.extension}'
+            second = f'{family}_{table[position + 1][1]}{manifest.extension}'
+            first_entry = manifest.shards.get(first, {'count': 0, 'size': 0})
+            second_entry = manifest.shards.get(second, {'count': 0, 'size': 0})
+            if first in manifest.shards and second in manifest.shards \
+                    and not exceeds_budget(first_entry['count'] + second_entry['count'],
+                                           first_entry['size'] + second_entry['size'], max_records, max_bytes):
+                with shard_lock(min(first, second), database_path=database_path), \
+                        shard_lock(max(first, second), database_path=database_path):
+                    merge_shards(manifest, first, second)
+                num_merged += 1
+                table = get_family_shard_table(manifest)
+            else:
+                position += 1
+    return {'split': num_split, 'merged': num_merged, 'shards': len(manifest.shards)}
+
+
+def rebalance_database(database_path: Optional[str] = None,
+                       max_records: Optional[int] = None,
+                       max_bytes: Optional[int] = None,
+                       ) -> Dict[str, dict]:
+    """
+    Rebalance the shards of all families of a database, see ``rebalance_family()``.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+        max_records (int, optional): The maximal number of reactions per shard, the database setting by default.
+        max_bytes (int, optional): The maximal number of bytes per shard, the database setting by default.
+
+    Returns:
+        Dict[str, dict]: Keys are family labels, values are the rebalancing summaries.
+    """
+    return {family: rebalance_family(family, database_path=database_path, max_records=max_records,
+                                     max_bytes=max_bytes)
+            for family in ReactionDB(database_path=database_path).get_families()}
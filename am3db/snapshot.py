@@ -0,0 +1,444 @@
+"""
+AM3DB's snapshot module.
+
+A read-only snapshot packs all families of a database into a single file for analytics.
+Opening a snapshot memory-maps the file and parses only a small header, so it costs milliseconds regardless of the
+database size, and records are decoded lazily, one at a time, when accessed.
+
+File layout (all numbers little-endian)::
+
+    magic (8 bytes) | header length (uint64) | JSON header | padding | arrays, each aligned to ``ALIGNMENT`` bytes
+
+The header maps every family label to its range of rows, and every array name to its offset, dtype and shape.
+Rows are grouped by family and sorted by reaction ID within a family:
+    'ids' (int64): The reaction ID of every row, binary-searched to find the row of a reaction ID.
+    'r_offsets', 'p_offsets' (int64): The atoms of row ``i`` are ``[offsets[i], offsets[i + 1])``
+                                      in 'r_coords' / 'r_symbols', and 'p_coords' / 'p_symbols' respectively.
+    'r_coords', 'p_coords' (float64): (number of atoms) x 3 coordinate arrays of all rows.
+    'r_symbols', 'p_symbols' (uint16): Element codes of all atoms, indexing the header 'symbols' list.
+    'map_offsets' (int64), 'map_shapes' (int32), 'maps' (int32): The atom maps of row ``i`` are
+        ``maps[map_offsets[i]:map_offsets[i + 1]]`` reshaped to ``map_shapes[i]``.
+    'record_offsets' (int64), 'records' (uint8): The remaining fields of row ``i``, binary encoded
+        (see ``am3db.storage.encode_shard()``) in ``records[record_offsets[i]:record_offsets[i + 1]]``.
+
+Coordinates and atom maps are returned as zero-copy NumPy views into the memory-mapped file.
+
+Example::
+
+    export_snapshot('am3db.snapshot')
+    with Snapshot('am3db.snapshot') as snapshot:
+        record = snapshot.get('H_Abstraction', 12)
+        coords, entry = record.r_coords, record.as_dict()
+"""
+
+import json
+import mmap
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from am3db.atom_maps import decode_atom_maps
+from am3db.common import VERSION
+from am3db.storage import decode_shard, encode_shard, get_tmp_path
+
+
+SNAPSHOT_MAGIC = b'AM3SNAP\x01'
+ALIGNMENT = 64
+SIDES = ('r', 'p')
+
+_ARRAY_DTYPES = {'ids': '<i8',
+                 'r_offsets': '<i8', 'r_coords': '<f8', 'r_symbols': '<u2',
+                 'p_offsets': '<i8', 'p_coords': '<f8', 'p_symbols': '<u2',
+                 'map_offsets': '<i8', 'map_shapes': '<i4', 'maps': '<i4',
+                 'record_offsets': '<i8', 'records': 'u1',
+                 }
+
+
+class Snapshot(object):
+    """
+    A read-only, memory-mapped snapshot of a database.
+
+    Args:
+        path (str): The path to the snapshot file.
+
+    Attributes:
+        path (str): The path to the snapshot file.
+        header (dict): The snapshot header.
+        families (Dict[str, Tuple[int, int]]): Keys are family labels, values are their [first, last + 1) rows.
+        symbols (List[str]): The element symbols, indexed by the element codes.
+        arrays (Dict[str, np.ndarray]): The read-only arrays, views into the memory-mapped file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            self._mmap.close()
+            raise ValueError(f'Not an AM3DB snapshot (bad magic header): {path}')
+        header_length = int.from_bytes(self._mmap[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + 8], 'little')
+        header_start = len(SNAPSHOT_MAGIC) + 8
+        self.header = json.loads(self._mmap[header_start:header_start + header_length].decode('utf-8'))
+        self._data_start = align(header_start + header_length)
+        self.families = {label: tuple(rows) for label, rows in self.header['families'].items()}
+        self.symbols = self.header['symbols']
+        self.arrays = dict()
+        for name, spec in self.header['arrays'].items():
+            count = int(np.prod(spec['shape']))
+            self.arrays[name] = np.frombuffer(self._mmap, dtype=np.dtype(spec['dtype']), count=count,
+                                              offset=self._data_start + spec['offset']).reshape(spec['shape'])
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.arrays['ids'])
+
+    def __contains__(self, key: Tuple[str, int]) -> bool:
+        return self.get_row(*key) is not None
+
+    def close(self):
+        """
+        Release the arrays and unmap the file. Views obtained from the snapshot must not be used afterwards.
+        """
+        self.arrays = dict()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Views are still referenced, the file is unmapped once they are garbage collected.
+
+    def get_row(self,
+                family: str,
+                index: int,
+                ) -> Optional[int]:
+        """
+        Get the row of a reaction.
+
+        Args:
+            family (str): The reaction family label.
+            index (int): The reaction ID.
+
+        Returns:
+            Optional[int]: The row, ``None`` if the reaction is not in the snapshot.
+        """
+        if family not in self.families:
+            return None
+        start, end = self.families[family]
+        ids = self.arrays['ids']
+        row = start + int(np.searchsorted(ids[start:end], index))
+        return row if row < end and ids[row] == index else None
+
+    def get(self,
+            family: str,
+            index: int,
+            ) -> Optional['SnapshotRecord']:
+        """
+        Get a lazy record of a reaction.
+
+        Args:
+            family (str): The reaction family label.
+            index (int): The reaction ID.
+
+        Returns:
+            Optional[SnapshotRecord]: The record, ``None`` if the reaction is not in the snapshot.
+        """
+        row = self.get_row(family, index)
+        return SnapshotRecord(self, family, row) if row is not None else None
+
+    def records(self, family: Optional[str] = None) -> Iterator['SnapshotRecord']:
+        """
+        Iterate over lazy records.
+
+        Args:
+            family (str, optional): Only iterate over the records of this family.
+
+        Yields:
+            SnapshotRecord: The records, grouped by family and sorted by reaction ID.
+        """
+        for label in ([family] if family is not None else sorted(self.families.keys())):
+            start, end = self.families.get(label, (0, 0))
+            for row in range(start, end):
+                yield SnapshotRecord(self, label, row)
+
+    def get_coords(self,
+                   row: int,
+                   side: str = 'r',
+                   ) -> np.ndarray:
+        """
+        Get the coordinates of a row as a zero-copy view.
+
+        Args:
+            row (int): The row.
+            side (str, optional): 'r' for the reactants or 'p' for the products.
+
+        Returns:
+            np.ndarray: A read-only (number of atoms) x 3 array.
+        """
+        offsets = self.arrays[f'{side}_offsets']
+        return self.arrays[f'{side}_coords'][offsets[row]:offsets[row + 1]]
+
+    def get_symbols(self,
+                    row: int,
+                    side: str = 'r',
+                    ) -> List[str]:
+        """
+        Get the element symbols of a row.
+
+        Args:
+            row (int): The row.
+            side (str, optional): 'r' for the reactants or 'p' for the products.
+
+        Returns:
+            List[str]: The element symbols.
+        """
+        offsets = self.arrays[f'{side}_offsets']
+        return [self.symbols[code] for code in self.arrays[f'{side}_symbols'][offsets[row]:offsets[row + 1]]]
+
+    def get_atom_maps(self, row: int) -> np.ndarray:
+        """
+        Get the atom maps of a row as a zero-copy view.
+
+        Args:
+            row (int): The row.
+
+        Returns:
+            np.ndarray: A read-only (number of maps) x (number of atoms) array.
+        """
+        offsets = self.arrays['map_offsets']
+        return self.arrays['maps'][offsets[row]:offsets[row + 1]].reshape(tuple(self.arrays['map_shapes'][row]))
+
+    def get_fields(self, row: int) -> dict:
+        """
+        Decode the fields of a row which are not stored as arrays.
+
+        Args:
+            row (int): The row.
+
+        Returns:
+            dict: The fields, the geometries without their coordinates.
+        """
+        start = self._data_start + self.header['arrays']['records']['offset']
+        offsets = self.arrays['record_offsets']
+        return decode_shard(self._mmap[start + int(offsets[row]):start + int(offsets[row + 1])])
+
+
+class SnapshotRecord(object):
+    """
+    A lazy record of a reaction in a snapshot, its fields are only decoded when accessed.
+
+    Args:
+        snapshot (Snapshot): The snapshot.
+        family (str): The reaction family label.
+        row (int): The row of the reaction in the snapshot.
+
+    Attributes:
+        family (str): The reaction family label.
+        row (int): The row of the reaction in the snapshot.
+    """
+    __slots__ = ('snapshot', 'family', 'row', '_fields')
+
+    def __init__(self,
+                 snapshot: Snapshot,
+                 family: str,
+                 row: int,
+                 ):
+        self.snapshot = snapshot
+        self.family = family
+        self.row = row
+        self._fields = None
+
+    def __repr__(self) -> str:
+        return f'SnapshotRecord(family={self.family}, index={self.index})'
+
+    @property
+    def index(self) -> int:
+        """The reaction ID"""
+        return int(self.snapshot.arrays['ids'][self.row])
+
+    @property
+    def r_coords(self) -> np.ndarray:
+        """The concatenated reactant coordinates, a zero-copy view"""
+        return self.snapshot.get_coords(self.row, 'r')
+
+    @property
+    def p_coords(self) -> np.ndarray:
+        """The concatenated product coordinates, a zero-copy view"""
+        return self.snapshot.get_coords(self.row, 'p')
+
+    @property
+    def atom_maps(self) -> np.ndarray:
+        """The atom maps, a zero-copy view"""
+        return self.snapshot.get_atom_maps(self.row)
+
+    def __getitem__(self, key: str):
+        if key == 'atom_maps' and self.atom_maps.size:
+            return self.atom_maps.tolist()
+        fields = self._get_fields()
+        if key in ('r_xyz', 'p_xyz') and fields.get(key):
+            return restore_xyz(fields[key], self.snapshot.get_coords(self.row, key[0]))
+        return fields[key]
+
+    def get(self, key: str, default=None):
+        """
+        Get a field of the database entry.
+
+        Args:
+            key (str): The field name.
+            default: The value returned if the entry has no such field.
+
+        Returns:
+            The field value.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def as_dict(self) -> dict:
+        """
+        Decode the full database entry.
+
+        Returns:
+            dict: The database entry.
+        """
+        entry = dict(self._get_fields())
+        for key in ('r_xyz', 'p_xyz'):
+            if entry.get(key):
+                entry[key] = self[key]
+        if self.atom_maps.size:
+            entry['atom_maps'] = self.atom_maps.tolist()
+        return entry
+
+    def _get_fields(self) -> dict:
+        """Decode the fields which are not stored as arrays, once."""
+        if self._fields is None:
+            self._fields = self.snapshot.get_fields(self.row)
+        return self._fields
+
+
+def export_snapshot(path: str,
+                    database_path: Optional[str] = None,
+                    families: Optional[List[str]] = None,
+                    ) -> dict:
+    """
+    Export a database into a snapshot file, atomically replacing an existing snapshot.
+
+    Args:
+        path (str): The path to the snapshot file.
+        database_path (str, optional): The path to the database folder.
+        families (List[str], optional): The families to export, all families by default.
+
+    Returns:
+        dict: The snapshot header.
+    """
+    from am3db.query import ReactionDB
+    db = ReactionDB(database_path=database_path)
+    columns = {name: list() for name in _ARRAY_DTYPES.keys()}
+    counts = {'r': 0, 'p': 0, 'maps': 0, 'records': 0}
+    for name in ('r_offsets', 'p_offsets', 'map_offsets', 'record_offsets'):
+        columns[name].append(np.zeros(1, dtype=_ARRAY_DTYPES[name]))
+    symbol_codes, family_rows, num_rows = dict(), dict(), 0
+    for family in (families if families is not None else db.get_families()):
+        start = num_rows
+        for _, index, entry in db.query(family=family):
+            if num_rows > start and index <= columns['ids'][-1][0]:
+                raise ValueError(f'The reactions of the {family} family are not sorted by their IDs.')
+            fields = dict(entry)
+            for side in SIDES:
+                xyz_list = fields.get(f'{side}_xyz') or list()
+                coords, symbols = list(), list()
+                for xyz in xyz_list:
+                    coords.extend(xyz['coords'])
+                    symbols.extend(xyz['symbols'])
+                if len(xyz_list):
+                    fields[f'{side}_xyz'] = [{key: value for key, value in xyz.items() if key != 'coords'}
+                                             for xyz in xyz_list]
+                columns[f'{side}_coords'].append(np.asarray(coords, dtype=np.float64).reshape((-1, 3)))
+                columns[f'{side}_symbols'].append(
+                    np.asarray([symbol_codes.setdefault(symbol, len(symbol_codes)) for symbol in symbols],
+                               dtype=np.uint16))
+                counts[side] += len(symbols)
+                columns[f'{side}_offsets'].append(np.asarray([counts[side]], dtype=np.int64))
+            try:
+                atom_maps = decode_atom_maps(fields.get('atom_maps')).maps
+            except ValueError:
+                # Invalid (e.g., ragged) atom maps are stored as they are, and kept with the other fields.
+                atom_maps = np.zeros((0, 0), dtype=np.int32)
+            if atom_maps.size:
+                del fields['atom_maps']
+            columns['maps'].append(atom_maps.reshape(-1).astype(np.int32))
+            columns['map_shapes'].append(np.asarray([atom_maps.shape], dtype=np.int32))
+            counts['maps'] += atom_maps.size
+            columns['map_offsets'].append(np.asarray([counts['maps']], dtype=np.int64))
+            record = np.frombuffer(encode_shard(fields), dtype=np.uint8)
+            columns['records'].append(record)
+            counts['records'] += len(record)
+            columns['record_offsets'].append(np.asarray([counts['records']], dtype=np.int64))
+            columns['ids'].append(np.asarray([index], dtype=np.int64))
+            num_rows += 1
+        if num_rows > start:
+            family_rows[family] = [start, num_rows]
+    empty_shapes = {'r_coords': (0, 3), 'p_coords': (0, 3), 'map_shapes': (0, 2)}
+    arrays = {name: (np.concatenate(parts) if len(parts) else np.zeros(empty_shapes.get(name, 0)))
+              .astype(_ARRAY_DTYPES[name], copy=False)
+              for name, parts in columns.items()}
+    header = {'version': VERSION,
+              'num_reactions': num_rows,
+              'families': family_rows,
+              'symbols': list(symbol_codes.keys()),
+              'arrays': dict(),
+              }
+    offset = 0
+    for name, values in arrays.items():
+        header['arrays'][name] = {'offset': offset, 'dtype': _ARRAY_DTYPES[name], 'shape': list(values.shape)}
+        offset = align(offset + values.nbytes)
+    encoded_header = json.dumps(header).encode('utf-8')
+    tmp_path = get_tmp_path(path)
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(len(encoded_header).to_bytes(8, 'little'))
+        f.write(encoded_header)
+        data_start = align(f.tell())
+        for name, values in arrays.items():
+            f.write(b'\x00' * (data_start + header['arrays'][name]['offset'] - f.tell()))
+            f.write(values.tobytes())
+    os.replace(tmp_path, path)
+    return header
+
+
+def restore_xyz(xyz_list: List[dict],
+                coords: np.ndarray,
+                ) -> List[dict]:
+    """
+    Restore the xyz dictionaries of a side of a reaction from their stored fields and concatenated coordinates.
+
+    Args:
+        xyz_list (List[dict]): The xyz dictionaries without their coordinates.
+        coords (np.ndarray): The concatenated coordinates of all species.
+
+    Returns:
+        List[dict]: The xyz dictionaries.
+    """
+    restored, start = list(), 0
+    for xyz in xyz_list:
+        end = start + len(xyz['symbols'])
+        restored.append(dict(xyz, coords=tuple(tuple(float(c) for c in row) for row in coords[start:end])))
+        start = end
+    return restored
+
+
+def align(offset: int) -> int:
+    """
+    Round an offset up to the next multiple of ``ALIGNMENT``.
+
+    Args:
+        offset (int): The offset.
+
+    Returns:
+        int: The aligned offset.
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
@@ -0,0 +1,192 @@
+"""
+AM3DB's species cache module.
+
+The same species (e.g., H, OH, CH3) appear in many reactions of a dataset. This module memoizes the per-species
+data computed by ``AMReaction.as_db_dict()``: InChI keys, resonance structure adjacency lists, generated xyz,
+the molecular graph symmetries used for clustering the atom maps,
+and the canonical SMILES used to key the RMG family memo (``am3db.families``).
+Species are keyed by their adjacency list, which is sensitive to the atom order, so cached adjacency lists and
+coordinates are only reused for species with an identical atom order.
+"""
+
+import copy
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+from am3db.atom_maps import get_automorphisms
+
+if TYPE_CHECKING:
+    from arc.species import ARCSpecies
+
+
+class SpeciesCache(object):
+    """
+    A size-bound LRU cache of per-species data.
+
+    Args:
+        max_size (int, optional): The maximal number of cached species, 0 disables the cache.
+
+    Attributes:
+        max_size (int): The maximal number of cached species.
+        hits (dict): Keys are cached fields, values are the number of cache hits.
+        misses (dict): Keys are cached fields, values are the number of cache misses.
+    """
+    fields = ('inchi_key', 'smiles', 'adjacency_lists', 'xyz', 'symmetries')
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = {field: 0 for field in self.fields}
+        self.misses = {field: 0 for field in self.fields}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self,
+            key: Optional[str],
+            field: str,
+            compute: Callable,
+            ):
+        """
+        Get a cached field of a species, computing and caching it on a miss.
+
+        Args:
+            key (str): The species key, the value is computed without caching if ``None``.
+            field (str): The cached field name.
+            compute (Callable): A function computing the value.
+
+        Returns:
+            A copy of the cached value.
+        """
+        if key is None or self.max_size <= 0:
+            self.misses[field] += 1
+            return compute()
+        entry = self._entries.get(key, None)
+        if entry is not None and field in entry:
+            self.hits[field] += 1
+            self._entries.move_to_end(key)
+            return copy.deepcopy(entry[field])
+        self.misses[field] += 1
+        value = compute()
+        if entry is None:
+            entry = self._entries[key] = dict()
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        entry[field] = value
+        return copy.deepcopy(value)  # Don't share objects between database entries.
+
+    def get_inchi_key(self, spc: 'ARCSpecies') -> str:
+        """
+        Get the InChI key of a species.
+
+        Args:
+            spc (ARCSpecies): The species.
+
+        Returns:
+            str: The InChI key.
+        """
+        return self.get(get_species_key(spc), 'inchi_key', lambda: spc.mol.to_inchi_key())
+
+    def get_smiles(self, spc: 'ARCSpecies') -> str:
+        """
+        Get the canonical SMILES of a species.
+
+        Args:
+            spc (ARCSpecies): The species.
+
+        Returns:
+            str: The SMILES.
+        """
+        return self.get(get_species_key(spc), 'smiles', lambda: spc.mol.to_smiles())
+
+    def get_adjacency_lists(self, spc: 'ARCSpecies') -> List[str]:
+        """
+        Get the adjacency lists of all representative resonance structures of a species.
+
+        Args:
+            spc (ARCSpecies): The species.
+
+        Returns:
+            List[str]: The adjacency lists.
+        """
+        def compute():
+            from arc.common import generate_resonance_structures
+            mols = generate_resonance_structures(spc.mol)
+            return [mol.to_adjacency_list() for mol in mols or [spc.mol]]
+        return self.get(get_species_key(spc), 'adjacency_lists', compute)
+
+    def get_xyz(self, spc: 'ARCSpecies') -> dict:
+        """
+        Get the xyz of a species, only generated coordinates are cached, given coordinates are returned as is.
+
+        Args:
+            spc (ARCSpecies): The species.
+
+        Returns:
+            dict: The xyz.
+        """
+        if spc.initial_xyz is not None:
+            return spc.initial_xyz
+        return self.get(get_species_key(spc), 'xyz', spc.get_xyz)
+
+    def get_symmetries(self, spc: 'ARCSpecies') -> Optional[List[List[int]]]:
+        """
+        Get the automorphisms of the molecular graph of a species, as permutations of its atom indices.
+
+        Args:
+            spc (ARCSpecies): The species.
+
+        Returns:
+            Optional[List[List[int]]]: The automorphisms, ``None`` if there are more than ``MAX_SYMMETRIES``.
+        """
+        def compute():
+            indices = {atom: i for i, atom in enumerate(spc.mol.atoms)}
+            labels = [(atom.element.symbol, atom.radical_electrons, atom.lone_pairs, atom.charge)
+                      for atom in spc.mol.atoms]
+            bonds = {(indices[atom], indices[other]): bond.order
+                     for atom in spc.mol.atoms for other, bond in atom.edges.items()}
+            return get_automorphisms(labels, bonds)
+        return self.get(get_species_key(spc), 'symmetries', compute)
+
+    def stats(self) -> dict:
+        """
+        Get the cache statistics.
+
+        Returns:
+            dict: The cache size, bound, and the hits, misses and hit rate per field.
+        """
+        stats = {'size': len(self._entries), 'max_size': self.max_size}
+        for field in self.fields:
+            total = self.hits[field] + self.misses[field]
+            stats[field] = {'hits': self.hits[field],
+                            'misses': self.misses[field],
+                            'hit_rate': self.hits[field] / total if total else 0.0}
+        return stats
+
+    def clear(self):
+        """
+        Clear the cached species and reset the counters.
+        """
+        self._entries.clear()
+        self.hits = {field: 0 for field in self.fields}
+        self.misses = {field: 0 for field in self.fields}
+
+
+def get_species_key(spc: 'ARCSpecies') -> Optional[str]:
+    """
+    Get the cache key of a species.
+
+    Args:
+        spc (ARCSpecies): The species.
+
+    Returns:
+        Optional[str]: The adjacency list of the species, ``None`` if it has no molecule.
+    """
+    if spc.mol is None:
+        return None
+    return spc.mol.to_adjacency_list()
+
+
+SPECIES_CACHE = SpeciesCache()
@@ -0,0 +1,265 @@
+"""
+AM3DB's SQLite database module.
+
+An optional single-file database (using the standard library ``sqlite3`` module) storing the entries generated by
+``AMReaction.as_db_dict()``, with indexes on the family label, the sorted reactant/product InChI keys,
+the multiplicity/charge, and the review state. Entries are stored losslessly in the binary shard encoding,
+and the database can be imported from and exported to the shard layout.
+"""
+
+import os
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
+
+from am3db.common import DATABASE_PATH
+from am3db.journal import get_journal, get_journaled_families
+from am3db.storage import decode_shard, encode_shard, get_family_from_shard_filename, read_shard
+from am3db.writer import DatabaseWriter
+
+
+SQLITE_FILE = 'am3db.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reactions (
+    family TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    multiplicity INTEGER,
+    charge INTEGER,
+    r_key TEXT NOT NULL,
+    p_key TEXT NOT NULL,
+    approved INTEGER NOT NULL,
+    rejected INTEGER NOT NULL,
+    entry BLOB NOT NULL,
+    PRIMARY KEY (family, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_family ON reactions (family);
+CREATE INDEX IF NOT EXISTS idx_species ON reactions (r_key, p_key);
+CREATE INDEX IF NOT EXISTS idx_surface ON reactions (multiplicity, charge);
+CREATE INDEX IF NOT EXISTS idx_review ON reactions (approved, rejected);
+"""
+
+
+class SQLiteDatabase(object):
+    """
+    An AM3DB database stored in a single SQLite file.
+
+    Args:
+        path (str, optional): The path to the SQLite file, defaults to ``<database>/am3db.sqlite``.
+
+    Attributes:
+        path (str): The path to the SQLite file.
+        connection (sqlite3.Connection): The database connection.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(DATABASE_PATH, SQLITE_FILE)
+        if os.path.dirname(self.path) and not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> 'SQLiteDatabase':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Commit pending changes and close the database connection.
+        """
+        self.connection.commit()
+        self.connection.close()
+
+    def insert(self,
+               family: str,
+               index: int,
+               entry: dict,
+               ):
+        """
+        Insert or replace a reaction entry.
+
+        Args:
+            family (str): The reaction family label.
+            index (int): The reaction ID in the database.
+            entry (dict): The database entry, as generated by ``AMReaction.as_db_dict()``.
+        """
+        self.insert_many([(family, index, entry)])
+
+    def insert_many(self, rows: List[Tuple[str, int, dict]]):
+        """
+        Insert or replace many reaction entries in a single transaction.
+
+        Args:
+            rows (List[Tuple[str, int, dict]]): Tuples of family labels, reaction IDs, and database entries.
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO reactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(family,
+                  index,
+                  entry.get('multiplicity'),
+                  entry.get('charge'),
+                  get_species_key(entry.get('r_inchi_keys')),
+                  get_species_key(entry.get('p_inchi_keys')),
+                  int(bool(entry.get('approved_by'))),
+                  int(bool(entry.get('rejected_by'))),
+                  encode_shard(entry),
+                  ) for family, index, entry in rows])
+
+    def get(self,
+            family: str,
+            index: int,
+            ) -> Optional[dict]:
+        """
+        Get a reaction entry by its family and reaction ID.
+
+        Args:
+            family (str): The reaction family label.
+            index (int): The reaction ID in the database.
+
+        Returns:
+            Optional[dict]: The database entry, ``None`` if it does not exist.
+        """
+        row = self.connection.execute('SELECT entry FROM reactions WHERE family = ? AND idx = ?',
+                                      (family, index)).fetchone()
+        return decode_shard(row[0]) if row is not None else None
+
+    def find(self,
+             r_inchi_keys: List[str],
+             p_inchi_keys: List[str],
+             multiplicity: Optional[int] = None,
+             charge: Optional[int] = None,
+             family: Optional[str] = None,
+             both_directions: bool = False,
+             ) -> List[Tuple[str, int]]:
+        """
+        Find reactions by their reactant and product InChI keys using the species index.
+
+        Args:
+            r_inchi_keys (List[str]): The reactant InChI keys, in any order.
+            p_inchi_keys (List[str]): The product InChI keys, in any order.
+            multiplicity (int, optional): The reaction surface multiplicity.
+            charge (int, optional): The reaction surface charge.
+            family (str, optional): The reaction family label.
+            both_directions (bool, optional): Whether to also match reactions stored in the reverse direction.
+
+        Returns:
+            List[Tuple[str, int]]: The family labels and reaction IDs of the matching reactions.
+        """
+        r_key, p_key = get_species_key(r_inchi_keys), get_species_key(p_inchi_keys)
+        directions = [(r_key, p_key), (p_key, r_key)] if both_directions and r_key != p_key else [(r_key, p_key)]
+        matches = list()
+        for key_1, key_2 in directions:
+            query, args = 'SELECT family, idx FROM reactions WHERE r_key = ? AND p_key = ?', [key_1, key_2]
+            for column, value in [('multiplicity', multiplicity), ('charge', charge), ('family', family)]:
+                if value is not None:
+                    query += f' AND {column} = ?'
+                    args.append(value)
+            matches.extend(self.connection.execute(query + ' ORDER BY family, idx', args).fetchall())
+        return matches
+
+    def query(self,
+              family: Optional[str] = None,
+              multiplicity: Optional[int] = None,
+              charge: Optional[int] = None,
+              approved: Optional[bool] = None,
+              rejected: Optional[bool] = None,
+              ) -> Iterator[Tuple[str, int, dict]]:
+        """
+        Iterate over the reaction entries matching all given criteria.
+
+        Args:
+            family (str, optional): The reaction family label.
+            multiplicity (int, optional): The reaction surface multiplicity.
+            charge (int, optional): The reaction surface charge.
+            approved (bool, optional): Whether the reaction was approved by at least one reviewer.
+            rejected (bool, optional): Whether the reaction was rejected by at least one reviewer.
+
+        Yields:
+            Tuple[str, int, dict]: The family label, reaction ID, and database entry.
+        """
+        conditions, args = list(), list()
+        for column, value in [('family', family), ('multiplicity', multiplicity), ('charge', charge),
+                              ('approved', approved), ('rejected', rejected)]:
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                args.append(int(value) if isinstance(value, bool) else value)
+        query = 'SELECT family, idx, entry FROM reactions'
+        if len(conditions):
+            query += ' WHERE ' + ' AND '.join(conditions)
+        for family_label, index, entry in self.connection.execute(query + ' ORDER BY family, idx', args):
+            yield family_label, index, decode_shard(entry)
+
+    def count(self, family: Optional[str] = None) -> int:
+        """
+        Count the reactions in the database.
+
+        Args:
+            family (str, optional): Only count reactions of this family.
+
+        Returns:
+            int: The number of reactions.
+        """
+        if family is None:
+            return self.connection.execute('SELECT COUNT(*) FROM reactions').fetchone()[0]
+        return self.connection.execute('SELECT COUNT(*) FROM reactions WHERE family = ?', (family,)).fetchone()[0]
+
+    def import_shards(self, database_path: Optional[str] = None) -> int:
+        """
+        Import all shards of a database directory (of any storage backend), merged with the family journals.
+
+        Args:
+            database_path (str, optional): The path to the database folder.
+
+        Returns:
+            int: The number of imported reactions.
+        """
+        database_path = database_path or DATABASE_PATH
+        reactions_path = os.path.join(database_path, 'reactions')
+        journal_entries = {family: dict(get_journal(family, database_path).entries)
+                           for family in get_journaled_families(database_path)}
+        imported = set()
+        if os.path.isdir(reactions_path):
+            for file_name in sorted(os.listdir(reactions_path)):
+                family = get_family_from_shard_filename(file_name)
+                if family is None:
+                    continue
+                content = read_shard(os.path.join(reactions_path, file_name))
+                self.insert_many([(family, index, entry) for index, entry in content.items()])
+                imported.update((family, index) for index in content.keys())
+        for family, entries in journal_entries.items():
+            self.insert_many([(family, index, entry) for index, entry in entries.items()])
+            imported.update((family, index) for index in entries.keys())
+        return len(imported)
+
+    def export_shards(self, database_path: Optional[str] = None) -> int:
+        """
+        Export all reactions to the shard layout of a database directory, using its storage backend.
+
+        Args:
+            database_path (str, optional): The path to the database folder.
+
+        Returns:
+            int: The number of exported reactions.
+        """
+        num_exported = 0
+        with DatabaseWriter(database_path=database_path, on_duplicate='allow') as writer:
+            for family, index, entry in self.query():
+                writer.add_entry(family=family, entry=entry, index=index)
+                num_exported += 1
+        return num_exported
+
+
+def get_species_key(inchi_keys: Optional[List[str]]) -> str:
+    """
+    Get an order-independent key representing one side of a reaction.
+
+    Args:
+        inchi_keys (List[str]): The InChI keys of the species.
+
+    Returns:
+        str: The sorted InChI keys joined by a '+' sign.
+    """
+    return '+'.join(sorted(inchi_keys or list()))
+
@@ -0,0 +1,555 @@
+"""
+AM3DB's storage module.
+
+Shards are read and written through a storage backend. The backend of a database is recorded in
+``<database>/settings.yml`` (YAML shards are used if the file does not exist).
+Supported backends are:
+    'yaml': Human-readable YAML shards named ``<family>_<n>.yml``.
+    'binary': Compact binary shards named ``<family>_<n>.am3``, in which numeric lists (xyz coordinates, atom maps)
+              are stored as packed arrays and all strings (symbols, adjacency lists, InChI keys) in a string table.
+"""
+
+import os
+import struct
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from am3db.common import DATABASE_PATH, read_yaml_file, save_yaml_file
+from am3db.instrumentation import timed
+
+
+SETTINGS_FILE = 'settings.yml'
+
+
+class StorageBackend(object):
+    """
+    A base class for shard storage backends.
+
+    Attributes:
+        name (str): The backend name.
+        extension (str): The shard file extension.
+    """
+    name = ''
+    extension = ''
+
+    def read(self, path: str) -> dict:
+        """
+        Read the content of a shard.
+
+        Args:
+            path (str): The path to the shard file.
+
+        Returns:
+            dict: The shard content keyed by reaction ID.
+        """
+        raise NotImplementedError
+
+    def write(self,
+              path: str,
+              content: dict,
+              ):
+        """
+        Write the content of a shard, not necessarily atomically.
+
+        Args:
+            path (str): The path to the shard file.
+            content (dict): The shard content keyed by reaction ID.
+        """
+        raise NotImplementedError
+
+
+class YAMLBackend(StorageBackend):
+    """
+    A storage backend of YAML shards.
+    """
+    name = 'yaml'
+    extension = '.yml'
+
+    def read(self, path: str) -> dict:
+        return read_yaml_file(path) or dict()
+
+    def write(self,
+              path: str,
+              content: dict,
+              ):
+        save_yaml_file(path, content)
+
+
+class BinaryBackend(StorageBackend):
+    """
+    A storage backend of compact binary shards.
+
+    A shard file consists of a magic header, a string table and a single encoded value (the shard dictionary).
+    Every value is prefixed by a one-byte tag; homogeneous lists or tuples of floats and ints are packed as
+    float64 and int64 arrays, and rectangular nested lists or tuples of numbers (e.g., xyz coordinates
+    or atom maps) as 2D arrays, so that decoding them costs a single ``array.frombytes()`` call.
+    The distinction between lists and tuples is preserved, making the conversion to and from YAML lossless.
+    """
+    name = 'binary'
+    extension = '.am3'
+
+    def read(self, path: str) -> dict:
+        with open(path, 'rb') as f:
+            data = f.read()
+        return decode_shard(data) or dict()
+
+    def write(self,
+              path: str,
+              content: dict,
+              ):
+        with open(path, 'wb') as f:
+            f.write(encode_shard(content))
+
+
+BACKENDS = {backend.name: backend for backend in [YAMLBackend(), BinaryBackend()]}
+
+_settings_cache = dict()
+
+
+def get_backend(name: str) -> StorageBackend:
+    """
+    Get a storage backend by its name.
+
+    Args:
+        name (str): The backend name.
+
+    Returns:
+        StorageBackend: The storage backend.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown storage backend "{name}", supported backends are: {list(BACKENDS.keys())}')
+    return BACKENDS[name]
+
+
+def get_backend_by_path(path: str) -> StorageBackend:
+    """
+    Get the storage backend of a shard file by its extension.
+
+    Args:
+        path (str): The path to the shard file.
+
+    Returns:
+        StorageBackend: The storage backend.
+    """
+    for backend in BACKENDS.values():
+        if path.endswith(backend.extension):
+            return backend
+    raise ValueError(f'Cannot determine the storage backend of {path}')
+
+
+def get_database_settings(database_path: Optional[str] = None) -> dict:
+    """
+    Get the settings of a database, cached until the settings file changes.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        dict: The database settings, empty if the database has no settings file.
+    """
+    settings_path = os.path.join(database_path or DATABASE_PATH, SETTINGS_FILE)
+    if not os.path.isfile(settings_path):
+        return dict()
+    mtime_ns = os.stat(settings_path).st_mtime_ns
+    if settings_path not in _settings_cache or _settings_cache[settings_path][0] != mtime_ns:
+        _settings_cache[settings_path] = (mtime_ns, read_yaml_file(settings_path) or dict())
+    return _settings_cache[settings_path][1]
+
+
+def set_database_setting(key: str,
+                         value,
+                         database_path: Optional[str] = None,
+                         ):
+    """
+    Record a setting of a database in its settings file.
+
+    Args:
+        key (str): The setting name.
+        value: The setting value.
+        database_path (str, optional): The path to the database folder.
+    """
+    settings_path = os.path.join(database_path or DATABASE_PATH, SETTINGS_FILE)
+    settings = read_yaml_file(settings_path) if os.path.isfile(settings_path) else None
+    settings = settings or dict()
+    settings[key] = value
+    save_yaml_file_atomically(path=settings_path, content=settings)
+
+
+def get_database_backend(database_path: Optional[str] = None) -> StorageBackend:
+    """
+    Get the storage backend of a database.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        StorageBackend: The storage backend, YAML if the database has no settings file.
+    """
+    return get_backend(get_database_settings(database_path).get('backend', 'yaml'))
+
+
+def set_database_backend(name: str,
+                         database_path: Optional[str] = None,
+                         ):
+    """
+    Record the storage backend of a database in its settings file.
+    Use ``convert_database()`` to also convert existing shards.
+
+    Args:
+        name (str): The backend name.
+        database_path (str, optional): The path to the database folder.
+    """
+    get_backend(name)
+    set_database_setting(key='backend', value=name, database_path=database_path)
+
+
+@timed('storage.read_shard')
+def read_shard(path: str) -> dict:
+    """
+    Read the content of a database shard using the backend matching its extension.
+
+    Args:
+        path (str): The path to the shard file.
+
+    Returns:
+        dict: The shard content keyed by reaction ID, an empty dictionary if the shard does not exist.
+    """
+    if not os.path.isfile(path):
+        return dict()
+    return get_backend_by_path(path).read(path)
+
+
+@timed('storage.save_shard')
+def save_shard(path: str,
+               content: dict,
+               ):
+    """
+    Atomically save the content of a database shard using the backend matching its extension.
+    The content is written to a temporary file in the same folder which then replaces the shard,
+    so readers never observe a partially written shard.
+
+    Args:
+        path (str): The path to the shard file.
+        content (dict): The shard content keyed by reaction ID.
+    """
+    backend = get_backend_by_path(path)
+    tmp_path = get_tmp_path(path)
+    backend.write(tmp_path, content)
+    os.replace(tmp_path, path)
+
+
+def save_yaml_file_atomically(path: str,
+                              content,
+                              ):
+    """
+    Save a YAML file by writing a temporary file in the same folder which then replaces it,
+    so readers never observe a partially written file.
+
+    Args:
+        path (str): The path to the YAML file.
+        content: The content to save.
+    """
+    tmp_path = get_tmp_path(path)
+    save_yaml_file(path=tmp_path, content=content)
+    os.replace(tmp_path, path)
+
+
+def get_tmp_path(path: str) -> str:
+    """
+    Get the path to a temporary file for atomically replacing a file,
+    unique per process and thread, so concurrent writers never write the same temporary file.
+
+    Args:
+        path (str): The path to the file to replace.
+
+    Returns:
+        str: The path to the temporary file.
+    """
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def convert_shard(src_path: str,
+                  dst_path: str,
+                  ):
+    """
+    Convert a shard between storage backends, as determined by the file extensions.
+
+    Args:
+        src_path (str): The path to the source shard file.
+        dst_path (str): The path to the converted shard file.
+    """
+    save_shard(dst_path, read_shard(src_path))
+
+
+def convert_database(name: str,
+                     database_path: Optional[str] = None,
+                     ) -> List[str]:
+    """
+    Convert all shards of a database to a storage backend and record it in the database settings.
+    The family manifests are rebuilt on their next load since the shards they record no longer exist.
+
+    Args:
+        name (str): The target backend name.
+        database_path (str, optional): The path to the database folder.
+
+    Returns:
+        List[str]: The filenames of the converted shards.
+    """
+    backend = get_backend(name)
+    reactions_path = os.path.join(database_path or DATABASE_PATH, 'reactions')
+    converted = list()
+    if os.path.isdir(reactions_path):
+        for file_name in sorted(os.listdir(reactions_path)):
+            src_backend = None
+            for other in BACKENDS.values():
+                if file_name.endswith(other.extension) and other is not backend:
+                    src_backend = other
+            if src_backend is None:
+                continue
+            dst_file_name = file_name[:-len(src_backend.extension)] + backend.extension
+            convert_shard(os.path.join(reactions_path, file_name), os.path.join(reactions_path, dst_file_name))
+            os.remove(os.path.join(reactions_path, file_name))
+            converted.append(dst_file_name)
+    set_database_backend(name=name, database_path=database_path)
+    return converted
+
+
+def parse_shard_filename(file_name: str,
+                         extension: Optional[str] = None,
+                         ) -> Optional[Tuple[str, int]]:
+    """
+    Parse a shard filename in the format ``<family>_<n><extension>``.
+
+    Args:
+        file_name (str): The filename.
+        extension (str, optional): The expected file extension, any storage backend extension if not given.
+
+    Returns:
+        Optional[Tuple[str, int]]: The family label and the shard number, ``None`` if the file is not a shard.
+    """
+    extensions = [extension] if extension is not None else [backend.extension for backend in BACKENDS.values()]
+    for ext in extensions:
+        if file_name.endswith(ext):
+            family, _, number = file_name[:-len(ext)].rpartition('_')
+            if family and number.isdigit():
+                return family, int(number)
+    return None
+
+
+def get_family_from_shard_filename(file_name: str) -> Optional[str]:
+    """
+    Get the family label from a shard filename in the format ``<family>_<n><extension>``.
+
+    Args:
+        file_name (str): The shard filename.
+
+    Returns:
+        Optional[str]: The family label, ``None`` if the file is not a shard.
+    """
+    parsed = parse_shard_filename(file_name)
+    return parsed[0] if parsed is not None else None
+
+
+# Binary shard encoding
+
+MAGIC = b'AM3DB\x01'
+
+_NONE, _TRUE, _FALSE, _INT, _FLOAT, _STR, _LIST, _TUPLE, _DICT = b'NTFifsLUD'
+_BIG_INT, _INT_ARRAY, _FLOAT_ARRAY, _INT_MATRIX, _FLOAT_MATRIX = b'bIAKM'
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_MATRIX_HEADER = struct.Struct('<BII')
+
+
+def encode_shard(content) -> bytes:
+    """
+    Encode shard content into the binary shard format.
+
+    Args:
+        content: The shard content.
+
+    Returns:
+        bytes: The encoded shard.
+    """
+    strings, body = dict(), bytearray()
+    _encode(content, body, strings)
+    header = bytearray(MAGIC)
+    header += _U32.pack(len(strings))
+    for string in strings.keys():  # Dictionaries preserve insertion order, matching the string indices.
+        encoded = string.encode('utf-8')
+        header += _U32.pack(len(encoded))
+        header += encoded
+    return bytes(header + body)
+
+
+def decode_shard(data: bytes):
+    """
+    Decode a binary shard.
+
+    Args:
+        data (bytes): The encoded shard.
+
+    Returns:
+        The shard content.
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not an AM3DB binary shard (bad magic header).')
+    view = memoryview(data)
+    offset = len(MAGIC)
+    num_strings = _U32.unpack_from(view, offset)[0]
+    offset += 4
+    strings = list()
+    for _ in range(num_strings):
+        length = _U32.unpack_from(view, offset)[0]
+        offset += 4
+        strings.append(str(view[offset:offset + length], 'utf-8'))
+        offset += length
+    value, _ = _decode(view, offset, strings)
+    return value
+
+
+def _get_number_kind(values) -> Optional[type]:
+    """
+    Determine whether a non-empty sequence holds only ints (within int64) or only floats.
+
+    Returns:
+        Optional[type]: ``int``, ``float``, or ``None`` for anything else.
+    """
+    if not len(values):
+        return None
+    kind = type(values[0])
+    if kind is float:
+        return float if all(type(v) is float for v in values) else None
+    if kind is int:
+        return int if all(type(v) is int and _INT64_MIN <= v <= _INT64_MAX for v in values) else None
+    return None
+
+
+def _encode(value, out: bytearray, strings: Dict[str, int]):
+    """
+    Recursively encode a value into the binary shard format.
+
+    Args:
+        value: The value to encode.
+        out (bytearray): The output buffer.
+        strings (Dict[str, int]): The string table being built, keys are strings, values are their indices.
+    """
+    value_type = type(value)
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif value_type is int and _INT64_MIN <= value <= _INT64_MAX:
+        out.append(_INT)
+        out += _I64.pack(value)
+    elif value_type is int:
+        out.append(_BIG_INT)
+        out += _U32.pack(strings.setdefault(str(value), len(strings)))
+    elif value_type is float:
+        out.append(_FLOAT)
+        out += _F64.pack(value)
+    elif value_type is str:
+        out.append(_STR)
+        out += _U32.pack(strings.setdefault(value, len(strings)))
+    elif value_type is dict:
+        out.append(_DICT)
+        out += _U32.pack(len(value))
+        for key, item in value.items():
+            _encode(key, out, strings)
+            _encode(item, out, strings)
+    elif value_type in (list, tuple):
+        is_tuple = value_type is tuple
+        kind = _get_number_kind(value)
+        if kind is not None:
+            out.append(_FLOAT_ARRAY if kind is float else _INT_ARRAY)
+            out.append(is_tuple)
+            out += _U32.pack(len(value))
+            out += array('d' if kind is float else 'q', value).tobytes()
+            return
+        if len(value) and all(type(row) is type(value[0]) and type(row) in (list, tuple) for row in value) \
+                and len(value[0]) and all(len(row) == len(value[0]) for row in value):
+            flat = [v for row in value for v in row]
+            kind = _get_number_kind(flat)
+            if kind is not None:
+                out.append(_FLOAT_MATRIX if kind is float else _INT_MATRIX)
+                out += _MATRIX_HEADER.pack(is_tuple * 2 + (type(value[0]) is tuple), len(value), len(value[0]))
+                out += array('d' if kind is float else 'q', flat).tobytes()
+                return
+        out.append(_TUPLE if is_tuple else _LIST)
+        out += _U32.pack(len(value))
+        for item in value:
+            _encode(item, out, strings)
+    else:
+        raise TypeError(f'Cannot encode a value of type {value_type} in a binary shard: {value}')
+
+
+def _decode(view: memoryview,
+            offset: int,
+            strings: List[str],
+            ):
+    """
+    Recursively decode a value from the binary shard format.
+
+    Args:
+        view (memoryview): The encoded shard.
+        offset (int): The offset of the value to decode.
+        strings (List[str]): The string table.
+
+    Returns:
+        Tuple: The decoded value and the offset following it.
+    """
+    tag = view[offset]
+    offset += 1
+    if tag == _NONE:
+        return None, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _INT:
+        return _I64.unpack_from(view, offset)[0], offset + 8
+    if tag == _FLOAT:
+        return _F64.unpack_from(view, offset)[0], offset + 8
+    if tag == _STR:
+        return strings[_U32.unpack_from(view, offset)[0]], offset + 4
+    if tag == _BIG_INT:
+        return int(strings[_U32.unpack_from(view, offset)[0]]), offset + 4
+    if tag == _DICT:
+        length = _U32.unpack_from(view, offset)[0]
+        offset += 4
+        value = dict()
+        for _ in range(length):
+            key, offset = _decode(view, offset, strings)
+            value[key], offset = _decode(view, offset, strings)
+        return value, offset
+    if tag in (_LIST, _TUPLE):
+        length = _U32.unpack_from(view, offset)[0]
+        offset += 4
+        items = list()
+        for _ in range(length):
+            item, offset = _decode(view, offset, strings)
+            items.append(item)
+        return (tuple(items) if tag == _TUPLE else items), offset
+    if tag in (_INT_ARRAY, _FLOAT_ARRAY):
+        is_tuple = view[offset]
+        length = _U32.unpack_from(view, offset + 1)[0]
+        offset += 5
+        values = array('d' if tag == _FLOAT_ARRAY else 'q')
+        values.frombytes(view[offset:offset + 8 * length])
+        return (tuple(values) if is_tuple else values.tolist()), offset + 8 * length
+    if tag in (_INT_MATRIX, _FLOAT_MATRIX):
+        flags, rows, cols = _MATRIX_HEADER.unpack_from(view, offset)
+        offset += _MATRIX_HEADER.size
+        values = array('d' if tag == _FLOAT_MATRIX else 'q')
+        values.frombytes(view[offset:offset + 8 * rows * cols])
+        flat = values.tolist()
+        row_type = tuple if flags & 1 else list
+        matrix = [row_type(flat[i * cols:(i + 1) * cols]) for i in range(rows)]
+        return (tuple(matrix) if flags & 2 else matrix), offset + 8 * rows * cols
+    raise ValueError(f'Corrupt binary shard, got an unknown tag {bytes([tag])} at offset {offset - 1}')
@@ -6,9 +6,9 @@ import os
 from enum import Enum
 from typing import Optional
 
-from arc.common import read_yaml_file, save_yaml_file
-
-from am3db.common import DATABASE_PATH
+from am3db.common import DATABASE_PATH, read_yaml_file
+from am3db.locks import FileLock, get_lock_path
+from am3db.storage import save_yaml_file_atomically
 
 
 class StatusEnum(str, Enum):
@@ -66,14 +66,87 @@ class User(object):
     def save(self):
         """
         Save the user and status in the database.
+        The users file is locked, loaded again and atomically replaced, so concurrent saves are not lost.
+        """
+        with FileLock(get_lock_path('users', database_path=os.path.dirname(self.users_path))):
+            self.load()
+            self.update()
+            save_yaml_file_atomically(path=self.users_path, content=self.users)
+
+
+class UserRegistry(object):
+    """
+    A cached view of the users file, which is only parsed again after it changes on disk.
+
+    Args:
+        users_path (str, optional): The path to the users file, defaults to the database users file.
+
+    Attributes:
+        users_path (str): The path to the users file.
+        users (dict): Keys are usernames, values are statuses, ``None`` if the users file does not exist.
+    """
+
+    def __init__(self, users_path: Optional[str] = None):
+        self.users_path = users_path or os.path.join(DATABASE_PATH, 'users.yml')
+        self.users = None
+        self._stat = None
+
+    def load(self) -> Optional[dict]:
+        """
+        Get the users, parsing the users file only if it changed since it was last parsed.
+
+        Returns:
+            Optional[dict]: Keys are usernames, values are statuses, ``None`` if the users file does not exist.
         """
-        self.update()
-        save_yaml_file(path=self.users_path, content=self.users)
+        try:
+            stat = os.stat(self.users_path)
+        except FileNotFoundError:
+            self.users, self._stat = None, None
+            return None
+        stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if stat != self._stat:
+            self.users, self._stat = read_yaml_file(self.users_path) or dict(), stat
+        return self.users
+
+    def get(self, name: str) -> Optional[User]:
+        """
+        Get a User object instance.
+
+        Args:
+            name (str): The username.
+
+        Returns:
+            Optional[User]: The corresponding User object instance, ``None`` if the user does not exist.
+        """
+        users = self.load()
+        if users is None or name not in users.keys():
+            return None
+        return User(name=name, status=users[name])
+
+
+_user_registries = dict()
+
+
+def get_user_registry(users_path: Optional[str] = None) -> UserRegistry:
+    """
+    Get the user registry of a users file, cached per process.
+
+    Args:
+        users_path (str, optional): The path to the users file, defaults to the database users file.
+
+    Returns:
+        UserRegistry: The user registry.
+    """
+    users_path = os.path.abspath(users_path or os.path.join(DATABASE_PATH, 'users.yml'))
+    if users_path not in _user_registries:
+        _user_registries[users_path] = UserRegistry(users_path=users_path)
+    return _user_registries[users_path]
 
 
 def get_user_from_file(name: str) -> Optional[User]:
     """
     Get a User object instance from the database.
+    The users file is parsed once and cached until it changes on disk.
 
     Args:
         name (str): The username.
@@ -81,8 +154,7 @@ def get_user_from_file(name: str) -> Optional[User]:
     Returns:
         Optional[User]: The corresponding User object instance
     """
-    users_path = os.path.join(DATABASE_PATH, 'users.yml')
-    users = read_yaml_file(users_path) if os.path.isfile(users_path) else None
+    users = get_user_registry().load()
     if users is None:
         print(f'Error: User {name} does not have edit privileges in the system.\n')
         return None
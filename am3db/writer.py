@@ -0,0 +1,359 @@
+"""
+AM3DB's writer module.
+
+Saves database entries to the shards (or the family journals) of a database folder.
+This module does not depend on ARC/RMG, reactions are only converted to database entries by ``AMReaction``.
+"""
+
+import os
+from typing import TYPE_CHECKING, List, Optional
+
+from am3db.atom_maps import encode_atom_maps, get_atom_maps_format
+from am3db.catalog import notify_shard_written
+from am3db.common import DATABASE_PATH
+from am3db.duplicates import (DUPLICATE_POLICIES,
+                              DuplicateReactionError,
+                              clear_duplicate_indices,
+                              get_duplicate_index,
+                              merge_review_state,
+                              )
+from am3db.instrumentation import count, timed
+from am3db.journal import COMPACTION_THRESHOLD, get_journal, is_journaled
+from am3db.locks import allocate_indices, family_lock, release_indices, shard_lock
+from am3db.manifest import FamilyManifest, determine_family_filename_by_index
+from am3db.sharding import get_shard_budget, is_adaptive, split_oversized_shards, split_shard
+from am3db.storage import get_database_backend, read_shard, save_shard
+
+if TYPE_CHECKING:
+    from am3db.reaction import AMReaction
+
+
+INDEX_BLOCK_SIZE = 100  # The number of reaction IDs a writer reserves at once per family.
+
+
+class DatabaseWriter(object):
+    """
+    A context manager for saving many reactions in the database in one pass.
+    Reactions are grouped by family and shard, reaction IDs are reserved in blocks of ``INDEX_BLOCK_SIZE``
+    per family (see ``am3db.locks.allocate_indices``) and handed out locally,
+    and each touched shard is read once and atomically written once when the context exits.
+    In journal mode, the entries are instead appended to the family journals (see ``am3db.journal``),
+    which are compacted into the shards once they hold ``COMPACTION_THRESHOLD`` entries.
+    Atom maps are written in the format of the ``atom_maps_format`` database setting (see ``am3db.atom_maps``).
+
+    Example::
+
+        with DatabaseWriter() as writer:
+            for rxn in reactions:
+                writer.add(rxn)
+
+    Before a reaction is added, a hash index of the stored reactions of its family is consulted
+    to detect duplicates (see ``am3db.duplicates``), and the ``on_duplicate`` policy is applied:
+        'allow': Save the duplicate under a new reaction ID.
+        'skip': Don't save the reaction, set its ID to that of the stored duplicate.
+        'merge': Merge the review state of the reaction into the stored duplicate.
+        'raise': Raise a DuplicateReactionError.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+        on_duplicate (str, optional): The duplicate policy, 'skip' by default.
+        journal (bool, optional): Whether to append to the family journals instead of writing the shards,
+                                  the ``journal`` database setting is used if not given.
+
+    Attributes:
+        database_path (str): The path to the database folder.
+        on_duplicate (str): The duplicate policy.
+        journal (bool): Whether entries are appended to the family journals.
+        atom_maps_format (str): The format in which atom maps are written, 'list' or 'compact'.
+        backend (StorageBackend): The storage backend of the database.
+        manifests (Dict[str, FamilyManifest]): The manifests of the families touched by this writer.
+        reserved (Dict[str, List[int]]): Keys are family labels, values are the [next, end) reaction IDs
+                                         reserved by this writer and not assigned yet.
+        pending (Dict[Tuple[str, str], dict]): Keys are (family, shard filename) tuples,
+                                               values are the pending reaction entries keyed by reaction ID.
+    """
+
+    def __init__(self,
+                 database_path: Optional[str] = None,
+                 on_duplicate: str = 'skip',
+                 journal: Optional[bool] = None,
+                 ):
+        if on_duplicate not in DUPLICATE_POLICIES:
+            raise ValueError(f'Got an illegal on_duplicate argument "{on_duplicate}", '
+                             f'allowed values are: {DUPLICATE_POLICIES}')
+        self.database_path = database_path or DATABASE_PATH
+        self.on_duplicate = on_duplicate
+        self.journal = journal if journal is not None else is_journaled(self.database_path)
+        self.atom_maps_format = get_atom_maps_format(self.database_path)
+        self.backend = get_database_backend(self.database_path)
+        self.manifests = dict()
+        self.reserved = dict()
+        self.pending = dict()
+
+    def __enter__(self) -> 'DatabaseWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.release_indices()
+            if self.on_duplicate != 'allow':
+                clear_duplicate_indices()  # The indices may hold entries that were never written.
+
+    def get_manifest(self, family: str) -> FamilyManifest:
+        """
+        Get the manifest of a family, loading it on first usage.
+
+        Args:
+            family (str): The reaction family label.
+
+        Returns:
+            FamilyManifest: The family manifest.
+        """
+        if family not in self.manifests:
+            self.manifests[family] = FamilyManifest(family=family, database_path=self.database_path).load()
+        return self.manifests[family]
+
+    def add(self, reaction: 'AMReaction') -> Optional[int]:
+        """
+        Add a reaction to be written to the database, assigning it a reaction ID if it doesn't have one.
+
+        Args:
+            reaction (AMReaction): The reaction to save.
+
+        Returns:
+            Optional[int]: The reaction ID, ``None`` if the reaction cannot be saved.
+        """
+        if reaction.family is None:
+            print('Error: Cannot save a reaction without identifying its family.')
+            return None
+        return self.add_entry(family=reaction.family.label,
+                              entry=reaction.as_db_dict(),
+                              reaction=reaction,
+                              own_reverse=bool(reaction.family_own_reverse))
+
+    def add_entry(self,
+                  family: str,
+                  entry: dict,
+                  index: Optional[int] = None,
+                  reaction: Optional['AMReaction'] = None,
+                  own_reverse: bool = False,
+                  ) -> int:
+        """
+        Add an already computed database entry to be written to the database.
+
+        Args:
+            family (str): The reaction family label.
+            entry (dict): The database entry, as generated by ``AMReaction.as_db_dict()``.
+            index (int, optional): The reaction ID, assigned from the family manifest if not given.
+            reaction (AMReaction, optional): The corresponding reaction, its ID and database path are set.
+            own_reverse (bool, optional): Whether the family is its own reverse, used for detecting duplicates.
+
+        Returns:
+            int: The reaction ID.
+        """
+        manifest = self.get_manifest(family)
+        if index is None and reaction is not None:
+            index = reaction._index
+        if self.on_duplicate != 'allow':
+            duplicate_index = get_duplicate_index(manifest)
+            stored_index = duplicate_index.find(entry, own_reverse=own_reverse)
+            if stored_index is not None and stored_index != index:
+                count('writer.duplicates')
+                if self.on_duplicate == 'raise':
+                    raise DuplicateReactionError(f'The reaction already exists in the {family} family '
+                                                 f'as reaction {stored_index}.')
+                if self.on_duplicate == 'skip':
+                    if reaction is not None:
+                        reaction.index = stored_index
+                        reaction.database_path = self.database_path
+                    return stored_index
+                entry = merge_review_state(stored_entry=self.get_entry(family, stored_index), new_entry=entry)
+                index = stored_index
+        next_index = max(manifest.next_index, get_journal(family, database_path=self.database_path).next_index)
+        if index is None:
+            index = self.reserve_index(family, minimum=next_index)
+        elif index >= next_index:
+            allocate_indices(family, count=0, minimum=index + 1, database_path=self.database_path)
+            if family in self.reserved and self.reserved[family][0] <= index:
+                self.reserved[family][0] = index + 1
+        if self.on_duplicate != 'allow':
+            duplicate_index.add(index=index, entry=entry)
+        manifest.next_index = max(manifest.next_index, index + 1)
+        if reaction is not None:
+            reaction.index = index
+            reaction.database_path = self.database_path
+        if entry.get('atom_maps') is not None:
+            entry = dict(entry, atom_maps=encode_atom_maps(entry['atom_maps'], self.atom_maps_format))
+        shard = determine_family_filename_by_index(index=index, family=family, extension=self.backend.extension,
+                                                   database_path=self.database_path)
+        self.pending.setdefault((family, shard), dict())[index] = entry
+        count('writer.entries')
+        return index
+
+    def reserve_index(self,
+                      family: str,
+                      minimum: int = 0,
+                      ) -> int:
+        """
+        Assign the next reaction ID reserved by this writer for a family,
+        reserving a new block of IDs if the reserved IDs were used up.
+
+        Args:
+            family (str): The reaction family label.
+            minimum (int, optional): The smallest assignable ID, e.g., the next free ID according to the manifest.
+
+        Returns:
+            int: The reaction ID.
+        """
+        block = self.reserved.get(family)
+        if block is None or block[0] >= block[1] or block[0] < minimum:
+            if block is not None:
+                release_indices(family, first=block[0], end=block[1], database_path=self.database_path)
+            first = allocate_indices(family, count=INDEX_BLOCK_SIZE, minimum=minimum, database_path=self.database_path)
+            block = self.reserved[family] = [first, first + INDEX_BLOCK_SIZE]
+        block[0] += 1
+        return block[0] - 1
+
+    def release_indices(self):
+        """
+        Return the reserved reaction IDs which were not assigned, so that the IDs of a family stay consecutive
+        unless other writers reserved IDs in the meantime.
+        """
+        for family, (first, end) in self.reserved.items():
+            if first < end:
+                release_indices(family, first=first, end=end, database_path=self.database_path)
+        self.reserved = dict()
+
+    def get_entry(self,
+                  family: str,
+                  index: int,
+                  ) -> dict:
+        """
+        Get a database entry, either pending in this writer, journaled, or stored in the database.
+
+        Args:
+            family (str): The reaction family label.
+            index (int): The reaction ID.
+
+        Returns:
+            dict: The database entry, an empty dictionary if it does not exist.
+        """
+        for (pending_family, _), pending in self.pending.items():
+            if pending_family == family and index in pending:
+                return pending[index]
+        shard = determine_family_filename_by_index(index=index, family=family, extension=self.backend.extension,
+                                                   database_path=self.database_path)
+        journal = get_journal(family, database_path=self.database_path)
+        if index in journal.entries:
+            return journal.entries[index]
+        return read_shard(os.path.join(self.get_manifest(family).reactions_path, shard)).get(index, dict())
+
+    @timed('writer.flush')
+    def flush(self):
+        """
+        Write all pending entries to the database, each touched shard is written once.
+        Each family is locked while its manifest is reloaded, its shards are updated, and the manifest is saved,
+        and each shard is locked while it is read, updated, and atomically replaced,
+        so entries written by concurrent writers are preserved.
+        Pending entries are assigned to shards again under the family lock, in case another process split
+        or merged shards since they were added, and shards exceeding the shard budget are split
+        (see ``am3db.sharding``).
+        """
+        self.release_indices()
+        if not len(self.pending):
+            return
+        if self.journal:
+            self.flush_to_journals()
+            return
+        set_up_folders(self.database_path)
+        max_records, max_bytes = get_shard_budget(self.database_path)
+        for family in sorted(set(family for family, _ in self.pending.keys())):
+            with family_lock(family, database_path=self.database_path):
+                manifest = FamilyManifest(family=family, database_path=self.database_path).load(save_rebuilt=True)
+                shard_entries = dict()
+                for (pending_family, _), entries in sorted(self.pending.items()):
+                    if pending_family == family:
+                        for index, entry in entries.items():
+                            shard = determine_family_filename_by_index(index=index, family=family,
+                                                                       extension=self.backend.extension,
+                                                                       database_path=self.database_path)
+                            shard_entries.setdefault(shard, dict())[index] = entry
+                manifest.next_index = max(manifest.next_index, self.get_manifest(family).next_index)
+                duplicate_index, in_sync = None, False
+                if self.on_duplicate != 'allow':
+                    # If another writer changed the family since it was indexed, the index is rebuilt on next usage.
+                    duplicate_index = get_duplicate_index(self.manifests[family])
+                    in_sync = duplicate_index.is_in_sync(manifest)
+                for shard in sorted(shard_entries.keys()):
+                    with shard_lock(shard, database_path=self.database_path):
+                        shard_path = os.path.join(manifest.reactions_path, shard)
+                        content = read_shard(shard_path)
+                        content.update(shard_entries[shard])
+                        save_shard(shard_path, content)
+                        notify_shard_written(manifest.reactions_path, shard)
+                        manifest.update_shard(shard=shard, count=len(content))
+                        split_shard(manifest, shard, content, max_records=max_records, max_bytes=max_bytes)
+                manifest.save()
+                self.manifests[family] = manifest
+                if in_sync:
+                    duplicate_index.synchronize(manifest)
+        self.pending = dict()
+
+    def flush_to_journals(self):
+        """
+        Append all pending entries to the family journals, one write per family,
+        and compact the journals which reached the compaction threshold.
+        """
+        for family in sorted(set(family for family, _ in self.pending.keys())):
+            entries = dict()
+            for (shard_family, _), shard_entries in sorted(self.pending.items()):
+                if shard_family == family:
+                    entries.update(shard_entries)
+            journal = get_journal(family, database_path=self.database_path)
+            duplicate_index = get_duplicate_index(self.manifests[family]) if self.on_duplicate != 'allow' else None
+            with journal.lock():
+                # If another writer appended since the family was indexed, the index is rebuilt on next usage.
+                in_sync = duplicate_index is not None and duplicate_index.is_in_sync(self.manifests[family])
+                journal.append(entries)
+                if in_sync:
+                    duplicate_index.synchronize(self.manifests[family])
+            if len(journal) >= COMPACTION_THRESHOLD:
+                journal.compact()
+                if is_adaptive(self.database_path):
+                    split_oversized_shards(family, database_path=self.database_path)
+                self.manifests[family] = FamilyManifest(family=family, database_path=self.database_path).load()
+        self.pending = dict()
+
+
+def save_many(reactions: List['AMReaction'],
+              database_path: Optional[str] = None,
+              on_duplicate: str = 'skip',
+              ) -> List[Optional[int]]:
+    """
+    Save many reactions in the database, writing each touched shard once.
+
+    Args:
+        reactions (List[AMReaction]): The reactions to save.
+        database_path (str, optional): The path to the database folder.
+        on_duplicate (str, optional): The duplicate policy, see ``DatabaseWriter``.
+
+    Returns:
+        List[Optional[int]]: The reaction IDs, ``None`` entries correspond to reactions that were not saved.
+    """
+    with DatabaseWriter(database_path=database_path, on_duplicate=on_duplicate) as writer:
+        indices = [writer.add(reaction) for reaction in reactions]
+    return indices
+
+
+def set_up_folders(database_path: Optional[str] = None):
+    """
+    Set up the database folders upon first usage.
+
+    Args:
+        database_path (str, optional): The path to the database folder.
+    """
+    reactions_path = os.path.join(database_path or DATABASE_PATH, 'reactions')
+    if not os.path.isdir(reactions_path):
+        os.makedirs(reactions_path)
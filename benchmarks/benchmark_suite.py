@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB benchmark suite
+
+Times the hot paths of saving, loading and indexing reactions on a synthetic database,
+and optionally compares the timings with a stored baseline.
+Run as: python benchmarks/benchmark_suite.py [--families 2] [--reactions 500] [--shard-size 500] [--atoms 20]
+                                             [--backend yaml] [--repeat 3] [--output results.json]
+                                             [--baseline baseline.json] [--tolerance 0.25]
+The exit code is 1 if a benchmark regressed by more than the tolerance relative to the baseline.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage_benchmark import generate_entry  # noqa: E402
+
+from am3db import manifest as manifest_module  # noqa: E402
+from am3db.common import VERSION, get_git_commit, save_yaml_file  # noqa: E402
+from am3db.journal import get_journal  # noqa: E402
+from am3db.manifest import FamilyManifest, determine_family_filename_by_index, get_all_family_files  # noqa: E402
+from am3db.query import ReactionDB  # noqa: E402
+from am3db.server import ReviewService, simulate_reviewers  # noqa: E402
+from am3db.snapshot import Snapshot, export_snapshot  # noqa: E402
+from am3db.storage import BACKENDS, get_database_backend, save_shard, set_database_backend  # noqa: E402
+from am3db.user import UserRegistry  # noqa: E402
+from am3db.writer import DatabaseWriter  # noqa: E402
+
+
+def generate_database(database_path: str,
+                      families: int,
+                      reactions: int,
+                      atoms: int,
+                      users: int,
+                      backend: str = 'yaml',
+                      ) -> list:
+    """Generate a synthetic database, return the family labels."""
+    labels = [f'family_{i}' for i in range(families)]
+    reactions_path = os.path.join(database_path, 'reactions')
+    os.makedirs(reactions_path, exist_ok=True)
+    set_database_backend(backend, database_path=database_path)
+    extension = get_database_backend(database_path).extension
+    for label in labels:
+        shards = dict()
+        for index in range(reactions):
+            shard = determine_family_filename_by_index(index=index, family=label, extension=extension)
+            shards.setdefault(shard, dict())[index] = generate_entry(atoms)
+        for shard, content in shards.items():
+            save_shard(os.path.join(reactions_path, shard), content)
+        FamilyManifest(family=label, database_path=database_path).load()  # Build the manifest.
+    save_yaml_file(path=os.path.join(database_path, 'users.yml'),
+                   content={f'user_{i}': 'student' for i in range(users)})
+    return labels
+
+
+def time_it(function, repeat: int) -> dict:
+    """Return the best and median wall times in seconds of calling a function."""
+    times = list()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - t0)
+    return {'best_s': min(times), 'median_s': statistics.median(times), 'repeat': repeat}
+
+
+def resolve_index(family: str, database_path: str) -> int:
+    """Resolve the next free reaction ID of a family, as ``AMReaction.index`` does for an unsaved reaction."""
+    return max(FamilyManifest(family=family, database_path=database_path).load().next_index,
+               get_journal(family, database_path=database_path).next_index)
+
+
+def save_entry(family: str, database_path: str, atoms: int) -> int:
+    """Save a single computed entry, as ``AMReaction.save()`` does after ``as_db_dict()``."""
+    with DatabaseWriter(database_path=database_path, on_duplicate='allow') as writer:
+        return writer.add_entry(family=family, entry=generate_entry(atoms))
+
+
+def load_family(family: str, database_path: str) -> int:
+    """Load all entries of a family."""
+    return sum(1 for _ in ReactionDB(database_path=database_path).query(family=family))
+
+
+def load_snapshot_family(family: str, snapshot_path: str) -> int:
+    """Open a snapshot and sum the reactant coordinates of all reactions of a family."""
+    with Snapshot(snapshot_path) as snapshot:
+        return sum(1 for record in snapshot.records(family=family) if record.r_coords.sum() is not None)
+
+
+def load_records(family: str, database_path: str) -> int:
+    """Load the records of a family and read their review state and atom maps."""
+    return sum(1 for record in ReactionDB(database_path=database_path).records(family=family)
+               if record.approved or len(record.atom_maps) >= 0)
+
+
+def review_concurrently(family: str, database_path: str, names: list) -> dict:
+    """Let every user review a pending reaction of a family concurrently through an in-process review service."""
+    async def run():
+        service = ReviewService(database_path=database_path)
+        summary = await simulate_reviewers(service, names=names, family=family)
+        await service.close()
+        return summary
+    return asyncio.run(run())
+
+
+def make_reaction():
+    """Construct a small AMReaction, ``None`` if ARC is not available."""
+    try:
+        from arc.species import ARCSpecies
+        from am3db.reaction import AMReaction
+    except ImportError:
+        return None
+    return AMReaction(r_species=[ARCSpecies(label='CH4', smiles='C'), ARCSpecies(label='OH', smiles='[OH]')],
+                      p_species=[ARCSpecies(label='CH3', smiles='[CH3]'), ARCSpecies(label='H2O', smiles='O')])
+
+
+def run_benchmarks(args) -> dict:
+    """Generate the synthetic database and run all benchmarks."""
+    random.seed(args.seed)
+    manifest_module.MAX_RXNS_PER_FILE = args.shard_size
+    folder = tempfile.mkdtemp()
+    database_path = os.path.join(folder, 'database')
+    results = dict()
+    try:
+        t0 = time.perf_counter()
+        labels = generate_database(database_path, families=args.families, reactions=args.reactions,
+                                   atoms=args.atoms, users=args.users, backend=args.backend)
+        generation_time = time.perf_counter() - t0
+        family = labels[0]
+        reactions_path = os.path.join(database_path, 'reactions')
+        registry = UserRegistry(users_path=os.path.join(database_path, 'users.yml'))
+        names = [f'user_{i}' for i in range(args.users)]
+
+        results['index'] = time_it(lambda: resolve_index(family, database_path), args.repeat)
+        results['get_all_family_files'] = \
+            time_it(lambda: get_all_family_files(family, reactions_path=reactions_path), args.repeat)
+        results['load_family'] = time_it(lambda: load_family(family, database_path), args.repeat)
+        results['load_records'] = time_it(lambda: load_records(family, database_path), args.repeat)
+        results['user_lookup_cold'] = time_it(lambda: UserRegistry(users_path=registry.users_path).get(names[-1]),
+                                              args.repeat)
+        results['user_lookups'] = time_it(lambda: [registry.get(name) for name in names], args.repeat)
+        results['review_server'] = time_it(lambda: review_concurrently(family, database_path, names), args.repeat)
+        results['save'] = time_it(lambda: save_entry(family, database_path, args.atoms), args.repeat)
+
+        snapshot_path = os.path.join(folder, 'am3db.snapshot')
+        results['snapshot_export'] = time_it(lambda: export_snapshot(snapshot_path, database_path=database_path),
+                                             args.repeat)
+        results['snapshot_open'] = time_it(lambda: Snapshot(snapshot_path).close(), args.repeat)
+        results['snapshot_load_family'] = time_it(lambda: load_snapshot_family(family, snapshot_path), args.repeat)
+
+        reaction = make_reaction()
+        if reaction is None:
+            results['as_db_dict'] = {'skipped': 'ARC is not available.'}
+        else:
+            results['as_db_dict'] = time_it(reaction.as_db_dict, args.repeat)
+    finally:
+        shutil.rmtree(folder)
+    return {'version': VERSION,
+            'commit': get_git_commit()[0],
+            'python': platform.python_version(),
+            'parameters': {'families': args.families, 'reactions': args.reactions, 'shard_size': args.shard_size,
+                           'atoms': args.atoms, 'users': args.users, 'backend': args.backend,
+                           'repeat': args.repeat, 'seed': args.seed},
+            'generation_s': generation_time,
+            'results': results}
+
+
+def compare(results: dict,
+            baseline: dict,
+            tolerance: float,
+            ) -> dict:
+    """Compare the best times of the results with a baseline, return the ratios and the regressions."""
+    comparison = dict()
+    for name, result in results['results'].items():
+        reference = baseline.get('results', dict()).get(name, dict())
+        if 'best_s' not in result or not reference.get('best_s'):
+            continue
+        ratio = result['best_s'] / reference['best_s']
+        comparison[name] = {'baseline_s': reference['best_s'], 'ratio': ratio, 'regression': ratio > 1 + tolerance}
+    if baseline.get('parameters') != results['parameters']:
+        print('Warning: The baseline was measured with other parameters.', file=sys.stderr)
+    return comparison
+
+
+def main():
+    """Run the benchmark suite, print the results as JSON and compare them with a baseline."""
+    parser = argparse.ArgumentParser(description='Benchmark the AM3DB save, load and index paths.')
+    parser.add_argument('--families', type=int, default=2, help='The number of families.')
+    parser.add_argument('--reactions', type=int, default=500, help='The number of reactions per family.')
+    parser.add_argument('--shard-size', type=int, default=manifest_module.MAX_RXNS_PER_FILE,
+                        help='The number of reactions per shard (MAX_RXNS_PER_FILE).')
+    parser.add_argument('--atoms', type=int, default=20, help='The number of atoms per reaction.')
+    parser.add_argument('--backend', type=str, default='yaml', choices=list(BACKENDS.keys()),
+                        help='The storage backend of the synthetic database.')
+    parser.add_argument('--users', type=int, default=100, help='The number of users.')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of repetitions per measurement.')
+    parser.add_argument('--seed', type=int, default=0, help='The random seed of the synthetic database.')
+    parser.add_argument('--output', type=str, default=None, help='A path to save the results as JSON.')
+    parser.add_argument('--baseline', type=str, default=None, help='A path to baseline results to compare with.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='The allowed relative slowdown compared with the baseline.')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+    regressed = False
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            results['comparison'] = compare(results, json.load(f), tolerance=args.tolerance)
+        regressed = any(result['regression'] for result in results['comparison'].values())
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
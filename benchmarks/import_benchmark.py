@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB import benchmark
+
+Measures the time it takes a fresh interpreter to import each AM3DB module,
+and whether the import pulls in ARC or RMG.
+Run as: python benchmarks/import_benchmark.py [--repeat 3] [modules ...]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+AM3DB_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['am3db.query', 'am3db.user', 'am3db.review', 'am3db.logger', 'am3db.writer', 'am3db.geometry',
+           'am3db.sqlite_database', 'am3db.reaction', 'am3db.ingestion']
+
+IMPORT_CODE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - t0,
+                   'arc': any(name.split('.')[0] in ('arc', 'rmgpy') for name in sys.modules)}}))
+"""
+
+
+def time_import(module: str, repeat: int) -> dict:
+    """Import a module in fresh interpreters, return the best import time and whether ARC/RMG got imported."""
+    best, arc, error = None, False, None
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', IMPORT_CODE.format(module=module)],
+                                cwd=AM3DB_PATH, capture_output=True, text=True)
+        if output.returncode:
+            error = output.stderr.strip().splitlines()[-1] if output.stderr.strip() else 'failed'
+            break
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        best = result['seconds'] if best is None else min(best, result['seconds'])
+        arc = result['arc']
+    return {'module': module, 'seconds': best, 'imports_arc': arc, 'error': error}
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmark the import time of AM3DB modules.')
+    parser.add_argument('modules', nargs='*', default=MODULES, help='The modules to import.')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of fresh interpreters per module.')
+    args = parser.parse_args()
+    print(json.dumps([time_import(module, args.repeat) for module in args.modules], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB storage benchmark
+
+Compares loading and saving a synthetic shard with every storage backend.
+Run as: python benchmarks/storage_benchmark.py [--reactions 500] [--atoms 20] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from am3db.storage import BACKENDS  # noqa: E402
+
+
+def generate_xyz(num_atoms: int) -> dict:
+    """Generate a random ARC xyz dictionary."""
+    symbols = tuple(random.choice(['C', 'H', 'O', 'N']) for _ in range(num_atoms))
+    isotopes = tuple({'C': 12, 'H': 1, 'O': 16, 'N': 14}[symbol] for symbol in symbols)
+    coords = tuple(tuple(random.uniform(-3, 3) for _ in range(3)) for _ in range(num_atoms))
+    return {'symbols': symbols, 'isotopes': isotopes, 'coords': coords}
+
+
+def generate_adjacency_list(num_atoms: int) -> str:
+    """Generate a synthetic adjacency list."""
+    return ''.join(f'{i + 1} C u0 p0 c0 {{{i + 2 if i + 1 < num_atoms else 1},S}}\n' for i in range(num_atoms))
+
+
+def generate_entry(num_atoms: int) -> dict:
+    """Generate a synthetic database entry resembling the output of AMReaction.as_db_dict()."""
+    half = num_atoms // 2
+    atom_map = list(range(num_atoms))
+    random.shuffle(atom_map)
+    return {'multiplicity': 2,
+            'charge': 0,
+            'r_inchi_keys': ['TUJKJAMUKRIRHC-UHFFFAOYSA-N', 'QUSNBJAOOMFDIB-UHFFFAOYSA-N'],
+            'p_inchi_keys': ['XLYOFNOQVPJJNP-UHFFFAOYSA-N', 'RZRWAZWNUOVMAY-UHFFFAOYSA-N'],
+            'r_adjacency_lists': [[generate_adjacency_list(half)], [generate_adjacency_list(num_atoms - half)]],
+            'p_adjacency_lists': [[generate_adjacency_list(half)], [generate_adjacency_list(num_atoms - half)]],
+            'r_xyz': [generate_xyz(half), generate_xyz(num_atoms - half)],
+            'p_xyz': [generate_xyz(half), generate_xyz(num_atoms - half)],
+            'r_rmg_labels': {'*1': 2, '*2': 11, '*3': 0},
+            'p_rmg_labels': {'*1': 3, '*2': 1, '*3': 0},
+            'atom_maps': [atom_map],
+            'clustering': [],
+            'approved_by': None,
+            'rejected_by': None,
+            'rejected_reasons': [],
+            }
+
+
+def time_it(function, repeat: int) -> float:
+    """Return the best wall time in seconds of calling a function."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    """Run the storage benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description='Benchmark the AM3DB storage backends.')
+    parser.add_argument('--reactions', type=int, default=500, help='The number of reactions in the shard.')
+    parser.add_argument('--atoms', type=int, default=20, help='The number of atoms per reaction.')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of repetitions per measurement.')
+    args = parser.parse_args()
+
+    random.seed(0)
+    content = {index: generate_entry(args.atoms) for index in range(args.reactions)}
+    results = dict()
+    folder = tempfile.mkdtemp()
+    try:
+        for name, backend in BACKENDS.items():
+            path = os.path.join(folder, f'fam_0{backend.extension}')
+            save_time = time_it(lambda: backend.write(path, content), args.repeat)
+            load_time = time_it(lambda: backend.read(path), args.repeat)
+            assert backend.read(path) == content, f'The {name} backend did not round-trip the shard.'
+            results[name] = {'save_s': save_time, 'load_s': load_time, 'size_bytes': os.path.getsize(path)}
+    finally:
+        shutil.rmtree(folder)
+    for name, result in results.items():
+        if name != 'yaml':
+            result['load_speedup'] = results['yaml']['load_s'] / result['load_s']
+            result['save_speedup'] = results['yaml']['save_s'] / result['save_s']
+    print(json.dumps({'reactions': args.reactions, 'atoms': args.atoms, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
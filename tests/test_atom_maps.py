@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_atom_maps module
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from am3db.atom_maps import (AtomMapSet,
+                             combine_symmetries,
+                             decode_atom_maps,
+                             encode_atom_maps,
+                             get_automorphisms,
+                             get_index_dtype,
+                             )
+from am3db.common import AM3DB_PATH
+from am3db.query import ReactionDB
+from am3db.storage import read_shard, set_database_setting
+from am3db.writer import DatabaseWriter
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'atom_maps_db')
+
+
+def test_list_round_trip():
+    """Test converting atom maps to and from the database list format."""
+    atom_maps = [[0, 1, 3, 4, 5, 2], [0, 1, 3, 5, 4, 2]]
+    atom_map_set = AtomMapSet.from_list(atom_maps)
+    assert len(atom_map_set) == 2
+    assert atom_map_set.num_atoms == 6
+    assert atom_map_set.maps.dtype == np.uint8
+    assert atom_map_set.to_list() == atom_maps
+    assert AtomMapSet.from_list([0, 2, 1]).to_list() == [[0, 2, 1]]
+    assert len(AtomMapSet.from_list(None)) == 0
+
+
+def test_invalid_atom_maps():
+    """Test that invalid atom maps are rejected."""
+    with pytest.raises(ValueError):
+        AtomMapSet([[0, 3, 1]])
+    with pytest.raises(ValueError):
+        AtomMapSet([0, 1, 2])
+
+
+def test_compact_round_trip():
+    """Test the compact serialization."""
+    atom_map_set = AtomMapSet.from_list([[0, 2, 1], [1, 0, 2]])
+    compact = atom_map_set.to_compact()
+    assert compact.startswith('2x3:')
+    assert AtomMapSet.from_compact(compact) == atom_map_set
+    large = AtomMapSet(np.arange(300)[np.newaxis, ::-1])
+    assert large.maps.dtype == np.uint16
+    assert AtomMapSet.from_compact(large.to_compact()) == large
+    assert decode_atom_maps(compact) == atom_map_set
+    assert decode_atom_maps([[0, 2, 1], [1, 0, 2]]) == atom_map_set
+
+
+def test_get_index_dtype():
+    """Test the get_index_dtype() function."""
+    assert get_index_dtype(10) == np.uint8
+    assert get_index_dtype(256) == np.uint8
+    assert get_index_dtype(257) == np.uint16
+    assert get_index_dtype(70000) == np.uint32
+
+
+def test_deduplicate():
+    """Test removing repeated atom maps."""
+    atom_map_set = AtomMapSet.from_list([[0, 2, 1], [1, 0, 2], [0, 2, 1], [2, 1, 0]])
+    assert atom_map_set.deduplicate().to_list() == [[0, 2, 1], [1, 0, 2], [2, 1, 0]]
+
+
+def test_inverse():
+    """Test inverting atom maps."""
+    atom_map_set = AtomMapSet.from_list([[1, 2, 0], [0, 1, 2]])
+    assert atom_map_set.inverse().to_list() == [[2, 0, 1], [0, 1, 2]]
+    assert atom_map_set.inverse().inverse() == atom_map_set
+
+
+def test_compose():
+    """Test composing atom maps with permutations."""
+    atom_map_set = AtomMapSet.from_list([[1, 2, 0]])
+    assert atom_map_set.compose(product_permutation=[2, 0, 1]).to_list() == [[0, 1, 2]]
+    assert atom_map_set.compose(reactant_permutation=[2, 0, 1]).to_list() == [[0, 1, 2]]
+    assert atom_map_set.compose(product_permutation=[0, 1, 2], reactant_permutation=[0, 1, 2]) == atom_map_set
+
+
+def test_cluster():
+    """Test grouping symmetry-equivalent atom maps."""
+    atom_map_set = AtomMapSet.from_list([[0, 2, 1], [0, 1, 2], [1, 0, 2], [0, 2, 1]])
+    assert atom_map_set.cluster() == [[0, 3], [1], [2]]
+    # Product atoms 1 and 2 are equivalent (e.g., the two H atoms of H2O).
+    assert atom_map_set.cluster(product_symmetries=[[0, 1, 2], [0, 2, 1]]) == [[0, 1, 3], [2]]
+    # Reactant atoms 0 and 1 are also equivalent.
+    assert atom_map_set.cluster(reactant_symmetries=[[0, 1, 2], [1, 0, 2]],
+                                product_symmetries=[[0, 1, 2], [0, 2, 1]]) == [[0, 1, 2, 3]]
+    assert AtomMapSet.from_list([]).cluster() == []
+
+
+def test_encode_atom_maps():
+    """Test encoding atom maps in the list and compact formats."""
+    compact = AtomMapSet.from_list([[0, 1], [1, 0]]).to_compact()
+    assert encode_atom_maps([[0, 1], [1, 0]], 'compact') == compact
+    assert encode_atom_maps(compact, 'list') == [[0, 1], [1, 0]]
+    assert encode_atom_maps([0, 1]) == [[0, 1]]
+    assert encode_atom_maps([[0, 1], [1]], 'compact') == [[0, 1], [1]]  # Ragged atom maps are kept as is.
+    assert encode_atom_maps(None, 'compact') is None
+    with pytest.raises(ValueError):
+        encode_atom_maps([[0]], 'binary')
+
+
+def test_get_automorphisms():
+    """Test enumerating the automorphisms of molecular graphs."""
+    # H2O: O0 bonded to H1 and H2.
+    bonds = {(0, 1): 1, (1, 0): 1, (0, 2): 1, (2, 0): 1}
+    assert get_automorphisms(['O', 'H', 'H'], bonds) == [[0, 1, 2], [0, 2, 1]]
+    # Ethane: 3! permutations of the H atoms on each C atom, times swapping the methyl groups.
+    bonds = {(0, 1): 1, (1, 0): 1}
+    for carbon, hydrogens in [(0, (2, 3, 4)), (1, (5, 6, 7))]:
+        for hydrogen in hydrogens:
+            bonds[(carbon, hydrogen)] = bonds[(hydrogen, carbon)] = 1
+    automorphisms = get_automorphisms(['C', 'C'] + ['H'] * 6, bonds)
+    assert len(automorphisms) == 72
+    assert [1, 0, 5, 6, 7, 2, 3, 4] in automorphisms
+    assert get_automorphisms(['C', 'C'] + ['H'] * 6, bonds, max_count=10) is None
+    # Bond labels are respected: O=C-O has no symmetry, O-C-O has.
+    assert get_automorphisms(['C', 'O', 'O'], {(0, 1): 2, (1, 0): 2, (0, 2): 1, (2, 0): 1}) == [[0, 1, 2]]
+
+
+def test_combine_symmetries():
+    """Test combining the symmetries of the species on one side of a reaction."""
+    assert combine_symmetries([[[0, 1], [1, 0]], None, [[0, 1], [1, 0]]], sizes=[2, 1, 2]) == \
+        [[0, 1, 2, 3, 4], [0, 1, 2, 4, 3], [1, 0, 2, 3, 4], [1, 0, 2, 4, 3]]
+    assert combine_symmetries([[[0, 1], [1, 0]], [[0, 1], [1, 0]]], sizes=[2, 2], max_count=2) == \
+        [[0, 1, 2, 3], [1, 0, 2, 3]]
+
+
+def test_compact_storage():
+    """Test writing atom maps in the compact format according to the database setting."""
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
+    os.makedirs(TEST_DATABASE_PATH)
+    set_database_setting('atom_maps_format', 'compact', database_path=TEST_DATABASE_PATH)
+    with DatabaseWriter(database_path=TEST_DATABASE_PATH, on_duplicate='allow') as writer:
+        writer.add_entry(family='fam', entry={'r_inchi_keys': ['A'], 'p_inchi_keys': ['B'],
+                                              'atom_maps': [[0, 2, 1], [1, 0, 2]]})
+        writer.add_entry(family='fam', entry={'r_inchi_keys': ['A'], 'p_inchi_keys': ['C'],
+                                              'atom_maps': [[0, 2, 1], [1]]})
+    content = read_shard(os.path.join(TEST_DATABASE_PATH, 'reactions', 'fam_0.yml'))
+    assert content[0]['atom_maps'] == AtomMapSet.from_list([[0, 2, 1], [1, 0, 2]]).to_compact()
+    assert content[1]['atom_maps'] == [[0, 2, 1], [1]]
+    record = ReactionDB(database_path=TEST_DATABASE_PATH).get_record('fam', 0)
+    assert record.atom_maps.to_list() == [[0, 2, 1], [1, 0, 2]]
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_catalog module
+"""
+
+import os
+import shutil
+
+from am3db import catalog
+from am3db.common import AM3DB_PATH, save_yaml_file
+from am3db.manifest import get_all_family_files
+from am3db.query import ReactionDB
+from am3db.writer import DatabaseWriter
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'catalog_db')
+REACTIONS_PATH = os.path.join(TEST_DATABASE_PATH, 'reactions')
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    os.makedirs(REACTIONS_PATH, exist_ok=True)
+    for shard in ['R_Addition_0.yml', 'R_Addition_10.yml', 'R_Addition_2.yml', 'R_Addition_MultipleBond_0.yml']:
+        save_yaml_file(path=os.path.join(REACTIONS_PATH, shard), content={0: {'charge': 0}})
+    for file_name in ['R_Addition_0.yml.123.tmp', 'R_Addition_0_back.yml', 'notes.txt']:
+        with open(os.path.join(REACTIONS_PATH, file_name), 'w') as f:
+            f.write('')
+
+
+def test_parse_shard_filename():
+    """Test parsing shard filenames."""
+    assert catalog.parse_shard_filename('R_Addition_MultipleBond_12.yml') == ('R_Addition_MultipleBond', 12)
+    assert catalog.parse_shard_filename('fam_3.am3') == ('fam', 3)
+    assert catalog.parse_shard_filename('fam_3.am3', extension='.yml') is None
+    assert catalog.parse_shard_filename('fam_0.yml.123.tmp') is None
+    assert catalog.parse_shard_filename('fam_back.yml') is None
+    assert catalog.parse_shard_filename('_0.yml') is None
+
+
+def test_shard_catalog():
+    """Test listing the families and shards of a reactions folder."""
+    shard_catalog = catalog.ShardCatalog(REACTIONS_PATH)
+    assert shard_catalog.get_families() == ['R_Addition', 'R_Addition_MultipleBond']
+    assert shard_catalog.get_shards('R_Addition') == ['R_Addition_0.yml', 'R_Addition_2.yml', 'R_Addition_10.yml']
+    assert shard_catalog.get_shards('R_Addition', extension='.am3') == []
+    assert shard_catalog.get_shards('H_Abstraction') == []
+    assert shard_catalog.find_shard('R_Addition', 1005) == 'R_Addition_2.yml'
+    assert shard_catalog.find_shard('R_Addition', 505) is None
+    assert shard_catalog.find_shard('R_Addition_MultipleBond', 0) == 'R_Addition_MultipleBond_0.yml'
+
+
+def test_catalog_refresh():
+    """Test that the folder is only listed again after it changed."""
+    shard_catalog = catalog.ShardCatalog(REACTIONS_PATH)
+    os.utime(REACTIONS_PATH, ns=(0, 0))  # Not modified recently.
+    shard_catalog.get_shards('R_Addition')
+    shard_catalog.get_shards('R_Addition_MultipleBond')
+    assert shard_catalog.find_shard('R_Addition', 0) == 'R_Addition_0.yml'
+    assert shard_catalog.num_scans == 1
+    shard_catalog.add_shard('R_Addition_1.yml')  # A writer notification.
+    assert shard_catalog.get_shards('R_Addition') == ['R_Addition_0.yml', 'R_Addition_1.yml',
+                                                      'R_Addition_2.yml', 'R_Addition_10.yml']
+    assert shard_catalog.num_scans == 1
+    os.remove(os.path.join(REACTIONS_PATH, 'R_Addition_10.yml'))
+    os.utime(REACTIONS_PATH, ns=(10 ** 9, 10 ** 9))
+    assert shard_catalog.get_shards('R_Addition') == ['R_Addition_0.yml', 'R_Addition_2.yml']
+    assert shard_catalog.num_scans == 2
+    shard_catalog.invalidate()
+    shard_catalog.get_families()
+    assert shard_catalog.num_scans == 3
+
+
+def test_get_all_family_files():
+    """Test that a family label is not matched as a substring of another family label."""
+    assert get_all_family_files('R_Addition', reactions_path=REACTIONS_PATH) == ['R_Addition_0.yml',
+                                                                                 'R_Addition_2.yml']
+    assert get_all_family_files('R_Addition_MultipleBond', reactions_path=REACTIONS_PATH) \
+        == ['R_Addition_MultipleBond_0.yml']
+    assert get_all_family_files('Addition', reactions_path=REACTIONS_PATH) == []
+
+
+def test_writer_notification():
+    """Test that shards written by a DatabaseWriter are visible in the cached catalog."""
+    shard_catalog = catalog.get_catalog(REACTIONS_PATH)
+    assert catalog.get_catalog(REACTIONS_PATH + os.sep) is shard_catalog
+    assert shard_catalog.get_shards('intra_H_migration') == []
+    with DatabaseWriter(database_path=TEST_DATABASE_PATH, on_duplicate='allow') as writer:
+        writer.add_entry(family='intra_H_migration', entry={'charge': 0}, index=600)
+    assert shard_catalog.get_shards('intra_H_migration') == ['intra_H_migration_1.yml']
+    assert ReactionDB(database_path=TEST_DATABASE_PATH).get_families() \
+        == ['R_Addition', 'R_Addition_MultipleBond', 'intra_H_migration']
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
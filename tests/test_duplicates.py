@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_duplicates module
+"""
+
+import os
+import shutil
+
+from am3db import duplicates
+from am3db.common import AM3DB_PATH, save_yaml_file
+from am3db.manifest import FamilyManifest
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'duplicates_index_db')
+
+
+def get_entry(r_inchi_keys, p_inchi_keys, multiplicity=2, charge=0, **kwargs) -> dict:
+    """Generate a minimal database entry."""
+    entry = {'r_inchi_keys': r_inchi_keys, 'p_inchi_keys': p_inchi_keys, 'multiplicity': multiplicity, 'charge': charge}
+    entry.update(kwargs)
+    return entry
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    save_yaml_file(path=os.path.join(TEST_DATABASE_PATH, 'reactions', 'fam_0.yml'),
+                   content={0: get_entry(['A', 'B'], ['C', 'D']), 1: get_entry(['E'], ['F'])})
+
+
+def test_get_reaction_key():
+    """Test the get_reaction_key() function."""
+    assert duplicates.get_reaction_key(get_entry(['B', 'A'], ['C'])) == (('A', 'B'), ('C',), 2, 0)
+    assert duplicates.get_reaction_key(get_entry(['B', 'A'], ['C']), reverse=True) == (('C',), ('A', 'B'), 2, 0)
+    assert duplicates.get_reaction_key(get_entry([], ['C'])) is None
+
+
+def test_duplicate_index():
+    """Test building, querying, and incrementally updating the duplicate index."""
+    duplicates.clear_duplicate_indices()
+    manifest = FamilyManifest(family='fam', database_path=TEST_DATABASE_PATH).load()
+    duplicate_index = duplicates.get_duplicate_index(manifest)
+    assert duplicate_index.is_in_sync(manifest)
+    assert duplicate_index.find(get_entry(['B', 'A'], ['D', 'C'])) == 0
+    assert duplicate_index.find(get_entry(['A', 'B'], ['C', 'D'], multiplicity=1)) is None
+    assert duplicate_index.find(get_entry(['F'], ['E'])) is None
+    assert duplicate_index.find(get_entry(['F'], ['E']), own_reverse=True) == 1
+    duplicate_index.add(index=2, entry=get_entry(['G'], ['H']))
+    assert duplicate_index.find(get_entry(['G'], ['H'])) == 2
+    assert duplicates.get_duplicate_index(manifest) is duplicate_index
+
+    save_yaml_file(path=os.path.join(TEST_DATABASE_PATH, 'reactions', 'fam_1.yml'),
+                   content={500: get_entry(['I'], ['J'])})
+    manifest = FamilyManifest(family='fam', database_path=TEST_DATABASE_PATH).load()
+    assert not duplicate_index.is_in_sync(manifest)
+    duplicate_index = duplicates.get_duplicate_index(manifest)
+    assert duplicate_index.find(get_entry(['I'], ['J'])) == 500
+    assert duplicate_index.find(get_entry(['G'], ['H'])) is None
+
+
+def test_merge_review_state():
+    """Test the merge_review_state() function."""
+    stored = get_entry(['A'], ['B'], approved_by=['u1'], rejected_by=None, rejected_reasons=[])
+    new = get_entry(['A'], ['B'], approved_by=['u1', 'u2'], rejected_by=['u3'], rejected_reasons=['Wrong map'])
+    merged = duplicates.merge_review_state(stored, new)
+    assert merged['approved_by'] == ['u1', 'u2']
+    assert merged['rejected_by'] == ['u3']
+    assert merged['rejected_reasons'] == ['Wrong map']
+    assert stored['approved_by'] == ['u1']
+
+    # Rejections are merged as (reviewer, reason) pairs.
+    stored = get_entry(['A'], ['B'], approved_by=None, rejected_by=['u1', 'u2'], rejected_reasons=['Swapped', 'Wrong'])
+    new = get_entry(['A'], ['B'], approved_by=None, rejected_by=['u2', 'u3', 'u1'],
+                    rejected_reasons=['Wrong', 'Wrong', 'Other'])
+    merged = duplicates.merge_review_state(stored, new)
+    assert merged['approved_by'] is None
+    assert merged['rejected_by'] == ['u1', 'u2', 'u3', 'u1']
+    assert merged['rejected_reasons'] == ['Swapped', 'Wrong', 'Wrong', 'Other']
+
+
+def teardown_module():
+    """
+    Teardown any state that was previously setup with a setup_module method.
+    """
+    if os.path.isdir(TEST_DATABASE_PATH):
+        shutil.rmtree(TEST_DATABASE_PATH)
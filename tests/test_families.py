@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_families module
+"""
+
+from am3db import families
+from am3db.species_cache import SpeciesCache
+
+
+class Molecule(object):
+    """A minimal molecule exposing the identifiers used for the cache keys."""
+
+    def __init__(self, smiles: str, adjacency_list: str):
+        self.smiles = smiles
+        self.adjacency_list = adjacency_list
+
+    def to_smiles(self) -> str:
+        return self.smiles
+
+    def to_adjacency_list(self) -> str:
+        return self.adjacency_list
+
+
+class Species(object):
+    """A minimal species."""
+
+    def __init__(self, smiles: str, multiplicity: int = 1, atom_order: str = ''):
+        self.mol = Molecule(smiles, adjacency_list=f'{smiles} {atom_order}')
+        self.multiplicity = multiplicity
+
+
+class Reaction(object):
+    """A minimal reaction."""
+
+    def __init__(self, r_species: list, p_species: list, multiplicity: int = 2):
+        self.r_species = r_species
+        self.p_species = p_species
+        self.multiplicity = multiplicity
+        self.charge = 0
+        self.family = None
+        self.family_own_reverse = False
+
+
+def test_get_reaction_key():
+    """Test that the reaction key ignores the species and atom order."""
+    cache = SpeciesCache()
+    rxn_1 = Reaction([Species('[OH]', 2), Species('C')], [Species('O'), Species('[CH3]', 2)])
+    rxn_2 = Reaction([Species('C', atom_order='reordered'), Species('[OH]', 2)], [Species('[CH3]', 2), Species('O')])
+    key = families.get_reaction_key(rxn_1, species_cache=cache)
+    assert key == ((('C', 1), ('[OH]', 2)), (('O', 1), ('[CH3]', 2)), 2, 0)
+    assert families.get_reaction_key(rxn_2, species_cache=cache) == key
+    assert families.get_reaction_key(Reaction(rxn_1.p_species, rxn_1.r_species), species_cache=cache) != key
+    assert families.get_reaction_key(Reaction([Species('[CH2]', 3)], [Species('[CH2]', 1)]), species_cache=cache) \
+        != families.get_reaction_key(Reaction([Species('[CH2]', 1)], [Species('[CH2]', 3)]), species_cache=cache)
+    no_mol = Species('O')
+    no_mol.mol = None
+    assert families.get_reaction_key(Reaction([no_mol], [Species('O')]), species_cache=cache) is None
+
+
+def test_family_cache(monkeypatch):
+    """Test that a family is determined once per reaction identity, with the shared RMG database."""
+    calls = list()
+
+    def determine_family(reaction, db=None):
+        calls.append(db)
+        reaction.family, reaction.family_own_reverse = 'H_Abstraction', True
+
+    monkeypatch.setattr('arc.rmgdb.determine_family', determine_family)
+    monkeypatch.setattr(families, '_rmg_database', 'rmgdb')
+    cache = families.FamilyCache(max_size=10)
+    rxn_1 = Reaction([Species('[OH]', 2), Species('C')], [Species('O'), Species('[CH3]', 2)])
+    rxn_2 = Reaction([Species('C'), Species('[OH]', 2)], [Species('[CH3]', 2), Species('O')])
+    cache.determine_family(rxn_1, species_cache=SpeciesCache())
+    cache.determine_family(rxn_2, species_cache=SpeciesCache())
+    assert calls == ['rmgdb']
+    assert (rxn_2.family, rxn_2.family_own_reverse) == ('H_Abstraction', True)
+    assert cache.stats() == {'size': 1, 'max_size': 10, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == 0
+
+
+def test_lru_eviction():
+    """Test the LRU eviction and that results without a key are not cached."""
+    cache = families.FamilyCache(max_size=1)
+    assert cache.get(('a',), lambda: ('A', False)) == ('A', False)
+    assert cache.get(('b',), lambda: (None, False)) == (None, False)
+    assert cache.get(('a',), lambda: ('A2', False)) == ('A2', False)
+    assert cache.get(None, lambda: ('C', False)) == ('C', False)
+    assert len(cache) == 1
+    assert cache.misses == 4
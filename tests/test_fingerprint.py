@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_fingerprint module
+"""
+
+from am3db import fingerprint
+
+
+ENTRY = {'multiplicity': 2,
+         'charge': 0,
+         'r_adjacency_lists': [['multiplicity 2\n1 O u1 p2 c0 {2,S}\n2 H u0 p0 c0 {1,S}\n']],
+         'p_adjacency_lists': [['multiplicity 2\n1 O u1 p2 c0 {2,S}\n2 H u0 p0 c0 {1,S}\n']],
+         'r_xyz': [{'symbols': ('O', 'H'), 'isotopes': (16, 1), 'coords': ((0.0, 0.0, 0.0), (0.0, 0.0, 0.97))}],
+         'p_xyz': [{'symbols': ('O', 'H'), 'isotopes': (16, 1), 'coords': ((0.0, 0.0, 0.0), (0.0, 0.0, 0.98))}],
+         'atom_maps': [[0, 1]],
+         'approved_by': ['user_1'],
+         }
+
+
+def test_compute_fingerprint():
+    """Test that the fingerprint only depends on the inputs of an entry."""
+    value = fingerprint.get_entry_fingerprint(ENTRY)
+    assert len(value) == 64
+    assert fingerprint.get_entry_fingerprint(dict(ENTRY, atom_maps=[[1, 0]], approved_by=None)) == value
+    as_lists = dict(ENTRY, r_xyz=[{'symbols': ['O', 'H'], 'isotopes': [16, 1],
+                                   'coords': [[0.0, 0.0, 0.0], [0.0, 0.0, 0.97]]}])
+    assert fingerprint.get_entry_fingerprint(as_lists) == value  # As loaded from a YAML shard.
+    moved = dict(ENTRY, r_xyz=[dict(ENTRY['r_xyz'][0], coords=((0.0, 0.0, 0.0), (0.0, 0.0, 0.96)))])
+    assert fingerprint.get_entry_fingerprint(moved) != value
+    assert fingerprint.get_entry_fingerprint(dict(ENTRY, charge=1)) != value
+    assert fingerprint.get_entry_fingerprint(ENTRY, version='0.0.0') != value
+
+
+def test_is_stale():
+    """Test detecting stale entries."""
+    assert fingerprint.is_stale(ENTRY)
+    entry = dict(ENTRY, fingerprint=fingerprint.get_entry_fingerprint(ENTRY))
+    assert not fingerprint.is_stale(entry)
+    assert fingerprint.is_stale(entry, version='99.0.0')
+    assert fingerprint.is_stale(dict(entry, p_xyz=ENTRY['r_xyz']))
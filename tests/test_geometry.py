@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_geometry module
+"""
+
+import os
+import shutil
+
+import numpy as np
+
+from am3db import geometry
+from am3db.common import AM3DB_PATH, save_yaml_file
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'geometry_db')
+
+WATER = {'symbols': ('O', 'H', 'H'),
+         'isotopes': (16, 1, 1),
+         'coords': ((0.0, 0.0, 0.1173), (0.0, 0.7572, -0.4692), (0.0, -0.7572, -0.4692))}
+
+
+def rotate(xyz: dict, shift: float = 0.0) -> dict:
+    """Rotate an xyz about the z axis, translate it, and displace its last atom by ``shift``."""
+    rotation = np.array([[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+    coords = np.asarray(xyz['coords']) @ rotation.T + np.array([1.0, 2.0, 3.0])
+    coords[-1, 0] += shift
+    return {'symbols': xyz['symbols'], 'isotopes': xyz['isotopes'],
+            'coords': tuple(tuple(float(c) for c in row) for row in coords)}
+
+
+def reorder(xyz: dict, order: list) -> dict:
+    """Reorder the atoms of an xyz."""
+    return {key: tuple(xyz[key][i] for i in order) for key in ['symbols', 'isotopes', 'coords']}
+
+
+ENTRIES = [('intra_H_migration', 0, {'r_xyz': [WATER], 'p_xyz': [reorder(rotate(WATER), [1, 0, 2])],
+                                     'atom_maps': [[1, 0, 2]]}),
+           ('intra_H_migration', 1, {'r_xyz': [rotate(WATER, shift=0.3)], 'p_xyz': [WATER],
+                                     'atom_maps': [[0, 2, 1]]}),
+           ('H_Abstraction', 0, {'r_xyz': [WATER, {'symbols': ('H',), 'isotopes': (1,), 'coords': ((0.0, 0.0, 0.0),)}],
+                                 'p_xyz': [WATER, {'symbols': ('H',), 'isotopes': (1,), 'coords': ((5.0, 0.0, 0.0),)}],
+                                 'atom_maps': None}),
+           ('intra_H_migration', 2, {'r_xyz': [reorder(WATER, [1, 0, 2])], 'p_xyz': [WATER], 'atom_maps': [[1, 0, 2]]}),
+           ]
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    save_yaml_file(path=os.path.join(TEST_DATABASE_PATH, 'reactions', 'intra_H_migration_0.yml'),
+                   content={index: entry for family, index, entry in ENTRIES if family == 'intra_H_migration'})
+
+
+def test_geometry_store_layout():
+    """Test the contiguous coordinate arrays."""
+    store = geometry.GeometryStore(ENTRIES)
+    assert len(store) == 4
+    assert store.r_offsets.tolist() == [0, 3, 6, 10, 13]
+    assert store.r_coords.shape == (13, 3)
+    assert store.mapped_p_indices[:3].tolist() == [1, 0, 2]
+    assert store.mapped_p_indices[6:10].tolist() == [-1] * 4
+    assert np.allclose(store.get_coords(0), np.asarray(WATER['coords']))
+    assert store.get_coords(2, side='product') is None
+    assert np.allclose(store.get_coords(0, side='product'), np.asarray(rotate(WATER)['coords']))
+
+
+def test_kabsch_rmsd():
+    """Test the batch Kabsch RMSD."""
+    coords = np.asarray(WATER['coords'])
+    batch = np.stack([np.asarray(rotate(WATER)['coords']), np.asarray(rotate(WATER, shift=0.3)['coords'])])
+    rmsds = geometry.kabsch_rmsd(batch, coords)
+    assert rmsds[0] < 1e-6
+    assert 0.05 < rmsds[1] < 0.3
+
+
+def test_search():
+    """Test the nearest geometry search."""
+    store = geometry.GeometryStore(ENTRIES)
+    results = store.search(WATER, k=2)
+    assert [(family, index) for family, index, _ in results] == [('intra_H_migration', 0), ('intra_H_migration', 1)]
+    assert results[0][2] < 1e-6 < results[1][2]
+    # Reaction 2 has the same atoms in another order, it is only matched through its atom-mapped products.
+    assert ('intra_H_migration', 2) not in [(family, index) for family, index, _ in store.search(WATER, k=10)]
+    assert [(family, index) for family, index, _ in store.search(reorder(WATER, [1, 0, 2]), side='product')] \
+        == [('intra_H_migration', 2)]
+    results = store.search(WATER, side='product')
+    assert sorted((family, index) for family, index, _ in results) \
+        == [('intra_H_migration', 0), ('intra_H_migration', 1)]
+    assert all(rmsd < 1e-6 for _, _, rmsd in results)  # Swapping the water H atoms is a rotation.
+    assert store.search({'symbols': ('C',), 'coords': ((0.0, 0.0, 0.0),)}) == []
+    assert [(f, i) for f, i, _ in store.search([WATER, {'symbols': ('H',), 'coords': ((0.0, 0.0, 9.0),)}])] \
+        == [('H_Abstraction', 0)]
+
+
+def test_atom_map_rmsds():
+    """Test the RMSD between the reactants and the atom-mapped products."""
+    rmsds = geometry.GeometryStore(ENTRIES).atom_map_rmsds()
+    assert rmsds[0] < 1e-6  # The products are the rigidly moved reactants, in another atom order.
+    assert rmsds[1] > 1e-3
+    assert np.isnan(rmsds[2])
+    assert rmsds[3] < 1e-6
+
+
+def test_invalid_atom_maps():
+    """Test that reactions with invalid stored atom maps are treated as unmapped."""
+    entries = ENTRIES + [('intra_H_migration', 3, {'r_xyz': [WATER], 'p_xyz': [WATER], 'atom_maps': [[0, 1], [2]]})]
+    store = geometry.GeometryStore(entries)
+    assert store.mapped_p_indices[13:].tolist() == [-1] * 3
+    assert store.get_coords(4, side='product') is None
+    assert np.isnan(store.atom_map_rmsds()[4])
+    assert store.search(WATER, k=1)[0][:2] == ('intra_H_migration', 0)
+
+
+def test_from_database():
+    """Test loading the geometries from a database."""
+    store = geometry.GeometryStore.from_database(database_path=TEST_DATABASE_PATH, family='intra_H_migration')
+    assert store.keys == [('intra_H_migration', 0), ('intra_H_migration', 1), ('intra_H_migration', 2)]
+    assert store.search(WATER, k=1)[0][:2] == ('intra_H_migration', 0)
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_importer module
+"""
+
+import gzip
+import os
+import shutil
+
+import pytest
+
+from am3db import importer
+from am3db.common import AM3DB_PATH, read_yaml_file, save_yaml_file
+from am3db.query import ReactionDB
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'importer_db')
+INPUTS_PATH = os.path.join(TEST_DATABASE_PATH, 'inputs')
+CSV_PATH = os.path.join(INPUTS_PATH, 'reactions.csv')
+JSONL_PATH = os.path.join(INPUTS_PATH, 'reactions.jsonl.gz')
+LIBRARY_PATH = os.path.join(INPUTS_PATH, 'library')
+
+CSV = """id,reactants,products,multiplicity
+OH+NCC,[OH].NCC,O.[NH]CC,2
+bad,[OH].CC,,
+OH+C2H6,[OH] + CC,O + [CH2]C,2
+"""
+
+JSONL = """{"reactants": ["[OH]", "NCC"], "products": ["O", "[NH]CC"]}
+
+{"r_species": [{"label": "nC3H5", "smiles": "[CH2]CC"}], "p_species": [{"label": "iC3H5", "smiles": "C[CH]C"}]}
+not json
+"""
+
+REACTIONS = """#!/usr/bin/env python
+# encoding: utf-8
+
+name = "test"
+shortDesc = ""
+longDesc = \"\"\"
+\"\"\"
+entry(
+    index = 1,
+    label = "OH + H2 <=> H2O + H",
+    degeneracy = 2,
+    kinetics = Arrhenius(A=(2.16e+08, 'cm^3/(mol*s)'), n=1.51, Ea=(3430, 'cal/mol'), T0=(1, 'K')),
+)
+
+entry(
+    index = 2,
+    label = "OH + X <=> H2O + H",
+    kinetics = Arrhenius(A=(1, 'cm^3/(mol*s)'), n=0, Ea=(0, 'cal/mol'), T0=(1, 'K')),
+)
+"""
+
+DICTIONARY = """OH
+multiplicity 2
+1 O u1 p2 c0 {2,S}
+2 H u0 p0 c0 {1,S}
+
+// A comment
+H2
+1 H u0 p0 c0 {2,S}
+2 H u0 p0 c0 {1,S}
+
+H2O
+1 O u0 p2 c0 {2,S} {3,S}
+2 H u0 p0 c0 {1,S}
+3 H u0 p0 c0 {1,S}
+
+H
+multiplicity 2
+1 H u1 p0 c0
+"""
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
+    os.makedirs(LIBRARY_PATH)
+    with open(CSV_PATH, 'w') as f:
+        f.write(CSV)
+    with gzip.open(JSONL_PATH, 'wt') as f:
+        f.write(JSONL)
+    with open(os.path.join(LIBRARY_PATH, 'reactions.py'), 'w') as f:
+        f.write(REACTIONS)
+    with open(os.path.join(LIBRARY_PATH, 'dictionary.txt'), 'w') as f:
+        f.write(DICTIONARY)
+
+
+def test_get_input_format():
+    """Test determining the input format."""
+    assert importer.get_input_format(CSV_PATH) == 'csv'
+    assert importer.get_input_format('reactions.tsv') == 'csv'
+    assert importer.get_input_format(JSONL_PATH) == 'jsonl'
+    assert importer.get_input_format(LIBRARY_PATH) == 'rmg'
+    assert importer.get_input_format(os.path.join(LIBRARY_PATH, 'reactions.py')) == 'rmg'
+    with pytest.raises(ValueError):
+        importer.get_input_format('reactions.xlsx')
+
+
+def test_read_records():
+    """Test lazily reading the records of the supported inputs."""
+    records = list(importer.read_records(CSV_PATH))
+    assert [key for key, _ in records] == ['OH+NCC', 'bad', 'OH+C2H6']
+    assert records[0][1]['reactants'] == '[OH].NCC'
+
+    records = list(importer.read_records(JSONL_PATH))
+    assert [key for key, _ in records] == ['line 1', 'line 3', 'line 4']
+    assert 'invalid' in records[2][1]
+
+    records = list(importer.read_records(LIBRARY_PATH))
+    assert [key for key, _ in records] == ['1: OH + H2 <=> H2O + H', '2: OH + X <=> H2O + H']
+    assert records[0][1]['reactants'] == ['OH', 'H2']
+    assert records[0][1]['products'] == ['H2O', 'H']
+    assert records[0][1]['adjacency_lists']['H'] == 'multiplicity 2\n1 H u1 p0 c0\n'
+    assert records[1][1]['adjacency_lists']['X'] is None
+
+
+def test_spec_from_record():
+    """Test converting input records into reaction specifications."""
+    spec = importer.spec_from_record({'id': 'r1', 'reactants': '[OH] + CC', 'products': 'O.[CH2]C',
+                                      'multiplicity': '2', 'charge': ''})
+    assert spec == {'r_species': [{'label': 'r0', 'smiles': '[OH]'}, {'label': 'r1', 'smiles': 'CC'}],
+                    'p_species': [{'label': 'p0', 'smiles': 'O'}, {'label': 'p1', 'smiles': '[CH2]C'}],
+                    'multiplicity': 2}
+    spec = importer.spec_from_record({'id': 2, 'r_species': [{'label': 'H', 'smiles': '[H]'}]})
+    assert spec == {'r_species': [{'label': 'H', 'smiles': '[H]'}]}
+    spec = importer.spec_from_record({'reactants': ['H'], 'products': ['H'], 'adjacency_lists': {'H': 'adj'}})
+    assert spec['r_species'] == [{'label': 'H', 'adjlist': 'adj'}]
+    for record in [{'reactants': 'C', 'products': ''},
+                   {'reactants': ['X'], 'products': ['H'], 'adjacency_lists': {'X': None, 'H': 'adj'}},
+                   {'invalid': 'Line 4 is not valid JSON.'}]:
+        with pytest.raises(ValueError):
+            importer.spec_from_record(record)
+
+
+def test_load_checkpoint():
+    """Test that a checkpoint is only used for the same unmodified input."""
+    checkpoint_path = os.path.join(TEST_DATABASE_PATH, 'test.checkpoint.yml')
+    source = importer.get_source_state(CSV_PATH)
+    assert importer.load_checkpoint(checkpoint_path, source=source) is None
+    save_yaml_file(path=checkpoint_path, content=dict(source, position=2))
+    assert importer.load_checkpoint(checkpoint_path, source=source)['position'] == 2
+    assert importer.load_checkpoint(checkpoint_path, source=dict(source, size=source['size'] + 1)) is None
+    os.remove(checkpoint_path)
+
+
+def test_import_reactions():
+    """Test importing a CSV file, and resuming an interrupted import."""
+    summary = importer.import_reactions(CSV_PATH, database_path=TEST_DATABASE_PATH, max_workers=1)
+    assert summary == {'read': 3, 'imported': 2, 'failed': 1, 'resumed': 0,
+                       'report': os.path.join(TEST_DATABASE_PATH, 'imports', 'reactions.csv.failures.jsonl')}
+    failures = importer.read_failures(summary['report'])
+    assert [(failure['position'], failure['key']) for failure in failures] == [(1, 'bad')]
+    assert failures[0]['message'] == 'ValueError: The record has no products.'
+    assert ReactionDB(database_path=TEST_DATABASE_PATH).count(family='H_Abstraction') == 2
+
+    # Resume an import which was interrupted after the first record.
+    checkpoint_path = os.path.join(TEST_DATABASE_PATH, 'imports', 'reactions.csv.checkpoint.yml')
+    checkpoint = read_yaml_file(checkpoint_path)
+    assert checkpoint['complete']
+    checkpoint.update(position=1, imported=1, failed=0, report_offset=0, complete=False)
+    save_yaml_file(path=checkpoint_path, content=checkpoint)
+    summary = importer.import_reactions(CSV_PATH, database_path=TEST_DATABASE_PATH, max_workers=2, chunk_size=1)
+    assert summary['resumed'] == 1
+    assert summary['imported'] == 2
+    assert len(importer.read_failures(summary['report'])) == 1
+    assert ReactionDB(database_path=TEST_DATABASE_PATH).count(family='H_Abstraction') == 2  # No duplicates.
+
+
+def test_import_rmg_library():
+    """Test importing an RMG kinetics library."""
+    summary = importer.import_reactions(LIBRARY_PATH, database_path=TEST_DATABASE_PATH, max_workers=1)
+    assert summary['imported'] == 1
+    assert 'not defined in the species dictionary' in importer.read_failures(summary['report'])[0]['message']
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
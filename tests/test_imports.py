@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_imports module
+"""
+
+import json
+import subprocess
+import sys
+
+from am3db.common import AM3DB_PATH
+
+
+LIGHT_MODULES = ['am3db.common', 'am3db.storage', 'am3db.manifest', 'am3db.locks', 'am3db.journal',
+                 'am3db.duplicates', 'am3db.query', 'am3db.geometry', 'am3db.user', 'am3db.review',
+                 'am3db.logger', 'am3db.writer', 'am3db.sqlite_database', 'am3db.species_cache', 'am3db.atom_maps',
+                 'am3db.families', 'am3db.instrumentation', 'am3db.catalog', 'am3db.sharding',
+                 'am3db.fingerprint', 'am3db.snapshot', 'am3db.records', 'am3db.server', 'am3db.ingestion',
+                 'am3db.importer', 'am3db.refresh']
+
+
+def test_light_modules_do_not_import_arc():
+    """Test that the read, query, review, logging and writing paths do not import ARC or RMG."""
+    code = f'import json, sys\n' \
+           f'import {", ".join(LIGHT_MODULES)}\n' \
+           f'print(json.dumps(sorted(name for name in sys.modules if name.split(".")[0] in ("arc", "rmgpy"))))\n'
+    output = subprocess.run([sys.executable, '-c', code], cwd=AM3DB_PATH, capture_output=True, text=True, check=True)
+    assert json.loads(output.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_ingestion module
+"""
+
+import os
+import shutil
+import time
+
+from am3db import ingestion
+from am3db.common import AM3DB_PATH, read_yaml_file
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'ingestion_db')
+
+SPECS = [{'r_species': [{'label': 'OH', 'smiles': '[OH]'}, {'label': 'NCC', 'smiles': 'NCC'}],
+          'p_species': [{'label': 'H2O', 'smiles': 'O'}, {'label': 'NjCC', 'smiles': '[NH]CC'}]},
+         {'r_species': [{'label': 'nC3H5', 'smiles': '[CH2]CC'}],
+          'p_species': [{'label': 'iC3H5', 'smiles': 'C[CH]C'}]},
+         {'unknown_argument': 1},
+         {'r_species': [{'label': 'OH', 'smiles': '[OH]'}, {'label': 'C2H6', 'smiles': 'CC'}],
+          'p_species': [{'label': 'H2O', 'smiles': 'O'}, {'label': 'C2H5', 'smiles': '[CH2]C'}]},
+         ]
+
+
+def process_slowly(spec, position: int) -> ingestion.IngestionResult:
+    """Process an item slowly, catching any exception as processing functions usually do."""
+    try:
+        time.sleep(spec)
+    except Exception as e:
+        return ingestion.IngestionResult(position=position, error=repr(e))
+    return ingestion.IngestionResult(position=position)
+
+
+def test_chunk_specs():
+    """Test the chunk_specs() function."""
+    chunks = list(ingestion.chunk_specs(iter(['a', 'b', 'c', 'd', 'e']), chunk_size=2))
+    assert chunks == [[(0, 'a'), (1, 'b')], [(2, 'c'), (3, 'd')], [(4, 'e')]]
+
+
+def test_process_serially():
+    """Test processing reaction specifications in the current process."""
+    pipeline = ingestion.IngestionPipeline(max_workers=1, chunk_size=3)
+    results = list(pipeline.process(SPECS))
+    assert [result.position for result in results] == [0, 1, 2, 3]
+    assert [result.success for result in results] == [True, True, False, True]
+    assert [result.family for result in results] == ['H_Abstraction', 'intra_H_migration', None, 'H_Abstraction']
+    assert results[0].entry['r_inchi_keys'] == ['TUJKJAMUKRIRHC-UHFFFAOYSA-N', 'QUSNBJAOOMFDIB-UHFFFAOYSA-N']
+    assert 'TypeError' in results[2].error
+
+
+def test_item_timeout():
+    """Test that the per-item timeout is not swallowed by exception handling in the processing function."""
+    results = ingestion.process_chunk([(0, 5), (1, 0)], timeout=0.1, function=process_slowly)
+    assert [result.position for result in results] == [0, 1]
+    assert results[0].error == 'ItemTimeoutError: Processing took more than 0.1 s.'
+    assert results[1].success
+
+
+def test_ingest_in_parallel():
+    """Test ingesting reaction specifications over a process pool."""
+    pipeline = ingestion.IngestionPipeline(database_path=TEST_DATABASE_PATH, max_workers=2, chunk_size=1)
+    summary = pipeline.ingest(SPECS)
+    assert summary == {'ingested': 3, 'failed': 1}
+    assert os.path.isfile(os.path.join(TEST_DATABASE_PATH, 'reactions', 'intra_H_migration_0.yml'))
+    content = read_yaml_file(os.path.join(TEST_DATABASE_PATH, 'reactions', 'H_Abstraction_0.yml'))
+    assert sorted(content.keys()) == [0, 1]
+    assert content[0]['r_inchi_keys'] == ['TUJKJAMUKRIRHC-UHFFFAOYSA-N', 'QUSNBJAOOMFDIB-UHFFFAOYSA-N']
+    assert len(content[1]['p_inchi_keys']) == 2
+
+
+def teardown_module():
+    """
+    Teardown any state that was previously setup with a setup_module method.
+    """
+    if os.path.isdir(TEST_DATABASE_PATH):
+        shutil.rmtree(TEST_DATABASE_PATH)
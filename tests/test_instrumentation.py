@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_instrumentation module
+"""
+
+import json
+import os
+import shutil
+
+from am3db import instrumentation
+from am3db.common import AM3DB_PATH
+from am3db.storage import read_shard, save_shard
+
+
+TEST_DATA_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'instrumentation')
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    instrumentation.disable()
+    instrumentation.reset()
+    os.makedirs(TEST_DATA_PATH, exist_ok=True)
+
+
+def test_disabled():
+    """Test that nothing is recorded while instrumentation is disabled."""
+    assert not instrumentation.is_enabled()
+    with instrumentation.timer('stage') as timer:
+        pass
+    assert timer is instrumentation._NULL_TIMER
+    instrumentation.count('counter')
+    read_shard(os.path.join(TEST_DATA_PATH, 'missing_0.yml'))
+    assert instrumentation.get_stats() == {'stages': {}, 'counters': {}}
+
+
+def test_timers_and_counters():
+    """Test the aggregated timings, histograms and counters."""
+    instrumentation.enable()
+    try:
+        for _ in range(3):
+            with instrumentation.timer('stage'):
+                pass
+        instrumentation.record('slow', 0.5)
+        instrumentation.count('counter')
+        instrumentation.count('counter', 2)
+        shard_path = os.path.join(TEST_DATA_PATH, 'fam_0.yml')
+        save_shard(shard_path, {0: {'multiplicity': 1}})
+        assert read_shard(shard_path) == {0: {'multiplicity': 1}}
+    finally:
+        instrumentation.disable()
+    stats = instrumentation.get_stats()
+    assert stats['counters'] == {'counter': 3}
+    assert stats['stages']['stage']['count'] == 3
+    assert sum(stats['stages']['stage']['histogram']) == 3
+    assert stats['stages']['slow']['histogram'] == [0, 0, 0, 0, 0, 1, 0, 0]
+    assert stats['stages']['slow']['mean_s'] == 0.5
+    assert stats['stages']['storage.read_shard']['count'] == 1
+    assert stats['stages']['storage.save_shard']['count'] == 1
+    assert 'slow' in instrumentation.format_stats().splitlines()[1]
+
+
+def test_merge_and_save_stats():
+    """Test merging statistics of another process and saving them as JSON."""
+    before = instrumentation.reset()
+    assert before['stages']['slow']['count'] == 1
+    assert instrumentation.get_stats() == {'stages': {}, 'counters': {}}
+    instrumentation.merge_stats(before)
+    instrumentation.merge_stats(before)
+    stats = instrumentation.get_stats()
+    assert stats['stages']['slow']['count'] == 2
+    assert stats['stages']['slow']['total_s'] == 1.0
+    assert stats['counters']['counter'] == 6
+    path = os.path.join(TEST_DATA_PATH, 'stats.json')
+    instrumentation.save_stats(path)
+    with open(path, 'r') as f:
+        assert json.load(f) == stats
+
+
+def test_log_stats():
+    """Test logging the statistics."""
+    class Logger(object):
+        messages = list()
+
+        def info(self, message):
+            self.messages.append(message)
+
+    logger = Logger()
+    instrumentation.log_stats(logger)
+    assert logger.messages[0].startswith('Instrumentation statistics:\nstage')
+
+
+def test_profile_call():
+    """Test profiling a single call."""
+    result, report = instrumentation.profile_call(sorted, [3, 1, 2], reverse=True,
+                                                  path=os.path.join(TEST_DATA_PATH, 'profile.prof'))
+    assert result == [3, 2, 1]
+    assert 'function calls' in report
+    assert os.path.isfile(os.path.join(TEST_DATA_PATH, 'profile.prof'))
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    instrumentation.disable()
+    instrumentation.reset()
+    shutil.rmtree(TEST_DATA_PATH, ignore_errors=True)
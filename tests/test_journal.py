@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_journal module
+"""
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import pytest
+
+from am3db import journal
+from am3db.common import AM3DB_PATH
+from am3db.duplicates import DuplicateReactionError
+from am3db.manifest import FamilyManifest
+from am3db.query import ReactionDB
+from am3db.sqlite_database import SQLiteDatabase
+from am3db.storage import read_shard, set_database_setting
+from am3db.writer import DatabaseWriter
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'journal_db')
+
+
+def get_entry(i: int) -> dict:
+    """Get a synthetic database entry."""
+    return {'multiplicity': 2, 'charge': 0, 'r_inchi_keys': [f'R{i}'], 'p_inchi_keys': [f'P{i}'],
+            'r_xyz': [{'symbols': ('H',), 'isotopes': (1,), 'coords': ((0.0, 0.0, float(i)),)}],
+            'approved_by': None, 'rejected_by': None}
+
+
+def compact_and_append(indices: list):
+    """
+    Compact the journal and append entries to a new journal from another process.
+    The journal is emptied in place instead of being removed, as if the file system reused its inode.
+    """
+    fam_journal = journal.Journal(family='fam', database_path=TEST_DATABASE_PATH)
+    with mock.patch.object(journal.os, 'remove', lambda path: open(path, 'wb').close()):
+        fam_journal.compact()
+    with fam_journal.lock():
+        fam_journal.append({i: dict(get_entry(i), note='x' * 50) for i in indices})
+
+
+def teardown_function():
+    """
+    Remove the test database after each test.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
+
+
+def test_append_and_read():
+    """Test appending records and reading them incrementally."""
+    fam_journal = journal.Journal(family='fam', database_path=TEST_DATABASE_PATH)
+    assert fam_journal.read() == dict()
+    with fam_journal.lock():
+        fam_journal.append({0: get_entry(0), 1: get_entry(1)})
+    reader = journal.Journal(family='fam', database_path=TEST_DATABASE_PATH)
+    assert reader.read() == {0: get_entry(0), 1: get_entry(1)}
+    assert reader.next_index == 2
+    with fam_journal.lock():
+        fam_journal.append({1: {'updated': True}, 7: get_entry(7)})
+    assert reader.read() == {0: get_entry(0), 1: {'updated': True}, 7: get_entry(7)}
+    assert reader.get_shard_entries() == {'fam_0.yml': {0: get_entry(0), 1: {'updated': True}, 7: get_entry(7)}}
+
+
+def test_partial_record():
+    """Test that a partially written record is ignored and then truncated."""
+    fam_journal = journal.Journal(family='fam', database_path=TEST_DATABASE_PATH)
+    with fam_journal.lock():
+        fam_journal.append({0: get_entry(0), 1: get_entry(1)})
+    size = os.path.getsize(fam_journal.path)
+    with open(fam_journal.path, 'r+b') as f:
+        f.truncate(size - 3)  # A crash while the last record was being written.
+    assert journal.Journal(family='fam', database_path=TEST_DATABASE_PATH).read() == {0: get_entry(0)}
+    with fam_journal.lock():
+        fam_journal.append({2: get_entry(2)})
+    assert journal.Journal(family='fam', database_path=TEST_DATABASE_PATH).read() == {0: get_entry(0),
+                                                                                       2: get_entry(2)}
+    with open(fam_journal.path, 'r+b') as f:
+        f.seek(size - 3)
+        f.write(b'\x00\x00\x00')  # A corrupted record.
+    assert 2 not in journal.Journal(family='fam', database_path=TEST_DATABASE_PATH).read()
+
+
+def test_concurrent_compaction():
+    """Test that a stale journal of one process doesn't truncate a journal recreated by another process."""
+    fam_journal = journal.Journal(family='fam', database_path=TEST_DATABASE_PATH)
+    with fam_journal.lock():
+        fam_journal.append({0: get_entry(0), 1: get_entry(1)})
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        executor.submit(compact_and_append, [2, 3, 4, 5]).result()
+    with fam_journal.lock():
+        fam_journal.append({6: get_entry(6)})
+    entries = journal.Journal(family='fam', database_path=TEST_DATABASE_PATH).read()
+    assert sorted(entries.keys()) == [2, 3, 4, 5, 6]
+    assert entries[5]['note'] == 'x' * 50
+    assert sorted(read_shard(os.path.join(TEST_DATABASE_PATH, 'reactions', 'fam_0.yml')).keys()) == [0, 1]
+
+
+def test_journaled_writer():
+    """Test saving to the journal, reading the merged database, and compacting."""
+    set_database_setting('journal', True, database_path=TEST_DATABASE_PATH)
+    assert journal.is_journaled(TEST_DATABASE_PATH)
+    with DatabaseWriter(database_path=TEST_DATABASE_PATH) as writer:
+        assert writer.journal
+        assert [writer.add_entry(family='fam', entry=get_entry(i)) for i in range(3)] == [0, 1, 2]
+    reactions_path = os.path.join(TEST_DATABASE_PATH, 'reactions')
+    assert not os.path.isdir(reactions_path) or not len(os.listdir(reactions_path))
+    db = ReactionDB(database_path=TEST_DATABASE_PATH)
+    assert db.get_families() == ['fam']
+    assert db.get('fam', 1) == get_entry(1)
+    assert [index for _, index, _ in db.query(family='fam')] == [0, 1, 2]
+
+    # Duplicates of journaled reactions are detected.
+    with pytest.raises(DuplicateReactionError):
+        with DatabaseWriter(database_path=TEST_DATABASE_PATH, on_duplicate='raise') as writer:
+            writer.add_entry(family='fam', entry=get_entry(1))
+
+    assert journal.compact_journals(TEST_DATABASE_PATH) == 3
+    assert not os.path.isfile(os.path.join(TEST_DATABASE_PATH, 'journals', 'fam.journal'))
+    assert sorted(read_shard(os.path.join(reactions_path, 'fam_0.yml')).keys()) == [0, 1, 2]
+    assert FamilyManifest(family='fam', database_path=TEST_DATABASE_PATH).load().next_index == 3
+
+    # Journal entries are merged with the shards, taking precedence.
+    with DatabaseWriter(database_path=TEST_DATABASE_PATH) as writer:
+        writer.add_entry(family='fam', entry={'updated': True}, index=1)
+        assert writer.add_entry(family='fam', entry=get_entry(600)) == 3
+        assert writer.add_entry(family='fam', entry=get_entry(601), index=600) == 600
+    assert db.get('fam', 1) == {'updated': True}
+    assert [(index, entry.get('updated', False)) for _, index, entry in db.query(family='fam')] \
+        == [(0, False), (1, True), (2, False), (3, False), (600, False)]
+    assert [index for _, index, _ in db.query(family='fam', indices=[600])] == [600]
+    with SQLiteDatabase(path=os.path.join(TEST_DATABASE_PATH, 'am3db.sqlite')) as sqlite_db:
+        assert sqlite_db.import_shards(TEST_DATABASE_PATH) == 5
+        assert sqlite_db.get('fam', 1) == {'updated': True}
+
+
+def test_compaction_threshold(monkeypatch):
+    """Test that writers compact the journal once it reaches the compaction threshold."""
+    monkeypatch.setattr('am3db.writer.COMPACTION_THRESHOLD', 5)
+    with DatabaseWriter(database_path=TEST_DATABASE_PATH, journal=True, on_duplicate='allow') as writer:
+        for i in range(4):
+            writer.add_entry(family='fam', entry=get_entry(i))
+    assert len(journal.get_journal('fam', TEST_DATABASE_PATH)) == 4
+    with DatabaseWriter(database_path=TEST_DATABASE_PATH, journal=True, on_duplicate='allow') as writer:
+        writer.add_entry(family='fam', entry=get_entry(4))
+    assert len(journal.get_journal('fam', TEST_DATABASE_PATH)) == 0
+    assert len(read_shard(os.path.join(TEST_DATABASE_PATH, 'reactions', 'fam_0.yml'))) == 5
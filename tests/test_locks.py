@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_locks module
+"""
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from am3db import locks
+from am3db.common import AM3DB_PATH, read_yaml_file
+from am3db.manifest import FamilyManifest
+from am3db.query import ReactionDB
+from am3db.user import User
+from am3db.writer import DatabaseWriter
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'locks_db')
+NUM_WORKERS, NUM_REACTIONS, FLUSH_EVERY = 4, 60, 7
+
+
+def write_reactions(worker: int) -> list:
+    """Write reactions of two families from a worker process, flushing periodically."""
+    indices = list()
+    with DatabaseWriter(database_path=TEST_DATABASE_PATH) as writer:
+        for i in range(NUM_REACTIONS):
+            family = 'intra_H_migration' if i % 3 else 'H_Abstraction'
+            index = writer.add_entry(family=family, entry={'worker': worker, 'i': i})
+            indices.append((family, index))
+            if i % FLUSH_EVERY == 0:
+                writer.flush()
+    return indices
+
+
+def save_user(worker: int):
+    """Save a user from a worker process."""
+    users_path = os.path.join(TEST_DATABASE_PATH, 'users.yml')
+    for i in range(10):
+        user = User(name=f'user_{worker}_{i}')
+        user.users_path = users_path
+        user.save()
+
+
+def test_file_lock():
+    """Test acquiring and releasing a lock."""
+    path = locks.get_lock_path('test', database_path=TEST_DATABASE_PATH)
+    assert path == os.path.join(TEST_DATABASE_PATH, 'locks', 'test.lock')
+    with locks.FileLock(path) as lock:
+        assert lock.is_locked
+        with pytest.raises(locks.LockTimeoutError):
+            locks.FileLock(path, timeout=0.05).acquire()
+    assert not lock.is_locked
+    with locks.FileLock(path, timeout=0.05):
+        pass
+
+
+def test_allocate_indices():
+    """Test allocating reaction IDs."""
+    assert locks.allocate_indices('fam', database_path=TEST_DATABASE_PATH) == 0
+    assert locks.allocate_indices('fam', count=5, database_path=TEST_DATABASE_PATH) == 1
+    assert locks.allocate_indices('fam', minimum=3, database_path=TEST_DATABASE_PATH) == 6
+    assert locks.allocate_indices('fam', count=0, minimum=100, database_path=TEST_DATABASE_PATH) == 100
+    assert locks.allocate_indices('fam', minimum=3, database_path=TEST_DATABASE_PATH) == 100
+    assert not locks.release_indices('fam', first=50, end=100, database_path=TEST_DATABASE_PATH)
+    assert locks.release_indices('fam', first=101, end=101, database_path=TEST_DATABASE_PATH)
+    first = locks.allocate_indices('fam', count=10, database_path=TEST_DATABASE_PATH)
+    assert locks.release_indices('fam', first=first + 4, end=first + 10, database_path=TEST_DATABASE_PATH)
+    assert locks.allocate_indices('fam', database_path=TEST_DATABASE_PATH) == first + 4
+
+
+def test_reserve_indices(monkeypatch):
+    """Test that a writer reserves reaction IDs in blocks and returns the unused ones."""
+    calls = list()
+
+    def allocate_indices(family, count=1, minimum=0, database_path=None):
+        calls.append(count)
+        return locks.allocate_indices(family, count=count, minimum=minimum, database_path=database_path)
+
+    monkeypatch.setattr('am3db.writer.allocate_indices', allocate_indices)
+    monkeypatch.setattr('am3db.writer.INDEX_BLOCK_SIZE', 10)
+    database_path = os.path.join(TEST_DATABASE_PATH, 'blocks_db')
+    with DatabaseWriter(database_path=database_path, on_duplicate='allow') as writer:
+        indices = [writer.add_entry(family='block', entry={'i': i}) for i in range(25)]
+        assert writer.add_entry(family='block', entry={'i': 25}, index=27) == 27
+        assert writer.add_entry(family='block', entry={'i': 26}) == 28
+    assert indices == list(range(25))
+    assert calls == [10, 10, 10, 0]
+    assert locks.allocate_indices('block', database_path=database_path) == 29
+
+
+def test_concurrent_writers():
+    """Test that concurrent writer processes neither lose reactions nor assign duplicate reaction IDs."""
+    with ProcessPoolExecutor(max_workers=NUM_WORKERS) as executor:
+        results = list(executor.map(write_reactions, range(NUM_WORKERS)))
+    assigned = [key for indices in results for key in indices]
+    assert len(set(assigned)) == len(assigned) == NUM_WORKERS * NUM_REACTIONS
+    stored = {(family, index): (entry['worker'], entry['i'])
+              for family, index, entry in ReactionDB(database_path=TEST_DATABASE_PATH).query()}
+    assert len(stored) == NUM_WORKERS * NUM_REACTIONS
+    for worker, indices in enumerate(results):
+        for i, key in enumerate(indices):
+            assert stored[key] == (worker, i)
+    for family in ['H_Abstraction', 'intra_H_migration']:
+        manifest = FamilyManifest(family=family, database_path=TEST_DATABASE_PATH)
+        manifest.load()
+        assert manifest.is_in_sync()
+        assert sum(shard['count'] for shard in manifest.shards.values()) \
+            == sum(1 for f, _ in stored.keys() if f == family)
+        assert manifest.next_index == max(index for f, index in stored.keys() if f == family) + 1
+
+
+def test_concurrent_user_saves():
+    """Test that concurrently saved users are not lost."""
+    with ProcessPoolExecutor(max_workers=NUM_WORKERS) as executor:
+        list(executor.map(save_user, range(NUM_WORKERS)))
+    users = read_yaml_file(os.path.join(TEST_DATABASE_PATH, 'users.yml'))
+    assert len(users) == NUM_WORKERS * 10
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
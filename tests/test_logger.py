@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_logger module
+"""
+
+import gc
+import glob
+import os
+import weakref
+
+from am3db import logger
+from am3db.common import AM3DB_PATH
+
+
+LOGS_PATH = os.path.join(AM3DB_PATH, 'logs')
+LOGGERS = list()
+
+
+def get_logger(user: str, **kwargs) -> logger.Logger:
+    """Get a test Logger and keep track of its log file."""
+    am3db_logger = logger.Logger(user=user, project='test_project', **kwargs)
+    LOGGERS.append(am3db_logger)
+    return am3db_logger
+
+
+def read_log(am3db_logger: logger.Logger) -> str:
+    """Read the content of a log file."""
+    with open(am3db_logger.log_file, 'r') as f:
+        return f.read()
+
+
+def test_log():
+    """Test logging messages in the default mode."""
+    am3db_logger = get_logger('test_logger_user_1', echo=False)
+    am3db_logger.info('message 1')
+    am3db_logger.warning('message 2')
+    content = read_log(am3db_logger)
+    assert 'Starting project test_project' in content
+    assert 'message 1\n' in content
+    assert '\nWARNING: message 2\n' in content
+
+
+def test_echo(capsys):
+    """Test turning the console echo off."""
+    get_logger('test_logger_user_2', echo=True).info('echoed message')
+    get_logger('test_logger_user_3', echo=False).info('silent message')
+    output = capsys.readouterr().out
+    assert 'echoed message' in output
+    assert 'silent message' not in output
+
+
+def test_buffered_log():
+    """Test logging messages in the buffered mode."""
+    am3db_logger = get_logger('test_logger_user_4', buffered=True, echo=False, flush_interval=60)
+    for i in range(100):
+        am3db_logger.info(f'buffered message {i}')
+    am3db_logger.error('an error')
+    # Errors are written promptly, together with the messages buffered before them.
+    for _ in range(100):
+        if os.path.isfile(am3db_logger.log_file) and 'ERROR: an error' in read_log(am3db_logger):
+            break
+        am3db_logger._thread.join(timeout=0.05)
+    content = read_log(am3db_logger)
+    assert 'buffered message 99\n' in content
+    assert 'ERROR: an error' in content
+    am3db_logger.info('last message')
+    am3db_logger.close()
+    assert not am3db_logger._thread.is_alive()
+    assert read_log(am3db_logger).endswith('last message\n')
+    am3db_logger.info('after closing')
+    assert read_log(am3db_logger).endswith('after closing\n')
+
+
+def test_flush():
+    """Test explicitly flushing a buffered logger."""
+    am3db_logger = get_logger('test_logger_user_5', buffered=True, echo=False, flush_interval=60)
+    am3db_logger.info('flushed message')
+    am3db_logger.flush()
+    assert 'flushed message\n' in read_log(am3db_logger)
+    am3db_logger.close()
+
+
+def test_rotate_buffered_logger():
+    """Test rotating a buffered log file while the background thread writes to it."""
+    am3db_logger = get_logger('test_logger_user_8', buffered=True, echo=False, flush_size=1, backup_count=3)
+    for i in range(20):
+        am3db_logger.info(f'message {i}')
+        if i in (5, 12):
+            am3db_logger.rotate()
+    am3db_logger.flush()
+    assert am3db_logger._thread.is_alive()
+    assert read_log(am3db_logger).startswith('message 13\n')
+    with open(f'{am3db_logger.log_file}.1', 'r') as f:
+        assert f.read() == ''.join(f'message {i}\n' for i in range(6, 13))
+    am3db_logger.close()
+
+
+def test_release_unclosed_logger():
+    """Test that a buffered logger which was not closed is garbage collected, and its messages are written."""
+    am3db_logger = logger.Logger(user='test_logger_user_7', project='test_project', buffered=True, echo=False,
+                                 flush_interval=60)
+    am3db_logger.info('unclosed message')
+    reference, thread, log_file = weakref.ref(am3db_logger), am3db_logger._thread, am3db_logger.log_file
+    del am3db_logger
+    gc.collect()
+    assert reference() is None
+    assert not thread.is_alive()
+    with open(log_file, 'r') as f:
+        assert f.read().endswith('unclosed message\n')
+    os.remove(log_file)
+
+
+def test_rotation():
+    """Test rotating the log file by size."""
+    for buffered in [False, True]:
+        am3db_logger = get_logger(f'test_logger_user_6_{buffered}', buffered=buffered, echo=False,
+                                  flush_size=1, max_bytes=1000, backup_count=2)
+        for i in range(100):
+            am3db_logger.info(f'rotated message {i:03d} ' + 'x' * 50)
+        am3db_logger.close()
+        rotated = sorted(glob.glob(f'{glob.escape(am3db_logger.log_file)}.*'))
+        assert rotated == [f'{am3db_logger.log_file}.1', f'{am3db_logger.log_file}.2']
+        assert all(os.path.getsize(path) < 1100 for path in rotated)
+        assert read_log(am3db_logger).endswith('rotated message 099 ' + 'x' * 50 + '\n')
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    for am3db_logger in LOGGERS:
+        am3db_logger.close()
+        for path in glob.glob(f'{glob.escape(am3db_logger.log_file)}*'):
+            os.remove(path)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_manifest module
+"""
+
+import os
+import shutil
+
+from am3db import manifest
+from am3db.common import AM3DB_PATH, read_yaml_file, save_yaml_file
+from am3db.locks import family_lock
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'manifest_db')
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    reactions_path = os.path.join(TEST_DATABASE_PATH, 'reactions')
+    os.makedirs(reactions_path, exist_ok=True)
+    save_yaml_file(path=os.path.join(reactions_path, 'fam_0.yml'), content={0: {'charge': 0}, 1: {'charge': 0}})
+    save_yaml_file(path=os.path.join(reactions_path, 'fam_1.yml'), content={500: {'charge': 0}})
+    save_yaml_file(path=os.path.join(reactions_path, 'fam_extra_0.yml'), content={7: {'charge': 0}})
+
+
+def test_get_shard_number():
+    """Test the get_shard_number() function."""
+    assert manifest.get_shard_number('fam_0.yml', 'fam') == 0
+    assert manifest.get_shard_number('fam_12.yml', 'fam') == 12
+    assert manifest.get_shard_number('fam_extra_0.yml', 'fam') is None
+    assert manifest.get_shard_number('fam_0.yml', 'am') is None
+    assert manifest.get_shard_number('fam_0.yml.bak', 'fam') is None
+
+
+def test_get_shard_indices():
+    """Test the get_shard_indices() function."""
+    assert manifest.get_shard_indices({3: {}, 4: {}}) == [3, 4]
+    assert manifest.get_shard_indices([{'index': 5}]) == [5]
+    assert manifest.get_shard_indices(None) == []
+
+
+def test_load_and_rebuild():
+    """Test loading a missing manifest, which rebuilds it from the shards."""
+    fam_manifest = manifest.FamilyManifest(family='fam', database_path=TEST_DATABASE_PATH).load()
+    assert fam_manifest.next_index == 501
+    assert sorted(fam_manifest.shards.keys()) == ['fam_0.yml', 'fam_1.yml']
+    assert fam_manifest.shards['fam_0.yml']['count'] == 2
+    assert fam_manifest.shards['fam_1.yml']['count'] == 1
+    assert not os.path.isfile(fam_manifest.path)  # Loading has no side effects.
+    with family_lock('fam', database_path=TEST_DATABASE_PATH):
+        fam_manifest = manifest.FamilyManifest(family='fam', database_path=TEST_DATABASE_PATH).load(save_rebuilt=True)
+    assert os.path.isfile(fam_manifest.path)
+    content = read_yaml_file(fam_manifest.path)
+    assert content['family'] == 'fam'
+    assert content['next_index'] == 501
+
+
+def test_out_of_sync_manifest():
+    """Test that a manifest is rebuilt once the shards are modified behind its back."""
+    fam_manifest = manifest.FamilyManifest(family='fam', database_path=TEST_DATABASE_PATH).load()
+    assert fam_manifest.is_in_sync()
+    save_yaml_file(path=os.path.join(TEST_DATABASE_PATH, 'reactions', 'fam_2.yml'), content={1000: {'charge': 0}})
+    assert not fam_manifest.is_in_sync()
+    fam_manifest = manifest.FamilyManifest(family='fam', database_path=TEST_DATABASE_PATH).load()
+    assert fam_manifest.next_index == 1001
+    assert fam_manifest.shards['fam_2.yml']['count'] == 1
+    os.remove(os.path.join(TEST_DATABASE_PATH, 'reactions', 'fam_2.yml'))
+    assert not fam_manifest.is_in_sync()
+
+
+def test_derived_shard_table():
+    """Test that a shard table derived from shards which don't follow the default layout is saved with the manifest."""
+    reactions_path = os.path.join(TEST_DATABASE_PATH, 'reactions')
+    save_yaml_file(path=os.path.join(reactions_path, 'moved_0.yml'), content={0: {'charge': 0}})
+    save_yaml_file(path=os.path.join(reactions_path, 'moved_1.yml'), content={10: {'charge': 0}})
+    moved_manifest = manifest.FamilyManifest(family='moved', database_path=TEST_DATABASE_PATH).load()
+    assert moved_manifest.derived_shard_table == [[0, 0], [10, 1]]
+    assert manifest.get_shard_table('moved', database_path=TEST_DATABASE_PATH) is None
+    with family_lock('moved', database_path=TEST_DATABASE_PATH):
+        moved_manifest.save()
+    assert moved_manifest.derived_shard_table is None
+    assert manifest.get_shard_table('moved', database_path=TEST_DATABASE_PATH) == [[0, 0], [10, 1]]
+    assert manifest.determine_family_filename_by_index(12, 'moved', database_path=TEST_DATABASE_PATH) == 'moved_1.yml'
+
+
+def test_update_shard():
+    """Test updating the manifest after a shard was written."""
+    fam_manifest = manifest.FamilyManifest(family='fam', database_path=TEST_DATABASE_PATH).load()
+    save_yaml_file(path=os.path.join(TEST_DATABASE_PATH, 'reactions', 'fam_1.yml'),
+                   content={500: {'charge': 0}, 501: {'charge': 0}})
+    fam_manifest.update_shard(shard='fam_1.yml', count=2, index=501)
+    fam_manifest.save()
+    assert fam_manifest.next_index == 502
+    fam_manifest = manifest.FamilyManifest(family='fam', database_path=TEST_DATABASE_PATH).load()
+    assert fam_manifest.is_in_sync()
+    assert fam_manifest.next_index == 502
+    assert fam_manifest.shards['fam_1.yml']['count'] == 2
+
+
+def teardown_module():
+    """
+    Teardown any state that was previously setup with a setup_module method.
+    """
+    if os.path.isdir(TEST_DATABASE_PATH):
+        shutil.rmtree(TEST_DATABASE_PATH)
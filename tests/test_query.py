@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_query module
+"""
+
+import os
+import shutil
+
+from am3db import query
+from am3db.common import AM3DB_PATH, save_yaml_file
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'query_db')
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    reactions_path = os.path.join(TEST_DATABASE_PATH, 'reactions')
+    save_yaml_file(path=os.path.join(reactions_path, 'intra_H_migration_0.yml'),
+                   content={0: {'multiplicity': 2, 'charge': 0, 'r_inchi_keys': ['A'], 'p_inchi_keys': ['B'],
+                                'approved_by': ['u1'], 'rejected_by': None, 'atom_maps': [[0, 1]]},
+                            1: {'multiplicity': 1, 'charge': 0, 'r_inchi_keys': ['C'], 'p_inchi_keys': ['D'],
+                                'approved_by': ['u1'], 'rejected_by': None, 'atom_maps': [[1, 0]]}})
+    save_yaml_file(path=os.path.join(reactions_path, 'intra_H_migration_1.yml'),
+                   content={500: {'multiplicity': 2, 'charge': 0, 'r_inchi_keys': ['B'], 'p_inchi_keys': ['E'],
+                                  'approved_by': None, 'rejected_by': ['u2'], 'atom_maps': None}})
+    save_yaml_file(path=os.path.join(reactions_path, 'H_Abstraction_0.yml'),
+                   content={0: {'multiplicity': 2, 'charge': 0, 'r_inchi_keys': ['A', 'F'], 'p_inchi_keys': ['G', 'H'],
+                                'approved_by': ['u1'], 'rejected_by': None, 'atom_maps': None}})
+
+
+def test_get_families_and_shards():
+    """Test listing families and shards."""
+    db = query.ReactionDB(database_path=TEST_DATABASE_PATH)
+    assert db.get_families() == ['H_Abstraction', 'intra_H_migration']
+    assert db.get_shards('intra_H_migration') == ['intra_H_migration_0.yml', 'intra_H_migration_1.yml']
+    assert db.get_shards('H_Abstraction') == ['H_Abstraction_0.yml']
+    assert db.get_shards('R_Recombination') == []
+
+
+def test_get():
+    """Test getting a single entry."""
+    db = query.ReactionDB(database_path=TEST_DATABASE_PATH)
+    assert db.get('intra_H_migration', 500)['r_inchi_keys'] == ['B']
+    assert db.get('intra_H_migration', 2) is None
+
+
+def test_query():
+    """Test streaming queries."""
+    db = query.ReactionDB(database_path=TEST_DATABASE_PATH)
+    results = db.query(family='intra_H_migration', approved=True, multiplicity=2, inchi_key='B', fields=['atom_maps'])
+    assert not isinstance(results, list)
+    assert list(results) == [('intra_H_migration', 0, {'atom_maps': [[0, 1]]})]
+    assert [(f, i) for f, i, _ in db.query(inchi_key='A')] == [('H_Abstraction', 0), ('intra_H_migration', 0)]
+    assert [(f, i) for f, i, _ in db.query(rejected=True)] == [('intra_H_migration', 500)]
+    assert [(f, i) for f, i, _ in db.query(where=lambda e: len(e['r_inchi_keys']) == 2)] == [('H_Abstraction', 0)]
+    assert db.count(family='intra_H_migration') == 3
+    assert db.count(multiplicity=1) == 1
+
+
+def test_query_skips_shards():
+    """Test that shards which cannot hold the requested indices are not read."""
+    corrupt_shard_path = os.path.join(TEST_DATABASE_PATH, 'reactions', 'H_Abstraction_2.yml')
+    save_yaml_file(path=corrupt_shard_path, content={'corrupt': 'should not be read'})
+    db = query.ReactionDB(database_path=TEST_DATABASE_PATH)
+    assert db.get_shards('H_Abstraction') == ['H_Abstraction_0.yml', 'H_Abstraction_2.yml']
+    assert [(f, i) for f, i, _ in db.query(family='H_Abstraction', indices=[0, 1])] == [('H_Abstraction', 0)]
+    os.remove(corrupt_shard_path)
+    assert [i for _, i, _ in db.query(family='intra_H_migration', indices=range(1, 600))] == [1, 500]
+
+
+def test_entry_matches_and_project_entry():
+    """Test the entry_matches() and project_entry() functions."""
+    entry = {'multiplicity': 2, 'charge': 0, 'r_inchi_keys': ['A'], 'p_inchi_keys': [], 'approved_by': None}
+    assert query.entry_matches(entry, multiplicity=2, charge=0, inchi_key='A', approved=False)
+    assert not query.entry_matches(entry, approved=True)
+    assert query.project_entry(entry, ['charge', 'missing']) == {'charge': 0, 'missing': None}
+    assert query.project_entry(entry) is entry
+
+
+def teardown_module():
+    """
+    Teardown any state that was previously setup with a setup_module method.
+    """
+    if os.path.isdir(TEST_DATABASE_PATH):
+        shutil.rmtree(TEST_DATABASE_PATH)
@@ -8,11 +8,14 @@ AM3DB tests test_reaction module
 import os
 import shutil
 
-from arc.common import read_yaml_file
+import pytest
+from arc.common import read_yaml_file, save_yaml_file
 from arc.species import ARCSpecies
 
 import am3db.reaction as reaction
 from am3db.common import AM3DB_PATH
+from am3db.duplicates import DuplicateReactionError
+from am3db.fingerprint import get_entry_fingerprint
 from am3db.reaction import AMReaction
 
 
@@ -43,8 +46,9 @@ def test_as_db_dict():
     content = rxn.as_db_dict()
     assert content == {'approved_by': None,
                        'atom_maps': content['atom_maps'],
-                       'clustering': [],
+                       'clustering': content['clustering'],
                        'charge': 0,
+                       'fingerprint': get_entry_fingerprint(content),
                        'multiplicity': 2,
                        'p_adjacency_lists': [['multiplicity 2\n'
                                               '1  C u0 p0 c0 {3,S} {4,S} {5,S} {6,S}\n'
@@ -81,7 +85,9 @@ def test_as_db_dict():
                        'rejected_by': None,
                        'rejected_reasons': []}
     assert sorted(content['atom_maps'][0]) == [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+    assert sorted(sum(content['clustering'], list())) == list(range(len(content['atom_maps'])))
     assert sorted(list(content['p_rmg_labels'].keys())) == ['*1', '*2', '*3']
+    assert rxn.get_fingerprint() == content['fingerprint']
 
     rxn = AMReaction(r_species=[ARCSpecies(label='OH', smiles='[OH]'), ARCSpecies(label='NCC', smiles='NCC')],
                      p_species=[ARCSpecies(label='H2O', smiles='O'), ARCSpecies(label='NjCC', smiles='[NH]CC')])
@@ -91,8 +97,9 @@ def test_as_db_dict():
     content = rxn.as_db_dict()
     assert content == {'approved_by': ['user_1'],
                        'atom_maps': [[0, 1, 3, 4, 5, 2, 6, 8, 7, 11, 9, 10]],
-                       'clustering': [],
+                       'clustering': [[0]],
                        'charge': 0,
+                       'fingerprint': get_entry_fingerprint(content),
                        'multiplicity': 2,
                        'p_adjacency_lists': [['1 O u0 p2 c0 {2,S} {3,S}\n'
                                               '2 H u0 p0 c0 {1,S}\n'
@@ -139,6 +146,11 @@ def test_as_db_dict():
                        'rejected_by': ['user_2'],
                        'rejected_reasons': ['Not sure']}
 
+    rxn.atom_map = [[0, 1, 3], [1]]  # An invalid atom map is stored as is.
+    content = rxn.as_db_dict()
+    assert content['atom_maps'] == [[0, 1, 3], [1]]
+    assert content['clustering'] == []
+
 
 def test_save():
     """Test the save() method."""
@@ -170,3 +182,79 @@ def test_save():
     shutil.copy(src=os.path.join(AM3DB_PATH, 'tests', 'data', 'reactions', 'H_Abstraction_0_back.yml'),
                 dst=os.path.join(AM3DB_PATH, 'tests', 'data', 'reactions', 'H_Abstraction_0.yml'))
     os.remove(os.path.join(AM3DB_PATH, 'tests', 'data', 'reactions', 'H_Abstraction_0_back.yml'))
+    shutil.rmtree(os.path.join(AM3DB_PATH, 'tests', 'data', 'manifests'))
+    shutil.rmtree(os.path.join(AM3DB_PATH, 'tests', 'data', 'locks'))
+
+
+def test_save_many():
+    """Test the save_many() function and the DatabaseWriter context manager."""
+    test_database_path = os.path.join(AM3DB_PATH, 'tests', 'data', 'save_many_db')
+    rxn_1 = AMReaction(r_species=[ARCSpecies(label='OH', smiles='[OH]'), ARCSpecies(label='NCC', smiles='NCC')],
+                       p_species=[ARCSpecies(label='H2O', smiles='O'), ARCSpecies(label='NjCC', smiles='[NH]CC')])
+    rxn_2 = AMReaction(r_species=[ARCSpecies(label='nC3H5', smiles='[CH2]CC')],
+                       p_species=[ARCSpecies(label='iC3H5', smiles='C[CH]C')])
+    rxn_3 = AMReaction(r_species=[ARCSpecies(label='OH', smiles='[OH]'), ARCSpecies(label='C2H6', smiles='CC')],
+                       p_species=[ARCSpecies(label='H2O', smiles='O'), ARCSpecies(label='C2H5', smiles='[CH2]C')],
+                       index=600)
+    indices = reaction.save_many([rxn_1, rxn_2, rxn_3], database_path=test_database_path)
+    assert indices == [0, 0, 600]
+    assert rxn_1.index == 0
+    reactions_path = os.path.join(test_database_path, 'reactions')
+    assert sorted(os.listdir(reactions_path)) == ['H_Abstraction_0.yml', 'H_Abstraction_1.yml',
+                                                  'intra_H_migration_0.yml']
+    content = read_yaml_file(os.path.join(reactions_path, 'H_Abstraction_0.yml'))
+    assert list(content.keys()) == [0]
+    assert content[0]['r_inchi_keys'] == ['TUJKJAMUKRIRHC-UHFFFAOYSA-N', 'QUSNBJAOOMFDIB-UHFFFAOYSA-N']
+
+    rxn_4 = AMReaction(r_species=[ARCSpecies(label='OH', smiles='[OH]'), ARCSpecies(label='NCC', smiles='NCC')],
+                       p_species=[ARCSpecies(label='H2O', smiles='O'), ARCSpecies(label='NjCC', smiles='[NH]CC')])
+    with reaction.DatabaseWriter(database_path=test_database_path, on_duplicate='allow') as writer:
+        assert writer.add(rxn_4) == 601
+        assert len(writer.pending) == 1
+    assert rxn_4.index == 601
+    content = read_yaml_file(os.path.join(reactions_path, 'H_Abstraction_1.yml'))
+    assert sorted(content.keys()) == [600, 601]
+    shutil.rmtree(test_database_path)
+
+
+def test_save_duplicates():
+    """Test the duplicate policies when saving a reaction which already exists in the database."""
+    test_database_path = os.path.join(AM3DB_PATH, 'tests', 'data', 'duplicates_db')
+    rxn_1 = AMReaction(r_species=[ARCSpecies(label='OH', smiles='[OH]'), ARCSpecies(label='NCC', smiles='NCC')],
+                       p_species=[ARCSpecies(label='H2O', smiles='O'), ARCSpecies(label='NjCC', smiles='[NH]CC')])
+    assert rxn_1.save(database_path=test_database_path) == 0
+
+    rxn_2 = AMReaction(r_species=[ARCSpecies(label='NCC', smiles='NCC'), ARCSpecies(label='OH', smiles='[OH]')],
+                       p_species=[ARCSpecies(label='NjCC', smiles='[NH]CC'), ARCSpecies(label='H2O', smiles='O')])
+    assert rxn_2.save(database_path=test_database_path) == 0
+    assert rxn_2.index == 0
+    with pytest.raises(DuplicateReactionError):
+        rxn_2.save(database_path=test_database_path, on_duplicate='raise')
+
+    rxn_3 = AMReaction(r_species=[ARCSpecies(label='OH', smiles='[OH]'), ARCSpecies(label='NCC', smiles='NCC')],
+                       p_species=[ARCSpecies(label='H2O', smiles='O'), ARCSpecies(label='NjCC', smiles='[NH]CC')])
+    rxn_3.approved_by = ['user_1']
+    assert rxn_3.save(database_path=test_database_path, on_duplicate='merge') == 0
+    content = read_yaml_file(os.path.join(test_database_path, 'reactions', 'H_Abstraction_0.yml'))
+    assert list(content.keys()) == [0]
+    assert content[0]['approved_by'] == ['user_1']
+
+    rxn_4 = AMReaction(r_species=[ARCSpecies(label='OH', smiles='[OH]'), ARCSpecies(label='NCC', smiles='NCC')],
+                       p_species=[ARCSpecies(label='H2O', smiles='O'), ARCSpecies(label='NjCC', smiles='[NH]CC')])
+    assert rxn_4.save(database_path=test_database_path, on_duplicate='allow') == 1
+    shutil.rmtree(test_database_path)
+
+
+def test_next_index():
+    """Test that the next free reaction ID is read once from the reaction's database."""
+    test_database_path = os.path.join(AM3DB_PATH, 'tests', 'data', 'next_index_db')
+    reactions_path = os.path.join(test_database_path, 'reactions')
+    save_yaml_file(path=os.path.join(reactions_path, 'H_Abstraction_0.yml'), content={0: {}, 4: {}})
+    rxn = AMReaction(r_species=[ARCSpecies(label='OH', smiles='[OH]'), ARCSpecies(label='NCC', smiles='NCC')],
+                     p_species=[ARCSpecies(label='H2O', smiles='O'), ARCSpecies(label='NjCC', smiles='[NH]CC')],
+                     database_path=test_database_path)
+    assert rxn.index == 5
+    assert os.path.isfile(os.path.join(test_database_path, 'manifests', 'H_Abstraction.yml'))  # The rebuilt manifest.
+    save_yaml_file(path=os.path.join(reactions_path, 'H_Abstraction_0.yml'), content={0: {}, 4: {}, 9: {}})
+    assert rxn.index == 5
+    shutil.rmtree(test_database_path)
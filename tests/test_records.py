@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_records module
+"""
+
+import os
+import shutil
+
+import numpy as np
+
+from am3db.atom_maps import AtomMapSet
+from am3db.common import AM3DB_PATH
+from am3db.query import ReactionDB
+from am3db.records import StoredReaction
+from am3db.storage import save_shard
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'records_db')
+REACTIONS_PATH = os.path.join(TEST_DATABASE_PATH, 'reactions')
+
+ENTRY = {'multiplicity': 2,
+         'charge': 0,
+         'r_inchi_keys': ['TUJKJAMUKRIRHC-UHFFFAOYSA-N', 'UFHFLCQGNIYNRP-UHFFFAOYSA-N'],
+         'p_inchi_keys': ['XLYOFNOQVPJJNP-UHFFFAOYSA-N', 'YZCKVEUIGOORGS-UHFFFAOYSA-N'],
+         'r_adjacency_lists': [['multiplicity 2\n1 O u1 p2 c0 {2,S}\n2 H u0 p0 c0 {1,S}\n'],
+                               ['1 H u0 p0 c0 {2,S}\n2 H u0 p0 c0 {1,S}\n']],
+         'p_adjacency_lists': [['1 O u0 p2 c0 {2,S} {3,S}\n2 H u0 p0 c0 {1,S}\n3 H u0 p0 c0 {1,S}\n'],
+                               ['multiplicity 2\n1 H u1 p0 c0\n']],
+         'r_xyz': [{'symbols': ('O', 'H'), 'isotopes': (16, 1), 'coords': ((0.0, 0.0, 0.0), (0.0, 0.0, 0.97))},
+                   {'symbols': ('H', 'H'), 'isotopes': (1, 1), 'coords': ((0.0, 0.0, 0.37), (0.0, 0.0, -0.37))}],
+         'p_xyz': [{'symbols': ('O', 'H', 'H'), 'isotopes': (16, 1, 1),
+                    'coords': ((0.0, 0.0, 0.12), (0.0, 0.76, -0.47), (0.0, -0.76, -0.47))},
+                   {'symbols': ('H',), 'isotopes': (1,), 'coords': ((0.0, 0.0, 0.0),)}],
+         'atom_maps': [[0, 1, 2, 3]],
+         'clustering': [],
+         'approved_by': ['user_1'],
+         'rejected_by': None,
+         'rejected_reasons': [],
+         }
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
+    os.makedirs(REACTIONS_PATH)
+    save_shard(os.path.join(REACTIONS_PATH, 'H_Abstraction_0.yml'),
+               {0: ENTRY, 1: dict(ENTRY, approved_by=None, atom_maps=AtomMapSet([[0, 1, 3, 2]]).to_compact())})
+
+
+def test_stored_reaction():
+    """Test reading fields of a stored reaction."""
+    record = StoredReaction(family='H_Abstraction', index=0, entry=ENTRY)
+    assert not hasattr(record, '__dict__')
+    assert record.multiplicity == 2
+    assert record.approved
+    assert not record.rejected
+    assert record.rejected_reasons == []
+    assert record['r_inchi_keys'] == ENTRY['r_inchi_keys']
+    assert record.get('unknown', 0) == 0
+    assert record._atom_maps is not None and not isinstance(record._atom_maps, AtomMapSet)  # Not decoded yet.
+    assert record.atom_maps.to_list() == [[0, 1, 2, 3]]
+    assert record.atom_maps is record.atom_maps
+    assert record.r_coords.shape == (4, 3)
+    assert np.isclose(record.r_coords[3, 2], -0.37)
+    assert record.p_coords.shape == (4, 3)
+    assert repr(record) == 'StoredReaction(family=H_Abstraction, index=0)'
+    record = StoredReaction(family='H_Abstraction', index=2, entry=dict(ENTRY, atom_maps=[[0, 1, 3], [1]]))
+    assert len(record.atom_maps) == 0
+    assert record['atom_maps'] == [[0, 1, 3], [1]]
+
+
+def test_records():
+    """Test streaming records from the database."""
+    db = ReactionDB(database_path=TEST_DATABASE_PATH)
+    records = list(db.records(family='H_Abstraction'))
+    assert [record.index for record in records] == [0, 1]
+    assert records[1].atom_maps.to_list() == [[0, 1, 3, 2]]
+    assert [record.index for record in db.records(approved=True)] == [0]
+    assert db.get_record('H_Abstraction', 1).approved_by is None
+    assert db.get_record('H_Abstraction', 2) is None
+
+
+def test_to_am_reaction():
+    """Test constructing the full reaction of a stored reaction."""
+    reaction = ReactionDB(database_path=TEST_DATABASE_PATH).get_record('H_Abstraction', 0).to_am_reaction()
+    assert reaction.index == 0
+    assert reaction.family.label == 'H_Abstraction'
+    assert reaction.approved_by == ['user_1']
+    assert reaction.atom_map == [[0, 1, 2, 3]]
+    assert [spc.mol.to_smiles() for spc in reaction.r_species] == ['[OH]', '[H][H]']
+    reaction = StoredReaction(family='H_Abstraction', index=1, entry=dict(ENTRY, atom_maps=None)).to_am_reaction()
+    assert reaction.index == 1
+    assert reaction.approved_by is None  # The review state does not apply to recomputed atom maps.
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_refresh module
+"""
+
+import os
+import shutil
+
+from am3db import refresh
+from am3db.common import AM3DB_PATH
+from am3db.fingerprint import get_entry_fingerprint
+from am3db.ingestion import IngestionPipeline
+from am3db.query import ReactionDB
+from am3db.storage import read_shard, save_shard
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'refresh_db')
+REACTIONS_PATH = os.path.join(TEST_DATABASE_PATH, 'reactions')
+
+SPECS = [{'r_species': [{'label': 'OH', 'smiles': '[OH]'}, {'label': 'NCC', 'smiles': 'NCC'}],
+          'p_species': [{'label': 'H2O', 'smiles': 'O'}, {'label': 'NjCC', 'smiles': '[NH]CC'}]},
+         {'r_species': [{'label': 'OH', 'smiles': '[OH]'}, {'label': 'C2H6', 'smiles': 'CC'}],
+          'p_species': [{'label': 'H2O', 'smiles': 'O'}, {'label': 'C2H5', 'smiles': '[CH2]C'}]},
+         ]
+
+
+def make_entry(index: int) -> dict:
+    """Make a fingerprinted database entry."""
+    entry = {'multiplicity': 1, 'charge': 0, 'r_adjacency_lists': [], 'p_adjacency_lists': [],
+             'r_xyz': [{'symbols': ('H',), 'isotopes': (1,), 'coords': ((float(index), 0.0, 0.0),)}],
+             'p_xyz': [], 'atom_maps': [[0]], 'approved_by': None, 'rejected_by': None, 'rejected_reasons': []}
+    entry['fingerprint'] = get_entry_fingerprint(entry)
+    return entry
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
+    os.makedirs(REACTIONS_PATH)
+    save_shard(os.path.join(REACTIONS_PATH, 'fam_0.yml'), {0: make_entry(0), 1: make_entry(1)})
+    save_shard(os.path.join(REACTIONS_PATH, 'fam_1.yml'), {500: make_entry(500)})
+
+
+def test_get_refresh_tasks():
+    """Test streaming only the stale and updated entries."""
+    stale = make_entry(1)
+    stale['r_xyz'] = [{'symbols': ('H',), 'isotopes': (1,), 'coords': ((9.0, 0.0, 0.0),)}]
+    save_shard(os.path.join(REACTIONS_PATH, 'fam_0.yml'), {0: make_entry(0), 1: stale})
+    summary = {'checked': 0, 'unchanged': 0}
+    updates, fingerprints = {('fam', 500): {'r_species': []}, ('fam', 7): {'r_species': []}}, dict()
+    tasks = list(refresh.get_refresh_tasks(TEST_DATABASE_PATH, updates=updates, summary=summary,
+                                           fingerprints=fingerprints))
+    assert [(family, index, spec) for family, index, _, spec in tasks] == [('fam', 1, None),
+                                                                           ('fam', 500, {'r_species': []})]
+    assert summary == {'checked': 3, 'unchanged': 1}
+    assert fingerprints == {('fam', 1): stale['fingerprint'], ('fam', 500): make_entry(500)['fingerprint']}
+    assert list(updates.keys()) == [('fam', 7)]
+    assert len(list(refresh.get_refresh_tasks(TEST_DATABASE_PATH, updates=dict(), force=True))) == 3
+    save_shard(os.path.join(REACTIONS_PATH, 'fam_0.yml'), {0: make_entry(0), 1: make_entry(1)})
+
+
+def test_carry_review_state():
+    """Test carrying the review state over to a recomputed entry."""
+    stored = dict(make_entry(0), approved_by=['user_1'], rejected_by=['user_2'], rejected_reasons=['Not sure'])
+    entry = refresh.carry_review_state(stored_entry=stored, new_entry=make_entry(0))
+    assert entry['approved_by'] == ['user_1']
+    assert entry['rejected_reasons'] == ['Not sure']
+    entry = refresh.carry_review_state(stored_entry=stored, new_entry=dict(make_entry(0), atom_maps=[[0], [0]]))
+    assert entry['approved_by'] is None
+    assert entry['rejected_by'] is None
+
+
+def test_write_back():
+    """Test that only the shards holding recomputed entries are written back."""
+    mtime = os.stat(os.path.join(REACTIONS_PATH, 'fam_1.yml')).st_mtime_ns
+    new_entry = dict(make_entry(0), multiplicity=3)
+    summary = {'recomputed': 0, 'failed': 0, 'shards': list(), 'errors': list()}
+    refresh.write_back({'fam': {0: (make_entry(0)['fingerprint'], new_entry),
+                                1: ('modified-meanwhile', dict(make_entry(1), multiplicity=3))}},
+                       database_path=TEST_DATABASE_PATH, summary=summary)
+    assert summary['recomputed'] == 1
+    assert summary['failed'] == 1
+    assert summary['shards'] == ['fam_0.yml']
+    assert summary['errors'][0][:2] == ('fam', 1)
+    content = read_shard(os.path.join(REACTIONS_PATH, 'fam_0.yml'))
+    assert content[0]['multiplicity'] == 3
+    assert content[1]['multiplicity'] == 1
+    assert os.stat(os.path.join(REACTIONS_PATH, 'fam_1.yml')).st_mtime_ns == mtime
+
+
+def test_refresh_database():
+    """Test recomputing only the entries whose inputs changed."""
+    IngestionPipeline(database_path=TEST_DATABASE_PATH, max_workers=1).ingest(SPECS)
+    summary = refresh.refresh_database(database_path=TEST_DATABASE_PATH, families=['H_Abstraction'], max_workers=1)
+    assert summary['checked'] == 2
+    assert summary['recomputed'] == 0
+    assert summary['shards'] == []
+
+    shard_path = os.path.join(REACTIONS_PATH, 'H_Abstraction_0.yml')
+    content = read_shard(shard_path)
+    content[1]['approved_by'] = ['user_1']
+    del content[1]['fingerprint']  # Computed by a version of AM3DB before fingerprints.
+    save_shard(shard_path, content)
+    summary = refresh.refresh_database(database_path=TEST_DATABASE_PATH, families=['H_Abstraction'], max_workers=2,
+                                       updates={('H_Abstraction', 0): SPECS[0]})
+    assert summary['failed'] == 0
+    assert summary['recomputed'] == 1
+    assert summary['unchanged'] == 1
+    assert summary['shards'] == ['H_Abstraction_0.yml']
+    entry = ReactionDB(database_path=TEST_DATABASE_PATH).get('H_Abstraction', 1)
+    assert entry['fingerprint'] == get_entry_fingerprint(entry)
+    assert entry['approved_by'] == ['user_1']
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
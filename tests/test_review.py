@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_review module
+"""
+
+import os
+import shutil
+
+import pytest
+from am3db import review
+from am3db.common import AM3DB_PATH, read_yaml_file, save_yaml_file
+from am3db.manifest import FamilyManifest
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'review_db')
+USERS_PATH = os.path.join(TEST_DATABASE_PATH, 'users.yml')
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    save_yaml_file(path=USERS_PATH, content={'S': 'student', 'A': 'admin'})
+    reactions_path = os.path.join(TEST_DATABASE_PATH, 'reactions')
+    save_yaml_file(path=os.path.join(reactions_path, 'intra_H_migration_0.yml'),
+                   content={0: {'approved_by': None, 'rejected_by': None, 'rejected_reasons': []},
+                            1: {'approved_by': None, 'rejected_by': None, 'rejected_reasons': []}})
+    save_yaml_file(path=os.path.join(reactions_path, 'intra_H_migration_1.yml'),
+                   content={500: {'approved_by': None, 'rejected_by': ['S'], 'rejected_reasons': ['wrong']}})
+
+
+def test_review_batch(capsys):
+    """Test applying many review decisions."""
+    reactions_path = os.path.join(TEST_DATABASE_PATH, 'reactions')
+    reviewed = review.review_batch('S', [('intra_H_migration', 0, 'approve'),
+                                         ('intra_H_migration', 1, 'reject', 'swapped atoms'),
+                                         ('intra_H_migration', 2, 'approve'),
+                                         ], database_path=TEST_DATABASE_PATH)
+    assert reviewed == [('intra_H_migration', 0), ('intra_H_migration', 1)]
+    assert 'Reaction 2 of the intra_H_migration family does not exist' in capsys.readouterr().out
+    content = read_yaml_file(os.path.join(reactions_path, 'intra_H_migration_0.yml'))
+    assert content[0]['approved_by'] == ['S']
+    assert content[1]['rejected_by'] == ['S']
+    assert content[1]['rejected_reasons'] == ['swapped atoms']
+    assert FamilyManifest(family='intra_H_migration', database_path=TEST_DATABASE_PATH).load().is_in_sync()
+
+    # Only an admin can approve a rejected reaction.
+    review.review_batch('S', [('intra_H_migration', 500, 'approve')], database_path=TEST_DATABASE_PATH)
+    assert read_yaml_file(os.path.join(reactions_path, 'intra_H_migration_1.yml'))[500]['rejected_by'] == ['S']
+    review.review_batch('A', [('intra_H_migration', 500, 'approve')], database_path=TEST_DATABASE_PATH)
+    entry = read_yaml_file(os.path.join(reactions_path, 'intra_H_migration_1.yml'))[500]
+    assert entry['rejected_by'] is None
+    assert entry['approved_by'] == ['S', 'A']
+
+
+def test_review_batch_errors():
+    """Test reviewing with an unknown user or illegal decisions."""
+    assert review.review_batch('X', [('intra_H_migration', 0, 'approve')], database_path=TEST_DATABASE_PATH) == []
+    with pytest.raises(ValueError):
+        review.review_batch('S', [('intra_H_migration', 0, 'maybe')], database_path=TEST_DATABASE_PATH)
+    with pytest.raises(ValueError):
+        review.review_batch('S', [('intra_H_migration', 0, 'reject')], database_path=TEST_DATABASE_PATH)
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
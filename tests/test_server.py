@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_server module
+"""
+
+import asyncio
+import os
+import shutil
+import time
+from unittest import mock
+
+from am3db.common import AM3DB_PATH, save_yaml_file
+from am3db.review import apply_reviews
+from am3db.server import HTTPReviewClient, LocalReviewClient, ReviewServer, ReviewService, simulate_reviewers
+from am3db.storage import read_shard, save_shard
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'server_db')
+REACTIONS_PATH = os.path.join(TEST_DATABASE_PATH, 'reactions')
+USERS_PATH = os.path.join(TEST_DATABASE_PATH, 'users.yml')
+NAMES = [f'student_{i}' for i in range(200)]
+
+
+def make_entry() -> dict:
+    """Make a database entry which was not reviewed."""
+    return {'multiplicity': 1, 'charge': 0, 'r_inchi_keys': ['A'], 'p_inchi_keys': ['B'],
+            'approved_by': None, 'rejected_by': None, 'rejected_reasons': []}
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
+    os.makedirs(REACTIONS_PATH)
+    save_yaml_file(path=USERS_PATH, content=dict({'S': 'student', 'A': 'admin'},
+                                                 **{name: 'student' for name in NAMES}))
+    save_shard(os.path.join(REACTIONS_PATH, 'fam_0.yml'), {index: make_entry() for index in range(3)})
+    save_shard(os.path.join(REACTIONS_PATH, 'fam_1.yml'),
+               {500: dict(make_entry(), rejected_by=['S'], rejected_reasons=['wrong'])})
+    save_shard(os.path.join(REACTIONS_PATH, 'load_0.yml'), {index: make_entry() for index in range(500)})
+    save_shard(os.path.join(REACTIONS_PATH, 'load_1.yml'), {index: make_entry() for index in range(500, 1000)})
+
+
+def test_review_service():
+    """Test reviewing through the in-process client."""
+    async def run():
+        service = ReviewService(database_path=TEST_DATABASE_PATH, users_path=USERS_PATH, debounce=0.01)
+        client = LocalReviewClient(service, 'S')
+        status, page = await client.pending(family='fam', size=2)
+        assert status == 200
+        assert page['total'] == 3
+        assert [reaction['index'] for reaction in page['reactions']] == [0, 1]
+        assert page['reactions'][0]['r_inchi_keys'] == ['A']
+        status, page = await client.pending(family='fam', page=1, size=2)
+        assert [reaction['index'] for reaction in page['reactions']] == [2]
+
+        results = await asyncio.gather(client.review('fam', 0, 'approve'),
+                                       client.review('fam', 1, 'reject', 'Swapped atoms.'),
+                                       LocalReviewClient(service, 'A').review('fam', 500, 'approve'))
+        assert [status for status, _ in results] == [200, 200, 200]
+        assert service.stats == {'decisions': 3, 'batches': 2, 'reviewed': 3}
+        status, page = await client.pending(family='fam')
+        assert [reaction['index'] for reaction in page['reactions']] == [2]
+
+        assert (await client.review('fam', 7, 'approve'))[0] == 404
+        assert (await client.review('fam', 2, 'reject'))[0] == 400
+        assert (await client.review('fam', 2, 'maybe'))[0] == 400
+        assert (await LocalReviewClient(service, 'X').review('fam', 2, 'approve'))[0] == 403
+        assert (await client.request('GET', '/review'))[0] == 405
+        assert (await client.request('GET', '/unknown'))[0] == 404
+        status, response = await client.request('GET', '/reactions/fam/1')
+        assert response['entry']['rejected_reasons'] == ['Swapped atoms.']
+        await service.close()
+
+    asyncio.run(run())
+    content = read_shard(os.path.join(REACTIONS_PATH, 'fam_0.yml'))
+    assert content[0]['approved_by'] == ['S']
+    assert content[1]['rejected_by'] == ['S']
+    entry = read_shard(os.path.join(REACTIONS_PATH, 'fam_1.yml'))[500]
+    assert entry['rejected_by'] is None
+    assert entry['approved_by'] == ['A']
+
+
+def test_review_server():
+    """Test reviewing over HTTP."""
+    async def run():
+        service = ReviewService(database_path=TEST_DATABASE_PATH, users_path=USERS_PATH, debounce=0.01)
+        server = ReviewServer(service, port=0)
+        await server.start()
+        client = HTTPReviewClient(server.host, server.port, 'S')
+        status, response = await client.request('GET', '/families')
+        assert status == 200
+        assert 'fam' in response['families']
+        status, response = await client.review('fam', 2, 'approve')
+        assert status == 200 and response['reviewed']
+        assert (await client.pending(family='fam'))[1]['total'] == 0
+        await client.close()
+        await server.stop()
+
+    asyncio.run(run())
+    assert read_shard(os.path.join(REACTIONS_PATH, 'fam_0.yml'))[2]['approved_by'] == ['S']
+
+
+def test_simulate_reviewers():
+    """Test that the decisions of many concurrent reviewers are coalesced into few shard writes."""
+    async def run():
+        service = ReviewService(database_path=TEST_DATABASE_PATH, users_path=USERS_PATH, debounce=0.05)
+        summary = await simulate_reviewers(service, names=NAMES, reviews_per_reviewer=2, family='load',
+                                           reject_every=2)
+        await service.close()
+        return summary
+
+    summary = asyncio.run(run())
+    assert summary['reviewers'] == 200
+    assert summary['reviewed'] == 400
+    assert summary['failed'] == 0
+    assert summary['batches'] < 40
+    content = read_shard(os.path.join(REACTIONS_PATH, 'load_0.yml'))
+    content.update(read_shard(os.path.join(REACTIONS_PATH, 'load_1.yml')))
+    assert sum(len(entry['approved_by'] or list()) for entry in content.values()) == 200
+    assert sum(len(entry['rejected_by'] or list()) for entry in content.values()) == 200
+    assert content[0]['approved_by'] == ['student_0']
+
+
+def apply_reviews_slowly(*args, **kwargs):
+    """Apply reviews slowly, so that decisions arriving meanwhile wait in the next batch."""
+    time.sleep(0.2)
+    return apply_reviews(*args, **kwargs)
+
+
+def test_queued_decisions():
+    """Test that a reaction stays queued while another decision on it waits in the next batch."""
+    async def run():
+        service = ReviewService(database_path=TEST_DATABASE_PATH, users_path=USERS_PATH, debounce=0.01)
+        with mock.patch('am3db.server.apply_reviews', apply_reviews_slowly):
+            first = asyncio.create_task(LocalReviewClient(service, 'S').review('fam', 500, 'approve'))
+            await asyncio.sleep(0.1)  # The first batch is being written.
+            second = asyncio.create_task(LocalReviewClient(service, NAMES[1]).review('fam', 500, 'approve'))
+            await asyncio.sleep(0)
+            assert service._queued == {('fam', 500): 2}
+            assert (await first)[0] == 200
+            assert service._queued == {('fam', 500): 1}
+            assert (await second)[0] == 200
+            assert service._queued == dict()
+        await service.close()
+
+    asyncio.run(run())
+    assert read_shard(os.path.join(REACTIONS_PATH, 'fam_1.yml'))[500]['approved_by'] == ['A', 'S', NAMES[1]]
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_sharding module
+"""
+
+import os
+import shutil
+
+from am3db import sharding
+from am3db.common import AM3DB_PATH
+from am3db.manifest import (FamilyManifest,
+                            determine_family_filename_by_index,
+                            get_shard_table,
+                            save_shard_table,
+                            )
+from am3db.query import ReactionDB
+from am3db.storage import read_shard, save_shard, set_database_setting
+from am3db.writer import DatabaseWriter
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'sharding_db')
+REACTIONS_PATH = os.path.join(TEST_DATABASE_PATH, 'reactions')
+
+
+def make_entry(index: int, atoms: int = 1) -> dict:
+    """Make a database entry of a given size."""
+    return {'charge': 0, 'multiplicity': 1, 'r_xyz': [f'H {index} 0.0 0.0'] * atoms}
+
+
+def populate(family: str, indices: range, atoms: int = 1) -> FamilyManifest:
+    """Write the entries of a family in the default layout and load its manifest."""
+    os.makedirs(REACTIONS_PATH, exist_ok=True)
+    shards = dict()
+    for index in indices:
+        shard = determine_family_filename_by_index(index=index, family=family, database_path=TEST_DATABASE_PATH)
+        shards.setdefault(shard, dict())[index] = make_entry(index, atoms)
+    for shard, content in shards.items():
+        save_shard(os.path.join(REACTIONS_PATH, shard), content)
+    return FamilyManifest(family=family, database_path=TEST_DATABASE_PATH).load()
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
+
+
+def test_determine_family_filename_by_index_with_a_table():
+    """Test looking up the shard of a reaction ID in a shard table."""
+    assert determine_family_filename_by_index(10, 'tab', database_path=TEST_DATABASE_PATH) == 'tab_0.yml'
+    save_shard_table('tab', [[100, 1], [0, 0], [40, 2]], database_path=TEST_DATABASE_PATH)
+    assert get_shard_table('tab', database_path=TEST_DATABASE_PATH) == [[0, 0], [40, 2], [100, 1]]
+    assert determine_family_filename_by_index(10, 'tab', database_path=TEST_DATABASE_PATH) == 'tab_0.yml'
+    assert determine_family_filename_by_index(40, 'tab', database_path=TEST_DATABASE_PATH) == 'tab_2.yml'
+    assert determine_family_filename_by_index(99, 'tab', database_path=TEST_DATABASE_PATH) == 'tab_2.yml'
+    assert determine_family_filename_by_index(5000, 'tab', extension='.am3',
+                                              database_path=TEST_DATABASE_PATH) == 'tab_1.am3'
+    assert determine_family_filename_by_index(10, 'other', database_path=TEST_DATABASE_PATH) == 'other_0.yml'
+
+
+def test_exceeds_budget():
+    """Test checking a shard against a shard budget."""
+    assert not sharding.exceeds_budget(10, 1000)
+    assert sharding.exceeds_budget(10, 1000, max_records=5)
+    assert not sharding.exceeds_budget(10, 1000, max_records=10)
+    assert sharding.exceeds_budget(10, 1000, max_bytes=500)
+    assert not sharding.exceeds_budget(1, 1000, max_records=0, max_bytes=500)
+
+
+def test_split_shard_by_records():
+    """Test splitting a shard by the number of reactions."""
+    manifest = populate('split_records', range(10))
+    content = read_shard(os.path.join(REACTIONS_PATH, 'split_records_0.yml'))
+    new_shards = sharding.split_shard(manifest, 'split_records_0.yml', content, max_records=4)
+    assert new_shards == ['split_records_1.yml', 'split_records_2.yml']
+    assert get_shard_table('split_records', TEST_DATABASE_PATH) == [[0, 0], [4, 1], [8, 2]]
+    assert sorted(read_shard(os.path.join(REACTIONS_PATH, 'split_records_0.yml')).keys()) == [0, 1, 2, 3]
+    assert sorted(read_shard(os.path.join(REACTIONS_PATH, 'split_records_2.yml')).keys()) == [8, 9]
+    manifest = FamilyManifest(family='split_records', database_path=TEST_DATABASE_PATH).load()
+    assert sum(entry['count'] for entry in manifest.shards.values()) == 10
+    assert manifest.next_index == 10
+    db = ReactionDB(database_path=TEST_DATABASE_PATH)
+    assert [index for _, index, _ in db.query(family='split_records')] == list(range(10))
+    assert db.get('split_records', 5)['r_xyz'] == ['H 5 0.0 0.0']
+
+
+def test_split_shard_by_bytes():
+    """Test splitting a shard by its size."""
+    manifest = populate('split_bytes', range(20), atoms=20)
+    size = manifest.shards['split_bytes_0.yml']['size']
+    content = read_shard(os.path.join(REACTIONS_PATH, 'split_bytes_0.yml'))
+    new_shards = sharding.split_shard(manifest, 'split_bytes_0.yml', content, max_bytes=size // 3)
+    assert len(new_shards) >= 3
+    manifest = FamilyManifest(family='split_bytes', database_path=TEST_DATABASE_PATH).load()
+    assert sum(entry['count'] for entry in manifest.shards.values()) == 20
+    assert all(entry['size'] <= size // 3 * 1.2 for entry in manifest.shards.values())
+
+
+def test_merge_shards():
+    """Test merging adjacent shards."""
+    manifest = populate('merge', range(10))
+    content = read_shard(os.path.join(REACTIONS_PATH, 'merge_0.yml'))
+    sharding.split_shard(manifest, 'merge_0.yml', content, max_records=4)
+    try:
+        sharding.merge_shards(manifest, 'merge_0.yml', 'merge_2.yml')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Expected a ValueError for merging non-adjacent shards.')
+    merged = sharding.merge_shards(manifest, 'merge_0.yml', 'merge_1.yml')
+    assert sorted(merged.keys()) == list(range(8))
+    assert not os.path.isfile(os.path.join(REACTIONS_PATH, 'merge_1.yml'))
+    assert get_shard_table('merge', TEST_DATABASE_PATH) == [[0, 0], [8, 2]]
+    assert determine_family_filename_by_index(5, 'merge', database_path=TEST_DATABASE_PATH) == 'merge_0.yml'
+    assert sorted(FamilyManifest(family='merge', database_path=TEST_DATABASE_PATH).load().shards.keys()) \
+        == ['merge_0.yml', 'merge_2.yml']
+    assert ReactionDB(database_path=TEST_DATABASE_PATH).count(family='merge') == 10
+
+
+def test_rebalance_family():
+    """Test rebalancing the shards of a family."""
+    populate('rebalance', range(1200))
+    summary = sharding.rebalance_family('rebalance', database_path=TEST_DATABASE_PATH, max_records=300)
+    assert summary['split'] == 2
+    assert summary['merged'] == 0
+    assert summary['shards'] == 5
+    summary = sharding.rebalance_family('rebalance', database_path=TEST_DATABASE_PATH, max_records=700)
+    assert summary['split'] == 0
+    assert summary['shards'] == 2
+    manifest = FamilyManifest(family='rebalance', database_path=TEST_DATABASE_PATH).load()
+    assert max(entry['count'] for entry in manifest.shards.values()) <= 700
+    assert sum(entry['count'] for entry in manifest.shards.values()) == 1200
+    db = ReactionDB(database_path=TEST_DATABASE_PATH)
+    assert [index for _, index, _ in db.query(family='rebalance')] == list(range(1200))
+    assert [index for _, index, _ in db.query(family='rebalance', indices=[0, 650, 1199])] == [0, 650, 1199]
+
+
+def test_writer_splits_shards():
+    """Test that the database writer splits shards exceeding the shard budget of the database."""
+    set_database_setting('shard_max_records', 50, database_path=TEST_DATABASE_PATH)
+    assert sharding.is_adaptive(TEST_DATABASE_PATH)
+    try:
+        with DatabaseWriter(database_path=TEST_DATABASE_PATH, on_duplicate='allow', journal=False) as writer:
+            for i in range(120):
+                writer.add_entry(family='online', entry=make_entry(i))
+        with DatabaseWriter(database_path=TEST_DATABASE_PATH, on_duplicate='allow', journal=False) as writer:
+            for i in range(120, 140):
+                writer.add_entry(family='online', entry=make_entry(i))
+        manifest = FamilyManifest(family='online', database_path=TEST_DATABASE_PATH).load()
+        assert sum(entry['count'] for entry in manifest.shards.values()) == 140
+        assert max(entry['count'] for entry in manifest.shards.values()) <= 50
+        db = ReactionDB(database_path=TEST_DATABASE_PATH)
+        assert [index for _, index, _ in db.query(family='online')] == list(range(140))
+        assert db.get('online', 130)['r_xyz'] == ['H 130 0.0 0.0']
+    finally:
+        set_database_setting('shard_max_records', None, database_path=TEST_DATABASE_PATH)
+    assert not sharding.is_adaptive(TEST_DATABASE_PATH)
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
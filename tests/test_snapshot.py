@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_snapshot module
+"""
+
+import os
+import shutil
+
+import numpy as np
+
+from am3db import snapshot
+from am3db.common import AM3DB_PATH
+from am3db.query import ReactionDB
+from am3db.storage import save_shard
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'snapshot_db')
+REACTIONS_PATH = os.path.join(TEST_DATABASE_PATH, 'reactions')
+SNAPSHOT_PATH = os.path.join(TEST_DATABASE_PATH, 'am3db.snapshot')
+
+
+def make_entry(index: int) -> dict:
+    """Make a database entry with two reactants and one product."""
+    return {'multiplicity': 2,
+            'charge': 0,
+            'r_inchi_keys': ['TUJKJAMUKRIRHC-UHFFFAOYSA-N', f'KEY-{index}'],
+            'r_xyz': [{'symbols': ('O', 'H'), 'isotopes': (16, 1), 'coords': ((0.0, 0.0, float(index)),
+                                                                               (0.0, 0.0, 0.97))},
+                      {'symbols': ('H',), 'isotopes': (1,), 'coords': ((1.5, 0.0, 0.0),)}],
+            'p_xyz': [{'symbols': ('H', 'O', 'H'), 'isotopes': (1, 16, 1),
+                       'coords': ((0.0, 0.7, 0.0), (0.0, 0.0, 0.0), (0.0, -0.7, 0.0))}],
+            'atom_maps': [[1, 0, 2], [1, 2, 0]],
+            'approved_by': ['user_1'] if index % 2 else None,
+            'rejected_reasons': [],
+            }
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
+    os.makedirs(REACTIONS_PATH)
+    save_shard(os.path.join(REACTIONS_PATH, 'H_Abstraction_0.yml'), {i: make_entry(i) for i in range(3)})
+    save_shard(os.path.join(REACTIONS_PATH, 'H_Abstraction_1.yml'), {500: make_entry(500)})
+    save_shard(os.path.join(REACTIONS_PATH, 'R_Addition_0.yml'), {7: dict(make_entry(7), atom_maps=None),
+                                                                   8: dict(make_entry(8), atom_maps=[[0, 1], [1]])})
+
+
+def test_export_and_read_snapshot():
+    """Test exporting a snapshot and reading it back."""
+    header = snapshot.export_snapshot(SNAPSHOT_PATH, database_path=TEST_DATABASE_PATH)
+    assert header['num_reactions'] == 6
+    assert header['families'] == {'H_Abstraction': [0, 4], 'R_Addition': [4, 6]}
+    with snapshot.Snapshot(SNAPSHOT_PATH) as snap:
+        assert len(snap) == 6
+        assert ('H_Abstraction', 500) in snap
+        assert ('H_Abstraction', 499) not in snap
+        assert snap.get('R_Addition', 0) is None
+        assert snap.get('unknown', 0) is None
+        for spec in snap.header['arrays'].values():
+            assert spec['offset'] % snapshot.ALIGNMENT == 0
+        db = ReactionDB(database_path=TEST_DATABASE_PATH)
+        for family, index, entry in db.query():
+            record = snap.get(family, index)
+            assert record.index == index
+            assert record.as_dict() == entry
+        record = snap.get('H_Abstraction', 2)
+        assert record['approved_by'] is None
+        assert record.get('unknown', 'default') == 'default'
+        assert record['r_xyz'][1] == {'symbols': ('H',), 'isotopes': (1,), 'coords': ((1.5, 0.0, 0.0),)}
+        assert np.array_equal(record.r_coords, [[0.0, 0.0, 2.0], [0.0, 0.0, 0.97], [1.5, 0.0, 0.0]])
+        assert not record.r_coords.flags.writeable
+        assert record.r_coords.base is not None  # A view into the memory-mapped file.
+        assert record.atom_maps.tolist() == [[1, 0, 2], [1, 2, 0]]
+        assert snap.get_symbols(record.row, 'p') == ['H', 'O', 'H']
+        assert snap.get('R_Addition', 7)['atom_maps'] is None
+        record = snap.get('R_Addition', 8)
+        assert record.atom_maps.shape == (0, 0)
+        assert record['atom_maps'] == [[0, 1], [1]]  # Invalid atom maps are kept as they were stored.
+        assert [record.index for record in snap.records(family='H_Abstraction')] == [0, 1, 2, 500]
+        assert len(snap.arrays['r_coords']) == 18
+
+
+def test_empty_snapshot():
+    """Test exporting an empty snapshot."""
+    path = os.path.join(TEST_DATABASE_PATH, 'empty.snapshot')
+    snapshot.export_snapshot(path, database_path=TEST_DATABASE_PATH, families=['unknown'])
+    with snapshot.Snapshot(path) as snap:
+        assert len(snap) == 0
+        assert list(snap.records()) == list()
+
+
+def teardown_module():
+    """
+    A method that is run after all unit tests in this class.
+    """
+    shutil.rmtree(TEST_DATABASE_PATH, ignore_errors=True)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_species_cache module
+"""
+
+from arc.species import ARCSpecies
+
+from am3db import species_cache
+
+
+def test_lru_eviction_and_counters():
+    """Test the LRU eviction and the hit/miss counters."""
+    cache = species_cache.SpeciesCache(max_size=2)
+    assert cache.get('a', 'inchi_key', lambda: 'A') == 'A'
+    assert cache.get('b', 'inchi_key', lambda: 'B') == 'B'
+    assert cache.get('a', 'inchi_key', lambda: 'not computed') == 'A'
+    assert cache.get('c', 'inchi_key', lambda: 'C') == 'C'  # Evicts 'b', the least recently used species.
+    assert len(cache) == 2
+    assert cache.get('b', 'inchi_key', lambda: 'B2') == 'B2'
+    assert cache.get(None, 'inchi_key', lambda: 'uncached') == 'uncached'
+    stats = cache.stats()
+    assert stats['size'] == 2
+    assert stats['max_size'] == 2
+    assert stats['inchi_key'] == {'hits': 1, 'misses': 5, 'hit_rate': 1 / 6}
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()['inchi_key']['hits'] == 0
+
+
+def test_returned_values_are_copies():
+    """Test that cached values are not shared between callers."""
+    cache = species_cache.SpeciesCache()
+    value = cache.get('a', 'adjacency_lists', lambda: ['adj'])
+    value.append('modified')
+    assert cache.get('a', 'adjacency_lists', lambda: None) == ['adj']
+
+
+def test_disabled_cache():
+    """Test that a zero-sized cache always computes."""
+    cache = species_cache.SpeciesCache(max_size=0)
+    cache.get('a', 'xyz', lambda: 1)
+    assert cache.get('a', 'xyz', lambda: 2) == 2
+    assert len(cache) == 0
+
+
+def test_species_data():
+    """Test getting InChI keys, adjacency lists, and xyz of species."""
+    cache = species_cache.SpeciesCache()
+    oh_1, oh_2 = ARCSpecies(label='OH', smiles='[OH]'), ARCSpecies(label='OH_2', smiles='[OH]')
+    assert species_cache.get_species_key(oh_1) == oh_1.mol.to_adjacency_list()
+    assert cache.get_inchi_key(oh_1) == 'TUJKJAMUKRIRHC-UHFFFAOYSA-N'
+    assert cache.get_inchi_key(oh_2) == 'TUJKJAMUKRIRHC-UHFFFAOYSA-N'
+    assert cache.hits['inchi_key'] == 1
+    assert cache.get_adjacency_lists(oh_2) == ['multiplicity 2\n1 O u1 p2 c0 {2,S}\n2 H u0 p0 c0 {1,S}\n']
+    xyz = cache.get_xyz(oh_1)
+    assert xyz['symbols'] == ('O', 'H')
+    assert cache.get_xyz(oh_2) == xyz
+    assert cache.hits['xyz'] == 1
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_sqlite_database module
+"""
+
+import os
+import shutil
+
+from am3db import sqlite_database
+from am3db.common import AM3DB_PATH, save_yaml_file
+from am3db.storage import read_shard
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'sqlite_db')
+TEST_EXPORT_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'sqlite_export_db')
+
+ENTRY_1 = {'multiplicity': 2,
+           'charge': 0,
+           'r_inchi_keys': ['TUJKJAMUKRIRHC-UHFFFAOYSA-N', 'QUSNBJAOOMFDIB-UHFFFAOYSA-N'],
+           'p_inchi_keys': ['XLYOFNOQVPJJNP-UHFFFAOYSA-N', 'RZRWAZWNUOVMAY-UHFFFAOYSA-N'],
+           'r_xyz': [{'symbols': ('O', 'H'), 'isotopes': (16, 1), 'coords': ((0.0, 0.0, 0.61), (0.0, 0.0, -0.37))}],
+           'atom_maps': [[0, 1, 3, 4, 5, 2]],
+           'approved_by': ['user_1'],
+           'rejected_by': None,
+           }
+ENTRY_2 = {'multiplicity': 2,
+           'charge': 0,
+           'r_inchi_keys': ['OCBFFGCSTGGPSQ-UHFFFAOYSA-N'],
+           'p_inchi_keys': ['HNUALPPJLMYHDK-UHFFFAOYSA-N'],
+           'approved_by': None,
+           'rejected_by': ['user_2'],
+           }
+
+
+def setup_module():
+    """
+    Setup.
+    """
+    save_yaml_file(path=os.path.join(TEST_DATABASE_PATH, 'reactions', 'H_Abstraction_0.yml'),
+                   content={0: ENTRY_1})
+    save_yaml_file(path=os.path.join(TEST_DATABASE_PATH, 'reactions', 'intra_H_migration_1.yml'),
+                   content={500: ENTRY_2})
+
+
+def test_get_species_key():
+    """Test the get_species_key() function."""
+    assert sqlite_database.get_species_key(['B', 'A']) == 'A+B'
+    assert sqlite_database.get_species_key(None) == ''
+
+
+def test_import_find_and_export():
+    """Test importing shards, looking up reactions, and exporting back to shards."""
+    db_path = os.path.join(TEST_DATABASE_PATH, 'am3db.sqlite')
+    with sqlite_database.SQLiteDatabase(path=db_path) as db:
+        assert db.import_shards(database_path=TEST_DATABASE_PATH) == 2
+        assert db.count() == 2
+        assert db.count(family='H_Abstraction') == 1
+        assert db.get('H_Abstraction', 0) == ENTRY_1
+        assert db.get('H_Abstraction', 1) is None
+
+        r_keys = ['QUSNBJAOOMFDIB-UHFFFAOYSA-N', 'TUJKJAMUKRIRHC-UHFFFAOYSA-N']
+        p_keys = ['RZRWAZWNUOVMAY-UHFFFAOYSA-N', 'XLYOFNOQVPJJNP-UHFFFAOYSA-N']
+        assert db.find(r_keys, p_keys) == [('H_Abstraction', 0)]
+        assert db.find(r_keys, p_keys, multiplicity=2, charge=0, family='H_Abstraction') == [('H_Abstraction', 0)]
+        assert db.find(r_keys, p_keys, multiplicity=1) == []
+        assert db.find(p_keys, r_keys) == []
+        assert db.find(p_keys, r_keys, both_directions=True) == [('H_Abstraction', 0)]
+
+        assert [(f, i) for f, i, _ in db.query(approved=True)] == [('H_Abstraction', 0)]
+        assert [(f, i) for f, i, _ in db.query(rejected=True)] == [('intra_H_migration', 500)]
+        assert [(f, i) for f, i, _ in db.query(family='intra_H_migration', approved=True)] == []
+        assert len(list(db.query(multiplicity=2, charge=0))) == 2
+
+        assert db.export_shards(database_path=TEST_EXPORT_PATH) == 2
+    assert read_shard(os.path.join(TEST_EXPORT_PATH, 'reactions', 'H_Abstraction_0.yml')) == {0: ENTRY_1}
+    assert read_shard(os.path.join(TEST_EXPORT_PATH, 'reactions', 'intra_H_migration_1.yml')) == {500: ENTRY_2}
+
+
+def teardown_module():
+    """
+    Teardown any state that was previously setup with a setup_module method.
+    """
+    for path in [TEST_DATABASE_PATH, TEST_EXPORT_PATH]:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
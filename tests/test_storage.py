@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+AM3DB tests test_storage module
+"""
+
+import os
+import shutil
+
+import pytest
+from am3db import storage
+from am3db.common import AM3DB_PATH, read_yaml_file, save_yaml_file
+
+
+TEST_DATABASE_PATH = os.path.join(AM3DB_PATH, 'tests', 'data', 'storage_db')
+
+ENTRY = {'multiplicity': 2,
+         'charge': 0,
+         'r_inchi_keys': ['TUJKJAMUKRIRHC-UHFFFAOYSA-N', 'QUSNBJAOOMFDIB-UHFFFAOYSA-N'],
+         'p_inchi_keys': ['XLYOFNOQVPJJNP-UHFFFAOYSA-N', 'RZRWAZWNUOVMAY-UHFFFAOYSA-N'],
+         'r_adjacency_lists': [['multiplicity 2\n1 O u1 p2 c0 {2,S}\n2 H u0 p0 c0 {1,S}\n']],
+         'p_adjacency_lists': [['1 O u0 p2 c0 {2,S} {3,S}\n2 H u0 p0 c0 {1,S}\n3 H u0 p0 c0 {1,S}\n']],
+         'r_xyz': [{'symbols': ('O', 'H'), 'isotopes': (16, 1),
+                    'coords': ((0.0, 0.0, 0.61), (0.0, 0.0, -0.37))}],
+         'p_xyz': [{'symbols': ('O', 'H', 'H'), 'isotopes': (16, 1, 1),
+                    'coords': ((0.0, 0.0, 0.12), (0.0, 0.76, -0.47), (0.0, -0.76, -0.47))}],
+         'r_rmg_labels': {'*1': 2, '*2': 11, '*3': 0},
+         'p_rmg_labels': None,
+         'atom_maps': [[0, 1, 3, 4, 5, 2], [0, 1, 3, 5, 4, 2]],
+         'clustering': [],
+         'approved_by': ['user_1'],
+         'rejected_by': None,
+         'rejected_reasons': [],
+         'flags': [True, False, 1.5, -3, 'mixed', (1, 2.0)],
+         }
+
+
+def test_binary_round_trip():
+    """Test encoding and decoding a shard in the binary format."""
+    content = {0: ENTRY, 7: {'charge': 0, 'big': 2 ** 70, 'empty': [], 'empty_tuple': ()}}
+    data = storage.encode_shard(content)
+    assert data.startswith(storage.MAGIC)
+    assert storage.decode_shard(data) == content
+    decoded = storage.decode_shard(data)
+    assert isinstance(decoded[0]['r_xyz'][0]['coords'], tuple)
+    assert isinstance(decoded[0]['r_xyz'][0]['coords'][0], tuple)
+    assert isinstance(decoded[0]['atom_maps'], list)
+    assert isinstance(decoded[0]['atom_maps'][0], list)
+
+
+def test_binary_string_table():
+    """Test that repeated strings are stored once."""
+    data = storage.encode_shard({i: {'r_inchi_keys': ['TUJKJAMUKRIRHC-UHFFFAOYSA-N']} for i in range(10)})
+    assert data.count(b'TUJKJAMUKRIRHC-UHFFFAOYSA-N') == 1
+
+
+def test_decode_bad_shard():
+    """Test decoding a file which is not a binary shard."""
+    with pytest.raises(ValueError):
+        storage.decode_shard(b'not a shard')
+
+
+def test_get_backend():
+    """Test getting storage backends by name and by path."""
+    assert storage.get_backend('yaml').extension == '.yml'
+    assert storage.get_backend('binary').extension == '.am3'
+    assert storage.get_backend_by_path('/a/fam_0.am3').name == 'binary'
+    assert storage.get_backend_by_path('/a/fam_0.yml').name == 'yaml'
+    with pytest.raises(ValueError):
+        storage.get_backend('csv')
+
+
+def test_get_family_from_shard_filename():
+    """Test the get_family_from_shard_filename() function."""
+    assert storage.get_family_from_shard_filename('H_Abstraction_0.yml') == 'H_Abstraction'
+    assert storage.get_family_from_shard_filename('intra_H_migration_12.am3') == 'intra_H_migration'
+    assert storage.get_family_from_shard_filename('settings.yml') is None
+    assert storage.get_family_from_shard_filename('fam_0.yml.123.tmp') is None
+
+
+def test_convert_database():
+    """Test converting a database between the YAML and binary backends."""
+    reactions_path = os.path.join(TEST_DATABASE_PATH, 'reactions')
+    save_yaml_file(path=os.path.join(reactions_path, 'fam_0.yml'), content={0: ENTRY, 1: ENTRY})
+    assert storage.get_database_backend(TEST_DATABASE_PATH).name == 'yaml'
+    assert storage.convert_database('binary', database_path=TEST_DATABASE_PATH) == ['fam_0.am3']
+    assert os.listdir(reactions_path) == ['fam_0.am3']
+    assert storage.get_database_backend(TEST_DATABASE_PATH).name == 'binary'
+    assert storage.read_shard(os.path.join(reactions_path, 'fam_0.am3')) == {0: ENTRY, 1: ENTRY}
+    assert storage.convert_database('yaml', database_path=TEST_DATABASE_PATH) == ['fam_0.yml']
+    assert read_yaml_file(os.path.join(reactions_path, 'fam_0.yml')) == {0: ENTRY, 1: ENTRY}
+    assert storage.get_database_backend(TEST_DATABASE_PATH).name == 'yaml'
+
+
+def teardown_module():
+    """
+    Teardown any state that was previously setup with a setup_module method.
+    """
+    if os.path.isdir(TEST_DATABASE_PATH):
+        shutil.rmtree(TEST_DATABASE_PATH)
@@ -8,10 +8,9 @@ AM3DB user tests module
 import os
 import shutil
 
-from arc.common import read_yaml_file, save_yaml_file
-
 from am3db import user
-from am3db.common import DATABASE_PATH
+from am3db.common import DATABASE_PATH, read_yaml_file, save_yaml_file
+from am3db.locks import get_lock_path
 
 
 def setup_module():
@@ -51,6 +50,23 @@ def test_get_user_from_file():
     assert user_3.status.value == 'admin'
 
 
+def test_user_registry():
+    """Test that the users file is only parsed again after it changes."""
+    users_path = os.path.join(DATABASE_PATH, 'users.yml')
+    save_yaml_file(path=users_path, content={'A': 'student'})
+    registry = user.get_user_registry()
+    assert registry is user.get_user_registry(users_path)
+    assert registry.get('A').status.value == 'student'
+    users = registry.users
+    assert registry.load() is users  # Not parsed again.
+    save_yaml_file(path=users_path, content={'A': 'admin', 'C': 'contributor'})
+    assert registry.get('A').status.value == 'admin'
+    assert user.get_user_from_file('C').status.value == 'contributor'
+    os.remove(users_path)
+    assert registry.get('A') is None
+    assert user.get_user_from_file('A') is None
+
+
 def teardown_module():
     """
     Teardown any state that was previously setup with a setup_module method.
@@ -62,3 +78,6 @@ def teardown_module():
     if os.path.isfile(users_back_path):
         shutil.copy(src=users_back_path, dst=users_path)
         os.remove(users_back_path)
+    users_lock_path = get_lock_path('users', database_path=DATABASE_PATH)
+    if os.path.isfile(users_lock_path):
+        os.remove(users_lock_path)